@@ -0,0 +1,6 @@
+#!/bin/bash -e
+
+BASEDIR=`dirname $0`/..
+
+cd $BASEDIR
+$BASEDIR/env/bin/python tests/benchmark/bench_cli.py "$@"
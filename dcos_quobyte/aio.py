@@ -0,0 +1,483 @@
+"""asyncio backend for the framework I/O
+
+Selected with DCOS_QUOBYTE_BACKEND=asyncio, see api.backend().  Fan-out over
+many frameworks and health polling then run as coroutines on one thread.
+All requests of a command share one AsyncHTTPClient, which keeps a pool of
+keep-alive connections per host, and concurrency is bounded by a semaphore
+instead of a thread pool.  Discovery keeps parsing the master state as it
+streams in, see discovery.fetch_framework_index().
+
+The HTTP client only implements what the framework API needs: HTTP/1.1
+requests with small bodies, and responses with Content-Length, chunked or
+connection delimited bodies.  This module requires Python 3.5 and is only
+imported once the backend is selected.
+"""
+
+import asyncio
+import json
+import logging
+import ssl
+import time
+
+from urllib.parse import urlsplit
+
+from dcos_quobyte import api
+from dcos_quobyte import batch
+from dcos_quobyte import cli
+from dcos_quobyte import constants
+from dcos_quobyte import polling
+from dcos_quobyte import rolling
+from dcos_quobyte import trace
+from dcos_quobyte import versions
+
+USER_AGENT = 'dcos-quobyte/' + constants.version
+MAX_HEADER_LINES = 100
+
+
+class Response(object):
+    """Response of AsyncHTTPClient.request()
+
+    :param status_code: HTTP status code
+    :type status_code: int
+    :param headers: headers with lower case names
+    :type headers: dict
+    :param content: body
+    :type content: bytes
+    """
+
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    def json(self):
+        return json.loads(self.content.decode('utf-8'))
+
+
+class ConnectError(OSError):
+    """No connection to the host could be established, so the request was
+    not sent"""
+
+
+class _Connection(object):
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    def close(self):
+        self.writer.close()
+
+
+async def _read_headers(reader):
+    headers = {}
+    for _ in range(MAX_HEADER_LINES):
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            return headers
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    raise ValueError("Too many response headers")
+
+
+async def _read_chunked(reader):
+    chunks = []
+    while True:
+        size = int((await reader.readline()).split(b';')[0].strip(), 16)
+        if size == 0:
+            # skip trailers up to the final empty line
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            return b''.join(chunks)
+        chunks.append(await reader.readexactly(size))
+        await reader.readexactly(2)
+
+
+async def _read_response(connection, method):
+    """Reads one response, returning it and whether the connection can be
+    reused"""
+
+    reader = connection.reader
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("Connection closed by server")
+    version, status, _ = (status_line.decode('latin-1').rstrip('\r\n') +
+                          '  ').split(' ', 2)
+    status_code = int(status)
+    headers = await _read_headers(reader)
+
+    reusable = (version == 'HTTP/1.1' and
+                headers.get('connection', '').lower() != 'close')
+    if method == 'HEAD' or status_code in (204, 304) or status_code < 200:
+        content = b''
+    elif 'chunked' in headers.get('transfer-encoding', '').lower():
+        content = await _read_chunked(reader)
+    elif 'content-length' in headers:
+        content = await reader.readexactly(int(headers['content-length']))
+    else:
+        content = await reader.read()
+        reusable = False
+    return Response(status_code, headers, content), reusable
+
+
+class AsyncHTTPClient(object):
+    """Minimal pooled HTTP/1.1 client on asyncio streams.  Instances belong
+    to the event loop they are used on.
+
+    :param timeout: connect and read timeout in seconds
+    :type timeout: (float, float)
+    :param retries: retries for idempotent requests
+    :type retries: int
+    :param pool_size: idle connections kept per host
+    :type pool_size: int
+    """
+
+    def __init__(self, timeout=(api.DEFAULT_CONNECT_TIMEOUT,
+                                api.DEFAULT_READ_TIMEOUT),
+                 retries=api.DEFAULT_RETRIES, pool_size=api.POOL_SIZE):
+        self.timeout = timeout
+        self.retries = retries
+        self.pool_size = pool_size
+        self.connections_opened = 0
+        self._idle = {}
+        self._ssl = None
+
+    @classmethod
+    def from_client(cls, client):
+        """Creates a client with the timeouts and retries of a
+        FrameworkClient
+
+        :param client: synchronous client
+        :type client: api.FrameworkClient
+        :rtype: AsyncHTTPClient
+        """
+
+        return cls(client.timeout, client.retries)
+
+    async def _connect(self, scheme, host, port):
+        idle = self._idle.get((scheme, host, port))
+        while idle:
+            connection = idle.pop()
+            if not connection.reader.at_eof():
+                return connection, True
+            connection.close()
+
+        if scheme == 'https' and self._ssl is None:
+            self._ssl = ssl.create_default_context()
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(
+                host, port, ssl=self._ssl if scheme == 'https' else None),
+            self.timeout[0])
+        self.connections_opened += 1
+        return _Connection(reader, writer), False
+
+    def _release(self, key, connection):
+        idle = self._idle.setdefault(key, [])
+        if len(idle) < self.pool_size:
+            idle.append(connection)
+        else:
+            connection.close()
+
+    async def _send(self, method, url, data, headers):
+        parts = urlsplit(url)
+        scheme = parts.scheme or 'http'
+        port = parts.port or (443 if scheme == 'https' else 80)
+        key = (scheme, parts.hostname, port)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        body = data.encode('utf-8') if hasattr(data, 'encode') else data
+
+        lines = [method + ' ' + path + ' HTTP/1.1',
+                 'Host: ' + parts.netloc.rpartition('@')[2],
+                 'User-Agent: ' + USER_AGENT,
+                 'Accept: */*',
+                 'Content-Length: ' + str(len(body or b''))]
+        lines.extend(name + ': ' + value
+                     for name, value in (headers or {}).items())
+        request = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+        while True:
+            try:
+                connection, reused = await self._connect(*key)
+            except (OSError, asyncio.TimeoutError) as e:
+                raise ConnectError(str(e) or type(e).__name__)
+            try:
+                connection.writer.write(request + (body or b''))
+                response, reusable = await asyncio.wait_for(
+                    _read_response(connection, method), self.timeout[1])
+            except asyncio.TimeoutError:
+                connection.close()
+                raise
+            except (OSError, EOFError, asyncio.IncompleteReadError) as e:
+                connection.close()
+                if reused:
+                    # the server closed an idle connection, try a new one
+                    logging.debug("Reused connection failed: " + str(e))
+                    continue
+                raise
+            except BaseException:
+                connection.close()
+                raise
+            if reusable:
+                self._release(key, connection)
+            else:
+                connection.close()
+            return response
+
+    async def request(self, method, url, data=None, headers=None,
+                      idempotent=None):
+        """Sends a request, retrying connection failures, timeouts and
+        502/503/504 responses of idempotent requests, like
+        api.FrameworkClient.request().  Other requests are only retried if
+        the connection could not be established.
+
+        :param method: HTTP method
+        :type method: str
+        :param url: request URL
+        :type url: str
+        :param data: request body
+        :type data: str | bytes | None
+        :param headers: additional request headers
+        :type headers: dict | None
+        :param idempotent: whether the request may be sent twice, defaults
+                           to whether `method` is in api.IDEMPOTENT_METHODS
+        :type idempotent: bool | None
+        :rtype: Response
+        """
+
+        if idempotent is None:
+            idempotent = method.upper() in api.IDEMPOTENT_METHODS
+        retries = self.retries
+        attempt = 0
+        while True:
+            try:
+                response = await self._send(method, url, data, headers)
+                if (attempt >= retries or not idempotent or
+                        response.status_code not in api.RETRY_STATUS_CODES):
+                    return response
+                reason = "status code " + str(response.status_code)
+            except (OSError, EOFError, asyncio.TimeoutError,
+                    asyncio.IncompleteReadError) as e:
+                if attempt >= retries or not (
+                        idempotent or isinstance(e, ConnectError)):
+                    raise
+                reason = str(e) or type(e).__name__
+            delay = api.backoff_delay(attempt)
+            attempt += 1
+            logging.info("Retrying " + method + " " + url + " in " +
+                         "{0:.2f}".format(delay) + "s (" + str(attempt) +
+                         "/" + str(retries) + "), reason was: " + reason)
+            await asyncio.sleep(delay)
+
+    async def get(self, url, **kwargs):
+        return await self.request('GET', url, **kwargs)
+
+    def close(self):
+        for idle in self._idle.values():
+            for connection in idle:
+                connection.close()
+        self._idle.clear()
+
+
+def _run(coroutine_function, *args):
+    loop = asyncio.new_event_loop()
+    client = AsyncHTTPClient.from_client(api.default_client())
+    try:
+        return loop.run_until_complete(coroutine_function(client, *args))
+    finally:
+        client.close()
+        loop.run_until_complete(asyncio.sleep(0))
+        loop.close()
+
+
+async def framework_call(client, host, path, data=None):
+    """Calls the framework API like cli.start() and cli.stop() do
+
+    :returns: 0 if the framework accepted the call, its status code if not,
+              and 2 if it could not be reached
+    :rtype: int
+    """
+
+    try:
+        response = await client.get(host.rstrip('/') + path, data=data,
+                                    idempotent=False)
+    except (OSError, EOFError, asyncio.TimeoutError,
+            asyncio.IncompleteReadError) as e:
+        logging.error("Unable to connect to framework at " + host + "\n"
+                      "Reason was: " + (str(e) or type(e).__name__))
+        return 2
+    if response.status_code != 200:
+        logging.error("Error! Framework at " + host + " returned status "
+                      "code: " + str(response.status_code))
+        return response.status_code
+    return 0
+
+
+async def _timed(operation, host):
+    start = time.time()
+    try:
+        code = await operation(host)
+        error = None
+    except Exception as e:
+        logging.debug("Operation against " + host + " failed",
+                      exc_info=True)
+        code = 1
+        error = str(e) or type(e).__name__
+    return batch.Result(host, code, error, time.time() - start)
+
+
+async def fan_out(operation, hosts, parallel=batch.DEFAULT_PARALLEL):
+    """Awaits `operation(host)` for all `hosts`, at most `parallel` at a
+    time, like batch.run() does with threads.
+
+    :param operation: coroutine function taking a framework URL and
+                      returning an exit code
+    :type operation: function
+    :param hosts: framework URLs
+    :type hosts: [str]
+    :param parallel: maximum number of concurrent operations
+    :type parallel: int
+    :returns: results in the order of `hosts`
+    :rtype: [batch.Result]
+    """
+
+    if not hosts:
+        raise ValueError("No Quobyte framework targets found.")
+    semaphore = asyncio.Semaphore(parallel)
+
+    async def bounded(host):
+        async with semaphore:
+            return await _timed(operation, host)
+
+    return list(await asyncio.gather(*[bounded(host) for host in hosts]))
+
+
+async def fetch_state(client, host):
+    """Returns the state document of the framework at `host`, or None if it
+    does not report one
+
+    :rtype: dict | None
+    """
+
+    response = await client.get(host.rstrip('/') + cli.STATE_API_STRING)
+    if response.status_code == 404:
+        return None
+    if response.status_code != 200:
+        raise ValueError("Framework state returned status code " +
+                         str(response.status_code))
+    return response.json()
+
+
+async def wait_converged(client, host, release, timeout,
+                         interval=polling.DEFAULT_INTERVAL,
+                         max_interval=polling.DEFAULT_MAX_INTERVAL,
+                         factor=polling.DEFAULT_FACTOR):
+    """Polls the state of `host` with growing intervals until it converged
+    to `release`, like rolling.wait_converged()
+
+    :raises: rolling.ConvergenceError
+    """
+
+    deadline = time.time() + timeout
+    while True:
+        try:
+            converged = rolling.is_converged(
+                await fetch_state(client, host), release)
+        except (OSError, EOFError, ValueError, asyncio.TimeoutError,
+                asyncio.IncompleteReadError) as e:
+            logging.debug("State of " + host + " not available yet: " +
+                          (str(e) or type(e).__name__))
+            converged = False
+        remaining = deadline - time.time()
+        if converged:
+            return
+        if remaining <= 0:
+            raise rolling.ConvergenceError(
+                "did not converge to release " + release + " within " +
+                str(timeout) + "s")
+        await asyncio.sleep(min(interval, remaining))
+        interval = min(max_interval, interval * factor)
+
+
+async def runs_release(client, host, release):
+    """Returns whether the framework at `host` already runs `release`, like
+    versions.runs_release()
+
+    :rtype: bool
+    """
+
+    try:
+        return versions.is_current(await fetch_state(client, host),
+                                   str(release))
+    except (OSError, EOFError, ValueError, asyncio.TimeoutError,
+            asyncio.IncompleteReadError) as e:
+        logging.debug("State of " + host + " unavailable: " +
+                      (str(e) or type(e).__name__))
+        return False
+
+
+async def _start(client, host, release, negotiate):
+    if negotiate and await runs_release(client, host, release):
+        logging.info("Framework at " + host + " already runs release " +
+                     str(release) + ", skipping start.")
+        return 0
+    return await framework_call(client, host, cli.API_STRING, str(release))
+
+
+async def _batch(client, action, hosts, parallel, release, negotiate):
+    if action == 'start' and release is None:
+        raise ValueError("No framework release specified, please provide"
+                         " --release=<a.b.c> option.")
+
+    async def operation(host):
+        if action == 'start':
+            return await _start(client, host, release, negotiate)
+        return await framework_call(client, host, cli.API_STRING)
+
+    return await fan_out(operation, hosts, parallel)
+
+
+def run_batch(action, hosts, parallel=batch.DEFAULT_PARALLEL, release=None,
+              negotiate=False):
+    """Runs start or stop against `hosts` on one event loop
+
+    :param action: 'start' or 'stop'
+    :type action: str
+    :param hosts: framework URLs
+    :type hosts: [str]
+    :param parallel: maximum number of concurrent requests
+    :type parallel: int
+    :param release: release to start
+    :type release: str | None
+    :param negotiate: skip frameworks already running `release`
+    :type negotiate: bool
+    :rtype: [batch.Result]
+    """
+
+    with trace.span('aio_batch', action=action, hosts=len(hosts)):
+        return _run(_batch, action, hosts, parallel, release, negotiate)
+
+
+async def _upgrade_wave(client, hosts, release, timeout, negotiate):
+    async def operation(host):
+        code = await _start(client, host, release, negotiate)
+        if code == 0:
+            await wait_converged(client, host, release, timeout)
+        return code
+
+    return await fan_out(operation, hosts, len(hosts))
+
+
+def upgrade_wave(hosts, release, timeout=rolling.DEFAULT_TIMEOUT,
+                 negotiate=False):
+    """Starts `release` on all `hosts` and waits for them to converge, for
+    use as the run_wave of rolling.rolling_upgrade()
+
+    :param negotiate: skip frameworks already running `release`
+    :type negotiate: bool
+    :rtype: [batch.Result]
+    """
+
+    with trace.span('aio_wave', hosts=len(hosts)):
+        return _run(_upgrade_wave, hosts, release, timeout, negotiate)
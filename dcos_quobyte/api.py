@@ -0,0 +1,217 @@
+"""HTTP client for the Quobyte framework API
+
+All requests against the framework go through one pooled requests session, so
+consecutive calls reuse the same TCP/TLS connection.  Requests are bounded by
+connect and read timeouts, and idempotent requests are retried with jittered
+exponential backoff.  Requests with side effects, such as the start and stop
+commands sent as GET /v1/version, are only retried when no connection could
+be established, so the framework never receives them twice.
+"""
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import logging
+import os
+import random
+import sys
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, ConnectTimeout, Timeout
+from requests.packages.urllib3.exceptions import NewConnectionError
+from dcos_quobyte import trace
+
+CONNECT_TIMEOUT_ENV = 'DCOS_QUOBYTE_CONNECT_TIMEOUT'
+READ_TIMEOUT_ENV = 'DCOS_QUOBYTE_READ_TIMEOUT'
+RETRIES_ENV = 'DCOS_QUOBYTE_RETRIES'
+KEEP_ALIVE_ENV = 'DCOS_QUOBYTE_KEEP_ALIVE'
+BACKEND_ENV = 'DCOS_QUOBYTE_BACKEND'
+
+BACKEND_THREADS = 'threads'
+BACKEND_ASYNCIO = 'asyncio'
+
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 30.0
+DEFAULT_RETRIES = 3
+BACKOFF_BASE = 0.2
+BACKOFF_CAP = 5.0
+POOL_SIZE = 10
+
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'])
+RETRY_STATUS_CODES = frozenset([502, 503, 504])
+
+_default_client = None
+
+
+def _env_float(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        logging.warning("Ignoring invalid " + name + " value " + str(value))
+        return default
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    """Returns the delay before retry number `attempt` (starting at 0),
+    using exponential backoff with full jitter.
+
+    :param attempt: number of the retry
+    :type attempt: int
+    :rtype: float
+    """
+
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def connect_failed(error):
+    """Returns whether `error` was raised before the request was sent, that
+    is while establishing the connection
+
+    :type error: requests.exceptions.RequestException
+    :rtype: bool
+    """
+
+    if isinstance(error, ConnectTimeout):
+        return True
+    cause = error.args[0] if error.args else None
+    return isinstance(getattr(cause, 'reason', cause), NewConnectionError)
+
+
+class FrameworkClient(object):
+    """Pooled HTTP client for the framework API
+
+    :param connect_timeout: seconds to wait for a connection
+    :type connect_timeout: float
+    :param read_timeout: seconds to wait for a response
+    :type read_timeout: float
+    :param retries: retries for idempotent requests
+    :type retries: int
+    :param keep_alive: reuse connections (and their TLS sessions) across
+                       requests
+    :type keep_alive: bool
+    :param pool_size: connections kept per host
+    :type pool_size: int
+    """
+
+    def __init__(self,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT,
+                 retries=DEFAULT_RETRIES,
+                 keep_alive=True,
+                 pool_size=POOL_SIZE):
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=POOL_SIZE,
+                              pool_maxsize=pool_size,
+                              max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if not keep_alive:
+            self.session.headers['Connection'] = 'close'
+
+    @classmethod
+    def from_environ(cls, pool_size=POOL_SIZE):
+        """Creates a client configured from the DCOS_QUOBYTE_* environment
+        variables.
+
+        :param pool_size: connections kept per host
+        :type pool_size: int
+        :rtype: FrameworkClient
+        """
+
+        return cls(
+            connect_timeout=_env_float(CONNECT_TIMEOUT_ENV,
+                                       DEFAULT_CONNECT_TIMEOUT),
+            read_timeout=_env_float(READ_TIMEOUT_ENV, DEFAULT_READ_TIMEOUT),
+            retries=int(_env_float(RETRIES_ENV, DEFAULT_RETRIES)),
+            keep_alive=os.environ.get(KEEP_ALIVE_ENV, '1') != '0',
+            pool_size=pool_size)
+
+    def request(self, method, url, idempotent=None, **kwargs):
+        """Sends a request, retrying connection failures and 502/503/504
+        responses of idempotent requests.  Other requests are only retried
+        if the connection could not be established.
+
+        :param method: HTTP method
+        :type method: str
+        :param url: request URL
+        :type url: str
+        :param idempotent: whether the request may be sent twice, defaults
+                           to whether `method` is in IDEMPOTENT_METHODS
+        :type idempotent: bool | None
+        :param kwargs: additional arguments to requests.Session.request
+        :type kwargs: dict
+        :returns: the response
+        :rtype: requests.Response
+        """
+
+        kwargs.setdefault('timeout', self.timeout)
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        retries = self.retries
+        attempt = 0
+        with trace.span('http', method=method, url=url) as span:
+            while True:
+                try:
+                    response = self.session.request(method, url, **kwargs)
+                    if (attempt >= retries or not idempotent or
+                            response.status_code not in RETRY_STATUS_CODES):
+                        span.set('status', response.status_code)
+                        if trace.enabled() and not kwargs.get('stream'):
+                            span.set('bytes', len(response.content))
+                        return response
+                    reason = "status code " + str(response.status_code)
+                    response.close()
+                except (ConnectionError, Timeout) as e:
+                    if attempt >= retries or not (idempotent or
+                                                  connect_failed(e)):
+                        raise
+                    reason = str(e)
+                delay = backoff_delay(attempt)
+                attempt += 1
+                span.set('retries', attempt)
+                logging.info("Retrying " + method + " " + url + " in " +
+                             "{0:.2f}".format(delay) + "s (" + str(attempt) +
+                             "/" + str(retries) + "), reason was: " + reason)
+                time.sleep(delay)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+def backend():
+    """Returns the I/O backend selected with DCOS_QUOBYTE_BACKEND, either
+    BACKEND_THREADS (the default) or BACKEND_ASYNCIO, see aio.py.
+
+    :rtype: str
+    """
+
+    value = os.environ.get(BACKEND_ENV, BACKEND_THREADS)
+    if value not in (BACKEND_THREADS, BACKEND_ASYNCIO):
+        logging.warning("Ignoring invalid " + BACKEND_ENV + " value " + value)
+        return BACKEND_THREADS
+    if value == BACKEND_ASYNCIO and sys.version_info < (3, 5):
+        logging.warning("The asyncio backend requires Python 3.5, using "
+                        "threads.")
+        return BACKEND_THREADS
+    return value
+
+
+def default_client():
+    """Returns the process wide FrameworkClient
+
+    :rtype: FrameworkClient
+    """
+
+    global _default_client
+    if _default_client is None:
+        _default_client = FrameworkClient.from_environ()
+    return _default_client
@@ -0,0 +1,102 @@
+"""Fan-out of framework operations over several Quobyte frameworks"""
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import collections
+import logging
+import time
+
+import concurrent.futures
+from dcos_quobyte import api
+
+DEFAULT_PARALLEL = api.POOL_SIZE
+
+Result = collections.namedtuple('Result', ['host', 'code', 'error',
+                                           'duration'])
+"""Outcome of one operation against one framework host"""
+
+
+def parse_hosts(hosts):
+    """Splits a comma separated list of framework URLs
+
+    :param hosts: comma separated URLs
+    :type hosts: str
+    :rtype: [str]
+    """
+
+    return [host.strip() for host in hosts.split(',') if host.strip()]
+
+
+def load_targets(path):
+    """Reads framework URLs from a file with one URL per line.  Empty lines
+    and lines starting with '#' are ignored.
+
+    :param path: path of the targets file
+    :type path: str
+    :rtype: [str]
+    """
+
+    with open(path) as targets_file:
+        return [line.strip() for line in targets_file
+                if line.strip() and not line.strip().startswith('#')]
+
+
+def _call(operation, host):
+    start = time.time()
+    try:
+        code = operation(host)
+        error = None
+    except Exception as e:
+        logging.debug("Operation against " + host + " failed",
+                      exc_info=True)
+        code = 1
+        error = str(e)
+    return Result(host, code, error, time.time() - start)
+
+
+def run(operation, hosts, parallel=DEFAULT_PARALLEL):
+    """Calls `operation(host)` for all `hosts` using at most `parallel`
+    threads.  A failing target does not affect the others.
+
+    :param operation: function taking a framework URL and returning an exit
+                      code
+    :type operation: function
+    :param hosts: framework URLs
+    :type hosts: [str]
+    :param parallel: maximum number of concurrent operations
+    :type parallel: int
+    :returns: results in the order of `hosts`
+    :rtype: [Result]
+    """
+
+    if not hosts:
+        raise ValueError("No Quobyte framework targets found.")
+    workers = min(parallel, len(hosts))
+    with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+        jobs = [pool.submit(_call, operation, host) for host in hosts]
+        return [job.result() for job in jobs]
+
+
+def report(results):
+    """Prints one line per result and a summary
+
+    :param results: results of run()
+    :type results: [Result]
+    :returns: 0 if all operations succeeded, 1 otherwise
+    :rtype: int
+    """
+
+    width = max(len(result.host) for result in results)
+    failed = 0
+    for result in results:
+        if result.code == 0:
+            outcome = "ok"
+        else:
+            failed += 1
+            outcome = "failed (" + (result.error or
+                                    "code " + str(result.code)) + ")"
+        print("{0:<{1}}  {2:6.2f}s  {3}".format(result.host, width,
+                                                result.duration, outcome))
+    print(str(len(results) - failed) + "/" + str(len(results)) +
+          " targets succeeded.")
+    return 0 if failed == 0 else 1
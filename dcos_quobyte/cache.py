@@ -0,0 +1,68 @@
+"""Small JSON files for state kept between invocations of the subcommand"""
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import errno
+import json
+import os
+import tempfile
+
+from dcos import constants as dcos_constants
+
+
+def path(name):
+    """Returns the path of the cache file `name`
+
+    :param name: file name
+    :type name: str
+    :rtype: str
+    """
+
+    return os.path.expanduser(
+        os.path.join('~', dcos_constants.DCOS_DIR, 'quobyte', name))
+
+
+def load(cache_path):
+    """Reads a JSON object from `cache_path`.  Missing or corrupt files read
+    as an empty object.
+
+    :param cache_path: path of the cache file
+    :type cache_path: str
+    :rtype: dict
+    """
+
+    try:
+        with open(cache_path) as cache_file:
+            entries = json.load(cache_file)
+    except (IOError, ValueError):
+        return {}
+    if not isinstance(entries, dict):
+        return {}
+    return entries
+
+
+def save(cache_path, entries):
+    """Atomically replaces `cache_path` with `entries`
+
+    :param cache_path: path of the cache file
+    :type cache_path: str
+    :param entries: JSON serializable object
+    :type entries: dict
+    :raises: IOError, OSError
+    """
+
+    directory = os.path.dirname(cache_path)
+    try:
+        os.makedirs(directory)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as tmp_file:
+            json.dump(entries, tmp_file)
+        os.rename(tmp_path, cache_path)
+    except (IOError, OSError):
+        os.remove(tmp_path)
+        raise
@@ -1,30 +1,218 @@
 """DCOS Quobyte Subcommand
 
 Usage:
-    dcos quobyte start [--host=<url>] [--release=<rel>]
-    dcos quobyte stop
-    dcos quobyte upgrade
+    dcos quobyte start [--host=<url> | --hosts=<urls> | --targets=<file>
+                        | --all] [--release=<rel>] [--parallel=<n>]
+                       [--force] [--prefetch] [--preflight]
+                       [--wait | --async] [--timeout=<sec>]
+                       [--refresh | --no-cache] [--trace]
+    dcos quobyte stop [--host=<url> | --hosts=<urls> | --targets=<file>
+                       | --all] [--parallel=<n>] [--batch-size=<n>]
+                      [--force] [--wait | --async] [--timeout=<sec>]
+                      [--refresh | --no-cache] [--trace]
+    dcos quobyte wait <operation-id> [--timeout=<sec>] [--trace]
+    dcos quobyte daemon [--socket=<path>] [--trace]
+    dcos quobyte upgrade [--host=<url> | --hosts=<urls> | --targets=<file>
+                          | --all] [--release=<rel>] [--window=<n>]
+                         [--max-failures=<n>] [--force] [--prefetch]
+                         [--preflight] [--timeout=<sec>]
+                         [--refresh | --no-cache] [--trace]
+    dcos quobyte apply -f <spec> [--host=<url> | --hosts=<urls>
+                                  | --targets=<file> | --all]
+                       [--parallel=<n>] [--dry-run] [--refresh | --no-cache]
+                       [--trace]
+    dcos quobyte preflight [-f <spec>] [--parallel=<n>]
+                           [--agent-timeout=<sec>] [--json] [--trace]
+    dcos quobyte plan [-f <spec>] [--domain=<attribute>] [--output=<file>]
+                      [--json] [--trace]
+    dcos quobyte status [--host=<url>] [--json] [--watch] [--interval=<sec>]
+                        [--refresh | --no-cache] [--trace]
+    dcos quobyte inventory [--json | --csv] [--trace]
+    dcos quobyte logs [--follow] [--tail=<bytes>] [--trace]
+    dcos quobyte metrics [--host=<url>] [--interval=<sec>] [--samples=<n>]
+                         [--watch] [--json | --prometheus]
+                         [--refresh | --no-cache] [--trace]
+    dcos quobyte volumes list [--host=<url>] [--tenant=<name>] [--json]
+                              [--refresh | --no-cache] [--trace]
+    dcos quobyte volumes (create | delete) -f <manifest> [--host=<url>]
+                         [--parallel=<n>] [--batch-size=<n>]
+                         [--journal=<file>] [--json]
+                         [--refresh | --no-cache] [--trace]
+    dcos quobyte bench-api [--host=<url>] [--operation=<op>] [--release=<rel>]
+                           [--concurrency=<n>] [--rate=<rps>]
+                           [--duration=<sec>] [--requests=<n>] [--json]
+                           [--refresh | --no-cache] [--trace]
     dcos quobyte (-h | --help | --info | --config-schema)
 
 Options:
-    --config-schema  Print the configuration schema of this subcommand
-    -h               Show this screen
-    --help           Show this screen
-    --host=<url>     URL of the Quobyte framework host (including port number)
-    --info           Prints a short description of this command
-    --release=<rel>  Quobyte release number to be used
-    --version        Show version
+    --agent-timeout=<sec>
+                         Seconds preflight waits for the agent states
+                         [default: 10]
+    --async              Return an operation ID to pass to wait instead of
+                         waiting
+    --all                Run against every Quobyte framework registered with
+                         the Mesos master
+    --batch-size=<n>     Volumes sent per batch, after each batch the journal
+                         is written (100 by default), or data services
+                         stopped together (10 by default)
+    --concurrency=<n>    Number of concurrent bench-api workers [default: 10]
+    --config-schema      Print the configuration schema of this subcommand
+    --csv                Print CSV instead of a table
+    --domain=<attribute>
+                         Agent attribute naming the failure domain, defaults
+                         to the zone of the Mesos fault domain
+    --dry-run            Print the changes without applying them
+    --duration=<sec>     Seconds to send bench-api requests for [default: 10]
+    -f, --file=<spec>    JSON deployment spec (see --config-schema) or volume
+                         manifest
+    -h                   Show this screen
+    --follow             Keep printing new log lines until interrupted
+    --force              Start the release even if the framework already runs
+                         it, or stop all services at once
+    --help               Show this screen
+    --host=<url>         URL of the Quobyte framework host (including port
+                         number)
+    --hosts=<urls>       Comma separated list of framework URLs to run against
+    --info               Prints a short description of this command
+    --interval=<sec>     Seconds between two polls of --watch or two metrics
+                         samples [default: 2]
+    --journal=<file>     Progress journal of volumes create and delete,
+                         defaults to the manifest path with .journal appended
+    --json               Print JSON instead of a table
+    --max-failures=<n>   Number of failed frameworks tolerated before an
+                         upgrade is aborted [default: 0]
+    --no-cache           Neither read nor update the framework discovery cache
+    --output=<file>      File to write the deployment spec of a plan to
+    --operation=<op>     Request bench-api sends: state, start or stop
+                         [default: state]
+    --parallel=<n>       Number of frameworks or agents to contact
+                         concurrently [default: 10]
+    --refresh            Ignore the discovery cache and look the framework up
+                         on the Mesos master again
+    --preflight          Check the Mesos agents first and do nothing unless
+                         enough of them can host Quobyte services
+    --prefetch           Have the agents pull the artifacts of the release
+                         before switching to it
+    --prometheus         Print metrics in the Prometheus text format
+    --rate=<rps>         Requests per second of an open-loop bench-api run,
+                         0 for a closed loop [default: 0]
+    --release=<rel>      Quobyte release number to be used
+    --requests=<n>       Number of bench-api requests to send at most
+    --samples=<n>        Number of metrics samples to take after the first
+                         one [default: 1]
+    --socket=<path>      Unix socket the daemon listens on, defaults to
+                         DCOS_QUOBYTE_SOCKET or ~/.dcos/quobyte/daemon.sock
+    --tail=<bytes>       Bytes of each log to print first [default: 4096]
+    --tenant=<name>      Only list the volumes of this tenant
+    --targets=<file>     File with one framework URL per line to run against
+    --timeout=<sec>      Seconds to wait for tasks, upgraded frameworks or
+                         each tier of a stop to settle [default: 600]
+    --trace              Write timing spans of the operation to stderr as
+                         JSON lines
+    --version            Show version
+    --wait               Wait until the Quobyte tasks are running (start) or
+                         gone (stop)
+    --watch              Keep polling the status and print its changes until
+                         interrupted
+    --window=<n>         Number of frameworks upgraded at the same time
+                         [default: 1]
+
+With --hosts, --targets or --all the command is run against all given
+frameworks concurrently. The exit status is 0 if it succeeded everywhere, and
+1 otherwise.
+
+upgrade performs a rolling upgrade: frameworks are upgraded in waves whose
+size is set by --window, and each wave has to report the new release and a
+healthy state before the next one starts.
+
+stop shuts the Quobyte services down tier by tier: data services first, in
+batches of --batch-size, then metadata, registry and api services. Each batch
+has to be gone from the Mesos master before the next one is stopped, and a
+tier that does not drain within --timeout aborts the stop while the later
+tiers keep running. --force and --async, or a framework that cannot stop
+services by role, stop all services at once.
+
+start and stop return as soon as the framework accepted the command. Given
+the --wait option they return once the Mesos master reports the Quobyte tasks
+of all targets as running, or as gone after stop, and fail after the timeout.
+Given the --async option they print an operation ID instead, which can be
+waited for later with wait <operation-id>.
+
+apply converges frameworks to a deployment spec declaring the release and the
+count, placement and resources of each Quobyte service. It reads the state of
+each framework once and only changes what differs from the spec, so applying
+an unchanged spec does nothing.
+
+start and upgrade first read the framework state and leave frameworks alone
+that already run the release in a healthy state, unless --force is given.
+With --prefetch the agents of all targets pull the container images and
+artifacts of the release in parallel before any framework is switched, so
+that the switch only restarts the services.
+
+preflight checks every Mesos agent for the free CPUs, memory, disk and ports
+of a Quobyte service, for the disks reserved for the Quobyte role and for the
+constraints of a deployment spec given with -f. It reads the agent states
+concurrently and reports agents that did not answer within --agent-timeout as
+unreachable. It lists the unfit agents, those with the most problems first,
+and exits with 1 if fewer agents fit than the spec has instances of a service.
+With --preflight, start and upgrade run these checks first.
+
+plan places the Quobyte services onto the Mesos agents, by the counts,
+resources and constraints of a deployment spec given with -f or by default
+three registry and metadata services, a data service on every agent with a
+disk reserved for Quobyte and one api service. Instances of a role are spread
+over the failure domains, metadata and registry services avoid agents already
+hosting Quobyte services, and data services go to the agents with the most
+reserved disks. With --output the placement is written as a deployment spec
+pinning each service to its agents, which apply then deploys.
+
+inventory lists the Quobyte tasks of all frameworks by agent, together with
+the Quobyte service (registry, metadata, data or api) each of them provides.
+
+logs prints the end of stdout and stderr of every Quobyte task, read from
+the Mesos agents, and with --follow keeps printing their new lines.
+
+metrics samples the resource counters of the Quobyte tasks on their agents
+and the framework API, and prints CPU, memory and disk use with disk and
+network throughput per task, busiest disks first. With --watch it prints
+them after every sample until interrupted.
+
+volumes create and delete provision the volumes of a JSON manifest, many at a
+time and in batches. Failed volumes do not stop the others. Finished volumes
+are written to a journal after each batch, so repeating an interrupted or
+partly failed run only sends the remaining volumes. The journal is removed
+once all volumes succeeded.
+
+bench-api load tests the framework API with state requests, or with the
+requests start and stop send, which act on the framework. In a closed loop
+every worker sends its next request once the previous one returned. With the
+option --rate requests are sent at that rate regardless of the responses, and
+their latency counts from when they were due. It prints the throughput, the
+error rate and latency percentiles.
+
+daemon keeps the framework URL and connections warm between commands. While
+DCOS_QUOBYTE_SOCKET points to its socket, start, stop and status against a
+single framework are forwarded to it.
+
+Tracing can also be switched on with the DCOS_QUOBYTE_TRACE environment
+variable, set to 1 for stderr or to the path of a file to append spans to.
 """
 
 from __future__ import print_function
 from __future__ import unicode_literals
+import json
 import logging
+import os
+import sys
 
-import requests
 from docopt import docopt
-from dcos import mesos
 from dcos_quobyte import constants
-from requests.exceptions import ConnectionError
+from dcos_quobyte import discovery
+from dcos_quobyte import trace
+
+# requests, dcos and the modules depending on them take a long time to import,
+# so they are imported by the commands needing them.  This keeps --info,
+# --config-schema, --help and --version, which the DCOS CLI calls often, fast.
 
 
 __copyright__ = "Quobyte Inc. 2015"
@@ -34,26 +222,167 @@ __author__ = "Silvan Kaiser"
 INFO_STRING = ("dcos-quobyte starts a Quobyte storage backend"
                "on your cluster")
 API_STRING = "/v1/version"
+STATE_API_STRING = "/v1/state"
 QUOBYTE_FRAMEWORK_NAME = "quobyte"
 SCHEMA = '''{
-                "$schema": "http://json-schema.org/schema#",
-                "id": "http://quobyte.com/schemas/dcos-quobyte.json"
-             }'''
-
-
-def find_quobyte_framework():
-    dcos_client = mesos.DCOSClient()
-    active_frameworks = mesos.get_master(dcos_client).frameworks()
-    logging.debug("Active frameworks found are: " + str(active_frameworks))
-    for framework in active_frameworks:
-        if framework['name'] == QUOBYTE_FRAMEWORK_NAME:
-            return framework['webui_url']
+    "$schema": "http://json-schema.org/draft-04/schema#",
+    "id": "http://quobyte.com/schemas/dcos-quobyte.json",
+    "title": "Quobyte deployment spec",
+    "type": "object",
+    "additionalProperties": false,
+    "properties": {
+        "release": {
+            "description": "Quobyte release the framework runs",
+            "type": "string",
+            "minLength": 1
+        },
+        "services": {
+            "description": "Services by role, unlisted ones stay as they are",
+            "type": "object",
+            "additionalProperties": false,
+            "properties": {
+                "registry": {"$ref": "#/definitions/service"},
+                "metadata": {"$ref": "#/definitions/service"},
+                "data": {"$ref": "#/definitions/service"},
+                "api": {"$ref": "#/definitions/service"}
+            }
+        }
+    },
+    "definitions": {
+        "service": {
+            "type": "object",
+            "additionalProperties": false,
+            "minProperties": 1,
+            "properties": {
+                "count": {
+                    "description": "Number of instances",
+                    "type": "integer",
+                    "minimum": 0
+                },
+                "constraints": {
+                    "description": "Marathon placement constraints",
+                    "type": "array",
+                    "items": {
+                        "type": "array",
+                        "minItems": 2,
+                        "maxItems": 3,
+                        "items": {"type": "string"}
+                    }
+                },
+                "cpus": {
+                    "description": "CPU shares per instance",
+                    "type": "number",
+                    "exclusiveMinimum": true,
+                    "minimum": 0
+                },
+                "mem": {
+                    "description": "Memory per instance in MB",
+                    "type": "number",
+                    "exclusiveMinimum": true,
+                    "minimum": 0
+                },
+                "disk": {
+                    "description": "Sandbox disk space per instance in MB",
+                    "type": "number",
+                    "minimum": 0
+                }
+            }
+        }
+    }
+}'''
+
+
+def cached_framework(key, cache_mode):
+    if key is None or cache_mode != discovery.CACHE_USE:
+        return None
+    cached_url = discovery.load_cached_url(key)
+    if cached_url is not None and discovery.is_reachable(cached_url):
+        logging.debug("Using cached Quobyte framework URL " + cached_url)
+        return cached_url
     return None
 
 
-def build_url(host=None):
+def dns_framework(key, cache_mode):
+    # a refresh asks the master, which a stale SRV record would outrun
+    if cache_mode == discovery.CACHE_REFRESH:
+        return None
+    return discovery.resolve_dns_url()
+
+
+def master_framework(key, cache_mode):
+    return scan_quobyte_framework()
+
+
+# Resolvers tried in order by find_quobyte_framework(), cheapest first.  Each
+# is called with the cluster key and the cache mode and returns the framework
+# URL or None.
+RESOLVERS = [('cache', cached_framework),
+             ('dns', dns_framework),
+             ('master', master_framework)]
+
+
+def find_quobyte_framework(cache_mode=discovery.CACHE_USE):
+    key = None
+    if cache_mode != discovery.CACHE_OFF:
+        key = discovery.cluster_key()
+    with trace.span('discovery', cache_mode=cache_mode) as span:
+        webui_url = resolved_by = None
+        for name, resolver in RESOLVERS:
+            webui_url = resolver(key, cache_mode)
+            if webui_url is not None:
+                logging.debug("Quobyte framework resolved by " + name + ".")
+                resolved_by = name
+                break
+        span.set('resolver', resolved_by)
+        span.set('cached', resolved_by == 'cache')
+        if key is not None:
+            if webui_url is None:
+                discovery.invalidate(key)
+            elif resolved_by != 'cache':
+                discovery.store_url(key, webui_url)
+        return webui_url
+
+
+def dcos_client():
+    with trace.span('dcos_client'):
+        from dcos import mesos
+
+        return mesos.DCOSClient()
+
+
+def fetch_framework_index():
+    client = dcos_client()
+    urls = discovery.master_state_urls(client)
+    if len(urls) > 1:
+        return discovery.fetch_framework_index_racing(
+            client, urls, discovery.cluster_key())
+    return discovery.fetch_framework_index(client)
+
+
+def scan_quobyte_framework():
+    index = fetch_framework_index()
+    logging.debug("Frameworks found are: " + index.summary())
+    frameworks = index.by_name(QUOBYTE_FRAMEWORK_NAME)
+    if not frameworks:
+        return None
+    if len(frameworks) > 1:
+        logging.warning("Found " + str(len(frameworks)) + " Quobyte "
+                        "frameworks, using " + str(frameworks[0].id) +
+                        ". Use --host to select another one.")
+    return frameworks[0].webui_url
+
+
+def find_quobyte_frameworks():
+    index = fetch_framework_index()
+    logging.debug("Frameworks found are: " + index.summary())
+    return [framework.webui_url for framework
+            in index.by_name(QUOBYTE_FRAMEWORK_NAME)
+            if framework.webui_url]
+
+
+def resolve_host(host=None, cache_mode=discovery.CACHE_USE):
     if host is None:
-        host = find_quobyte_framework()
+        host = find_quobyte_framework(cache_mode)
     if host is None:
         raise ValueError("Unable to retrieve URL for framework, please provide"
                          " --host=<http://a.b.c:xyz> option.")
@@ -63,7 +392,12 @@ def build_url(host=None):
     if host.endswith('/'):
         host = host.rstrip('/')
 
-    return str(host) + API_STRING
+    return str(host)
+
+
+def build_url(host=None, cache_mode=discovery.CACHE_USE,
+              api_string=API_STRING):
+    return resolve_host(host, cache_mode) + api_string
 
 
 def info():
@@ -71,13 +405,29 @@ def info():
     return 0
 
 
-def start(host=None, release=None):
+def start(host=None, release=None, cache_mode=discovery.CACHE_USE,
+          negotiate=False, prefetch=False):
+    import requests
+    from dcos_quobyte import api
+    from dcos_quobyte import versions
+    from requests.exceptions import ConnectionError, Timeout
+
     if release is None:
         raise ValueError("No framework release specified, please provide"
                          " --release=<a.b.c> option.")
-    request_url = build_url(host)
+    host = resolve_host(host, cache_mode)
+    if negotiate and versions.runs_release(host, release, get_state):
+        logging.info("Framework at " + host + " already runs release " +
+                     str(release) + ", skipping start.")
+        return 0
+    if prefetch:
+        code = versions.prefetch(host, release)
+        if code != 0:
+            return code
+    request_url = host + API_STRING
     try:
-        r = requests.get(request_url, data=str(release))
+        r = api.default_client().get(request_url, data=str(release),
+                                     idempotent=False)
         logging.info("start request result is " + str(r))
         status_code = r.status_code
         if status_code is requests.codes.ok:
@@ -87,16 +437,26 @@ def start(host=None, release=None):
             logging.error("Error! Framework returned status code: " +
                           str(status_code))
             return status_code
-    except ConnectionError as e:
+    except (ConnectionError, Timeout) as e:
         logging.error('Unable to connect to framework at ' + str(host))
         logging.error(str(e))
         return 2
 
 
-def stop(host=None):
-    request_url = build_url(host)
+def stop(host=None, cache_mode=discovery.CACHE_USE, ordered=False,
+         batch_size=None, timeout=None):
+    import requests
+    from dcos_quobyte import api
+    from requests.exceptions import ConnectionError, Timeout
+
+    if ordered:
+        host = resolve_host(host, cache_mode)
+        code = stop_ordered(host, batch_size, timeout)
+        if code != 0:
+            return code
+    request_url = build_url(host, cache_mode)
     try:
-        r = requests.get(request_url)
+        r = api.default_client().get(request_url, idempotent=False)
         status_code = r.status_code
         if status_code is requests.codes.ok:
             logging.info("Framework accepted stop command.")
@@ -105,14 +465,417 @@ def stop(host=None):
             logging.error("Error! Framework returned status code: " +
                           str(status_code))
             return status_code
-    except ConnectionError:
+    except (ConnectionError, Timeout) as e:
         logging.error('Unable to connect to framework at ' + str(host) + "\n"
-                      'Reason was: ' + str(ConnectionError))
+                      'Reason was: ' + str(e))
         return 2
 
 
-def upgrade(host=None, release=None):
-    return start(host, release)
+def stop_ordered(host, batch_size=None, timeout=None):
+    """Stops the services of the framework at `host` tier by tier, before
+    the framework itself is stopped.  Returns 0 if all of them stopped, or
+    if the framework cannot stop services by role, the Mesos master cannot
+    be read or lists no framework at `host`, so that all services are
+    stopped at once.
+    """
+
+    from dcos.errors import DCOSException
+    from dcos_quobyte import operations
+    from dcos_quobyte import shutdown
+    from requests.exceptions import RequestException
+
+    code = shutdown.probe_stop(host)
+    if code is None:
+        logging.warning("Framework at " + host + " cannot stop services by "
+                        "role, stopping all of them at once.")
+        return 0
+    if code != 0:
+        return code
+
+    try:
+        client = dcos_client()
+        framework_ids = set(
+            counts.framework_id for counts in operations.select(
+                discovery.fetch_task_counts(QUOBYTE_FRAMEWORK_NAME, client),
+                host, fallback=False)
+            if counts.framework_id is not None)
+        if not framework_ids:
+            logging.warning("No Quobyte framework of the Mesos master serves "
+                            "at " + host + ", stopping all its services at "
+                            "once.")
+            return 0
+
+        def fetch_live():
+            return shutdown.live_services(
+                discovery.fetch_framework_tasks(QUOBYTE_FRAMEWORK_NAME,
+                                                client),
+                framework_ids)
+
+        live = fetch_live()
+    except (RequestException, DCOSException) as e:
+        logging.warning("Unable to read the Quobyte tasks from the Mesos "
+                        "master, stopping all services of " + host + " at "
+                        "once.\nReason was: " + str(e))
+        return 0
+
+    code, phases = shutdown.run(
+        host, fetch_live, batch_size or shutdown.DEFAULT_BATCH_SIZE,
+        shutdown.DEFAULT_TIMEOUT if timeout is None else timeout, live=live)
+    if code is None:
+        logging.warning("Framework at " + host + " cannot stop services by "
+                        "role, stopping all of them at once.")
+        return 0
+    print('\n'.join(host + "  " + line
+                    for line in shutdown.format_phases(phases).split('\n')))
+    if code != 0:
+        logging.error("Stopping the Quobyte services of " + host + " failed, "
+                      "the remaining tiers are still running.")
+    return code
+
+
+def wait_operation(action, hosts, timeout=None):
+    from dcos.errors import DCOSException
+    from dcos_quobyte import operations
+    from requests.exceptions import RequestException
+
+    client = dcos_client()
+    target = operations.TARGETS[action]
+
+    def fetch_counts():
+        return discovery.fetch_task_counts(QUOBYTE_FRAMEWORK_NAME, client)
+
+    if timeout is None:
+        timeout = operations.DEFAULT_TIMEOUT
+    if operations.wait(hosts, target, fetch_counts, timeout,
+                       errors=(RequestException, DCOSException)):
+        logging.info("Quobyte tasks are " + target + ".")
+        return 0
+    logging.error("Quobyte tasks did not become " + target + " within " +
+                  str(timeout) + " seconds.")
+    return 1
+
+
+def submit_operation(action, hosts):
+    from dcos_quobyte import operations
+
+    print(operations.submit(action, hosts))
+    return 0
+
+
+def wait(operation_id, timeout=None):
+    from dcos_quobyte import operations
+
+    operation = operations.load(operation_id)
+    if operation is None:
+        raise ValueError("Unknown or expired operation " + operation_id +
+                         ".")
+    return wait_operation(operation['action'], operation['hosts'], timeout)
+
+
+def get_state(host=None, cache_mode=discovery.CACHE_USE):
+    import requests
+    from dcos_quobyte import api
+
+    r = api.default_client().get(build_url(host, cache_mode,
+                                           STATE_API_STRING))
+    if r.status_code == requests.codes.not_found:
+        logging.debug("Framework does not report its state.")
+        return None
+    r.raise_for_status()
+    return r.json()
+
+
+def upgrade(host=None, release=None, cache_mode=discovery.CACHE_USE,
+            hosts=None, window=1, max_failures=0, timeout=None, force=False,
+            prefetch=False):
+    from dcos_quobyte import api
+    from dcos_quobyte import batch
+    from dcos_quobyte import rolling
+    from dcos_quobyte import versions
+
+    if release is None:
+        raise ValueError("No framework release specified, please provide"
+                         " --release=<a.b.c> option.")
+    if hosts is None:
+        hosts = [resolve_host(host, cache_mode)]
+    if prefetch:
+        results = versions.prefetch_all(hosts, release)
+        if any(result.code != 0 for result in results):
+            logging.error("Prefetching release " + str(release) + " failed, "
+                          "no framework was upgraded.")
+            return batch.report(results)
+
+    def upgrade_one(target):
+        return start(target, release, negotiate=not force)
+
+    if timeout is None:
+        timeout = rolling.DEFAULT_TIMEOUT
+    run_wave = None
+    if api.backend() == api.BACKEND_ASYNCIO:
+        from dcos_quobyte import aio
+
+        def _aio_wave(wave):
+            return aio.upgrade_wave(wave, release, timeout,
+                                    negotiate=not force)
+
+        run_wave = _aio_wave
+
+    results = rolling.rolling_upgrade(hosts, release, upgrade_one, get_state,
+                                      window=window,
+                                      max_failures=max_failures,
+                                      timeout=timeout, run_wave=run_wave)
+    return batch.report(results)
+
+
+def apply(spec_path, host=None, cache_mode=discovery.CACHE_USE, hosts=None,
+          parallel=1, dry_run=False):
+    from dcos_quobyte import batch
+    from dcos_quobyte import spec
+    from requests.exceptions import RequestException
+
+    desired = spec.load(spec_path, json.loads(SCHEMA))
+
+    def apply_one(target):
+        target = resolve_host(target, cache_mode)
+        try:
+            state = get_state(target)
+        except RequestException as e:
+            logging.error('Unable to read the state of the framework at ' +
+                          target + "\nReason was: " + str(e))
+            return 2
+        plan = spec.diff(desired, state)
+        if spec.is_empty(plan):
+            print(target + "  matches the spec")
+            return 0
+        print('\n'.join(target + "  " + line
+                        for line in spec.format_plan(plan, state)))
+        if dry_run:
+            return 0
+        code = 0
+        if plan.services:
+            code = spec.update_services(target, plan.services)
+        if code == 0 and plan.release is not None:
+            code = start(target, plan.release)
+        return code
+
+    if hosts is None:
+        return apply_one(host)
+    return batch.report(batch.run(apply_one, hosts, parallel))
+
+
+def preflight(spec_path=None, parallel=10, timeout=None, output_json=False):
+    from dcos_quobyte import preflight as quobyte_preflight
+    from dcos_quobyte import spec
+
+    requirements = quobyte_preflight.DEFAULT_REQUIREMENTS
+    if spec_path is not None:
+        requirements = quobyte_preflight.requirements_from_spec(
+            spec.load(spec_path, json.loads(SCHEMA)))
+    client = dcos_client()
+    summary = quobyte_preflight.fetch_summary(client)
+    reports = quobyte_preflight.run(
+        summary.get('slaves', []), requirements,
+        quobyte_preflight.agent_state_fetcher(client),
+        timeout=quobyte_preflight.DEFAULT_TIMEOUT
+        if timeout is None else timeout, parallel=parallel,
+        hosting=quobyte_preflight.hosting_agents(summary,
+                                                 QUOBYTE_FRAMEWORK_NAME))
+    if output_json:
+        print(json.dumps(quobyte_preflight.to_json(reports, requirements),
+                         sort_keys=True, indent=2))
+    else:
+        print(quobyte_preflight.format_summary(reports, requirements))
+    return 0 if quobyte_preflight.is_ready(reports, requirements) else 1
+
+
+def plan(spec_path=None, domain=None, output=None, output_json=False):
+    from dcos_quobyte import placement
+    from dcos_quobyte import preflight as quobyte_preflight
+    from dcos_quobyte import spec
+
+    desired = None
+    if spec_path is not None:
+        desired = spec.load(spec_path, json.loads(SCHEMA))
+    index = placement.build_model(placement.fetch_agents(dcos_client()),
+                                  quobyte_preflight.role(), domain)
+    result = placement.place(index, placement.demands(desired))
+    document = placement.to_spec(result, desired)
+    if output is not None:
+        with open(output, 'w') as output_file:
+            json.dump(document, output_file, sort_keys=True, indent=2)
+    if output_json:
+        print(json.dumps(document, sort_keys=True, indent=2))
+    else:
+        print(placement.format_table(result, index))
+    return 1 if result.missing else 0
+
+
+def status(host=None, cache_mode=discovery.CACHE_USE, output_json=False,
+           watch=False, interval=None):
+    from dcos.errors import DCOSException
+    from dcos_quobyte import api
+    from dcos_quobyte import monitor
+    from requests.exceptions import RequestException
+
+    host = resolve_host(host, cache_mode)
+    fetch_state = monitor.StateFetcher(api.default_client(),
+                                       host + STATE_API_STRING)
+
+    def fetch_tasks():
+        return discovery.fetch_framework_tasks(QUOBYTE_FRAMEWORK_NAME,
+                                               dcos_client())
+
+    if watch:
+        def fetch_counts():
+            return discovery.fetch_task_counts(QUOBYTE_FRAMEWORK_NAME,
+                                               dcos_client())
+
+        # only the state-summary is read while the tasks do not change
+        fetch_tasks = monitor.TaskFetcher(fetch_counts, fetch_tasks)
+
+    def fetch():
+        return monitor.collect(host, fetch_state, fetch_tasks)
+
+    if watch:
+        return monitor.watch(fetch, output_json,
+                             interval or monitor.DEFAULT_INTERVAL,
+                             errors=(RequestException, DCOSException))
+
+    snap = None
+    if cache_mode == discovery.CACHE_USE:
+        snap = monitor.load_cached(host)
+    if snap is None:
+        try:
+            snap = fetch()
+        except (RequestException, DCOSException) as e:
+            logging.error('Unable to read the status of the framework at ' +
+                          host + "\nReason was: " + str(e))
+            return 2
+        if cache_mode != discovery.CACHE_OFF:
+            monitor.store(host, snap)
+
+    if output_json:
+        print(json.dumps(snap, sort_keys=True, indent=2))
+    else:
+        print(monitor.format_table(snap))
+    return 0
+
+
+def inventory(output_format=None):
+    from dcos_quobyte import inventory as quobyte_inventory
+
+    result = quobyte_inventory.fetch(QUOBYTE_FRAMEWORK_NAME, dcos_client())
+    if output_format == 'json':
+        print(json.dumps(quobyte_inventory.to_json(result), sort_keys=True,
+                         indent=2))
+    elif output_format == 'csv':
+        quobyte_inventory.write_csv(result, sys.stdout)
+    else:
+        print(quobyte_inventory.format_table(result))
+    return 0
+
+
+def logs(follow=False, tail=None):
+    from dcos_quobyte import logs as quobyte_logs
+
+    client = dcos_client()
+    log_files = quobyte_logs.find_logs(QUOBYTE_FRAMEWORK_NAME, client)
+    if not log_files:
+        logging.error("No Quobyte task logs found.")
+        return 1
+    reader = quobyte_logs.FileReader(client)
+    return quobyte_logs.stream(log_files, reader.read, follow=follow,
+                               tail=quobyte_logs.DEFAULT_TAIL
+                               if tail is None else tail)
+
+
+def metrics(host=None, cache_mode=discovery.CACHE_USE, interval=None,
+            samples=1, output_format=None, watch=False):
+    from dcos_quobyte import api
+    from dcos_quobyte import metrics as quobyte_metrics
+    from dcos_quobyte import monitor
+
+    host = resolve_host(host, cache_mode)
+    fetch_state = monitor.StateFetcher(api.default_client(),
+                                       host + STATE_API_STRING)
+    collector = quobyte_metrics.collector_for(QUOBYTE_FRAMEWORK_NAME,
+                                              dcos_client(), fetch_state)
+
+    def report(collector):
+        if output_format == 'json':
+            print(json.dumps(quobyte_metrics.to_json(collector),
+                             sort_keys=True, indent=2))
+        elif output_format == 'prometheus':
+            print(quobyte_metrics.format_prometheus(collector), end='')
+        else:
+            print(quobyte_metrics.format_table(collector))
+        sys.stdout.flush()
+
+    interval = interval or quobyte_metrics.DEFAULT_INTERVAL
+    try:
+        if watch:
+            quobyte_metrics.run(collector, None, interval, report)
+        else:
+            quobyte_metrics.run(collector, samples, interval)
+            report(collector)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def volumes(action, host=None, cache_mode=discovery.CACHE_USE, manifest=None,
+            parallel=1, batch_size=None, journal_path=None, tenant=None,
+            output_json=False):
+    from dcos_quobyte import volumes as quobyte_volumes
+
+    host = resolve_host(host, cache_mode)
+    if action == 'list':
+        entries = quobyte_volumes.list_volumes(host, tenant)
+        if output_json:
+            print(json.dumps(entries, sort_keys=True, indent=2))
+        else:
+            print(quobyte_volumes.format_table(entries))
+        return 0
+
+    wanted = quobyte_volumes.load_manifest(manifest)
+    journal = quobyte_volumes.Journal(
+        journal_path or manifest + quobyte_volumes.JOURNAL_SUFFIX, action)
+    results = quobyte_volumes.provision(
+        action, host, wanted, parallel,
+        batch_size or quobyte_volumes.DEFAULT_BATCH_SIZE, journal)
+    if output_json:
+        print(json.dumps(quobyte_volumes.to_json(results), sort_keys=True,
+                         indent=2))
+    else:
+        print(quobyte_volumes.format_report(action, results,
+                                            len(wanted) - len(results)))
+    return 1 if quobyte_volumes.failures(results) else 0
+
+
+def bench_api(host=None, cache_mode=discovery.CACHE_USE, operation='state',
+              release=None, concurrency=1, rate=None, duration=None,
+              requests=None, output_json=False):
+    from dcos_quobyte import loadtest
+
+    if operation not in ('start', 'stop', 'state'):
+        raise ValueError("Unknown operation " + str(operation) + ", please "
+                         "provide start, stop or state.")
+    if operation == 'start' and release is None:
+        raise ValueError("No framework release specified, please provide"
+                         " --release=<a.b.c> option.")
+    url = build_url(host, cache_mode, STATE_API_STRING
+                    if operation == 'state' else API_STRING)
+    result = loadtest.run(
+        loadtest.client_sender(url, str(release)
+                               if operation == 'start' else None),
+        concurrency, rate or None,
+        loadtest.DEFAULT_DURATION if duration is None else duration,
+        requests)
+    if output_json:
+        print(json.dumps(loadtest.summary(result), sort_keys=True, indent=2))
+    else:
+        print(loadtest.format_summary(result))
+    return 0 if result.histogram.count and not result.errors else 1
 
 
 def config_schema():
@@ -120,22 +883,251 @@ def config_schema():
     return 0
 
 
+def cache_mode(args):
+    if args['--no-cache']:
+        return discovery.CACHE_OFF
+    elif args['--refresh']:
+        return discovery.CACHE_REFRESH
+    return discovery.CACHE_USE
+
+
+def batch_targets(args):
+    from dcos_quobyte import batch
+
+    if args['--hosts']:
+        return batch.parse_hosts(args['--hosts'])
+    elif args['--targets']:
+        return batch.load_targets(args['--targets'])
+    elif args['--all']:
+        return find_quobyte_frameworks()
+    return None
+
+
+def number_option(args, option, convert=int, minimum=0):
+    try:
+        value = convert(args[option])
+    except (TypeError, ValueError):
+        value = None
+    if value is None or value < minimum:
+        raise ValueError("Invalid " + option + "=" + str(args[option]) +
+                         ", please provide a number of at least " +
+                         str(minimum) + ".")
+    return value
+
+
+def preflight_passed(args):
+    """Runs the preflight checks of start and upgrade --preflight"""
+
+    code = preflight(parallel=number_option(args, '--parallel', minimum=1),
+                     timeout=number_option(args, '--agent-timeout', float))
+    if code != 0:
+        logging.error("Not enough Mesos agents can host Quobyte services, "
+                      "no framework was changed.")
+    return code == 0
+
+
+def run_batch(operation, targets, parallel, **kwargs):
+    from dcos_quobyte import api
+    from dcos_quobyte import batch
+    from dcos_quobyte import versions
+
+    # every target prefetches before the first one switches releases
+    results = {}
+    if kwargs.pop('prefetch', False):
+        results = dict((result.host, result) for result in
+                       versions.prefetch_all(targets, kwargs['release'],
+                                             parallel)
+                       if result.code != 0)
+    remaining = [host for host in targets if host not in results]
+
+    def run_operation(host):
+        return operation(host=host, **kwargs)
+
+    if not remaining:
+        switched = []
+    elif (api.backend() == api.BACKEND_ASYNCIO and
+          operation in (start, stop) and not kwargs.get('ordered')):
+        from dcos_quobyte import aio
+
+        switched = aio.run_batch(operation.__name__, remaining, parallel,
+                                 kwargs.get('release'),
+                                 kwargs.get('negotiate', False))
+    else:
+        switched = batch.run(run_operation, remaining, parallel)
+    results.update((result.host, result) for result in switched)
+    return batch.report([results[host] for host in targets])
+
+
 def main():
     args = docopt(
         __doc__,
         help=False,
         version='dcos quobyte version {}'.format(constants.version))
 
+    if args['--trace']:
+        trace.enable()
+    else:
+        trace.enable_from_environ()
+    with trace.span('command', argv=sys.argv[1:]) as span:
+        code = forward(args)
+        if code is None:
+            code = dispatch(args)
+        span.set('exit_code', code)
+    return code
+
+
+def forward(args):
+    """Runs the command in the daemon if DCOS_QUOBYTE_SOCKET is set and
+    the command can be forwarded.  Returns its exit code, or None if the
+    command has to run locally.
+    """
+
+    if (not (args['start'] or args['stop'] or args['status']) or
+            args['--hosts'] or args['--targets'] or args['--all'] or
+            args['--async'] or args['--watch'] or args['--preflight'] or
+            (args['stop'] and not args['--force'])):
+        return None
+    from dcos_quobyte import daemon
+
+    path = os.environ.get(daemon.SOCKET_ENV)
+    if path is None:
+        return None
+    request = {'host': args['--host'], 'cache_mode': cache_mode(args)}
+    if args['status']:
+        request.update({'command': 'status', 'json': args['--json']})
+    else:
+        request.update({'command': 'start' if args['start'] else 'stop',
+                        'release': args['--release'],
+                        'force': args['--force'],
+                        'prefetch': args['--prefetch'],
+                        'wait': args['--wait'],
+                        'timeout': number_option(args, '--timeout', float)})
+
+    with trace.span('forward', path=path):
+        try:
+            response = daemon.call(path, request)
+        except (IOError, OSError, ValueError) as e:
+            logging.debug("Daemon at " + path + " unavailable, running "
+                          "locally: " + str(e))
+            return None
+    if response.get('output'):
+        print(response['output'])
+    if response.get('error'):
+        logging.error(response['error'])
+    return response['code']
+
+
+def dispatch(args):
     if args['--help'] or args['-h']:
         return print(__doc__)  # Prints the whole docstring
     elif args['--info']:
         return info()
-    elif args['start']:
-        return start(host=args['--host'], release=args['--release'])
-    elif args['stop']:
-        return stop(host=args['--host'])
+    elif args['--preflight'] and not preflight_passed(args):
+        return 1
+    elif args['start'] or args['stop']:
+        kwargs = {'cache_mode': cache_mode(args)}
+        if args['stop']:
+            from dcos_quobyte import shutdown
+
+            action, operation = 'stop', stop
+            kwargs.update({'ordered': not (args['--force'] or
+                                           args['--async']),
+                           'batch_size': shutdown.DEFAULT_BATCH_SIZE
+                           if args['--batch-size'] is None else
+                           number_option(args, '--batch-size', minimum=1),
+                           'timeout': number_option(args, '--timeout',
+                                                    float)})
+        else:
+            action, operation = 'start', start
+            kwargs.update({'release': args['--release'],
+                           'negotiate': not args['--force'],
+                           'prefetch': args['--prefetch']})
+
+        targets = batch_targets(args)
+        if targets is not None:
+            code = run_batch(operation, targets,
+                             number_option(args, '--parallel', minimum=1),
+                             **kwargs)
+        elif args['--wait'] or args['--async']:
+            targets = [resolve_host(args['--host'], kwargs['cache_mode'])]
+            code = operation(host=targets[0], **kwargs)
+        else:
+            return operation(host=args['--host'], **kwargs)
+
+        if code != 0:
+            return code
+        elif args['--wait']:
+            return wait_operation(action, targets,
+                                  number_option(args, '--timeout', float))
+        elif args['--async']:
+            return submit_operation(action, targets)
+        return code
+    elif args['wait']:
+        return wait(args['<operation-id>'],
+                    number_option(args, '--timeout', float))
+    elif args['daemon']:
+        from dcos_quobyte import daemon
+
+        return daemon.serve(args['--socket'])
     elif args['upgrade']:
-        return upgrade(host=args['--host'], release=args['--release'])
+        return upgrade(host=args['--host'], release=args['--release'],
+                       cache_mode=cache_mode(args),
+                       hosts=batch_targets(args),
+                       window=number_option(args, '--window', minimum=1),
+                       max_failures=number_option(args, '--max-failures'),
+                       timeout=number_option(args, '--timeout', float),
+                       force=args['--force'], prefetch=args['--prefetch'])
+    elif args['apply']:
+        return apply(args['--file'], host=args['--host'],
+                     cache_mode=cache_mode(args), hosts=batch_targets(args),
+                     parallel=number_option(args, '--parallel', minimum=1),
+                     dry_run=args['--dry-run'])
+    elif args['preflight']:
+        return preflight(args['--file'],
+                         parallel=number_option(args, '--parallel', minimum=1),
+                         timeout=number_option(args, '--agent-timeout', float),
+                         output_json=args['--json'])
+    elif args['plan']:
+        return plan(args['--file'], domain=args['--domain'],
+                    output=args['--output'], output_json=args['--json'])
+    elif args['status']:
+        return status(host=args['--host'], cache_mode=cache_mode(args),
+                      output_json=args['--json'], watch=args['--watch'],
+                      interval=number_option(args, '--interval', float))
+    elif args['inventory']:
+        return inventory('json' if args['--json'] else
+                         'csv' if args['--csv'] else None)
+    elif args['logs']:
+        return logs(follow=args['--follow'],
+                    tail=number_option(args, '--tail'))
+    elif args['metrics']:
+        return metrics(host=args['--host'], cache_mode=cache_mode(args),
+                       interval=number_option(args, '--interval', float),
+                       samples=number_option(args, '--samples', minimum=1),
+                       output_format='json' if args['--json'] else
+                       'prometheus' if args['--prometheus'] else None,
+                       watch=args['--watch'])
+    elif args['volumes']:
+        return volumes('create' if args['create'] else
+                       'delete' if args['delete'] else 'list',
+                       host=args['--host'], cache_mode=cache_mode(args),
+                       manifest=args['--file'],
+                       parallel=number_option(args, '--parallel', minimum=1),
+                       batch_size=None if args['--batch-size'] is None else
+                       number_option(args, '--batch-size', minimum=1),
+                       journal_path=args['--journal'], tenant=args['--tenant'],
+                       output_json=args['--json'])
+    elif args['bench-api']:
+        return bench_api(host=args['--host'], cache_mode=cache_mode(args),
+                         operation=args['--operation'],
+                         release=args['--release'],
+                         concurrency=number_option(args, '--concurrency',
+                                                   minimum=1),
+                         rate=number_option(args, '--rate', float),
+                         duration=number_option(args, '--duration', float),
+                         requests=None if args['--requests'] is None else
+                         number_option(args, '--requests', minimum=1),
+                         output_json=args['--json'])
     elif args['--config-schema']:
         return config_schema()
 
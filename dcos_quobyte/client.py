@@ -0,0 +1,158 @@
+"""Python API for the Quobyte framework
+
+QuobyteClient keeps the discovered framework URL, the pooled framework API
+connections, the DCOS client and the ETag of the framework state across
+calls, so programs driving many operations pay for discovery once instead of
+once per `dcos quobyte` invocation.  Failed operations raise QuobyteError.
+"""
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import logging
+
+from dcos_quobyte import api
+from dcos_quobyte import cli
+from dcos_quobyte import discovery
+from dcos_quobyte import monitor
+
+CONNECTION_FAILED = 2
+
+
+class QuobyteError(Exception):
+    """Raised if the framework rejected or failed an operation
+
+    :param message: description of the failure
+    :type message: str
+    :param code: exit code the CLI would return for the failure
+    :type code: int
+    """
+
+    def __init__(self, message, code=1):
+        super(QuobyteError, self).__init__(message)
+        self.code = code
+
+
+class QuobyteClient(object):
+    """Client for one Quobyte framework
+
+    :param host: framework URL, looked up on the Mesos master if None
+    :type host: str | None
+    :param cache_mode: use of the discovery cache for the lookup
+    :type cache_mode: str
+    """
+
+    def __init__(self, host=None, cache_mode=discovery.CACHE_USE):
+        self._configured = host is not None
+        self._host = cli.resolve_host(host) if host is not None else None
+        self._cache_mode = cache_mode
+        self._dcos_client = None
+        self._fetch_state = None
+
+    @property
+    def host(self):
+        """URL of the framework, discovered on first use
+
+        :rtype: str
+        """
+
+        if self._host is None:
+            self._host = cli.resolve_host(None, self._cache_mode)
+        return self._host
+
+    def refresh(self):
+        """Looks the framework up on the Mesos master again, unless its URL
+        was given to the constructor.
+        """
+
+        if not self._configured:
+            self._host = cli.resolve_host(None, discovery.CACHE_REFRESH)
+            self._fetch_state = None
+
+    def _call(self, action, operation):
+        code = operation(self.host)
+        if code == CONNECTION_FAILED and not self._configured:
+            # the framework may have moved since it was discovered
+            logging.info("Framework at " + self.host + " unreachable, "
+                         "looking it up again.")
+            self.refresh()
+            code = operation(self.host)
+        if code != 0:
+            raise QuobyteError("Quobyte " + action + " at " + self.host +
+                               " failed with code " + str(code), code)
+
+    def start(self, release, wait=False, timeout=None, force=False,
+              prefetch=False):
+        """Starts `release` on the framework, unless it already runs it
+
+        :param release: Quobyte release
+        :type release: str
+        :param wait: wait until the Quobyte tasks are running
+        :type wait: bool
+        :param timeout: seconds to wait at most
+        :type timeout: float | None
+        :param force: start even if the framework already runs `release`
+        :type force: bool
+        :param prefetch: have the agents pull the artifacts of `release`
+                         first
+        :type prefetch: bool
+        :raises: QuobyteError
+        """
+
+        self._call('start', lambda host: cli.start(
+            host, release, negotiate=not force, prefetch=prefetch))
+        if wait:
+            self.wait('start', timeout)
+
+    def stop(self, wait=False, timeout=None):
+        """Stops the framework's Quobyte services
+
+        :param wait: wait until the Quobyte tasks are gone
+        :type wait: bool
+        :param timeout: seconds to wait at most
+        :type timeout: float | None
+        :raises: QuobyteError
+        """
+
+        self._call('stop', cli.stop)
+        if wait:
+            self.wait('stop', timeout)
+
+    def wait(self, action, timeout=None):
+        """Waits until the tasks reached the target of `action`
+
+        :param action: 'start' or 'stop'
+        :type action: str
+        :param timeout: seconds to wait at most
+        :type timeout: float | None
+        :raises: QuobyteError
+        """
+
+        if cli.wait_operation(action, [self.host], timeout) != 0:
+            raise QuobyteError("Quobyte tasks at " + self.host + " did not "
+                               "settle after " + action)
+
+    def state(self):
+        """Returns the state reported by the framework
+
+        :rtype: dict | None
+        """
+
+        return cli.get_state(self.host)
+
+    def status(self):
+        """Returns a status snapshot, see monitor.snapshot()
+
+        :rtype: dict
+        """
+
+        if self._fetch_state is None:
+            self._fetch_state = monitor.StateFetcher(
+                api.default_client(), self.host + cli.STATE_API_STRING)
+        return monitor.collect(self.host, self._fetch_state,
+                               self._fetch_tasks)
+
+    def _fetch_tasks(self):
+        if self._dcos_client is None:
+            self._dcos_client = cli.dcos_client()
+        return discovery.fetch_framework_tasks(cli.QUOBYTE_FRAMEWORK_NAME,
+                                               self._dcos_client)
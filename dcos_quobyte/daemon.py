@@ -0,0 +1,188 @@
+"""Local daemon keeping QuobyteClients warm
+
+`dcos quobyte daemon` serves start, stop and status requests on a Unix
+socket.  When DCOS_QUOBYTE_SOCKET points to that socket, these commands are
+forwarded to the daemon, which answers them without importing the dcos
+modules, discovering the framework or opening new connections.  The daemon
+keeps its discovery result until --refresh is given, and commands are run
+locally again as soon as the daemon does not answer.
+
+Requests and responses are single JSON lines:
+
+    {"command": "start", "host": null, "release": "1.5", "wait": true}
+    {"code": 0, "output": "", "error": null}
+"""
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import errno
+import json
+import logging
+import os
+import socket
+import threading
+
+from dcos_quobyte import cache
+from six.moves import socketserver
+
+SOCKET_ENV = 'DCOS_QUOBYTE_SOCKET'
+COMMANDS = ('start', 'stop', 'status')
+
+
+def socket_path():
+    """Returns the daemon socket path from DCOS_QUOBYTE_SOCKET, or the
+    default ~/.dcos/quobyte/daemon.sock
+
+    :rtype: str
+    """
+
+    return os.environ.get(SOCKET_ENV) or cache.path('daemon.sock')
+
+
+def call(path, request):
+    """Sends `request` to the daemon listening at `path`
+
+    :param path: socket path
+    :type path: str
+    :param request: request, see the module documentation
+    :type request: dict
+    :returns: response of the daemon
+    :rtype: dict
+    :raises: socket.error if no daemon answers
+    """
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        stream = sock.makefile('rwb')
+        stream.write(json.dumps(request).encode('utf-8') + b'\n')
+        stream.flush()
+        line = stream.readline()
+    finally:
+        sock.close()
+    if not line:
+        raise socket.error(errno.ECONNRESET, "Daemon closed the connection")
+    return json.loads(line.decode('utf-8'))
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line.decode('utf-8'))
+            except ValueError as e:
+                response = {'code': 1, 'output': '', 'error': str(e)}
+            else:
+                response = self.server.execute(request)
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class Daemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket server running requests against warm QuobyteClients,
+    one per framework URL (or None for the discovered framework).
+
+    :param path: socket path
+    :type path: str
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path):
+        self._clients = {}
+        self._lock = threading.Lock()
+        socketserver.UnixStreamServer.__init__(self, path, _Handler)
+
+    def client(self, host):
+        from dcos_quobyte.client import QuobyteClient
+
+        with self._lock:
+            if host not in self._clients:
+                self._clients[host] = QuobyteClient(host)
+            return self._clients[host]
+
+    def execute(self, request):
+        """Runs one request
+
+        :param request: request, see the module documentation
+        :type request: dict
+        :returns: response
+        :rtype: dict
+        """
+
+        from dcos_quobyte import discovery
+        from dcos_quobyte import monitor
+        from dcos_quobyte.client import QuobyteError
+
+        command = request.get('command')
+        output = ''
+        try:
+            if command not in COMMANDS:
+                raise ValueError("Unsupported command " + str(command))
+            client = self.client(request.get('host'))
+            if request.get('cache_mode') == discovery.CACHE_REFRESH:
+                client.refresh()
+            if command == 'start':
+                client.start(request.get('release'), request.get('wait'),
+                             request.get('timeout'),
+                             force=request.get('force', False),
+                             prefetch=request.get('prefetch', False))
+            elif command == 'stop':
+                client.stop(request.get('wait'), request.get('timeout'))
+            else:
+                snap = client.status()
+                if request.get('json'):
+                    output = json.dumps(snap, sort_keys=True, indent=2)
+                else:
+                    output = monitor.format_table(snap)
+        except QuobyteError as e:
+            return {'code': e.code, 'output': output, 'error': str(e)}
+        except Exception as e:
+            logging.debug("Request " + str(request) + " failed",
+                          exc_info=True)
+            return {'code': 1, 'output': output, 'error': str(e)}
+        return {'code': 0, 'output': output, 'error': None}
+
+
+def serve(path=None):
+    """Serves requests on the Unix socket `path` until interrupted
+
+    :param path: socket path, defaults to socket_path()
+    :type path: str | None
+    :returns: exit code
+    :rtype: int
+    """
+
+    path = path or socket_path()
+    try:
+        call(path, {'command': 'ping'})
+    except (socket.error, ValueError):
+        pass
+    else:
+        logging.error("A daemon is already listening at " + path)
+        return 1
+    directory = os.path.dirname(path)
+    try:
+        if directory:
+            os.makedirs(directory)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+    if os.path.exists(path):
+        os.remove(path)
+
+    umask = os.umask(0o077)
+    try:
+        server = Daemon(path)
+    finally:
+        os.umask(umask)
+    logging.info("Serving Quobyte commands at " + path)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(path)
+    return 0
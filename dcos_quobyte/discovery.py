@@ -0,0 +1,1063 @@
+"""Quobyte framework discovery helpers
+
+Looking up the framework on the Mesos master means downloading the master
+state, which is expensive on large clusters.  The master state is therefore
+stream-parsed into a compact framework index, and the resulting URL is kept in
+a small on-disk cache, keyed by the DCOS configuration in use, so that
+repeated invocations of the subcommand can skip the master.
+
+This module is imported on every start of the subcommand, so requests and the
+dcos modules are only imported by the functions using them.
+"""
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import codecs
+import collections
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import re
+import socket
+import threading
+import time
+
+from dcos_quobyte import cache
+from dcos_quobyte import trace
+from six.moves import queue
+from six.moves.urllib.parse import urlparse
+
+CACHE_USE = 'use'
+CACHE_REFRESH = 'refresh'
+CACHE_OFF = 'off'
+
+CACHE_TTL_ENV = 'DCOS_QUOBYTE_CACHE_TTL'
+DEFAULT_CACHE_TTL = 300
+PROBE_TIMEOUT = 0.5
+
+DNS_NAME_ENV = 'DCOS_QUOBYTE_DNS_NAME'
+DEFAULT_DNS_NAME = 'quobyte.marathon.mesos'
+
+MASTERS_ENV = 'DCOS_QUOBYTE_MASTERS'
+HEDGE_DELAY = 0.25
+# (connect, read) timeout in seconds of every master and agent request
+RACE_TIMEOUT = (3.05, 30)
+
+STATE_PATH = 'master/state.json'
+SUMMARY_PATH = 'master/state-summary'
+STREAM_CHUNK_SIZE = 64 * 1024
+FRAMEWORK_FIELDS = ('id', 'name', 'role', 'webui_url', 'hostname', 'active')
+
+TASK_FIELDS = ('id', 'name', 'state', 'slave_id', 'framework_id')
+
+Framework = collections.namedtuple('Framework', FRAMEWORK_FIELDS)
+"""Subset of a framework entry of the Mesos master state"""
+
+Task = collections.namedtuple('Task', TASK_FIELDS)
+"""Subset of a task entry of the Mesos master state"""
+
+Agent = collections.namedtuple('Agent', ['id', 'hostname', 'pid'])
+"""Subset of an agent entry of the Mesos master state"""
+
+TaskCounts = collections.namedtuple('TaskCounts', ['framework_id',
+                                                   'webui_url', 'states'])
+"""Number of tasks of one framework per task state, e.g. TASK_RUNNING"""
+
+_WHITESPACE = ' \t\r\n'
+_DECODER = json.JSONDecoder()
+_STRING_SPECIAL = re.compile(r'["\\]')
+_SCALAR_END = re.compile(r'[,}\]\s]')
+
+
+class _JsonStream(object):
+    """Minimal pull parser over an iterator of text chunks.
+
+    Only the values the caller asks for are kept, everything else is skipped
+    and dropped right away, so memory use is bounded by the largest single
+    object rather than by the document size.
+
+    :param chunks: text chunks of one JSON document
+    :type chunks: iterable of str
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buf = ''
+        self._pos = 0
+
+    def _fill(self, mark=None):
+        """Appends the next chunk to the buffer, discarding everything before
+        `mark` (the current position if None).
+
+        :returns: False at the end of the document
+        :rtype: bool
+        """
+
+        base = self._pos if mark is None else mark
+        for chunk in self._chunks:
+            if chunk:
+                self._buf = self._buf[base:] + chunk
+                self._pos -= base
+                return True
+        return False
+
+    def _need_more(self, mark=None):
+        if not self._fill(mark):
+            raise ValueError("Unexpected end of JSON document")
+
+    def peek(self):
+        """Returns the next non-whitespace character without consuming it
+
+        :rtype: str
+        """
+
+        while True:
+            while (self._pos < len(self._buf) and
+                   self._buf[self._pos] in _WHITESPACE):
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            self._need_more()
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError("Expected '" + char + "' but found '" + found +
+                             "' in JSON document")
+        self._pos += 1
+
+    def _scan_string(self, capture):
+        self.expect('"')
+        start = self._pos
+        search_from = start
+        while True:
+            match = _STRING_SPECIAL.search(self._buf, search_from)
+            if match is not None:
+                if match.group() == '"':
+                    self._pos = match.end()
+                    if capture:
+                        return json.loads(
+                            '"' + self._buf[start:match.start()] + '"')
+                    return None
+                if match.end() < len(self._buf):
+                    # skip the escaped character
+                    search_from = match.end() + 1
+                    continue
+                search_from = match.start()
+            else:
+                search_from = len(self._buf)
+            mark = start if capture else search_from
+            search_from -= mark
+            self._need_more(mark)
+            start = 0
+
+    def read_string(self):
+        return self._scan_string(True)
+
+    def read_scalar(self):
+        self.peek()
+        start = self._pos
+        while True:
+            match = _SCALAR_END.search(self._buf, start)
+            if match is not None:
+                self._pos = match.start()
+                return json.loads(self._buf[start:match.start()])
+            if not self._fill(start):
+                self._pos = len(self._buf)
+                return json.loads(self._buf[start:])
+            start = 0
+
+    def read_value(self):
+        """Decodes the string or scalar at the current position
+
+        :rtype: str | int | float | bool | None
+        """
+
+        if self.peek() == '"':
+            return self.read_string()
+        return self.read_scalar()
+
+    def skip_value(self):
+        """Skips the value at the current position"""
+
+        char = self.peek()
+        if char == '"':
+            self._scan_string(False)
+            return
+        if char not in '{[':
+            self.read_scalar()
+            return
+        if char == '[':
+            # skip element-wise so that long lists never sit in the buffer
+            for _ in self.iter_array():
+                self.skip_value()
+            return
+
+        self.read_object()
+
+    def read_object(self):
+        """Decodes the object at the current position as a whole.  Objects
+        are handed to the C decoder, which is much faster than tokenizing
+        them in Python.
+
+        :rtype: dict
+        """
+
+        self.peek()
+        attempted = 0
+        while True:
+            available = len(self._buf) - self._pos
+            if available >= 2 * attempted:
+                attempted = available
+                try:
+                    value, self._pos = _DECODER.raw_decode(self._buf,
+                                                           self._pos)
+                    return value
+                except ValueError:
+                    pass
+            if not self._fill():
+                value, self._pos = _DECODER.raw_decode(self._buf, self._pos)
+                return value
+
+    def iter_object(self):
+        """Yields the keys of the object at the current position.  The
+        caller has to consume each value before advancing the iterator.
+        """
+
+        self.expect('{')
+        if self.peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = self.read_string()
+            self.expect(':')
+            yield key
+            char = self.peek()
+            self._pos += 1
+            if char == '}':
+                return
+            if char != ',':
+                raise ValueError("Expected ',' or '}' in JSON object")
+
+    def iter_array(self):
+        """Yields once per element of the array at the current position.  The
+        caller has to consume each element before advancing the iterator.
+        """
+
+        self.expect('[')
+        if self.peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield
+            char = self.peek()
+            self._pos += 1
+            if char == ']':
+                return
+            if char != ',':
+                raise ValueError("Expected ',' or ']' in JSON array")
+
+
+def _read_record(stream, record_type):
+    """Reads the object at the current position of `stream` into a
+    `record_type` namedtuple, keeping only the scalar fields it declares.
+    """
+
+    fields = dict.fromkeys(record_type._fields)
+    for field in stream.iter_object():
+        if field in fields and stream.peek() not in '{[':
+            fields[field] = stream.read_value()
+        else:
+            stream.skip_value()
+    return record_type(**fields)
+
+
+def _decode_record(stream, record_type):
+    """Like _read_record(), but decodes the object as a whole, which is
+    several times faster for small objects such as tasks and agents.
+    Objects that may hold large lists, like frameworks, are better read
+    with _read_record().
+    """
+
+    entry = stream.read_object()
+    if not isinstance(entry, dict):
+        raise ValueError("Expected a JSON object in the master state")
+    return record_type._make(
+        None if isinstance(value, (dict, list)) else value
+        for value in (entry.get(field) for field in record_type._fields))
+
+
+def iter_frameworks(chunks, keys=('frameworks',), header=None):
+    """Yields a Framework for every entry of the `keys` arrays of a Mesos
+    master state document, without materializing the document.
+
+    :param chunks: text chunks of the master state.json
+    :type chunks: iterable of str
+    :param keys: top level keys holding framework lists
+    :type keys: tuple of str
+    :param header: top level scalars to capture, filled in as their keys
+                   are passed
+    :type header: dict | None
+    :rtype: iterator of Framework
+    """
+
+    header = {} if header is None else header
+    stream = _JsonStream(chunks)
+    for key in stream.iter_object():
+        if key in header and stream.peek() not in '{[':
+            header[key] = stream.read_value()
+            continue
+        if key not in keys:
+            stream.skip_value()
+            continue
+        for _ in stream.iter_array():
+            yield _read_record(stream, Framework)
+
+
+def iter_framework_tasks(chunks, framework_name, task_type=Task,
+                         keys=('frameworks',), agents=None):
+    """Yields the running tasks of all frameworks named `framework_name`
+    from a Mesos master state document.  Tasks of other frameworks are
+    skipped without being decoded whenever their name precedes their tasks.
+
+    :param chunks: text chunks of the master state.json
+    :type chunks: iterable of str
+    :param framework_name: framework name
+    :type framework_name: str
+    :param task_type: namedtuple type the tasks are read into
+    :type task_type: type
+    :param keys: top level keys holding framework lists
+    :type keys: tuple of str
+    :param agents: filled in with an Agent for every agent by id
+    :type agents: dict | None
+    :rtype: iterator of Task
+    """
+
+    stream = _JsonStream(chunks)
+    for key in stream.iter_object():
+        if key == 'slaves' and agents is not None and stream.peek() == '[':
+            for _ in stream.iter_array():
+                agent = _decode_record(stream, Agent)
+                agents[agent.id] = agent
+            continue
+        if key not in keys:
+            stream.skip_value()
+            continue
+        for _ in stream.iter_array():
+            name = None
+            tasks = []
+            for field in stream.iter_object():
+                if field == 'name':
+                    name = stream.read_value()
+                elif (field == 'tasks' and stream.peek() == '[' and
+                      name in (None, framework_name)):
+                    for _ in stream.iter_array():
+                        tasks.append(_decode_record(stream, task_type))
+                else:
+                    stream.skip_value()
+            if name == framework_name:
+                for task in tasks:
+                    yield task
+
+
+def _iter_executors(chunks, framework_ids):
+    """Yields the executor entries of the frameworks `framework_ids` from a
+    Mesos agent state document, see iter_task_directories()"""
+
+    stream = _JsonStream(chunks)
+    for key in stream.iter_object():
+        if key not in ('frameworks', 'completed_frameworks'):
+            stream.skip_value()
+            continue
+        for _ in stream.iter_array():
+            framework_id = None
+            executors = []
+            for field in stream.iter_object():
+                if field == 'id':
+                    framework_id = stream.read_value()
+                elif (field in ('executors', 'completed_executors') and
+                      stream.peek() == '[' and
+                      framework_id in (None,) + tuple(framework_ids)):
+                    for _ in stream.iter_array():
+                        executors.append(stream.read_object())
+                else:
+                    stream.skip_value()
+            if framework_id in framework_ids:
+                for executor in executors:
+                    yield executor
+
+
+def _executor_task_ids(executor):
+    tasks = (executor.get('tasks', []) + executor.get('queued_tasks', []) +
+             executor.get('completed_tasks', []))
+    return set(task.get('id') for task in tasks) - set([None])
+
+
+def iter_task_directories(chunks, framework_ids):
+    """Yields (task ID, sandbox directory) for the tasks of the frameworks
+    `framework_ids` from a Mesos agent state document.  Executors of other
+    frameworks are skipped without being decoded whenever the framework ID
+    precedes them.
+
+    :param chunks: text chunks of the agent state.json
+    :type chunks: iterable of str
+    :param framework_ids: IDs of the frameworks of interest
+    :type framework_ids: set of str
+    :rtype: iterator of (str, str)
+    """
+
+    for executor in _iter_executors(chunks, framework_ids):
+        directory = executor.get('directory')
+        task_ids = _executor_task_ids(executor) | set([executor.get('id')])
+        for task_id in task_ids:
+            if task_id is not None and directory is not None:
+                yield task_id, directory
+
+
+def iter_executor_tasks(chunks, framework_ids):
+    """Yields (executor ID, task ID) for the tasks of the frameworks
+    `framework_ids` from a Mesos agent state document.  Tasks run by a
+    custom executor have an executor ID other than their task ID.
+
+    :param chunks: text chunks of the agent state.json
+    :type chunks: iterable of str
+    :param framework_ids: IDs of the frameworks of interest
+    :type framework_ids: set of str
+    :rtype: iterator of (str, str)
+    """
+
+    for executor in _iter_executors(chunks, framework_ids):
+        executor_id = executor.get('id')
+        if executor_id is None:
+            continue
+        for task_id in _executor_task_ids(executor):
+            yield executor_id, task_id
+
+
+def read_fields(chunks, names):
+    """Returns the top-level fields `names` of a JSON object document.  All
+    other fields are skipped, long arrays such as the frameworks of an agent
+    without being held in memory.
+
+    :param chunks: text chunks of the document
+    :type chunks: iterable of str
+    :param names: names of the fields to decode
+    :type names: set of str
+    :rtype: dict
+    """
+
+    stream = _JsonStream(chunks)
+    fields = {}
+    for key in stream.iter_object():
+        if key not in names:
+            stream.skip_value()
+        elif stream.peek() in '{[':
+            fields[key] = stream.read_object()
+        else:
+            fields[key] = stream.read_value()
+    return fields
+
+
+class FrameworkIndex(object):
+    """Frameworks of one master state fetch, indexed by name and id
+
+    :param frameworks: frameworks to index
+    :type frameworks: iterable of Framework
+    """
+
+    def __init__(self, frameworks):
+        self._by_name = {}
+        self._by_id = {}
+        self._active = 0
+        for framework in frameworks:
+            self._by_name.setdefault(framework.name, []).append(framework)
+            self._by_id[framework.id] = framework
+            if framework.active:
+                self._active += 1
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def by_name(self, name, inactive=False):
+        """Returns all frameworks registered under `name`
+
+        :param name: framework name
+        :type name: str
+        :param inactive: also include inactive frameworks
+        :type inactive: bool
+        :rtype: [Framework]
+        """
+
+        return [framework for framework in self._by_name.get(name, [])
+                if inactive or framework.active]
+
+    def by_id(self, framework_id):
+        """Returns the framework with id `framework_id` or None
+
+        :rtype: Framework | None
+        """
+
+        return self._by_id.get(framework_id)
+
+    def summary(self):
+        """Returns a short description of the index suitable for logging
+
+        :rtype: str
+        """
+
+        return (str(len(self._by_id)) + " frameworks (" + str(self._active) +
+                " active, " + str(len(self._by_name)) + " distinct names)")
+
+
+@contextlib.contextmanager
+def master_state_chunks(dcos_client=None):
+    """Context manager streaming the Mesos master state as text chunks
+
+    :param dcos_client: client to derive the master URL from
+    :type dcos_client: DCOSClient | None
+    :returns: iterator over text chunks of state.json
+    :rtype: context manager
+    """
+
+    import requests
+    from dcos import mesos
+
+    dcos_client = dcos_client or mesos.DCOSClient()
+    url = dcos_client.master_url(STATE_PATH)
+    with trace.span('master_state', url=url) as span:
+        with trace.span('master_request', url=url) as request_span:
+            response = requests.get(url, stream=True, timeout=RACE_TIMEOUT)
+            request_span.set('status', response.status_code)
+        try:
+            if response.status_code == requests.codes.unauthorized:
+                # let the dcos http layer deal with authentication
+                logging.debug("Master requires authentication, falling back "
+                              "to a buffered state fetch.")
+                span.set('buffered', True)
+                yield [json.dumps(mesos.get_master(dcos_client).state())]
+            else:
+                response.raise_for_status()
+                yield _decode_chunks(
+                    response.iter_content(STREAM_CHUNK_SIZE), span)
+        finally:
+            response.close()
+
+
+@contextlib.contextmanager
+def agent_state_chunks(dcos_client, agent):
+    """Context manager streaming the state of a Mesos agent as text chunks
+
+    :param dcos_client: client to derive the agent URL from
+    :type dcos_client: DCOSClient
+    :param agent: the agent
+    :type agent: Agent
+    :returns: iterator over text chunks of the agent's state.json
+    :rtype: context manager
+    """
+
+    import requests
+
+    url = dcos_client.slave_url(agent.id, agent_url(agent), 'state.json')
+    with trace.span('agent_state', url=url) as span:
+        response = requests.get(url, stream=True, timeout=RACE_TIMEOUT)
+        span.set('status', response.status_code)
+        try:
+            if response.status_code == requests.codes.unauthorized:
+                span.set('buffered', True)
+                yield [json.dumps(dcos_client.get_slave_state(
+                    agent.id, agent_url(agent)))]
+            else:
+                response.raise_for_status()
+                yield _decode_chunks(
+                    response.iter_content(STREAM_CHUNK_SIZE), span)
+        finally:
+            response.close()
+
+
+def agent_url(agent):
+    """Returns the private URL of `agent`, derived from its pid such as
+    slave(1)@10.0.0.1:5051
+
+    :type agent: Agent
+    :rtype: str | None
+    """
+
+    if not agent.pid or '@' not in agent.pid:
+        return None
+    return 'http://' + agent.pid.split('@', 1)[1]
+
+
+def _decode_chunks(chunks, span):
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    for chunk in chunks:
+        span.add('bytes', len(chunk))
+        yield decoder.decode(chunk)
+
+
+def fetch_framework_index(dcos_client=None):
+    """Fetches the Mesos master state and indexes its frameworks.  The
+    response is streamed, so only one framework entry is decoded at a time.
+
+    :param dcos_client: client to derive the master URL from
+    :type dcos_client: DCOSClient | None
+    :rtype: FrameworkIndex
+    """
+
+    with trace.span('framework_index') as span:
+        with master_state_chunks(dcos_client) as chunks:
+            index = FrameworkIndex(iter_frameworks(chunks))
+        span.set('frameworks', len(index))
+        return index
+
+
+def master_state_urls(dcos_client):
+    """Returns the state URLs of the configured master followed by those of
+    the masters listed in DCOS_QUOBYTE_MASTERS, a comma separated list of
+    master base URLs such as http://10.0.0.2:5050 or http://leader.mesos:5050
+
+    :param dcos_client: client to derive the configured master URL from
+    :type dcos_client: DCOSClient
+    :rtype: [str]
+    """
+
+    urls = [dcos_client.master_url(STATE_PATH)]
+    for master in os.environ.get(MASTERS_ENV, '').split(','):
+        master = master.strip()
+        if master:
+            url = master.rstrip('/') + '/' + STATE_PATH
+            if url not in urls:
+                urls.append(url)
+    return urls
+
+
+class _Cancelled(Exception):
+    """Raised inside a straggling master fetch once another master won"""
+
+
+def _fetch_leader_index(url, cancelled):
+    """Fetches and indexes the state of the master at `url`
+
+    :returns: the index and whether the master is the leading one.  Masters
+              omitting pid or leader, like older versions, count as leading.
+    :rtype: (FrameworkIndex, bool)
+    """
+
+    import requests
+
+    with trace.span('master_candidate', url=url) as span:
+        response = requests.get(url, stream=True, timeout=RACE_TIMEOUT)
+        try:
+            span.set('status', response.status_code)
+            response.raise_for_status()
+            chunks = _decode_chunks(response.iter_content(STREAM_CHUNK_SIZE),
+                                    span)
+            header = {'pid': None, 'leader': None}
+            index = FrameworkIndex(
+                iter_frameworks(_until(cancelled, chunks), header=header))
+        finally:
+            response.close()
+        leading = (None in header.values() or
+                   header['pid'] == header['leader'])
+        span.set('leading', leading)
+        return index, leading
+
+
+def _until(event, chunks):
+    for chunk in chunks:
+        if event.is_set():
+            raise _Cancelled()
+        yield chunk
+
+
+def race_framework_index(urls, preferred=None, hedge_delay=HEDGE_DELAY):
+    """Fetches the master state from all `urls` in parallel and indexes the
+    first one answered by the leading master.  The remaining fetches are
+    abandoned: they stop at their next chunk and never delay the exit, as
+    they run on daemon threads.
+
+    If `preferred` is one of `urls`, it is asked alone first, and the others
+    only join once it did not answer within `hedge_delay` seconds.
+
+    :param urls: master state URLs, see master_state_urls()
+    :type urls: [str]
+    :param preferred: URL to try first
+    :type preferred: str | None
+    :param hedge_delay: head start of the preferred URL in seconds
+    :type hedge_delay: float
+    :returns: the index and the URL that won, or (None, None) if no leading
+              master answered
+    :rtype: (FrameworkIndex | None, str | None)
+    """
+
+    cancelled = threading.Event()
+    results = queue.Queue()
+
+    def fetch(url):
+        try:
+            results.put((url, _fetch_leader_index(url, cancelled), None))
+        except Exception as e:
+            results.put((url, None, e))
+
+    def launch(batch):
+        for url in batch:
+            thread = threading.Thread(target=fetch, args=(url,))
+            thread.daemon = True
+            thread.start()
+        return len(batch)
+
+    held_back = []
+    if preferred in urls:
+        held_back = [url for url in urls if url != preferred]
+        running = launch([preferred])
+    else:
+        running = launch(urls)
+    with trace.span('master_race', masters=len(urls)) as span:
+        try:
+            while running:
+                try:
+                    url, outcome, error = results.get(
+                        timeout=hedge_delay if held_back else None)
+                except queue.Empty:
+                    logging.debug("Master " + str(preferred) + " is slow, "
+                                  "asking " + str(len(held_back)) +
+                                  " more.")
+                    running += launch(held_back)
+                    held_back = []
+                    continue
+                running -= 1
+                if error is not None:
+                    logging.debug("Master state from " + url + " failed: " +
+                                  str(error))
+                elif not outcome[1]:
+                    logging.debug("Master at " + url + " is not leading.")
+                else:
+                    span.set('winner', url)
+                    return outcome[0], url
+                if not running:
+                    running += launch(held_back)
+                    held_back = []
+            return None, None
+        finally:
+            cancelled.set()
+
+
+def fetch_framework_index_racing(dcos_client, urls, key=None):
+    """Races the masters at `urls` for the framework index, see
+    race_framework_index(), preferring the master that won last time for
+    cluster `key`.  Falls back to fetch_framework_index() if no leading
+    master answered, e.g. because they all require authentication.
+
+    :param dcos_client: client for the fallback fetch
+    :type dcos_client: DCOSClient
+    :param urls: master state URLs, see master_state_urls()
+    :type urls: [str]
+    :param key: cluster key, see cluster_key()
+    :type key: str | None
+    :rtype: FrameworkIndex
+    """
+
+    preferred = load_preferred_master(key) if key is not None else None
+    index, winner = race_framework_index(urls, preferred)
+    if index is None:
+        logging.debug("No leading master answered, asking the configured "
+                      "master.")
+        return fetch_framework_index(dcos_client)
+    logging.debug("Master state from " + winner + " came in first.")
+    if key is not None and winner != preferred:
+        store_preferred_master(key, winner)
+    return index
+
+
+def fetch_framework_tasks(framework_name, dcos_client=None, task_type=Task,
+                          agents=None):
+    """Fetches the running tasks of the frameworks named `framework_name`
+
+    :param framework_name: framework name
+    :type framework_name: str
+    :param dcos_client: client to derive the master URL from
+    :type dcos_client: DCOSClient | None
+    :param task_type: namedtuple type the tasks are read into
+    :type task_type: type
+    :param agents: filled in with an Agent for every agent by id
+    :type agents: dict | None
+    :rtype: [Task]
+    """
+
+    with master_state_chunks(dcos_client) as chunks:
+        return list(iter_framework_tasks(chunks, framework_name, task_type,
+                                         agents=agents))
+
+
+def fetch_task_counts(framework_name, dcos_client=None):
+    """Returns the task counts of the frameworks named `framework_name`.
+
+    They are read from the master's state-summary, which lists the number
+    of tasks per state instead of the tasks themselves and thus stays small
+    on large clusters.  Masters without state-summary are answered from the
+    full state, as one TaskCounts entry without framework ID and URL.
+
+    :param framework_name: framework name
+    :type framework_name: str
+    :param dcos_client: client to derive the master URL from
+    :type dcos_client: DCOSClient | None
+    :rtype: [TaskCounts]
+    """
+
+    import requests
+    from dcos import mesos
+
+    dcos_client = dcos_client or mesos.DCOSClient()
+    url = dcos_client.master_url(SUMMARY_PATH)
+    with trace.span('master_summary', url=url) as span:
+        response = requests.get(url, timeout=RACE_TIMEOUT)
+        span.set('status', response.status_code)
+        if response.status_code == requests.codes.ok:
+            span.set('bytes', len(response.content))
+            return [TaskCounts(framework.get('id'),
+                               framework.get('webui_url'),
+                               dict((key, value) for key, value
+                                    in framework.items()
+                                    if key.startswith('TASK_')))
+                    for framework in response.json().get('frameworks', [])
+                    if framework.get('name') == framework_name]
+
+    logging.debug("No state-summary from the master (status code " +
+                  str(response.status_code) + "), counting tasks in the "
+                  "full state.")
+    states = collections.Counter(
+        task.state for task
+        in fetch_framework_tasks(framework_name, dcos_client))
+    return [TaskCounts(None, None, dict(states))]
+
+
+def cache_path():
+    """Returns the path of the discovery cache file
+
+    :returns: path to the discovery cache
+    :rtype: str
+    """
+
+    return cache.path('discovery.json')
+
+
+def cache_ttl():
+    """Returns the discovery cache TTL in seconds, honouring the
+    DCOS_QUOBYTE_CACHE_TTL environment variable.
+
+    :rtype: float
+    """
+
+    value = os.environ.get(CACHE_TTL_ENV)
+    if value is None:
+        return DEFAULT_CACHE_TTL
+    try:
+        return float(value)
+    except ValueError:
+        logging.warning("Ignoring invalid " + CACHE_TTL_ENV + " value " +
+                        str(value))
+        return DEFAULT_CACHE_TTL
+
+
+def cluster_key():
+    """Returns a key identifying the cluster the DCOS configuration points
+    to, or None if there is no configuration to derive it from.
+
+    The raw configuration file is hashed instead of being parsed, so that
+    computing the key stays cheap.
+
+    :rtype: str | None
+    """
+
+    from dcos import util
+
+    path = util.get_config_path()
+    try:
+        with open(path, 'rb') as config_file:
+            content = config_file.read()
+    except IOError:
+        logging.debug("No DCOS config at " + path + ", discovery cache is "
+                      "disabled.")
+        return None
+
+    digest = hashlib.sha1(path.encode('utf-8'))
+    digest.update(content)
+    return digest.hexdigest()
+
+
+def _read_cache():
+    return cache.load(cache_path())
+
+
+def _write_cache(entries):
+    cache.save(cache_path(), entries)
+
+
+def load_cached_url(key, ttl=None):
+    """Returns the cached framework URL for `key` if it is younger than
+    `ttl` seconds.
+
+    :param key: cluster key, see cluster_key()
+    :type key: str
+    :param ttl: maximum age of the entry, defaults to cache_ttl()
+    :type ttl: float | None
+    :rtype: str | None
+    """
+
+    if ttl is None:
+        ttl = cache_ttl()
+    entry = _read_cache().get(key)
+    if not entry:
+        return None
+    age = time.time() - entry.get('timestamp', 0)
+    if age < 0 or age > ttl:
+        logging.debug("Cached framework URL expired " + str(int(age)) +
+                      "s ago.")
+        return None
+    return entry.get('webui_url')
+
+
+def store_url(key, url):
+    """Stores the framework URL for `key`, dropping expired entries of
+    other clusters on the way.
+
+    :param key: cluster key, see cluster_key()
+    :type key: str
+    :param url: framework web UI URL
+    :type url: str
+    """
+
+    now = time.time()
+    ttl = cache_ttl()
+    entries = dict((k, v) for k, v in _read_cache().items()
+                   if now - v.get('timestamp', 0) <= ttl)
+    entries[key] = {'webui_url': url, 'timestamp': now}
+    try:
+        _write_cache(entries)
+    except (IOError, OSError) as e:
+        logging.debug("Unable to write discovery cache: " + str(e))
+
+
+def invalidate(key):
+    """Removes the cache entry for `key`
+
+    :param key: cluster key, see cluster_key()
+    :type key: str
+    """
+
+    entries = _read_cache()
+    if entries.pop(key, None) is not None:
+        try:
+            _write_cache(entries)
+        except (IOError, OSError) as e:
+            logging.debug("Unable to write discovery cache: " + str(e))
+
+
+def masters_path():
+    return cache.path('masters.json')
+
+
+def load_preferred_master(key):
+    """Returns the master state URL that answered first for `key` last
+    time, or None
+
+    :param key: cluster key, see cluster_key()
+    :type key: str
+    :rtype: str | None
+    """
+
+    return cache.load(masters_path()).get(key)
+
+
+def store_preferred_master(key, url):
+    """Remembers `url` as the master state URL to ask first for `key`
+
+    :param key: cluster key, see cluster_key()
+    :type key: str
+    :param url: master state URL
+    :type url: str
+    """
+
+    entries = cache.load(masters_path())
+    entries[key] = url
+    try:
+        cache.save(masters_path(), entries)
+    except (IOError, OSError) as e:
+        logging.debug("Unable to write preferred master: " + str(e))
+
+
+def dns_name():
+    """Returns the Mesos-DNS name of the framework from DCOS_QUOBYTE_DNS_NAME,
+    by default quobyte.marathon.mesos, or None if set to an empty value or 0.
+
+    :rtype: str | None
+    """
+
+    name = os.environ.get(DNS_NAME_ENV, DEFAULT_DNS_NAME).strip()
+    if name in ('', '0'):
+        return None
+    return name
+
+
+def resolve_dns_url(name=None):
+    """Looks the framework up in Mesos-DNS and returns the URL of the first
+    reachable address, or None.  The SRV record of `name`, e.g.
+    _quobyte._tcp.marathon.mesos for quobyte.marathon.mesos, provides the
+    addresses and ports.  If `name` carries a port, as in
+    quobyte.marathon.mesos:7070, its A record is used with that port.
+
+    :param name: framework name in Mesos-DNS, defaults to dns_name()
+    :type name: str | None
+    :rtype: str | None
+    """
+
+    from dcos_quobyte import dns
+
+    name = name or dns_name()
+    if name is None:
+        return None
+    host, _, port = name.partition(':')
+    try:
+        if port:
+            addresses = [(address, int(port))
+                         for address in dns.resolve_a(host)]
+        else:
+            label, _, domain = host.partition('.')
+            addresses = dns.resolve_srv('_' + label + '._tcp.' + domain)
+    except (dns.DNSError, ValueError) as e:
+        logging.debug("DNS lookup of " + name + " failed: " + str(e))
+        return None
+    for address, address_port in addresses:
+        if ':' in address:
+            address = '[' + address + ']'
+        url = 'http://' + address + ':' + str(address_port)
+        if is_reachable(url):
+            return url
+    logging.debug("No reachable DNS record for " + name + ".")
+    return None
+
+
+def is_reachable(url, timeout=PROBE_TIMEOUT):
+    """Cheaply checks that something listens at `url` by opening a TCP
+    connection to it.  No request is sent, as requests against the
+    framework API have side effects.
+
+    :param url: URL to check
+    :type url: str
+    :param timeout: connect timeout in seconds
+    :type timeout: float
+    :rtype: bool
+    """
+
+    with trace.span('probe', url=url) as span:
+        try:
+            parsed = urlparse(url)
+            port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+            sock = socket.create_connection((parsed.hostname, port), timeout)
+        except (socket.error, ValueError, TypeError):
+            span.set('reachable', False)
+            return False
+        sock.close()
+        span.set('reachable', True)
+        return True
@@ -0,0 +1,258 @@
+"""Minimal DNS client for SRV and A lookups
+
+Mesos-DNS publishes Marathon apps as A records like quobyte.marathon.mesos
+and SRV records like _quobyte._tcp.marathon.mesos.  Looking these up takes a
+single small UDP exchange with the nameserver, so this module speaks just
+enough of RFC 1035 and RFC 2782 to send a query and decode the A and SRV
+records of the answer, without any dependency.
+
+The nameserver is taken from DCOS_QUOBYTE_DNS_SERVER (host or host:port) or
+else from the first nameserver line of /etc/resolv.conf.
+"""
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import collections
+import os
+import random
+import socket
+import struct
+
+from dcos_quobyte import trace
+
+SERVER_ENV = 'DCOS_QUOBYTE_DNS_SERVER'
+RESOLV_CONF = '/etc/resolv.conf'
+DEFAULT_PORT = 53
+DEFAULT_TIMEOUT = 0.5
+MAX_MESSAGE_SIZE = 4096
+
+TYPE_A = 1
+TYPE_SRV = 33
+CLASS_IN = 1
+
+RCODE_NXDOMAIN = 3
+_FLAG_RD = 0x0100
+_FLAG_QR = 0x8000
+
+_HEADER = struct.Struct(str('>HHHHHH'))
+_RECORD = struct.Struct(str('>HHIH'))
+_SRV = struct.Struct(str('>HHH'))
+
+Record = collections.namedtuple('Record', ['name', 'type', 'value'])
+"""Resource record of a response.  The value of an A record is the address
+as a string, the value of an SRV record an Srv."""
+
+Srv = collections.namedtuple('Srv', ['priority', 'weight', 'port', 'target'])
+
+
+class DNSError(Exception):
+    """Raised if the nameserver does not answer or answers with an error"""
+
+
+def nameserver(environ=None, resolv_conf=RESOLV_CONF):
+    """Returns the nameserver to query as (host, port)
+
+    :param environ: environment, defaults to os.environ
+    :type environ: dict | None
+    :param resolv_conf: path of resolv.conf
+    :type resolv_conf: str
+    :rtype: (str, int)
+    """
+
+    environ = os.environ if environ is None else environ
+    value = environ.get(SERVER_ENV)
+    if value:
+        host, _, port = value.rpartition(':')
+        if host and port.isdigit() and host.count(':') == 0:
+            return host, int(port)
+        return value.strip('[]'), DEFAULT_PORT
+    try:
+        with open(resolv_conf) as conf:
+            for line in conf:
+                fields = line.split()
+                if len(fields) > 1 and fields[0] == 'nameserver':
+                    return fields[1], DEFAULT_PORT
+    except IOError:
+        pass
+    return '127.0.0.1', DEFAULT_PORT
+
+
+def encode_name(name):
+    """Encodes a domain name as a sequence of labels
+
+    :rtype: bytes
+    """
+
+    encoded = b''
+    for label in name.rstrip('.').split('.'):
+        label = label.encode('idna') if label else b''
+        if not label or len(label) > 63:
+            raise ValueError("Invalid domain name " + name)
+        encoded += struct.pack(str('B'), len(label)) + label
+    return encoded + b'\0'
+
+
+def build_query(query_id, name, qtype):
+    """Returns a recursive query for the `qtype` records of `name`
+
+    :rtype: bytes
+    """
+
+    return (_HEADER.pack(query_id, _FLAG_RD, 1, 0, 0, 0) +
+            encode_name(name) + struct.pack(str('>HH'), qtype, CLASS_IN))
+
+
+def _read_name(message, offset):
+    """Decodes the possibly compressed name at `offset`
+
+    :returns: the name and the offset following it
+    :rtype: (str, int)
+    """
+
+    labels = []
+    end = None
+    jumps = 0
+    while True:
+        length = bytearray(message[offset:offset + 1])
+        if not length:
+            raise DNSError("Truncated name in DNS response")
+        length = length[0]
+        if length & 0xc0 == 0xc0:
+            if end is None:
+                end = offset + 2
+            jumps += 1
+            if jumps > 64:
+                raise DNSError("Compression loop in DNS response")
+            offset = struct.unpack(str('>H'),
+                                   message[offset:offset + 2])[0] & 0x3fff
+            continue
+        offset += 1
+        if length == 0:
+            break
+        labels.append(message[offset:offset + length].decode('ascii'))
+        offset += length
+    return '.'.join(labels), offset if end is None else end
+
+
+def parse_response(message, query_id):
+    """Decodes the answer and additional records of a response
+
+    :param message: response message
+    :type message: bytes
+    :param query_id: ID of the query the response has to match
+    :type query_id: int
+    :returns: A and SRV records; none if the name does not exist
+    :rtype: [Record]
+    :raises: DNSError
+    """
+
+    if len(message) < _HEADER.size:
+        raise DNSError("Truncated DNS response")
+    (response_id, flags, questions, answers, authorities,
+     additionals) = _HEADER.unpack(message[:_HEADER.size])
+    if response_id != query_id or not flags & _FLAG_QR:
+        raise DNSError("DNS response does not match the query")
+    rcode = flags & 0xf
+    if rcode == RCODE_NXDOMAIN:
+        return []
+    if rcode != 0:
+        raise DNSError("DNS query failed with rcode " + str(rcode))
+
+    offset = _HEADER.size
+    for _ in range(questions):
+        offset = _read_name(message, offset)[1] + 4
+    records = []
+    for section in range(answers + authorities + additionals):
+        name, offset = _read_name(message, offset)
+        rtype, rclass, _, length = _RECORD.unpack(
+            message[offset:offset + _RECORD.size])
+        offset += _RECORD.size
+        data = message[offset:offset + length]
+        if len(data) < length:
+            raise DNSError("Truncated DNS response")
+        wanted = (rclass == CLASS_IN and
+                  not answers <= section < answers + authorities)
+        if wanted and rtype == TYPE_A and length == 4:
+            records.append(Record(name, rtype, socket.inet_ntoa(data)))
+        elif wanted and rtype == TYPE_SRV:
+            priority, weight, port = _SRV.unpack(data[:_SRV.size])
+            target = _read_name(message, offset + _SRV.size)[0]
+            records.append(Record(name, rtype,
+                                  Srv(priority, weight, port, target)))
+        offset += length
+    return records
+
+
+def query(name, qtype, server=None, timeout=DEFAULT_TIMEOUT):
+    """Sends one query for the `qtype` records of `name` over UDP
+
+    :param name: domain name
+    :type name: str
+    :param qtype: TYPE_A or TYPE_SRV
+    :type qtype: int
+    :param server: nameserver as (host, port), defaults to nameserver()
+    :type server: (str, int) | None
+    :param timeout: seconds to wait for the answer
+    :type timeout: float
+    :returns: answer and additional records
+    :rtype: [Record]
+    :raises: DNSError
+    """
+
+    server = server or nameserver()
+    query_id = random.randint(0, 0xffff)
+    with trace.span('dns', domain=name, type=qtype) as span:
+        try:
+            family, _, _, _, address = socket.getaddrinfo(
+                server[0], server[1], 0, socket.SOCK_DGRAM)[0]
+            sock = socket.socket(family, socket.SOCK_DGRAM)
+        except socket.error as e:
+            raise DNSError("Unable to reach nameserver " + str(server[0]) +
+                           ": " + str(e))
+        try:
+            sock.settimeout(timeout)
+            sock.sendto(build_query(query_id, name, qtype), address)
+            while True:
+                message, sender = sock.recvfrom(MAX_MESSAGE_SIZE)
+                if message[:2] == struct.pack(str('>H'), query_id):
+                    break
+        except socket.timeout:
+            raise DNSError("No answer from nameserver " + str(server[0]))
+        except socket.error as e:
+            raise DNSError("DNS query to " + str(server[0]) + " failed: " +
+                           str(e))
+        finally:
+            sock.close()
+        records = parse_response(message, query_id)
+        span.set('records', len(records))
+        return records
+
+
+def resolve_srv(name, server=None, timeout=DEFAULT_TIMEOUT):
+    """Returns the targets of the SRV records of `name` as (host, port),
+    ordered by priority and weight.  Targets are replaced by their address
+    where the response carries it.
+
+    :rtype: [(str, int)]
+    :raises: DNSError
+    """
+
+    records = query(name, TYPE_SRV, server, timeout)
+    addresses = dict((record.name.lower(), record.value)
+                     for record in records if record.type == TYPE_A)
+    services = sorted((record.value for record in records
+                       if record.type == TYPE_SRV),
+                      key=lambda srv: (srv.priority, -srv.weight))
+    return [(addresses.get(srv.target.lower(), srv.target), srv.port)
+            for srv in services]
+
+
+def resolve_a(name, server=None, timeout=DEFAULT_TIMEOUT):
+    """Returns the addresses of the A records of `name`
+
+    :rtype: [str]
+    :raises: DNSError
+    """
+
+    return [record.value for record in query(name, TYPE_A, server, timeout)
+            if record.type == TYPE_A]
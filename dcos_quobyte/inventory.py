@@ -0,0 +1,214 @@
+"""Inventory of the Quobyte services running in the cluster
+
+The inventory lists every task of the Quobyte framework with the agent it
+runs on and the Quobyte service it provides, derived from the task name.
+Only the Quobyte tasks and the agent hostnames are kept from the streamed
+master state.  Tasks are stored as namedtuples whose repeated strings
+(states, agents, hostnames) are shared, and the indexes by agent and by
+role are built once, so large clusters stay cheap to list and group.
+"""
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import collections
+import csv
+
+from dcos_quobyte import discovery
+from dcos_quobyte import trace
+
+ROLES = ('registry', 'metadata', 'data', 'api')
+ROLE_OTHER = 'other'
+
+Service = collections.namedtuple('Service', ['task_id', 'name', 'role',
+                                             'state', 'agent_id',
+                                             'hostname'])
+"""A Quobyte task, placed on an agent"""
+
+
+def role_of(task_name):
+    """Returns the Quobyte service a task provides, judging by its name
+
+    :param task_name: Mesos task name
+    :type task_name: str | None
+    :returns: one of ROLES, or ROLE_OTHER
+    :rtype: str
+    """
+
+    name = (task_name or '').lower()
+    for role in ROLES:
+        if role in name:
+            return role
+    return ROLE_OTHER
+
+
+class Inventory(object):
+    """Quobyte services indexed by agent and by role
+
+    :param services: services to index
+    :type services: iterable of Service
+    """
+
+    def __init__(self, services):
+        self.services = tuple(services)
+        self._by_agent = {}
+        self._by_role = {}
+        for service in self.services:
+            self._by_agent.setdefault(service.agent_id, []).append(service)
+            self._by_role.setdefault(service.role, []).append(service)
+
+    def __len__(self):
+        return len(self.services)
+
+    def agents(self):
+        """Returns the IDs of the agents running Quobyte services
+
+        :rtype: [str]
+        """
+
+        return sorted(self._by_agent, key=lambda agent: agent or '')
+
+    def roles(self):
+        """Returns the roles present, in the order of ROLES
+
+        :rtype: [str]
+        """
+
+        order = ROLES + (ROLE_OTHER,)
+        return [role for role in order if role in self._by_role]
+
+    def on_agent(self, agent_id):
+        """Returns the services running on the agent `agent_id`
+
+        :rtype: [Service]
+        """
+
+        return list(self._by_agent.get(agent_id, []))
+
+    def with_role(self, role):
+        """Returns the services providing `role`
+
+        :rtype: [Service]
+        """
+
+        return list(self._by_role.get(role, []))
+
+    def role_counts(self, agent_id=None):
+        """Returns the number of services per role, on one agent or on all
+
+        :rtype: dict
+        """
+
+        if agent_id is None:
+            return dict((role, len(services))
+                        for role, services in self._by_role.items())
+        return dict(collections.Counter(
+            service.role for service in self._by_agent.get(agent_id, [])))
+
+
+def build(tasks, agents):
+    """Builds the inventory from master state tasks
+
+    :param tasks: Quobyte framework tasks
+    :type tasks: iterable of discovery.Task
+    :param agents: agents by agent ID
+    :type agents: dict
+    :rtype: Inventory
+    """
+
+    shared = {}
+
+    def share(value):
+        return shared.setdefault(value, value)
+
+    def hostname(agent_id):
+        agent = agents.get(agent_id)
+        return agent.hostname if agent is not None else None
+
+    return Inventory(Service(task.id, share(task.name), role_of(task.name),
+                             share(task.state), share(task.slave_id),
+                             share(hostname(task.slave_id)))
+                     for task in tasks)
+
+
+def fetch(framework_name, dcos_client=None):
+    """Fetches the inventory of the frameworks named `framework_name` with
+    a single pass over the master state
+
+    :param framework_name: framework name
+    :type framework_name: str
+    :param dcos_client: client to derive the master URL from
+    :type dcos_client: DCOSClient | None
+    :rtype: Inventory
+    """
+
+    with trace.span('inventory') as span:
+        agents = {}
+        tasks = discovery.fetch_framework_tasks(framework_name, dcos_client,
+                                                agents=agents)
+        result = build(tasks, agents)
+        span.set('tasks', len(result))
+        return result
+
+
+def to_json(inventory):
+    """Returns the inventory as a JSON serializable dict with the services
+    and their counts per role, overall and per agent
+
+    :rtype: dict
+    """
+
+    return {'services': [dict(zip(Service._fields, service))
+                         for service in inventory.services],
+            'roles': inventory.role_counts(),
+            'agents': dict((agent_id, {
+                'hostname': inventory.on_agent(agent_id)[0].hostname,
+                'roles': inventory.role_counts(agent_id)})
+                for agent_id in inventory.agents())}
+
+
+def write_csv(inventory, output):
+    """Writes one CSV row per service, preceded by a header row
+
+    :param output: text stream
+    :type output: file
+    """
+
+    writer = csv.writer(output, lineterminator='\n')
+    writer.writerow(Service._fields)
+    for service in inventory.services:
+        writer.writerow(['' if value is None else value
+                         for value in service])
+
+
+def format_table(inventory):
+    """Formats the inventory grouped by agent, followed by the number of
+    services per role
+
+    :rtype: str
+    """
+
+    if not inventory:
+        return "No Quobyte tasks running."
+    header = ('AGENT', 'ROLE', 'STATE', 'TASK')
+    rows = []
+    for agent_id in sorted(inventory.agents(), key=lambda agent: (
+            inventory.on_agent(agent)[0].hostname or agent or '')):
+        services = sorted(inventory.on_agent(agent_id),
+                          key=lambda service: (service.role,
+                                               service.task_id or ''))
+        for service in services:
+            rows.append((service.hostname or service.agent_id or '',
+                         service.role, service.state or '',
+                         service.task_id or ''))
+    widths = [max(len(row[i]) for row in rows + [header])
+              for i in range(len(header))]
+    lines = ['  '.join(value.ljust(width) for value, width
+                       in zip(row, widths)).rstrip()
+             for row in [header] + rows]
+    counts = inventory.role_counts()
+    lines.append('')
+    lines.append(str(len(inventory)) + " tasks on " +
+                 str(len(inventory.agents())) + " agents: " +
+                 ", ".join(role + " " + str(counts[role])
+                           for role in inventory.roles()))
+    return '\n'.join(lines)
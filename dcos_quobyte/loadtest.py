@@ -0,0 +1,294 @@
+"""Load tests of the framework API
+
+Workers, each with its own keep-alive connection, send requests to one
+framework endpoint for a fixed duration or number of requests.  In the
+closed-loop model every worker sends its next request as soon as the
+previous one returned, so the request rate follows the latency.  In the
+open-loop model requests are scheduled at a fixed rate regardless of the
+responses, and their latency is measured from the scheduled send time, so
+that a stalling framework shows up as latency instead of silently lowering
+the load.
+
+Latencies of successful requests are recorded in log-linear histograms
+with a fixed number of buckets, like HdrHistogram: values are kept with a
+relative error below 1/2**(PRECISION_BITS - 1) and memory does not grow
+with the number of requests.  Failed requests are counted by status code
+or error type.
+"""
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import collections
+import itertools
+import threading
+import time
+
+from dcos_quobyte import polling
+from dcos_quobyte import trace
+
+timer = getattr(time, 'perf_counter', time.time)
+
+PRECISION_BITS = 8
+MAX_LATENCY_US = 3600 * 1000 * 1000
+DEFAULT_CONCURRENCY = 10
+DEFAULT_DURATION = 10.0
+PERCENTILES = (50, 90, 99, 99.9)
+
+Result = collections.namedtuple('Result', ['histogram', 'errors', 'elapsed',
+                                           'concurrency', 'rate'])
+"""Outcome of a load test: latency histogram of the successful requests in
+microseconds, error counts by status code or error type, and the seconds
+the test ran"""
+
+
+class Histogram(object):
+    """Log-linear histogram of non-negative integers up to `highest`
+
+    :param highest: largest value recorded exactly, larger ones count as
+                    `highest`
+    :type highest: int
+    :param precision_bits: values share a bucket with at most
+                           2**(precision_bits - 1) others of their power of
+                           two
+    :type precision_bits: int
+    """
+
+    def __init__(self, highest=MAX_LATENCY_US, precision_bits=PRECISION_BITS):
+        self.highest = highest
+        self._bits = precision_bits
+        self._half = 1 << (precision_bits - 1)
+        self.counts = [0] * (self._index(highest) + 1)
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def _index(self, value):
+        bucket = max(0, value.bit_length() - self._bits)
+        return (bucket << (self._bits - 1)) + (value >> bucket)
+
+    def _highest_equivalent(self, index):
+        if index < 2 * self._half:
+            return index
+        bucket = index // self._half - 1
+        return ((index - bucket * self._half + 1) << bucket) - 1
+
+    def record(self, value):
+        """Counts one occurrence of `value`
+
+        :type value: int
+        """
+
+        value = min(max(0, int(value)), self.highest)
+        self.counts[self._index(value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        """Adds the counts of a histogram with the same bounds
+
+        :type other: Histogram
+        """
+
+        if len(other.counts) != len(self.counts):
+            raise ValueError("Histograms of different bounds")
+        for index, count in enumerate(other.counts):
+            if count:
+                self.counts[index] += count
+        self.count += other.count
+        self.total += other.total
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min,
+                                                              value)
+                self.max = value if self.max is None else max(self.max,
+                                                              value)
+
+    def mean(self):
+        return float(self.total) / self.count if self.count else None
+
+    def percentile(self, pct):
+        """Returns the smallest recorded value, up to the bucket precision,
+        that `pct` percent of the values do not exceed
+
+        :param pct: percentile between 0 and 100
+        :type pct: float
+        :rtype: int | None
+        """
+
+        if not self.count:
+            return None
+        rank = max(1, int(-(-self.count * pct // 100)))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self._highest_equivalent(index), self.max)
+        return self.max
+
+
+def client_sender(url, data=None):
+    """Returns a function creating one sender per worker.  Each sender owns
+    a framework API client without retries and returns the status code of
+    one request.
+
+    :param url: endpoint URL
+    :type url: str
+    :param data: request body
+    :type data: str | None
+    :rtype: function
+    """
+
+    from dcos_quobyte import api
+
+    def make_sender():
+        client = api.FrameworkClient.from_environ()
+        client.retries = 0
+
+        def send():
+            return client.get(url, data=data).status_code
+
+        return send
+
+    return make_sender
+
+
+def _work(send, schedule, deadline, histogram, errors):
+    for scheduled in schedule:
+        now = timer()
+        if scheduled is None:
+            if now >= deadline:
+                return
+            scheduled = now
+        elif scheduled > deadline:
+            return
+        elif scheduled > now:
+            time.sleep(scheduled - now)
+        try:
+            status = send()
+        except Exception as e:
+            status = type(e).__name__
+        if status == 200:
+            histogram.record((timer() - scheduled) * 1000000)
+        else:
+            errors[str(status)] += 1
+
+
+def run(make_sender, concurrency=DEFAULT_CONCURRENCY, rate=None,
+        duration=DEFAULT_DURATION, requests=None):
+    """Runs a load test with `concurrency` workers
+
+    :param make_sender: function returning a function that sends one
+                        request and returns its status code, called once
+                        per worker
+    :type make_sender: function
+    :param concurrency: number of workers, the open-loop model keeps at
+                        most this many requests in flight
+    :type concurrency: int
+    :param rate: requests per second of the open-loop model, None for the
+                 closed-loop model
+    :type rate: float | None
+    :param duration: seconds to send requests for
+    :type duration: float
+    :param requests: number of requests to send at most, unlimited if None
+    :type requests: int | None
+    :rtype: Result
+    """
+
+    lock = threading.Lock()
+    counter = itertools.count() if requests is None else iter(
+        range(requests))
+    start = timer()
+
+    def schedule():
+        while True:
+            with lock:
+                index = next(counter, None)
+            if index is None:
+                return
+            yield None if not rate else start + index / float(rate)
+
+    histograms = [Histogram() for _ in range(concurrency)]
+    errors = [collections.Counter() for _ in range(concurrency)]
+    senders = [make_sender() for _ in range(concurrency)]
+    with trace.span('loadtest', concurrency=concurrency, rate=rate) as span:
+        threads = [threading.Thread(target=_work, args=(
+            senders[i], schedule(), start + duration, histograms[i],
+            errors[i])) for i in range(concurrency)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            polling.join(thread)
+        elapsed = timer() - start
+        histogram = histograms[0]
+        for other in histograms[1:]:
+            histogram.merge(other)
+        total_errors = collections.Counter()
+        for counts in errors:
+            total_errors.update(counts)
+        span.set('requests', histogram.count + sum(total_errors.values()))
+    return Result(histogram, dict(total_errors), elapsed, concurrency, rate)
+
+
+def summary(result):
+    """Returns request counts, throughput and latency percentiles in
+    milliseconds as a JSON serializable dict
+
+    :type result: Result
+    :rtype: dict
+    """
+
+    histogram = result.histogram
+    failed = sum(result.errors.values())
+    sent = histogram.count + failed
+
+    def ms(value):
+        return None if value is None else round(value / 1000.0, 3)
+
+    return {'model': 'open' if result.rate else 'closed',
+            'concurrency': result.concurrency,
+            'target_rate': result.rate,
+            'elapsed': round(result.elapsed, 3),
+            'requests': sent,
+            'succeeded': histogram.count,
+            'errors': result.errors,
+            'error_rate': round(float(failed) / sent, 4) if sent else 0.0,
+            'throughput': round(histogram.count / result.elapsed, 2)
+            if result.elapsed > 0 else 0.0,
+            'latency_ms': dict(
+                [('min', ms(histogram.min)), ('mean', ms(histogram.mean())),
+                 ('max', ms(histogram.max))] +
+                [('p' + str(pct), ms(histogram.percentile(pct)))
+                 for pct in PERCENTILES])}
+
+
+def format_summary(result):
+    """Formats the summary of a load test as text
+
+    :type result: Result
+    :rtype: str
+    """
+
+    report = summary(result)
+    latency = report['latency_ms']
+    lines = [
+        "{0} loop, {1} workers{2}, {3:.1f}s".format(
+            report['model'], report['concurrency'],
+            ", " + str(report['target_rate']) + " req/s target"
+            if report['target_rate'] else "", report['elapsed']),
+        "requests {0}  succeeded {1}  errors {2} ({3:.2%})".format(
+            report['requests'], report['succeeded'],
+            report['requests'] - report['succeeded'],
+            report['error_rate']),
+        "throughput {0:.2f} req/s".format(report['throughput'])]
+    if report['succeeded']:
+        lines.append("latency ms  " + "  ".join(
+            name + " " + "{0:.2f}".format(latency[name])
+            for name in ['min', 'mean'] +
+            ['p' + str(pct) for pct in PERCENTILES] + ['max']))
+    for error, count in sorted(report['errors'].items()):
+        lines.append("error " + error + ": " + str(count))
+    return '\n'.join(lines)
@@ -0,0 +1,269 @@
+"""Log tailing of the Quobyte tasks
+
+The stdout and stderr files in the sandboxes of the Quobyte tasks are read
+through the files/read.json API of the Mesos agents.  Every file keeps its
+own offset, so each poll only transfers what was appended since the previous
+one, in reads of at most READ_LENGTH bytes.  Files are polled concurrently,
+one thread each, and their complete lines are multiplexed onto one output
+through a bounded queue, which throttles the readers when the output cannot
+keep up.
+"""
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import collections
+import logging
+import sys
+import threading
+
+from dcos_quobyte import discovery
+from dcos_quobyte import polling
+from dcos_quobyte import trace
+from six.moves import queue
+
+STREAMS = ('stdout', 'stderr')
+DEFAULT_TAIL = 4096
+READ_LENGTH = 64 * 1024
+MAX_LINE = 64 * 1024
+QUEUE_SIZE = 1024
+MIN_INTERVAL = 0.5
+MAX_INTERVAL = 5.0
+READ_TIMEOUT = (3.05, 30)
+MAX_PARALLEL_AGENTS = 10
+
+LogFile = collections.namedtuple('LogFile', ['task_id', 'name', 'agent',
+                                             'path'])
+"""A log file in the sandbox of a task"""
+
+
+def find_logs(framework_name, dcos_client, streams=STREAMS):
+    """Returns the log files of the tasks of the frameworks named
+    `framework_name`.  The sandbox directories are looked up in the states
+    of the agents running the tasks, which are fetched concurrently.
+
+    :param framework_name: framework name
+    :type framework_name: str
+    :param dcos_client: client to derive master and agent URLs from
+    :type dcos_client: DCOSClient
+    :param streams: file names to read in each sandbox
+    :type streams: tuple of str
+    :rtype: [LogFile]
+    """
+
+    import concurrent.futures
+
+    agents = {}
+    tasks = discovery.fetch_framework_tasks(framework_name, dcos_client,
+                                            agents=agents)
+    tasks_by_agent = {}
+    for task in tasks:
+        tasks_by_agent.setdefault(task.slave_id, []).append(task)
+
+    def directories(agent_id):
+        framework_ids = set(task.framework_id
+                            for task in tasks_by_agent[agent_id])
+        with discovery.agent_state_chunks(dcos_client,
+                                          agents[agent_id]) as chunks:
+            return dict(discovery.iter_task_directories(chunks,
+                                                        framework_ids))
+
+    known = [agent_id for agent_id in tasks_by_agent if agent_id in agents]
+    if not known:
+        return []
+    logs = []
+    with concurrent.futures.ThreadPoolExecutor(
+            min(len(known), MAX_PARALLEL_AGENTS)) as pool:
+        futures = dict((pool.submit(directories, agent_id), agent_id)
+                       for agent_id in known)
+        for future in concurrent.futures.as_completed(futures):
+            agent_id = futures[future]
+            try:
+                sandboxes = future.result()
+            except Exception as e:
+                logging.warning("Unable to read the state of agent " +
+                                agent_id + ": " + str(e))
+                continue
+            for task in tasks_by_agent[agent_id]:
+                if task.id not in sandboxes:
+                    logging.debug("No sandbox for task " + task.id)
+                    continue
+                for stream in streams:
+                    logs.append(LogFile(
+                        task.id, stream, agents[agent_id],
+                        sandboxes[task.id].rstrip('/') + '/' + stream))
+    return sorted(logs, key=lambda log: (log.task_id, log.name))
+
+
+class FileReader(object):
+    """Reads ranges of agent files over pooled connections, falling back to
+    the authenticating dcos client once an agent answers with 401.
+
+    :param dcos_client: client to derive agent URLs from
+    :type dcos_client: DCOSClient
+    """
+
+    def __init__(self, dcos_client):
+        import requests
+
+        self._dcos_client = dcos_client
+        self._session = requests.Session()
+        self._authenticate = False
+
+    def read(self, log, offset, length):
+        """Reads `length` bytes at `offset` of `log`.  An offset of -1
+        returns no data but the size of the file as offset.
+
+        :type log: LogFile
+        :rtype: dict with data and offset
+        """
+
+        import requests
+
+        private_url = discovery.agent_url(log.agent)
+        params = {'path': log.path, 'offset': offset, 'length': length}
+        if not self._authenticate:
+            url = self._dcos_client.slave_url(log.agent.id, private_url,
+                                              'files/read.json')
+            response = self._session.get(url, params=params,
+                                         timeout=READ_TIMEOUT)
+            if response.status_code != requests.codes.unauthorized:
+                response.raise_for_status()
+                return response.json()
+            self._authenticate = True
+        return self._dcos_client.slave_file_read(log.agent.id, private_url,
+                                                 log.path, offset, length)
+
+
+class Tail(object):
+    """Incremental reader of one log file
+
+    :param log: the file
+    :type log: LogFile
+    :param read: function reading a range of the file, see FileReader
+    :type read: function
+    :param tail: bytes of existing content to start with
+    :type tail: int
+    """
+
+    def __init__(self, log, read, tail=DEFAULT_TAIL):
+        self.log = log
+        self.offset = None
+        self._read = read
+        self._tail = tail
+        self._partial = ''
+        self._skip_partial = False
+
+    def poll(self):
+        """Yields the lines appended since the previous poll.  An unfinished
+        last line is kept for the next poll unless it exceeds MAX_LINE.
+
+        :rtype: iterator of str
+        """
+
+        if self.offset is None:
+            size = self._read(self.log, -1, -1)['offset']
+            self.offset = max(0, size - self._tail)
+            # the first line of a tail is likely cut off, but a tail of
+            # nothing starts at the end of the last line
+            self._skip_partial = self._tail > 0 and self.offset > 0
+        while True:
+            data = self._read(self.log, self.offset, READ_LENGTH)['data']
+            if not data:
+                return
+            # offsets count bytes, not the characters they decode to
+            length = len(data.encode('utf-8'))
+            self.offset += length
+            lines = (self._partial + data).split('\n')
+            self._partial = lines.pop()
+            if self._skip_partial and lines:
+                lines.pop(0)
+                self._skip_partial = False
+            for line in lines:
+                yield line
+            if len(self._partial) > MAX_LINE:
+                yield self._partial
+                self._partial = ''
+            if length < READ_LENGTH:
+                return
+
+    def rest(self):
+        """Returns the unfinished last line and forgets it
+
+        :rtype: str
+        """
+
+        partial, self._partial = self._partial, ''
+        return partial
+
+
+def _follow(tail, lines, stop, follow, failures):
+    interval = MIN_INTERVAL
+    try:
+        while not stop.is_set():
+            received = False
+            for line in tail.poll():
+                lines.put((tail.log, line))
+                received = True
+            if not follow:
+                partial = tail.rest()
+                if partial:
+                    lines.put((tail.log, partial))
+                break
+            interval = (MIN_INTERVAL if received else
+                        min(interval * 2, MAX_INTERVAL))
+            stop.wait(interval)
+    except Exception as e:
+        logging.warning("Unable to read " + tail.log.name + " of task " +
+                        tail.log.task_id + ": " + str(e))
+        failures.append(tail.log)
+    finally:
+        lines.put((tail.log, None))
+
+
+def stream(logs, read, output=None, follow=False, tail=DEFAULT_TAIL):
+    """Prints the last `tail` bytes of every log file, prefixed by task and
+    file name, and with `follow` keeps printing new lines until
+    interrupted.
+
+    :param logs: files to read
+    :type logs: [LogFile]
+    :param read: function reading a range of a file, see FileReader
+    :type read: function
+    :param output: text stream, defaults to stdout
+    :type output: file | None
+    :param follow: keep polling for new lines
+    :type follow: bool
+    :param tail: bytes of existing content to print per file
+    :type tail: int
+    :returns: exit code, 1 if a file could not be read
+    :rtype: int
+    """
+
+    output = output or sys.stdout
+    lines = queue.Queue(QUEUE_SIZE)
+    stop = threading.Event()
+    failures = []
+    for log in logs:
+        thread = threading.Thread(target=_follow, args=(
+            Tail(log, read, tail), lines, stop, follow, failures))
+        thread.daemon = True
+        thread.start()
+
+    active = len(logs)
+    with trace.span('logs', files=len(logs), follow=follow) as span:
+        try:
+            while active:
+                log, line = polling.get(lines)
+                if line is None:
+                    active -= 1
+                    continue
+                span.add('lines')
+                output.write(log.task_id + ' ' + log.name + ' | ' + line +
+                             '\n')
+                if lines.empty():
+                    output.flush()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stop.set()
+    return 1 if failures else 0
@@ -0,0 +1,429 @@
+"""Resource metrics of the Quobyte tasks
+
+Every sample reads the cumulative resource counters of the Quobyte tasks
+from monitor/statistics.json of each agent running them, all agents
+concurrently, together with the state of the framework API.  The counters
+are reported per executor; executors are mapped to their tasks through the
+agent state, which is read again only when an unknown executor shows up.
+Rates are the differences between two consecutive samples divided by the
+time between them, and the last DEFAULT_HISTORY of them are kept per task in
+a ring buffer.  Results print as a table ordered by disk throughput, as JSON
+or in the Prometheus text format.
+"""
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import collections
+import logging
+import time
+
+from dcos_quobyte import discovery
+from dcos_quobyte import inventory
+from dcos_quobyte import trace
+
+STATISTICS_PATH = 'monitor/statistics.json'
+DEFAULT_HISTORY = 60
+DEFAULT_INTERVAL = 2.0
+READ_TIMEOUT = (3.05, 30)
+MAX_PARALLEL_AGENTS = 10
+
+Usage = collections.namedtuple('Usage', [
+    'timestamp', 'cpu_seconds', 'mem_rss_bytes', 'disk_used_bytes',
+    'disk_read_bytes', 'disk_write_bytes', 'net_rx_bytes', 'net_tx_bytes'])
+"""Cumulative resource counters of a task at one point in time"""
+
+Rates = collections.namedtuple('Rates', [
+    'timestamp', 'cpus', 'mem_rss_bytes', 'disk_used_bytes',
+    'disk_read_rate', 'disk_write_rate', 'net_rx_rate', 'net_tx_rate'])
+"""Resource use of a task between two samples, rates per second"""
+
+FrameworkSample = collections.namedtuple('FrameworkSample', [
+    'timestamp', 'up', 'healthy', 'latency'])
+"""Availability of the framework API at one point in time"""
+
+# name, help, Rates field
+_TASK_METRICS = [
+    ('quobyte_task_cpus', "CPU cores used", 'cpus'),
+    ('quobyte_task_memory_rss_bytes', "Resident memory", 'mem_rss_bytes'),
+    ('quobyte_task_disk_used_bytes', "Sandbox disk usage",
+     'disk_used_bytes'),
+    ('quobyte_task_disk_read_bytes_per_second', "Disk read throughput",
+     'disk_read_rate'),
+    ('quobyte_task_disk_write_bytes_per_second', "Disk write throughput",
+     'disk_write_rate'),
+    ('quobyte_task_network_receive_bytes_per_second', "Network receive "
+     "throughput", 'net_rx_rate'),
+    ('quobyte_task_network_transmit_bytes_per_second', "Network transmit "
+     "throughput", 'net_tx_rate')]
+
+
+def _io_bytes(statistics, operation):
+    """Sums the bytes of `operation` (Read or Write) over the block devices
+    of the blkio statistics, preferring the device-less total entry.
+    """
+
+    throttling = (statistics.get('blkio_statistics') or {}).get(
+        'throttling') or []
+    totals = [entry for entry in throttling if 'device' not in entry]
+    return sum(value.get('value', 0)
+               for entry in (totals or throttling)
+               for value in entry.get('io_service_bytes', [])
+               if value.get('op') == operation)
+
+
+def usage(statistics):
+    """Extracts the counters of a statistics entry of monitor/statistics.json
+
+    :param statistics: the entry's statistics object
+    :type statistics: dict
+    :rtype: Usage
+    """
+
+    return Usage(statistics.get('timestamp', time.time()),
+                 statistics.get('cpus_user_time_secs', 0.0) +
+                 statistics.get('cpus_system_time_secs', 0.0),
+                 statistics.get('mem_rss_bytes', 0),
+                 statistics.get('disk_used_bytes', 0),
+                 _io_bytes(statistics, 'Read'),
+                 _io_bytes(statistics, 'Write'),
+                 statistics.get('net_rx_bytes', 0),
+                 statistics.get('net_tx_bytes', 0))
+
+
+def rates(previous, current):
+    """Computes the resource use between two samples of a task
+
+    :type previous: Usage
+    :type current: Usage
+    :returns: the rates, or None if no time passed or counters were reset,
+              e.g. because the task restarted
+    :rtype: Rates | None
+    """
+
+    elapsed = current.timestamp - previous.timestamp
+    if elapsed <= 0:
+        return None
+    deltas = [current[i] - previous[i] for i in (1, 4, 5, 6, 7)]
+    if any(delta < 0 for delta in deltas):
+        return None
+    cpu, read, write, rx, tx = [delta / elapsed for delta in deltas]
+    return Rates(current.timestamp, cpu, current.mem_rss_bytes,
+                 current.disk_used_bytes, read, write, rx, tx)
+
+
+class StatisticsFetcher(object):
+    """Fetches monitor/statistics.json of agents over pooled connections,
+    falling back to the authenticating dcos http module once an agent
+    answers with 401.
+
+    :param dcos_client: client to derive agent URLs from
+    :type dcos_client: DCOSClient
+    """
+
+    def __init__(self, dcos_client):
+        import requests
+
+        self._dcos_client = dcos_client
+        self._session = requests.Session()
+        self._authenticate = False
+
+    def __call__(self, agent):
+        import requests
+
+        url = self._dcos_client.slave_url(agent.id, discovery.agent_url(agent),
+                                          STATISTICS_PATH)
+        if not self._authenticate:
+            response = self._session.get(url, timeout=READ_TIMEOUT)
+            if response.status_code != requests.codes.unauthorized:
+                response.raise_for_status()
+                return response.json()
+            self._authenticate = True
+        from dcos import http
+
+        return http.get(url, timeout=READ_TIMEOUT[1]).json()
+
+
+class ExecutorFetcher(object):
+    """Reads which tasks of the frameworks `framework_ids` each executor of
+    an agent runs, from the agent state
+
+    :param dcos_client: client to derive agent URLs from
+    :type dcos_client: DCOSClient
+    :param framework_ids: IDs of the Quobyte frameworks
+    :type framework_ids: set of str
+    """
+
+    def __init__(self, dcos_client, framework_ids):
+        self._dcos_client = dcos_client
+        self._framework_ids = framework_ids
+
+    def __call__(self, agent):
+        executors = {}
+        with discovery.agent_state_chunks(self._dcos_client,
+                                          agent) as chunks:
+            for executor_id, task_id in discovery.iter_executor_tasks(
+                    chunks, self._framework_ids):
+                executors.setdefault(executor_id, []).append(task_id)
+        return executors
+
+
+class Collector(object):
+    """Samples the Quobyte tasks and keeps their rates in ring buffers
+
+    :param services: inventory of the Quobyte tasks to sample
+    :type services: inventory.Inventory
+    :param agents: agents by agent ID
+    :type agents: dict
+    :param fetch_statistics: function returning the statistics entries of
+                             an agent, see StatisticsFetcher
+    :type fetch_statistics: function
+    :param fetch_state: function returning the framework state, or None
+    :type fetch_state: function | None
+    :param history: number of samples kept per task
+    :type history: int
+    :param fetch_executors: function returning the task IDs by executor ID
+                            of an agent, see ExecutorFetcher, or None if
+                            executor IDs are task IDs
+    :type fetch_executors: function | None
+    """
+
+    def __init__(self, services, agents, fetch_statistics, fetch_state=None,
+                 history=DEFAULT_HISTORY, fetch_executors=None):
+        self.services = dict((service.task_id, service)
+                             for service in services.services)
+        self._agents = [agents[agent_id] for agent_id in services.agents()
+                        if agent_id in agents]
+        self._fetch_statistics = fetch_statistics
+        self._fetch_state = fetch_state
+        self._fetch_executors = fetch_executors
+        self._executors = {}
+        self._history = history
+        self._usage = {}
+        self.samples = 0
+        self.rates = {}
+        self.framework = collections.deque(maxlen=history)
+
+    def _sample_framework(self):
+        start = time.time()
+        try:
+            state = self._fetch_state()
+        except Exception as e:
+            logging.debug("Framework state unavailable: " + str(e))
+            return FrameworkSample(start, False, None, None)
+        return FrameworkSample(start, True,
+                               (state or {}).get('healthy'),
+                               time.time() - start)
+
+    def sample(self):
+        """Takes one sample of all agents and the framework concurrently
+        and updates the rates
+
+        :returns: number of agents that could not be sampled
+        :rtype: int
+        """
+
+        import concurrent.futures
+
+        failed = 0
+        workers = min(max(len(self._agents), 1), MAX_PARALLEL_AGENTS) + 1
+        with trace.span('metrics_sample', agents=len(self._agents)):
+            with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+                framework = None
+                if self._fetch_state is not None:
+                    framework = pool.submit(self._sample_framework)
+                futures = dict((pool.submit(self._sample_agent, agent),
+                                agent) for agent in self._agents)
+                for future in concurrent.futures.as_completed(futures):
+                    try:
+                        entries = future.result()
+                    except Exception as e:
+                        logging.warning("Unable to sample agent " +
+                                        str(futures[future].hostname) +
+                                        ": " + str(e))
+                        failed += 1
+                        continue
+                    self._update(entries)
+                if framework is not None:
+                    self.framework.append(framework.result())
+        self.samples += 1
+        return failed
+
+    def _sample_agent(self, agent):
+        """Returns the statistics entries of `agent` as (task ID, entry)"""
+
+        entries = self._fetch_statistics(agent)
+        if self._fetch_executors is None:
+            return [(entry.get('executor_id'), entry) for entry in entries]
+        executors = self._executors.get(agent.id, {})
+        if any(entry.get('executor_id') not in executors
+               for entry in entries):
+            executors = self._fetch_executors(agent)
+            # executors without Quobyte tasks are not looked up again
+            for entry in entries:
+                executors.setdefault(entry.get('executor_id'), [])
+            self._executors[agent.id] = executors
+        return [(task_id, entry) for entry in entries
+                for task_id in executors[entry.get('executor_id')]]
+
+    def _update(self, entries):
+        for task_id, entry in entries:
+            if task_id not in self.services:
+                continue
+            current = usage(entry.get('statistics') or {})
+            previous = self._usage.get(task_id)
+            self._usage[task_id] = current
+            if previous is None:
+                continue
+            task_rates = rates(previous, current)
+            if task_rates is not None:
+                self.rates.setdefault(task_id, collections.deque(
+                    maxlen=self._history)).append(task_rates)
+
+    def latest(self):
+        """Returns the latest rates of every task sampled twice
+
+        :rtype: dict of task ID to Rates
+        """
+
+        return dict((task_id, history[-1])
+                    for task_id, history in self.rates.items() if history)
+
+
+def run(collector, samples=1, interval=DEFAULT_INTERVAL, report=None):
+    """Samples on a fixed interval: once for the baseline, then `samples`
+    times, calling `report` after each of those.  Ticks are aligned to the
+    start, so slow samples do not make the interval drift.
+
+    :param collector: the collector
+    :type collector: Collector
+    :param samples: number of samples after the baseline, unlimited if None
+    :type samples: int | None
+    :param interval: seconds between two samples
+    :type interval: float
+    :param report: function called with the collector after each sample
+    :type report: function | None
+    """
+
+    start = time.time()
+    collector.sample()
+    tick = 0
+    while samples is None or tick < samples:
+        tick += 1
+        time.sleep(max(0.0, start + tick * interval - time.time()))
+        collector.sample()
+        if report is not None:
+            report(collector)
+
+
+def _hosts(collector):
+    return dict((task_id, service.hostname or service.agent_id or '')
+                for task_id, service in collector.services.items())
+
+
+def to_json(collector):
+    """Returns the ring buffers of the collector as a JSON serializable
+    dict
+
+    :rtype: dict
+    """
+
+    hosts = _hosts(collector)
+    tasks = dict((task_id, {'agent': hosts[task_id],
+                            'role': collector.services[task_id].role,
+                            'samples': [dict(zip(Rates._fields, sample))
+                                        for sample in history]})
+                 for task_id, history in collector.rates.items())
+    return {'framework': [dict(zip(FrameworkSample._fields, sample))
+                          for sample in collector.framework],
+            'tasks': tasks}
+
+
+def _escape(value):
+    return (value.replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def format_prometheus(collector):
+    """Formats the latest rates in the Prometheus text exposition format
+
+    :rtype: str
+    """
+
+    hosts = _hosts(collector)
+    latest = sorted(collector.latest().items())
+    lines = []
+    if collector.framework:
+        sample = collector.framework[-1]
+        lines.extend([
+            "# HELP quobyte_framework_up Whether the framework API answered",
+            "# TYPE quobyte_framework_up gauge",
+            "quobyte_framework_up " + str(int(sample.up))])
+        if sample.latency is not None:
+            lines.extend([
+                "# HELP quobyte_framework_api_latency_seconds Duration of "
+                "the framework state request",
+                "# TYPE quobyte_framework_api_latency_seconds gauge",
+                "quobyte_framework_api_latency_seconds " +
+                repr(sample.latency)])
+    for name, description, field in _TASK_METRICS:
+        lines.append("# HELP " + name + " " + description)
+        lines.append("# TYPE " + name + " gauge")
+        for task_id, task_rates in latest:
+            labels = ('task="' + _escape(task_id) + '",agent="' +
+                      _escape(hosts[task_id]) + '",role="' +
+                      collector.services[task_id].role + '"')
+            lines.append(name + "{" + labels + "} " +
+                         repr(float(getattr(task_rates, field))))
+    return '\n'.join(lines) + '\n'
+
+
+def _size(value):
+    for unit in ('B', 'K', 'M', 'G'):
+        if abs(value) < 1024:
+            return ('%.0f' if unit == 'B' else '%.1f') % value + unit
+        value /= 1024.0
+    return '%.1fT' % value
+
+
+def format_table(collector):
+    """Formats the latest rates with the busiest disks first
+
+    :rtype: str
+    """
+
+    hosts = _hosts(collector)
+    latest = sorted(collector.latest().items(), key=lambda item: (
+        -(item[1].disk_read_rate + item[1].disk_write_rate), item[0]))
+    if not latest:
+        return "No Quobyte task metrics sampled yet."
+    header = ('TASK', 'AGENT', 'ROLE', 'CPUS', 'MEM', 'DISK', 'READ/S',
+              'WRITE/S', 'RX/S', 'TX/S')
+    rows = [(task_id, hosts[task_id], collector.services[task_id].role,
+             '%.2f' % task_rates.cpus, _size(task_rates.mem_rss_bytes),
+             _size(task_rates.disk_used_bytes),
+             _size(task_rates.disk_read_rate),
+             _size(task_rates.disk_write_rate),
+             _size(task_rates.net_rx_rate), _size(task_rates.net_tx_rate))
+            for task_id, task_rates in latest]
+    widths = [max(len(row[i]) for row in rows + [header])
+              for i in range(len(header))]
+    return '\n'.join('  '.join(value.ljust(width) for value, width
+                               in zip(row, widths)).rstrip()
+                     for row in [header] + rows)
+
+
+def collector_for(framework_name, dcos_client, fetch_state=None,
+                  history=DEFAULT_HISTORY):
+    """Builds a collector for the tasks of the frameworks named
+    `framework_name`, looked up once in the master state
+
+    :rtype: Collector
+    """
+
+    agents = {}
+    tasks = discovery.fetch_framework_tasks(framework_name, dcos_client,
+                                            agents=agents)
+    framework_ids = set(task.framework_id for task in tasks)
+    return Collector(inventory.build(tasks, agents), agents,
+                     StatisticsFetcher(dcos_client), fetch_state, history,
+                     ExecutorFetcher(dcos_client, framework_ids))
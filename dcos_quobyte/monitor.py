@@ -0,0 +1,291 @@
+"""Status snapshots of a Quobyte deployment
+
+A snapshot combines the state reported by the framework with the Quobyte
+tasks known to the Mesos master.  Snapshots can be cached for a few seconds,
+and watching compares consecutive snapshots so that only changes are printed.
+While watching, the framework state is polled with conditional requests and
+the tasks are only read again once their counts in the master's small
+state-summary change.
+"""
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import json
+import logging
+import os
+import time
+
+import concurrent.futures
+import requests
+from dcos_quobyte import cache
+
+STATUS_TTL_ENV = 'DCOS_QUOBYTE_STATUS_TTL'
+DEFAULT_STATUS_TTL = 5.0
+DEFAULT_INTERVAL = 2.0
+MAX_INTERVAL_FACTOR = 8
+
+
+class StateFetcher(object):
+    """Fetches the framework state with conditional requests, so that an
+    unchanged state costs a 304 response instead of a full document.
+
+    :param client: framework API client
+    :type client: api.FrameworkClient
+    :param url: URL of the framework state
+    :type url: str
+    """
+
+    def __init__(self, client, url):
+        self._client = client
+        self._url = url
+        self._etag = None
+        self._state = None
+
+    def __call__(self):
+        headers = {}
+        if self._etag is not None:
+            headers['If-None-Match'] = self._etag
+        r = self._client.get(self._url, headers=headers)
+        if r.status_code == requests.codes.not_modified:
+            return self._state
+        if r.status_code == requests.codes.not_found:
+            logging.debug("Framework does not report its state.")
+            return None
+        r.raise_for_status()
+        self._etag = r.headers.get('ETag')
+        self._state = r.json()
+        return self._state
+
+
+class TaskFetcher(object):
+    """Fetches the tasks of a framework only when the number of tasks per
+    state reported by the master changed since the previous call, so that
+    an unchanged deployment costs the small state-summary instead of the
+    full master state.
+
+    :param fetch_counts: function returning the task counts, see
+                         discovery.fetch_task_counts()
+    :type fetch_counts: function
+    :param fetch_tasks: function returning the tasks
+    :type fetch_tasks: function
+    """
+
+    def __init__(self, fetch_counts, fetch_tasks):
+        self._fetch_counts = fetch_counts
+        self._fetch_tasks = fetch_tasks
+        self._counts = None
+        self._tasks = None
+
+    def __call__(self):
+        counts = sorted((entry.framework_id or '',
+                         sorted(entry.states.items()))
+                        for entry in self._fetch_counts())
+        if self._tasks is None or counts != self._counts:
+            self._tasks = self._fetch_tasks()
+            self._counts = counts
+        return self._tasks
+
+
+def snapshot(host, state, tasks):
+    """Builds a snapshot from the framework state and its tasks
+
+    :param host: framework URL
+    :type host: str
+    :param state: framework state document
+    :type state: dict | None
+    :param tasks: tasks of the framework
+    :type tasks: [discovery.Task]
+    :rtype: dict
+    """
+
+    state = state or {}
+    return {
+        'framework': host,
+        'release': state.get('release'),
+        'healthy': state.get('healthy'),
+        'tasks': dict((task.id, {'name': task.name,
+                                 'state': task.state,
+                                 'agent': task.slave_id})
+                      for task in tasks)
+    }
+
+
+def collect(host, fetch_state, fetch_tasks):
+    """Fetches framework state and tasks concurrently
+
+    :param host: framework URL
+    :type host: str
+    :param fetch_state: function returning the framework state
+    :type fetch_state: function
+    :param fetch_tasks: function returning the framework's tasks
+    :type fetch_tasks: function
+    :rtype: dict
+    """
+
+    with concurrent.futures.ThreadPoolExecutor(2) as pool:
+        state_job = pool.submit(fetch_state)
+        tasks_job = pool.submit(fetch_tasks)
+        return snapshot(host, state_job.result(), tasks_job.result())
+
+
+def status_ttl():
+    value = os.environ.get(STATUS_TTL_ENV)
+    try:
+        return DEFAULT_STATUS_TTL if value is None else float(value)
+    except ValueError:
+        logging.warning("Ignoring invalid " + STATUS_TTL_ENV + " value " +
+                        str(value))
+        return DEFAULT_STATUS_TTL
+
+
+def load_cached(host):
+    """Returns the cached snapshot of `host` if it is recent enough
+
+    :rtype: dict | None
+    """
+
+    entry = cache.load(cache.path('status.json')).get(host)
+    if not entry or not 0 <= time.time() - entry['timestamp'] <= status_ttl():
+        return None
+    return entry['snapshot']
+
+
+def store(host, snap):
+    """Caches the snapshot of `host`, keeping those of other hosts"""
+
+    cache_path = cache.path('status.json')
+    entries = cache.load(cache_path)
+    entries[host] = {'timestamp': time.time(), 'snapshot': snap}
+    try:
+        cache.save(cache_path, entries)
+    except (IOError, OSError) as e:
+        logging.debug("Unable to write status cache: " + str(e))
+
+
+def diff(old, new):
+    """Returns the differences between two snapshots as a list of
+    (field, key, old value, new value) tuples.  Added and removed tasks have
+    None as their old or new value.
+
+    :rtype: [tuple]
+    """
+
+    changes = []
+    for field in ('framework', 'release', 'healthy'):
+        if old.get(field) != new.get(field):
+            changes.append((field, None, old.get(field), new.get(field)))
+    old_tasks = old.get('tasks', {})
+    new_tasks = new.get('tasks', {})
+    for task_id in sorted(set(old_tasks) | set(new_tasks)):
+        before = old_tasks.get(task_id)
+        after = new_tasks.get(task_id)
+        if before != after:
+            changes.append(('task', task_id, before, after))
+    return changes
+
+
+def format_table(snap):
+    """Formats a snapshot as a compact table
+
+    :rtype: str
+    """
+
+    healthy = snap['healthy']
+    lines = ["Framework  " + str(snap['framework']),
+             "Release    " + str(snap['release'] or "unknown"),
+             "Healthy    " + ("unknown" if healthy is None else
+                              "yes" if healthy else "no")]
+    rows = [(task_id, task['name'] or '', task['state'] or '',
+             task['agent'] or '')
+            for task_id, task in sorted(snap['tasks'].items())]
+    if rows:
+        header = ('ID', 'NAME', 'STATE', 'AGENT')
+        widths = [max(len(row[i]) for row in rows + [header])
+                  for i in range(4)]
+        lines.append('')
+        for row in [header] + rows:
+            lines.append('  '.join(value.ljust(width) for value, width
+                                   in zip(row, widths)).rstrip())
+    else:
+        lines.append("No Quobyte tasks running.")
+    return '\n'.join(lines)
+
+
+def format_changes(changes):
+    """Formats the result of diff() with one line per change
+
+    :rtype: str
+    """
+
+    lines = []
+    for field, key, before, after in changes:
+        if field != 'task':
+            lines.append("~ " + field + ": " + str(before) + " -> " +
+                         str(after))
+        elif before is None:
+            lines.append("+ " + key + " " + str(after['name']) + " " +
+                         str(after['state']) + " " + str(after['agent']))
+        elif after is None:
+            lines.append("- " + key)
+        else:
+            lines.append("~ " + key + " " + str(before['state']) + " -> " +
+                         str(after['state']))
+    return '\n'.join(lines)
+
+
+def watch(fetch, output_json=False, interval=DEFAULT_INTERVAL,
+          iterations=None, errors=(requests.exceptions.RequestException,)):
+    """Prints the status once and then only its changes until interrupted.
+    The poll interval grows while nothing changes and is reset by the next
+    change.  Failed polls are logged and retried after the next interval.
+
+    :param fetch: function returning a snapshot
+    :type fetch: function
+    :param output_json: print JSON lines instead of text
+    :type output_json: bool
+    :param interval: base poll interval in seconds
+    :type interval: float
+    :param iterations: number of polls, unlimited if None
+    :type iterations: int | None
+    :param errors: exceptions of `fetch` to retry
+    :type errors: (type)
+    :returns: exit code
+    :rtype: int
+    """
+
+    previous = None
+    pause = interval
+    polls = 0
+    try:
+        while iterations is None or polls < iterations:
+            if polls:
+                time.sleep(pause)
+            polls += 1
+            try:
+                current = fetch()
+            except errors as e:
+                logging.warning("Unable to read the status, retrying: " +
+                                str(e))
+                pause = min(pause * 2, interval * MAX_INTERVAL_FACTOR)
+                continue
+            if previous is None:
+                previous = current
+                if output_json:
+                    print(json.dumps(current, sort_keys=True))
+                else:
+                    print(format_table(current))
+                continue
+            changes = diff(previous, current)
+            if not changes:
+                pause = min(pause * 2, interval * MAX_INTERVAL_FACTOR)
+                continue
+            pause = interval
+            previous = current
+            if output_json:
+                print(json.dumps({'timestamp': time.time(),
+                                  'changes': changes}, sort_keys=True))
+            else:
+                print(format_changes(changes))
+    except KeyboardInterrupt:
+        pass
+    return 0
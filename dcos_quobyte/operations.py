@@ -0,0 +1,156 @@
+"""Completion tracking of start and stop operations
+
+The framework API acknowledges start and stop right away.  Whether the
+Quobyte services actually came up or went down is read from the task counts
+the Mesos master reports for the framework, polled with growing intervals.
+
+Operations submitted with --async are recorded under an operation ID, so that
+a later `dcos quobyte wait <operation-id>` can track them.
+"""
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import binascii
+import logging
+import os
+import time
+
+from dcos_quobyte import cache
+from dcos_quobyte import polling
+from dcos_quobyte import trace
+
+DEFAULT_TIMEOUT = 600
+OPERATION_TTL = 24 * 60 * 60
+
+TARGET_RUNNING = 'running'
+TARGET_STOPPED = 'stopped'
+TARGETS = {'start': TARGET_RUNNING, 'stop': TARGET_STOPPED}
+
+PENDING_STATES = ('TASK_STAGING', 'TASK_STARTING')
+LIVE_STATES = PENDING_STATES + ('TASK_RUNNING', 'TASK_KILLING')
+
+
+def _count(task_counts, states):
+    return sum(counts.states.get(state, 0) for counts in task_counts
+               for state in states)
+
+
+def is_reached(task_counts, target):
+    """Returns whether the tasks reached `target`.  Running means at least one
+    running task and none still being launched, stopped means no live tasks.
+
+    :param task_counts: task counts of the framework
+    :type task_counts: [discovery.TaskCounts]
+    :param target: TARGET_RUNNING or TARGET_STOPPED
+    :type target: str
+    :rtype: bool
+    """
+
+    if target == TARGET_RUNNING:
+        return (_count(task_counts, ('TASK_RUNNING',)) > 0 and
+                _count(task_counts, PENDING_STATES) == 0)
+    return _count(task_counts, LIVE_STATES) == 0
+
+
+def select(task_counts, host, fallback=True):
+    """Returns the task counts of the framework serving at `host`, or with
+    `fallback` all of them if none can be matched by its web UI URL.
+
+    :type task_counts: [discovery.TaskCounts]
+    :type host: str
+    :param fallback: return all task counts if none matches `host`
+    :type fallback: bool
+    :rtype: [discovery.TaskCounts]
+    """
+
+    matching = [counts for counts in task_counts
+                if (counts.webui_url or '').rstrip('/') == host.rstrip('/')]
+    return matching or (task_counts if fallback else [])
+
+
+def wait(hosts, target, fetch_counts, timeout=DEFAULT_TIMEOUT, errors=()):
+    """Waits until the tasks of all `hosts` reached `target`.  Every poll
+    fetches the task counts once for all hosts; a poll failing with one of
+    `errors` counts as not reached yet.  A host that cannot be matched by
+    its web UI URL is judged by all task counts, unless it was matched
+    before: then its framework unregistered, which counts as stopped.
+
+    :param hosts: framework URLs
+    :type hosts: [str]
+    :param target: TARGET_RUNNING or TARGET_STOPPED
+    :type target: str
+    :param fetch_counts: function returning [discovery.TaskCounts]
+    :type fetch_counts: function
+    :param timeout: seconds to wait at most
+    :type timeout: float
+    :param errors: exceptions of `fetch_counts` to retry
+    :type errors: (type)
+    :returns: whether the target was reached in time
+    :rtype: bool
+    """
+
+    matched = set()
+
+    def reached(task_counts, host):
+        counts = select(task_counts, host, fallback=False)
+        if counts:
+            matched.add(host)
+        elif host in matched:
+            return target == TARGET_STOPPED
+        else:
+            counts = task_counts
+        return is_reached(counts, target)
+
+    def check():
+        try:
+            task_counts = fetch_counts()
+        except errors as e:
+            logging.debug("Task counts not available yet: " + str(e))
+            return False
+        pending = [host for host in hosts
+                   if not reached(task_counts, host)]
+        if pending:
+            logging.debug("Waiting for tasks of " + ", ".join(pending) +
+                          " to be " + target + ".")
+        return not pending
+
+    with trace.span('wait', target=target, hosts=len(hosts)) as span:
+        reached_in_time = polling.wait_for(check, timeout)
+        span.set('reached', reached_in_time)
+    return reached_in_time
+
+
+def operations_path():
+    return cache.path('operations.json')
+
+
+def submit(action, hosts):
+    """Records an operation and returns its ID
+
+    :param action: 'start' or 'stop'
+    :type action: str
+    :param hosts: framework URLs the operation ran against
+    :type hosts: [str]
+    :returns: operation ID
+    :rtype: str
+    :raises: IOError, OSError
+    """
+
+    now = time.time()
+    operation_id = binascii.hexlify(os.urandom(6)).decode('ascii')
+    entries = dict((key, value) for key, value
+                   in cache.load(operations_path()).items()
+                   if now - value.get('timestamp', 0) <= OPERATION_TTL)
+    entries[operation_id] = {'action': action, 'hosts': hosts,
+                             'timestamp': now}
+    cache.save(operations_path(), entries)
+    return operation_id
+
+
+def load(operation_id):
+    """Returns the operation recorded as `operation_id`, or None
+
+    :rtype: dict | None
+    """
+
+    return cache.load(operations_path()).get(operation_id)
@@ -0,0 +1,341 @@
+"""Placement of Quobyte services onto Mesos agents
+
+The agents are read once from the streamed master state, keeping only their
+free CPUs, memory and sandbox disk, the disks reserved for the Quobyte role
+and their attributes, and indexed by failure domain: the attribute given,
+or the zone of the Mesos fault domain, or else the agent itself.
+
+Services are placed role by role, metadata first, then registry, data and
+api.  Every agent hosts at most one instance of a role.  Among the agents
+that fit a role, each instance goes to a failure domain holding the fewest
+instances of the role so far, and there to the agent hosting the fewest
+other Quobyte services; ties between domains go to the better agent.
+Metadata and registry services then prefer agents with the fewest reserved
+disks that suffice, leaving agents with many disks to the data services,
+which prefer the most disks.
+Sorting the candidates once per role and keeping the domains in a heap
+makes a placement O(n log n) in the number of agents.
+
+Marathon constraints of a deployment spec are honored: LIKE, UNLIKE and
+CLUSTER filter the agents of a role, GROUP_BY spreads it over the values of
+an attribute instead of the failure domains, and UNIQUE and MAX_PER on an
+attribute also cap the instances per value.  The placement is written as a
+deployment spec pinning every role to its agents, which apply deploys.
+"""
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import collections
+import heapq
+import logging
+import re
+
+from dcos_quobyte import discovery
+from dcos_quobyte import inventory
+from dcos_quobyte import preflight
+from dcos_quobyte import trace
+
+PLACEMENT_ORDER = ('metadata', 'registry', 'data', 'api')
+# None places a data service on every agent that fits one
+DEFAULT_COUNTS = {'registry': 3, 'metadata': 3, 'data': None, 'api': 1}
+RESERVED_DISKS = {'registry': 1, 'metadata': 1, 'data': 1, 'api': 0}
+
+AgentModel = collections.namedtuple('AgentModel', [
+    'id', 'hostname', 'domain', 'attributes', 'cpus', 'mem', 'disk',
+    'disks'])
+"""An agent with its free resources and the disks reserved for Quobyte"""
+
+Demand = collections.namedtuple('Demand', [
+    'role', 'count', 'cpus', 'mem', 'disk', 'disks', 'filters', 'spread',
+    'cap'])
+"""What the instances of a role need: their number, or None for as many as
+fit, resources per instance, LIKE/UNLIKE/CLUSTER constraints, and the
+attribute to spread them over with the maximum number per value"""
+
+Placement = collections.namedtuple('Placement', ['assignments', 'missing'])
+"""Agents chosen per role, and the number of instances per role that found
+no agent"""
+
+
+def fault_domain(agent, attribute=None):
+    """Returns the failure domain of an agent of the master state
+
+    :param agent: agent entry of the master state
+    :type agent: dict
+    :param attribute: attribute naming the domain, defaults to the zone of
+                      the Mesos fault domain
+    :type attribute: str | None
+    :rtype: str
+    """
+
+    if attribute is not None:
+        value = (agent.get('attributes') or {}).get(attribute)
+    else:
+        fault = (agent.get('domain') or {}).get('fault_domain') or {}
+        value = (fault.get('zone') or {}).get('name')
+    if value is None:
+        return agent.get('hostname') or agent.get('id')
+    return str(value)
+
+
+def build_model(agents, reserved_role, domain_attribute=None):
+    """Models the active agents of the master state
+
+    :param agents: agent entries of the master state
+    :type agents: [dict]
+    :param reserved_role: role of the disks reserved for Quobyte
+    :type reserved_role: str
+    :param domain_attribute: attribute naming the failure domain
+    :type domain_attribute: str | None
+    :rtype: AgentIndex
+    """
+
+    models = []
+    for agent in agents:
+        if not agent.get('active', True):
+            continue
+        resources = agent.get('resources') or {}
+        used = agent.get('used_resources') or {}
+        free = [(resources.get(name) or 0) - (used.get(name) or 0)
+                for name in ('cpus', 'mem', 'disk')]
+        models.append(AgentModel(
+            agent.get('id'), agent.get('hostname'),
+            fault_domain(agent, domain_attribute),
+            agent.get('attributes') or {}, *free + [
+                preflight.count_reserved_disks(agent, reserved_role)]))
+    return AgentIndex(models)
+
+
+class AgentIndex(object):
+    """Agents indexed by ID and by failure domain
+
+    :param agents: the agents
+    :type agents: [AgentModel]
+    """
+
+    def __init__(self, agents):
+        self.agents = agents
+        self._by_id = dict((agent.id, agent) for agent in agents)
+        self._by_domain = collections.defaultdict(list)
+        for agent in agents:
+            self._by_domain[agent.domain].append(agent)
+
+    def __len__(self):
+        return len(self.agents)
+
+    def by_id(self, agent_id):
+        return self._by_id.get(agent_id)
+
+    def domains(self):
+        """Returns the failure domains, sorted
+
+        :rtype: [str]
+        """
+
+        return sorted(self._by_domain)
+
+    def in_domain(self, domain):
+        return self._by_domain.get(domain, [])
+
+
+def demands(spec=None):
+    """Returns what each role of a deployment spec needs, in placement
+    order.  Without services in the spec every role is placed with the
+    default counts.
+
+    :param spec: validated deployment spec
+    :type spec: dict | None
+    :rtype: [Demand]
+    """
+
+    services = (spec or {}).get('services') or dict(
+        (role, {}) for role in inventory.ROLES)
+    defaults = preflight.DEFAULT_REQUIREMENTS
+    result = []
+    for role in PLACEMENT_ORDER:
+        if role not in services:
+            continue
+        service = services[role]
+        filters, spread, cap = [], None, None
+        for constraint in service.get('constraints', []):
+            operator = constraint[1]
+            if len(constraint) == 3 and operator in preflight.AGENT_OPERATORS:
+                filters.append(tuple(constraint))
+            elif operator == 'GROUP_BY':
+                spread = constraint[0]
+            elif operator == 'UNIQUE' and constraint[0] != 'hostname':
+                spread, cap = constraint[0], 1
+            elif operator == 'MAX_PER' and len(constraint) == 3:
+                spread, cap = constraint[0], int(constraint[2])
+            elif constraint != ['hostname', 'UNIQUE']:
+                logging.debug("Ignoring constraint " + " ".join(constraint) +
+                              " of " + role)
+        result.append(Demand(
+            role, service.get('count', DEFAULT_COUNTS[role]),
+            service.get('cpus', defaults.cpus),
+            service.get('mem', defaults.mem),
+            service.get('disk', defaults.disk), RESERVED_DISKS[role],
+            tuple(filters), spread, cap))
+    return result
+
+
+def _fits(free, demand):
+    return (free[0] >= demand.cpus and free[1] >= demand.mem and
+            free[2] >= demand.disk and free[3] >= demand.disks)
+
+
+def _place(index, demand, free, hosted):
+    groups = collections.defaultdict(list)
+    for agent in index.agents:
+        if _fits(free[agent.id], demand) and all(
+                preflight.matches_constraint(agent.attributes, agent.hostname,
+                                             constraint)
+                for constraint in demand.filters):
+            group = agent.domain
+            if demand.spread is not None:
+                group = str(agent.attributes.get(demand.spread, ''))
+            groups[group].append(agent)
+
+    if demand.role == 'data':
+        def rank(agent):
+            return (len(hosted[agent.id]), -free[agent.id][3],
+                    -free[agent.id][0], agent.hostname or agent.id)
+    else:
+        def rank(agent):
+            return (len(hosted[agent.id]), free[agent.id][3],
+                    -free[agent.id][0], agent.hostname or agent.id)
+
+    heap = []
+    for group, members in groups.items():
+        # best candidate last, so that taking it is a pop()
+        members.sort(key=rank, reverse=True)
+        heap.append((0, rank(members[-1]), group))
+    heapq.heapify(heap)
+    wanted = demand.count
+    if wanted is None:
+        wanted = sum(len(members) for members in groups.values())
+    placed = []
+    while heap and len(placed) < wanted:
+        used, _, group = heapq.heappop(heap)
+        members = groups[group]
+        agent = members.pop()
+        remaining = free[agent.id]
+        remaining[0] -= demand.cpus
+        remaining[1] -= demand.mem
+        remaining[2] -= demand.disk
+        remaining[3] -= demand.disks
+        hosted[agent.id].append(demand.role)
+        placed.append(agent)
+        if members and (demand.cap is None or used + 1 < demand.cap):
+            heapq.heappush(heap, (used + 1, rank(members[-1]), group))
+    return placed
+
+
+def place(index, role_demands):
+    """Places the instances of every role onto the agents of `index`
+
+    :type index: AgentIndex
+    :param role_demands: demands in placement order, see demands()
+    :type role_demands: [Demand]
+    :rtype: Placement
+    """
+
+    free = dict((agent.id, [agent.cpus, agent.mem, agent.disk, agent.disks])
+                for agent in index.agents)
+    hosted = collections.defaultdict(list)
+    assignments = {}
+    missing = {}
+    with trace.span('placement', agents=len(index)) as span:
+        for demand in role_demands:
+            placed = _place(index, demand, free, hosted)
+            assignments[demand.role] = placed
+            if demand.count is not None and len(placed) < demand.count:
+                missing[demand.role] = demand.count - len(placed)
+        span.set('services', sum(len(placed)
+                                 for placed in assignments.values()))
+    return Placement(assignments, missing)
+
+
+def fetch_agents(dcos_client=None):
+    """Reads the agents from the master state, skipping its frameworks
+
+    :param dcos_client: client to derive the master URL from
+    :type dcos_client: DCOSClient | None
+    :rtype: [dict]
+    """
+
+    with discovery.master_state_chunks(dcos_client) as chunks:
+        fields = discovery.read_fields(chunks, set(['slaves']))
+    return fields.get('slaves', [])
+
+
+def _is_pin(constraint):
+    return constraint[0] == 'hostname' and constraint[1] == 'LIKE'
+
+
+def to_spec(placement, spec=None):
+    """Returns a deployment spec pinning every role to the agents chosen for
+    it.  Fields of `spec` are kept, except its hostname LIKE constraints.
+
+    :type placement: Placement
+    :param spec: deployment spec the placement was computed from
+    :type spec: dict | None
+    :rtype: dict
+    """
+
+    spec = spec or {}
+    document = {}
+    if spec.get('release') is not None:
+        document['release'] = spec['release']
+    services = {}
+    for role, placed in placement.assignments.items():
+        service = dict((spec.get('services') or {}).get(role) or {})
+        constraints = [list(constraint)
+                       for constraint in service.get('constraints', [])
+                       if not _is_pin(constraint)]
+        hostnames = sorted(agent.hostname for agent in placed
+                           if agent.hostname)
+        if hostnames:
+            constraints.append(['hostname', 'LIKE', '|'.join(
+                re.escape(hostname) for hostname in hostnames)])
+        service['count'] = len(placed)
+        service['constraints'] = constraints
+        services[role] = service
+    document['services'] = services
+    return document
+
+
+def format_table(placement, index):
+    """Formats the agents chosen per role, followed by the instances that
+    could not be placed and a summary
+
+    :type placement: Placement
+    :type index: AgentIndex
+    :rtype: str
+    """
+
+    rows = [(role, agent.hostname or agent.id, agent.domain,
+             str(agent.disks))
+            for role in inventory.ROLES if role in placement.assignments
+            for agent in sorted(placement.assignments[role],
+                                key=lambda agent: agent.hostname or agent.id)]
+    lines = []
+    if rows:
+        header = ('ROLE', 'AGENT', 'DOMAIN', 'DISKS')
+        widths = [max(len(row[i]) for row in rows + [header])
+                  for i in range(len(header))]
+        lines.extend('  '.join(value.ljust(width) for value, width
+                               in zip(row, widths)).rstrip()
+                     for row in [header] + rows)
+        lines.append('')
+    for role in inventory.ROLES:
+        if role in placement.missing:
+            lines.append("No agent fits " + str(placement.missing[role]) +
+                         " of the " + role + " services.")
+    used = set(agent.id for placed in placement.assignments.values()
+               for agent in placed)
+    lines.append(str(len(rows)) + " services placed on " + str(len(used)) +
+                 " of " + str(len(index)) + " agents in " +
+                 str(len(set(index.by_id(agent_id).domain
+                             for agent_id in used))) + " failure domains.")
+    return '\n'.join(lines)
@@ -0,0 +1,80 @@
+"""Polling with adaptive intervals, and waits that stay interruptible"""
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import time
+
+from six.moves import queue
+
+DEFAULT_INTERVAL = 0.5
+DEFAULT_MAX_INTERVAL = 10.0
+DEFAULT_FACTOR = 1.5
+# Python 2 defers KeyboardInterrupt while a queue get or a thread join waits
+# without a timeout, so get() and join() wait in slices of this length.
+WAIT_SLICE = 1.0
+
+
+def wait_for(check, timeout,
+             interval=DEFAULT_INTERVAL,
+             max_interval=DEFAULT_MAX_INTERVAL,
+             factor=DEFAULT_FACTOR):
+    """Calls `check` until it returns a true value or `timeout` seconds have
+    passed.  The pause between calls starts at `interval` and grows by
+    `factor` up to `max_interval`, so quick transitions are noticed quickly
+    while slow ones cost few requests.
+
+    :param check: function without arguments
+    :type check: function
+    :param timeout: seconds to wait at most
+    :type timeout: float
+    :param interval: initial pause between calls
+    :type interval: float
+    :param max_interval: upper bound of the pause
+    :type max_interval: float
+    :param factor: growth factor of the pause
+    :type factor: float
+    :returns: the last value returned by `check`
+    :rtype: object
+    """
+
+    deadline = time.time() + timeout
+    while True:
+        value = check()
+        remaining = deadline - time.time()
+        if value or remaining <= 0:
+            return value
+        time.sleep(min(interval, remaining))
+        interval = min(max_interval, interval * factor)
+
+
+def get(items, timeout=None):
+    """Takes the next item of the queue `items`, waiting for it at most
+    `timeout` seconds or, if None, until one arrives
+
+    :type items: queue.Queue
+    :type timeout: float | None
+    :rtype: object
+    :raises queue.Empty: if no item arrived within `timeout`
+    """
+
+    deadline = None if timeout is None else time.time() + timeout
+    while True:
+        wait = WAIT_SLICE
+        if deadline is not None:
+            wait = min(wait, deadline - time.time())
+            if wait <= 0:
+                raise queue.Empty()
+        try:
+            return items.get(timeout=wait)
+        except queue.Empty:
+            continue
+
+
+def join(thread):
+    """Waits until `thread` has finished
+
+    :type thread: threading.Thread
+    """
+
+    while thread.is_alive():
+        thread.join(WAIT_SLICE)
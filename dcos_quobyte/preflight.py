@@ -0,0 +1,443 @@
+"""Pre-flight checks of the Mesos agents for Quobyte services
+
+The agents are listed from the state summary of the Mesos master, which
+carries their resources, the resources in use and their attributes but no
+tasks, so it stays small on large clusters.  Every agent is checked for the
+CPUs, memory and disk one Quobyte service needs, for the ports of the
+Quobyte services and for the attribute constraints of a deployment spec.
+Agents passing these checks have their state fetched, concurrently by up to
+`parallel` threads, to count the disks reserved for the Quobyte role.  The
+fetches share one deadline: agents that did not answer in time are reported
+as unreachable instead of holding up the run.
+"""
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import collections
+import logging
+import os
+import re
+import threading
+import time
+
+from dcos_quobyte import discovery
+from dcos_quobyte import polling
+from dcos_quobyte import trace
+from six.moves import queue
+
+ROLE_ENV = 'DCOS_QUOBYTE_ROLE'
+DEFAULT_ROLE = 'quobyte'
+DEFAULT_TIMEOUT = 10.0
+SERVICE_PORTS = (7860, 7861, 7862, 7863)
+CHECKS = ('inactive', 'cpus', 'mem', 'disk', 'ports', 'attributes',
+          'disks', 'unreachable')
+
+Requirements = collections.namedtuple('Requirements', [
+    'cpus', 'mem', 'disk', 'ports', 'disks', 'constraints', 'agents'])
+"""What an agent needs to host a Quobyte service: free CPUs, memory and disk
+in MB, free ports, disks reserved for the Quobyte role and Marathon
+constraints on its attributes, and how many fit agents are needed"""
+
+DEFAULT_REQUIREMENTS = Requirements(cpus=1.0, mem=1024.0, disk=0.0,
+                                    ports=SERVICE_PORTS, disks=1,
+                                    constraints=(), agents=1)
+
+Problem = collections.namedtuple('Problem', ['check', 'message'])
+"""A failed check, `check` is one of CHECKS"""
+
+AgentReport = collections.namedtuple('AgentReport', ['id', 'hostname',
+                                                     'problems'])
+"""Outcome of the checks of one agent"""
+
+# constraints that can be judged on a single agent
+AGENT_OPERATORS = ('LIKE', 'UNLIKE', 'CLUSTER')
+
+
+def role():
+    """Returns the Mesos role holding the reservations of the Quobyte
+    services, set with DCOS_QUOBYTE_ROLE
+
+    :rtype: str
+    """
+
+    return os.environ.get(ROLE_ENV, DEFAULT_ROLE)
+
+
+def requirements_from_spec(spec):
+    """Derives the requirements from a deployment spec: the largest
+    resources of any service, reserved disks if it runs data services and
+    as many agents as the largest service has instances
+
+    :param spec: validated deployment spec
+    :type spec: dict
+    :rtype: Requirements
+    """
+
+    services = spec.get('services', {}).values()
+
+    def largest(field):
+        return max([service[field] for service in services
+                    if field in service] or
+                   [getattr(DEFAULT_REQUIREMENTS, field)])
+
+    data = spec.get('services', {}).get('data')
+    constraints = []
+    for service in services:
+        for constraint in service.get('constraints', []):
+            if (len(constraint) == 3 and constraint[1] in AGENT_OPERATORS
+                    and tuple(constraint) not in constraints):
+                constraints.append(tuple(constraint))
+    return DEFAULT_REQUIREMENTS._replace(
+        cpus=largest('cpus'), mem=largest('mem'), disk=largest('disk'),
+        disks=1 if data is None or data.get('count', 1) > 0 else 0,
+        constraints=tuple(constraints),
+        agents=max([service.get('count', 1) for service in services] or
+                   [DEFAULT_REQUIREMENTS.agents]))
+
+
+def parse_ranges(value):
+    """Parses a Mesos ranges resource such as "[31000-32000, 7860-7863]"
+
+    :param value: ranges in the state summary notation
+    :type value: str | None
+    :rtype: [(int, int)]
+    """
+
+    return [(int(begin), int(end)) for begin, end
+            in re.findall(r'(\d+)\s*-\s*(\d+)', value or '')]
+
+
+def _in_ranges(port, ranges):
+    return any(begin <= port <= end for begin, end in ranges)
+
+
+def matches_constraint(attributes, hostname, constraint):
+    """Returns whether an agent meets a LIKE, UNLIKE or CLUSTER constraint
+
+    :param attributes: agent attributes
+    :type attributes: dict
+    :param hostname: agent hostname
+    :type hostname: str
+    :param constraint: field, operator and value
+    :type constraint: (str, str, str)
+    :rtype: bool
+    """
+
+    field, operator, value = constraint
+    actual = hostname if field == 'hostname' else attributes.get(field)
+    actual = None if actual is None else str(actual)
+    if operator == 'CLUSTER':
+        return actual == value
+    like = actual is not None and re.match('(?:' + value + r')\Z',
+                                           actual) is not None
+    return like if operator == 'LIKE' else not like
+
+
+def _check_resources(agent, requirements, reserved_role):
+    resources = agent.get('resources') or {}
+    used = agent.get('used_resources') or {}
+    reserved = (agent.get('reserved_resources') or {}).get(
+        reserved_role) or {}
+    problems = []
+    for name in ('cpus', 'mem', 'disk'):
+        needed = getattr(requirements, name)
+        others = max((used.get(name) or 0) - (reserved.get(name) or 0), 0)
+        free = (resources.get(name) or 0) - others
+        if needed and free < needed:
+            problems.append(Problem(name, "{0} {1:g} free, {2:g} needed"
+                                    .format(name, free, needed)))
+    offered = parse_ranges(resources.get('ports'))
+    taken = parse_ranges(used.get('ports'))
+    own = parse_ranges(reserved.get('ports'))
+    missing = [port for port in requirements.ports
+               if not _in_ranges(port, offered) or
+               _in_ranges(port, taken) and not _in_ranges(port, own)]
+    if missing:
+        problems.append(Problem('ports', "ports " + ", ".join(
+            str(port) for port in missing) + " not available"))
+    return problems
+
+
+def check_agent(agent, requirements, reserved_role=None, hosting=False):
+    """Checks an agent of the master state summary against `requirements`,
+    without its reserved disks.  Resources and ports reserved for
+    `reserved_role` are Quobyte's own and count as free.  An agent
+    `hosting` Quobyte services already holds what they need, so its
+    resources and ports are not checked.
+
+    :param agent: agent entry of the state summary
+    :type agent: dict
+    :type requirements: Requirements
+    :param reserved_role: role of the Quobyte reservations, defaults to
+                          role()
+    :type reserved_role: str | None
+    :param hosting: whether Quobyte services run on the agent
+    :type hosting: bool
+    :rtype: [Problem]
+    """
+
+    if not agent.get('active', True):
+        return [Problem('inactive', "agent is not active")]
+    problems = []
+    if not hosting:
+        problems.extend(_check_resources(agent, requirements,
+                                         reserved_role or role()))
+    attributes = agent.get('attributes') or {}
+    for constraint in requirements.constraints:
+        if not matches_constraint(attributes, agent.get('hostname'),
+                                  constraint):
+            problems.append(Problem('attributes', "constraint " +
+                                    " ".join(constraint) + " not met"))
+    return problems
+
+
+def count_reserved_disks(state, reserved_role):
+    """Counts the disks of an agent state reserved for `reserved_role`.
+    Only disks with a source, that is MOUNT or PATH disks, count; the
+    sandbox disk does not.
+
+    :param state: fields of the agent state, see discovery.read_fields()
+    :type state: dict
+    :param reserved_role: role of the Quobyte framework
+    :type reserved_role: str
+    :rtype: int
+    """
+
+    reserved = (state.get('reserved_resources_full') or {}).get(
+        reserved_role) or []
+    return sum(1 for resource in reserved
+               if resource.get('name') == 'disk' and
+               (resource.get('disk') or {}).get('source'))
+
+
+def fetch_all(agents, fetch, timeout, parallel):
+    """Calls `fetch(agent)` for all `agents` with at most `parallel` daemon
+    threads, and returns what finished within `timeout` seconds.  Threads
+    still waiting for an agent at the deadline are left behind.
+
+    :param agents: agents to fetch
+    :type agents: [discovery.Agent]
+    :param fetch: function of an agent
+    :type fetch: function
+    :param timeout: seconds to wait for all fetches at most
+    :type timeout: float
+    :param parallel: maximum number of concurrent fetches
+    :type parallel: int
+    :returns: (value, error message) by agent ID
+    :rtype: dict
+    """
+
+    pending = queue.Queue()
+    for agent in agents:
+        pending.put(agent)
+    finished = queue.Queue()
+    stop = threading.Event()
+
+    def work():
+        while not stop.is_set():
+            try:
+                agent = pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                finished.put((agent.id, fetch(agent), None))
+            except Exception as e:
+                finished.put((agent.id, None, str(e) or type(e).__name__))
+
+    for _ in range(min(parallel, len(agents))):
+        thread = threading.Thread(target=work)
+        thread.daemon = True
+        thread.start()
+
+    results = {}
+    deadline = time.time() + timeout
+    try:
+        while len(results) < len(agents):
+            try:
+                agent_id, value, error = polling.get(
+                    finished, deadline - time.time())
+            except queue.Empty:
+                break
+            results[agent_id] = (value, error)
+    finally:
+        stop.set()
+    return results
+
+
+def agent_state_fetcher(dcos_client):
+    """Returns a function fetching the reserved resources of an agent
+
+    :param dcos_client: client to derive agent URLs from
+    :type dcos_client: DCOSClient
+    :rtype: function
+    """
+
+    def fetch(agent):
+        with discovery.agent_state_chunks(dcos_client, agent) as chunks:
+            return discovery.read_fields(chunks,
+                                         set(['reserved_resources_full']))
+
+    return fetch
+
+
+def run(agents, requirements, fetch_state, reserved_role=None,
+        timeout=DEFAULT_TIMEOUT, parallel=10, hosting=frozenset()):
+    """Checks all agents
+
+    :param agents: agent entries of the master state summary
+    :type agents: [dict]
+    :type requirements: Requirements
+    :param fetch_state: function returning the fields of an agent state,
+                        see agent_state_fetcher()
+    :type fetch_state: function
+    :param reserved_role: role of the reserved disks, defaults to role()
+    :type reserved_role: str | None
+    :param timeout: seconds to wait for the agent states
+    :type timeout: float
+    :param parallel: maximum number of concurrent agent state fetches
+    :type parallel: int
+    :param hosting: ids of the agents running Quobyte services, see
+                    hosting_agents()
+    :type hosting: set
+    :returns: one report per agent
+    :rtype: [AgentReport]
+    """
+
+    reserved_role = reserved_role or role()
+    with trace.span('preflight', agents=len(agents)) as span:
+        problems = dict((agent.get('id'),
+                         check_agent(agent, requirements, reserved_role,
+                                     agent.get('id') in hosting))
+                        for agent in agents)
+        candidates = []
+        if requirements.disks:
+            candidates = [discovery.Agent(agent.get('id'),
+                                          agent.get('hostname'),
+                                          agent.get('pid'))
+                          for agent in agents if not problems[agent.get('id')]]
+        states = fetch_all(candidates, fetch_state, timeout, parallel)
+        span.set('fetched', len(states))
+        for agent in candidates:
+            state, error = states.get(agent.id, (None, None))
+            if state is None:
+                reason = error or "no answer within " + str(timeout) + "s"
+                logging.debug("State of agent " + str(agent.id) +
+                              " unavailable: " + reason)
+                problems[agent.id].append(Problem(
+                    'unreachable', "state unavailable: " + reason))
+                continue
+            disks = count_reserved_disks(state, reserved_role)
+            if disks < requirements.disks:
+                problems[agent.id].append(Problem(
+                    'disks', str(disks) + " disks reserved for role " +
+                    reserved_role + ", " + str(requirements.disks) +
+                    " needed"))
+        reports = [AgentReport(agent.get('id'), agent.get('hostname'),
+                               problems[agent.get('id')]) for agent in agents]
+        span.set('unfit', len(unfit(reports)))
+        return reports
+
+
+def fetch_summary(dcos_client):
+    """Fetches the state summary of the Mesos master
+
+    :param dcos_client: client of the Mesos master
+    :type dcos_client: DCOSClient
+    :rtype: dict
+    """
+
+    with trace.span('state_summary'):
+        return dcos_client.get_state_summary()
+
+
+def fetch_agents(dcos_client):
+    """Lists the agents from the state summary of the Mesos master
+
+    :param dcos_client: client of the Mesos master
+    :type dcos_client: DCOSClient
+    :rtype: [dict]
+    """
+
+    return fetch_summary(dcos_client).get('slaves', [])
+
+
+def hosting_agents(summary, framework_name):
+    """Returns the ids of the agents running tasks of the frameworks named
+    `framework_name`
+
+    :param summary: state summary of the Mesos master
+    :type summary: dict
+    :type framework_name: str
+    :rtype: set
+    """
+
+    return set(agent_id for framework in summary.get('frameworks', [])
+               if framework.get('name') == framework_name
+               for agent_id in framework.get('slave_ids') or [])
+
+
+def unfit(reports):
+    """Returns the reports of the agents failing a check, those with the
+    most problems first
+
+    :type reports: [AgentReport]
+    :rtype: [AgentReport]
+    """
+
+    return sorted((report for report in reports if report.problems),
+                  key=lambda report: (-len(report.problems),
+                                      report.hostname or report.id or ''))
+
+
+def is_ready(reports, requirements):
+    """Returns whether enough agents passed all checks
+
+    :rtype: bool
+    """
+
+    return len(reports) - len(unfit(reports)) >= requirements.agents
+
+
+def to_json(reports, requirements):
+    """Returns the reports as a JSON serializable dict
+
+    :rtype: dict
+    """
+
+    return {'agents': len(reports),
+            'fit': len(reports) - len(unfit(reports)),
+            'required': requirements.agents,
+            'ready': is_ready(reports, requirements),
+            'unfit': [{'id': report.id, 'hostname': report.hostname,
+                       'problems': [dict(zip(Problem._fields, problem))
+                                    for problem in report.problems]}
+                      for report in unfit(reports)]}
+
+
+def format_summary(reports, requirements):
+    """Formats the unfit agents, most problems first, followed by the
+    number of agents failing each check
+
+    :rtype: str
+    """
+
+    ranked = unfit(reports)
+    lines = []
+    if ranked:
+        header = ('AGENT', 'PROBLEMS')
+        rows = [(report.hostname or report.id or '',
+                 "; ".join(problem.message for problem in report.problems))
+                for report in ranked]
+        width = max(len(row[0]) for row in rows + [header])
+        lines.extend('  '.join((row[0].ljust(width), row[1])).rstrip()
+                     for row in [header] + rows)
+        counts = collections.Counter(problem.check for report in ranked
+                                     for problem in report.problems)
+        lines.append('')
+        lines.append("Failed checks: " + ", ".join(
+            check + " " + str(counts[check]) for check in CHECKS
+            if check in counts))
+    lines.append(str(len(reports) - len(ranked)) + " of " +
+                 str(len(reports)) + " agents fit for Quobyte services, " +
+                 str(requirements.agents) + " needed.")
+    return '\n'.join(lines)
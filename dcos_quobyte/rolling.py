@@ -0,0 +1,120 @@
+"""Rolling upgrades of Quobyte frameworks
+
+Frameworks are upgraded in waves of at most `window` instances.  The next wave
+only starts once every instance of the current one reports the new release
+and a healthy state, and the rollout is aborted once more than `max_failures`
+instances failed.
+"""
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import logging
+
+from dcos_quobyte import batch
+from dcos_quobyte import polling
+from requests.exceptions import ConnectionError, Timeout
+
+DEFAULT_TIMEOUT = 600
+SKIPPED_ERROR = "skipped, rollout aborted"
+
+
+class ConvergenceError(Exception):
+    """Raised if a framework does not reach the target release in time"""
+
+
+def is_converged(state, release):
+    """Returns whether a framework state reports `release` and health.  A
+    None state means the framework does not report its state, which is
+    taken as converged.
+
+    :param state: framework state document
+    :type state: dict | None
+    :param release: target release
+    :type release: str
+    :rtype: bool
+    """
+
+    if state is None:
+        return True
+    return (state.get('release') == release and
+            state.get('healthy', True) is True)
+
+
+def wait_converged(host, release, get_state, timeout):
+    """Polls the state of `host` until it converged to `release`
+
+    :raises: ConvergenceError
+    """
+
+    def check():
+        try:
+            return is_converged(get_state(host), release)
+        except (ConnectionError, Timeout, ValueError) as e:
+            logging.debug("State of " + host + " not available yet: " +
+                          str(e))
+            return False
+
+    if not polling.wait_for(check, timeout):
+        raise ConvergenceError("did not converge to release " + release +
+                               " within " + str(timeout) + "s")
+
+
+def rolling_upgrade(hosts, release, upgrade_one, get_state,
+                    window=1, max_failures=0, timeout=DEFAULT_TIMEOUT,
+                    run_wave=None):
+    """Upgrades `hosts` to `release` in waves of `window` instances
+
+    :param hosts: framework URLs
+    :type hosts: [str]
+    :param release: target release
+    :type release: str
+    :param upgrade_one: function sending the upgrade to one framework URL,
+                        returning an exit code
+    :type upgrade_one: function
+    :param get_state: function returning the state document of a framework
+                      URL, or None if the framework does not report one
+    :type get_state: function
+    :param window: number of frameworks upgraded concurrently
+    :type window: int
+    :param max_failures: number of failed frameworks tolerated before the
+                         rollout is aborted
+    :type max_failures: int
+    :param timeout: seconds to wait for each wave to converge
+    :type timeout: float
+    :param run_wave: function upgrading a list of framework URLs and waiting
+                     for them to converge, returning [batch.Result]; runs
+                     `upgrade_one` and `get_state` on threads if None
+    :type run_wave: function
+    :returns: one result per host, in the order of `hosts`
+    :rtype: [batch.Result]
+    """
+
+    def upgrade_and_wait(host):
+        code = upgrade_one(host)
+        if code == 0:
+            wait_converged(host, release, get_state, timeout)
+        return code
+
+    results = []
+    failures = 0
+    waves = [hosts[i:i + window] for i in range(0, len(hosts), window)]
+    for number, wave in enumerate(waves):
+        logging.info("Upgrading wave " + str(number + 1) + "/" +
+                     str(len(waves)) + ": " + ", ".join(wave))
+        if run_wave is None:
+            wave_results = batch.run(upgrade_and_wait, wave, window)
+        else:
+            wave_results = run_wave(wave)
+        results.extend(wave_results)
+        failures += len([r for r in wave_results if r.code != 0])
+        if failures > max_failures:
+            remaining = [host for later in waves[number + 1:]
+                         for host in later]
+            if remaining:
+                logging.error("Aborting rollout after " + str(failures) +
+                              " failures, " + str(len(remaining)) +
+                              " frameworks were not upgraded.")
+            results.extend(batch.Result(host, None, SKIPPED_ERROR, 0.0)
+                           for host in remaining)
+            break
+    return results
@@ -0,0 +1,229 @@
+"""Ordered shutdown of the Quobyte services of a framework
+
+Services are stopped tier by tier: data services first, in batches of
+batch_size, then all metadata services, then the registry and finally the
+api services.  Every batch is stopped through POST /v1/stop, which names the
+role and the tasks to stop, and the next batch only starts once the Mesos
+master no longer reports any of them as live, polled with growing
+intervals.  A tier that does not drain within its timeout aborts the
+shutdown, so that metadata and registry services keep running for data
+services that are still flushing.  Frameworks are probed with an empty stop
+request before the master is read, and those without /v1/stop are stopped at
+once as before.
+"""
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import collections
+import json
+import logging
+import time
+
+from dcos_quobyte import inventory
+from dcos_quobyte import operations
+from dcos_quobyte import polling
+from dcos_quobyte import trace
+
+STOP_API_STRING = '/v1/stop'
+PHASES = ('data', 'metadata', 'registry', 'api')
+# roles stopped in batches, the others all at once
+BATCHED_ROLES = ('data',)
+DEFAULT_BATCH_SIZE = 10
+DEFAULT_TIMEOUT = 600
+STOP_UNSUPPORTED = (404, 405, 501)
+
+Phase = collections.namedtuple('Phase', ['role', 'services', 'stopped',
+                                         'batches', 'duration', 'error'])
+"""Outcome of stopping one tier: services it had, services stopped, batches
+sent, seconds taken and an error message if it did not complete"""
+
+
+def live_services(tasks, framework_ids=None):
+    """Returns the role of every live Quobyte task
+
+    :param tasks: framework tasks of the master state
+    :type tasks: [discovery.Task]
+    :param framework_ids: only keep tasks of these frameworks, if given
+    :type framework_ids: set | None
+    :returns: role by task ID
+    :rtype: dict
+    """
+
+    return dict((task.id, inventory.role_of(task.name)) for task in tasks
+                if task.state in operations.LIVE_STATES and
+                (not framework_ids or task.framework_id in framework_ids))
+
+
+def request_stop(host, role, task_ids, client=None):
+    """Asks the framework to stop the tasks `task_ids` of `role`
+
+    :param host: framework URL
+    :type host: str
+    :param role: Quobyte service role
+    :type role: str
+    :param task_ids: tasks to stop
+    :type task_ids: [str]
+    :param client: framework API client, defaults to api.default_client()
+    :type client: api.FrameworkClient | None
+    :returns: 0 once accepted, None if the framework cannot stop tasks by
+              role, the status code of a failed request, 2 if the framework
+              could not be reached
+    :rtype: int | None
+    """
+
+    from dcos_quobyte import api
+    from requests.exceptions import ConnectionError, Timeout
+
+    client = client or api.default_client()
+    url = host.rstrip('/') + STOP_API_STRING
+    try:
+        r = client.request('POST', url,
+                           data=json.dumps({'role': role, 'tasks': task_ids}),
+                           headers={'Content-Type': 'application/json'})
+    except (ConnectionError, Timeout) as e:
+        logging.error("Unable to connect to framework at " + host +
+                      "\nReason was: " + str(e))
+        return 2
+    if r.status_code in STOP_UNSUPPORTED:
+        return None
+    if r.status_code not in (200, 202):
+        logging.error("Error! Framework at " + host + " returned status "
+                      "code " + str(r.status_code) + " for stopping " +
+                      role + " services.")
+        return r.status_code
+    return 0
+
+
+def probe_stop(host, client=None):
+    """Asks the framework to stop no task, to learn whether it stops
+    services by role
+
+    :param host: framework URL
+    :type host: str
+    :param client: framework API client, defaults to api.default_client()
+    :type client: api.FrameworkClient | None
+    :returns: see request_stop()
+    :rtype: int | None
+    """
+
+    return request_stop(host, PHASES[0], [], client)
+
+
+def wait_stopped(task_ids, fetch_live, timeout):
+    """Waits until none of `task_ids` is live any more
+
+    :param task_ids: tasks to wait for
+    :type task_ids: [str]
+    :param fetch_live: function returning the live tasks, see
+                       live_services()
+    :type fetch_live: function
+    :param timeout: seconds to wait at most
+    :type timeout: float
+    :returns: the tasks still live at the timeout
+    :rtype: set
+    """
+
+    from requests.exceptions import RequestException
+
+    remaining = set(task_ids)
+
+    def check():
+        try:
+            remaining.intersection_update(fetch_live())
+        except RequestException as e:
+            logging.debug("Task states not available: " + str(e))
+            return False
+        return not remaining
+
+    polling.wait_for(check, max(timeout, 0))
+    return remaining
+
+
+def _batches(role, task_ids, batch_size):
+    size = batch_size if role in BATCHED_ROLES else len(task_ids)
+    return [task_ids[offset:offset + size]
+            for offset in range(0, len(task_ids), size)]
+
+
+def run(host, fetch_live, batch_size=DEFAULT_BATCH_SIZE,
+        timeout=DEFAULT_TIMEOUT, client=None, live=None):
+    """Stops the services of the framework at `host` tier by tier
+
+    :param host: framework URL
+    :type host: str
+    :param fetch_live: function returning the live tasks of the framework,
+                       see live_services()
+    :type fetch_live: function
+    :param batch_size: data services stopped together
+    :type batch_size: int
+    :param timeout: seconds each tier may take
+    :type timeout: float
+    :param client: framework API client, defaults to api.default_client()
+    :type client: api.FrameworkClient | None
+    :param live: live tasks at the start, fetched if not given
+    :type live: dict | None
+    :returns: exit code, None if the framework cannot stop services by
+              role, and the tiers handled
+    :rtype: (int | None, [Phase])
+    """
+
+    if live is None:
+        live = fetch_live()
+    phases = []
+    with trace.span('shutdown', url=host, services=len(live)) as span:
+        for role in PHASES:
+            task_ids = sorted(task_id for task_id, task_role in live.items()
+                              if task_role == role)
+            if not task_ids:
+                continue
+            start = time.time()
+            deadline = start + timeout
+            stopped = 0
+            batches = _batches(role, task_ids, batch_size)
+            for number, batch in enumerate(batches, 1):
+                with trace.span('stop_batch', role=role,
+                                services=len(batch)) as batch_span:
+                    code = request_stop(host, role, batch, client)
+                    if code is None:
+                        span.set('unsupported', True)
+                        return None, phases
+                    if code:
+                        phases.append(Phase(role, len(task_ids), stopped,
+                                            number, time.time() - start,
+                                            "stop request failed"))
+                        return code, phases
+                    remaining = wait_stopped(batch, fetch_live,
+                                             deadline - time.time())
+                    batch_span.set('remaining', len(remaining))
+                stopped += len(batch) - len(remaining)
+                logging.info(role + " services stopped: " + str(stopped) +
+                             "/" + str(len(task_ids)) + " (batch " +
+                             str(number) + "/" + str(len(batches)) + ")")
+                if remaining:
+                    phases.append(Phase(
+                        role, len(task_ids), stopped, number,
+                        time.time() - start, str(len(remaining)) +
+                        " still running after " + str(timeout) + "s"))
+                    return 1, phases
+            phases.append(Phase(role, len(task_ids), stopped, len(batches),
+                                time.time() - start, None))
+        span.set('phases', len(phases))
+    return 0, phases
+
+
+def format_phases(phases):
+    """Formats one line per tier
+
+    :type phases: [Phase]
+    :rtype: str
+    """
+
+    if not phases:
+        return "No Quobyte services were running."
+    width = max(len(phase.role) for phase in phases)
+    return '\n'.join(
+        "{0:<{1}}  {2}/{3} stopped in {4} batch{5}, {6:.1f}s{7}".format(
+            phase.role, width, phase.stopped, phase.services, phase.batches,
+            "" if phase.batches == 1 else "es", phase.duration,
+            "" if phase.error is None else ", " + phase.error)
+        for phase in phases)
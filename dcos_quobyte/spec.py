@@ -0,0 +1,172 @@
+"""Deployment specs and how far a framework is from them
+
+A spec declares the release of a Quobyte framework and, per Quobyte service,
+the number of instances, their placement constraints and their resources,
+see cli.SCHEMA.  apply compares a spec with the state the framework reports
+through /v1/state, fetched once, and only issues the calls needed to
+converge: a single PUT of /v1/services carrying just the changed fields of
+the changed services, and a switch through /v1/version if the release
+differs.  Services and fields a spec leaves out are not touched.
+"""
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import collections
+import json
+import logging
+
+from dcos_quobyte import inventory
+from dcos_quobyte import trace
+
+SERVICES_API_STRING = '/v1/services'
+SERVICE_FIELDS = ('count', 'constraints', 'cpus', 'mem', 'disk')
+
+Plan = collections.namedtuple('Plan', ['release', 'services'])
+"""Changes converging a framework to a spec: the release to switch to, or
+None, and the changed fields by service role"""
+
+
+def _describe(error):
+    path = '/'.join(str(part) for part in error.path)
+    return (path + ": " if path else "") + error.message
+
+
+def validate(document, schema):
+    """Checks a spec against the JSON schema
+
+    :param document: spec
+    :type document: dict
+    :param schema: JSON schema, see cli.SCHEMA
+    :type schema: dict
+    :raises: ValueError listing every violation
+    """
+
+    import jsonschema
+
+    errors = sorted(jsonschema.Draft4Validator(schema).iter_errors(document),
+                    key=lambda error: list(error.path))
+    if errors:
+        raise ValueError("Invalid spec: " +
+                         "; ".join(_describe(error) for error in errors))
+
+
+def load(path, schema):
+    """Reads and validates the spec in the file at `path`
+
+    :param path: path of a JSON spec
+    :type path: str
+    :param schema: JSON schema, see cli.SCHEMA
+    :type schema: dict
+    :rtype: dict
+    :raises: ValueError if the file is no valid spec
+    """
+
+    with open(path) as spec_file:
+        try:
+            document = json.load(spec_file)
+        except ValueError as e:
+            raise ValueError("Unable to parse spec " + path + ": " + str(e))
+    validate(document, schema)
+    return document
+
+
+def diff(spec, state):
+    """Returns the changes converging a framework in `state` to `spec`.
+    Without a state every field of the spec counts as changed.
+
+    :param spec: validated spec
+    :type spec: dict
+    :param state: framework state document
+    :type state: dict | None
+    :rtype: Plan
+    """
+
+    state = state or {}
+    release = spec.get('release')
+    if release is not None and release == state.get('release'):
+        release = None
+    current = state.get('services') or {}
+    services = {}
+    for role, desired in spec.get('services', {}).items():
+        actual = current.get(role) or {}
+        changes = dict((field, value) for field, value in desired.items()
+                       if actual.get(field) != value)
+        if changes:
+            services[role] = changes
+    return Plan(release, services)
+
+
+def is_empty(plan):
+    """Returns whether the framework already matches the spec
+
+    :type plan: Plan
+    :rtype: bool
+    """
+
+    return plan.release is None and not plan.services
+
+
+def format_plan(plan, state):
+    """Formats one line per change, with the current and the desired value
+
+    :type plan: Plan
+    :param state: framework state document the plan was computed from
+    :type state: dict | None
+    :rtype: [str]
+    """
+
+    state = state or {}
+    current = state.get('services') or {}
+
+    def value(document, field):
+        return json.dumps(document.get(field)) if field in document else '-'
+
+    lines = []
+    if plan.release is not None:
+        lines.append("release " + str(state.get('release', '-')) + " -> " +
+                     plan.release)
+    order = inventory.ROLES
+    for role in sorted(plan.services, key=order.index):
+        changes = plan.services[role]
+        actual = current.get(role) or {}
+        for field in SERVICE_FIELDS:
+            if field in changes:
+                lines.append(role + " " + field + " " +
+                             value(actual, field) + " -> " +
+                             value(changes, field))
+    return lines
+
+
+def update_services(host, services, client=None):
+    """Sends the changed service fields to the framework in one request
+
+    :param host: framework URL
+    :type host: str
+    :param services: changed fields by service role, see Plan
+    :type services: dict
+    :param client: framework API client, defaults to api.default_client()
+    :type client: api.FrameworkClient | None
+    :returns: 0 on success, the status code of a failed request, 2 if the
+              framework could not be reached
+    :rtype: int
+    """
+
+    from dcos_quobyte import api
+    from requests.exceptions import ConnectionError, Timeout
+
+    client = client or api.default_client()
+    url = host.rstrip('/') + SERVICES_API_STRING
+    with trace.span('update_services', url=url, services=len(services)):
+        try:
+            r = client.request('PUT', url, data=json.dumps(services),
+                               headers={'Content-Type': 'application/json'})
+        except (ConnectionError, Timeout) as e:
+            logging.error("Unable to connect to framework at " + host +
+                          "\nReason was: " + str(e))
+            return 2
+    if r.status_code != 200:
+        logging.error("Error! Framework at " + host + " returned status "
+                      "code " + str(r.status_code) + " for the service "
+                      "update.")
+        return r.status_code
+    return 0
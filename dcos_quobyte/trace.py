@@ -0,0 +1,179 @@
+"""Timing spans of CLI operations, exported as JSON lines
+
+Tracing is off by default and is switched on with --trace (spans go to
+stderr) or the DCOS_QUOBYTE_TRACE environment variable, whose value is either
+1 for stderr or the path of a file the spans are appended to.  Every finished
+span is written as one JSON object:
+
+    {"trace": "...", "span": 2, "parent": 1, "name": "http",
+     "start": 1444000000.123, "duration_ms": 12.5, "status": 200, ...}
+
+While tracing is off, span() returns a shared no-op span, so instrumented
+code only pays for a function call.
+"""
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import binascii
+import itertools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+TRACE_ENV = 'DCOS_QUOBYTE_TRACE'
+
+_lock = threading.Lock()
+_local = threading.local()
+_ids = itertools.count(1)
+_output = None
+_trace_id = None
+_clock = getattr(time, 'perf_counter', time.time)
+
+
+class _NullSpan(object):
+    """Span used while tracing is off"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def set(self, key, value):
+        pass
+
+    def add(self, key, amount=1):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span(object):
+    """A timed phase of an operation.  Attributes set on the span are
+    written together with its duration when it ends.
+
+    :param name: name of the phase
+    :type name: str
+    :param attributes: initial attributes
+    :type attributes: dict
+    """
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+        self.id = next(_ids)
+        self.parent = None
+        self._start = None
+        self._started = None
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def add(self, key, amount=1):
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def __enter__(self):
+        stack = _stack()
+        self.parent = stack[-1].id if stack else None
+        stack.append(self)
+        self._started = time.time()
+        self._start = _clock()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        duration = _clock() - self._start
+        _stack().remove(self)
+        record = dict(self.attributes)
+        if exc_type is not None:
+            record['error'] = exc_type.__name__ + ": " + str(exc_value)
+        record.update({'trace': _trace_id,
+                       'span': self.id,
+                       'parent': self.parent,
+                       'name': self.name,
+                       'start': round(self._started, 6),
+                       'duration_ms': round(duration * 1000.0, 3)})
+        _write(record)
+        return False
+
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def _write(record):
+    line = json.dumps(record, sort_keys=True, default=str)
+    with _lock:
+        if _output is None:
+            return
+        try:
+            _output.write(line + '\n')
+            _output.flush()
+        except (IOError, OSError, ValueError) as e:
+            logging.debug("Unable to write trace: " + str(e))
+
+
+def span(name, **attributes):
+    """Returns a context manager timing the phase `name`.  Spans opened
+    inside it on the same thread become its children.
+
+    :param name: name of the phase
+    :type name: str
+    :param attributes: attributes to record with the span
+    :type attributes: dict
+    :rtype: Span
+    """
+
+    if _output is None:
+        return _NULL_SPAN
+    return Span(name, attributes)
+
+
+def enabled():
+    return _output is not None
+
+
+def enable(output=None):
+    """Starts writing spans to `output`, stderr by default
+
+    :param output: text stream to write the JSON lines to
+    :type output: file
+    """
+
+    global _output, _trace_id
+    with _lock:
+        _trace_id = binascii.hexlify(os.urandom(8)).decode('ascii')
+        _output = output or sys.stderr
+
+
+def disable():
+    global _output
+    with _lock:
+        _output = None
+
+
+def enable_from_environ():
+    """Enables tracing as requested by DCOS_QUOBYTE_TRACE
+
+    :returns: True if tracing was enabled
+    :rtype: bool
+    """
+
+    value = os.environ.get(TRACE_ENV, '')
+    if value in ('', '0'):
+        return False
+    if value in ('1', 'stderr'):
+        enable()
+        return True
+    try:
+        enable(open(value, 'a'))
+    except (IOError, OSError) as e:
+        logging.warning("Unable to open trace file " + value + ": " + str(e))
+        return False
+    return True
@@ -0,0 +1,133 @@
+"""Release negotiation and artifact prefetching
+
+Before start switches a framework to a release, the framework state is
+read, and a framework already running that release in a healthy state is
+left alone instead of being restarted.
+
+Prefetching asks a framework to have its agents pull the container images
+and artifacts of a release ahead of the switch, via /v1/prefetch with the
+release as body.  The framework answers 200 once the artifacts are in place
+and 202 while they are still being pulled; frameworks without the endpoint
+are switched without prefetching.
+"""
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import logging
+
+from dcos_quobyte import batch
+from dcos_quobyte import polling
+from dcos_quobyte import rolling
+from dcos_quobyte import trace
+
+PREFETCH_API_STRING = '/v1/prefetch'
+DEFAULT_PREFETCH_TIMEOUT = 900
+PREFETCH_PENDING = 202
+PREFETCH_UNSUPPORTED = (404, 405, 501)
+
+
+def is_current(state, release):
+    """Returns whether a framework state reports `release` and health, so
+    that starting `release` would be a no-op.  Unlike
+    rolling.is_converged(), a missing state is not current.
+
+    :param state: framework state document
+    :type state: dict | None
+    :param release: release to start
+    :type release: str
+    :rtype: bool
+    """
+
+    return state is not None and rolling.is_converged(state, release)
+
+
+def runs_release(host, release, get_state):
+    """Returns whether the framework at `host` already runs `release`.  A
+    framework whose state cannot be read does not.
+
+    :param get_state: function returning the state document of a framework
+                      URL, or None if the framework does not report one
+    :type get_state: function
+    :rtype: bool
+    """
+
+    from requests.exceptions import RequestException
+
+    try:
+        return is_current(get_state(host), str(release))
+    except (RequestException, ValueError) as e:
+        logging.debug("State of " + host + " unavailable: " + str(e))
+        return False
+
+
+def prefetch(host, release, client=None, timeout=DEFAULT_PREFETCH_TIMEOUT):
+    """Asks the framework at `host` to pull the artifacts of `release` and
+    waits until they are in place
+
+    :param host: framework URL
+    :type host: str
+    :param release: release to prefetch
+    :type release: str
+    :param client: framework API client, defaults to api.default_client()
+    :type client: api.FrameworkClient | None
+    :param timeout: seconds to wait for the prefetch at most
+    :type timeout: float
+    :returns: 0 on success or if the framework cannot prefetch, the status
+              code of a failed request, 1 on timeout, 2 if the framework
+              could not be reached
+    :rtype: int
+    """
+
+    from dcos_quobyte import api
+    from requests.exceptions import ConnectionError, Timeout
+
+    if release is None:
+        raise ValueError("No framework release specified, please provide"
+                         " --release=<a.b.c> option.")
+    client = client or api.default_client()
+    url = host.rstrip('/') + PREFETCH_API_STRING
+    codes = []
+
+    def check():
+        codes.append(client.get(url, data=str(release)).status_code)
+        return codes[-1] != PREFETCH_PENDING
+
+    with trace.span('prefetch', url=url) as span:
+        try:
+            done = polling.wait_for(check, timeout)
+        except (ConnectionError, Timeout) as e:
+            logging.error("Unable to connect to framework at " + host +
+                          "\nReason was: " + str(e))
+            return 2
+        span.set('polls', len(codes))
+        if not done:
+            logging.error("Framework at " + host + " did not prefetch "
+                          "release " + str(release) + " within " +
+                          str(timeout) + "s.")
+            return 1
+        if codes[-1] in PREFETCH_UNSUPPORTED:
+            logging.warning("Framework at " + host + " does not support "
+                            "prefetching, continuing without.")
+            return 0
+        if codes[-1] != 200:
+            logging.error("Error! Framework at " + host + " returned status "
+                          "code " + str(codes[-1]) + " for prefetch.")
+            return codes[-1]
+        logging.info("Framework at " + host + " prefetched release " +
+                     str(release) + ".")
+        return 0
+
+
+def prefetch_all(hosts, release, parallel=batch.DEFAULT_PARALLEL,
+                 timeout=DEFAULT_PREFETCH_TIMEOUT):
+    """Prefetches `release` on all `hosts` concurrently
+
+    :returns: one result per host, in the order of `hosts`
+    :rtype: [batch.Result]
+    """
+
+    def prefetch_one(host):
+        return prefetch(host, release, timeout=timeout)
+
+    with trace.span('prefetch_all', hosts=len(hosts)):
+        return batch.run(prefetch_one, hosts, parallel)
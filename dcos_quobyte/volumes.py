@@ -0,0 +1,332 @@
+"""Bulk provisioning of Quobyte volumes through the framework API
+
+A manifest lists volumes with their tenant and, optionally, their volume
+configuration and owner; fields set at its top level apply to every volume
+that does not set them itself:
+
+    {"tenant": "analytics", "configuration": "BASE",
+     "volumes": [{"name": "scratch-0001"}, {"name": "home", "user": "ann"}]}
+
+Volumes are created with PUT and deleted with DELETE of
+/v1/volumes/<tenant>/<name>, both idempotent, so requests are retried and
+an interrupted run can simply be repeated.  Requests go out in batches of
+batch_size, each sent concurrently over the pooled connections of the
+framework client.  A failed volume does not stop the others.  After every
+batch the finished volumes are appended to a journal, and a repeated run
+with the same journal skips them unless the other action was recorded for
+them later.  The journal is removed once every volume succeeded.
+"""
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import collections
+import json
+import logging
+import os
+import time
+
+from dcos_quobyte import trace
+from six.moves.urllib.parse import quote
+
+VOLUMES_API_STRING = '/v1/volumes'
+ACTIONS = ('create', 'delete')
+DEFAULT_BATCH_SIZE = 100
+JOURNAL_SUFFIX = '.journal'
+# an existing volume is created, a missing one is deleted
+DONE_CODES = {'create': (200, 201, 204, 409), 'delete': (200, 204, 404)}
+
+Volume = collections.namedtuple('Volume', ['tenant', 'name', 'configuration',
+                                           'user', 'group'])
+"""A volume of a manifest"""
+
+ItemResult = collections.namedtuple('ItemResult', ['volume', 'code',
+                                                   'status', 'error',
+                                                   'duration'])
+"""Outcome of one volume: exit code 0 or 1, HTTP status code if there was a
+response, error message and seconds taken"""
+
+_OPTIONAL_FIELDS = ('configuration', 'user', 'group')
+
+
+def key(volume):
+    """Returns the tenant/name identifying a volume
+
+    :type volume: Volume
+    :rtype: str
+    """
+
+    return volume.tenant + '/' + volume.name
+
+
+def parse_manifest(document):
+    """Returns the volumes of a manifest document
+
+    :param document: manifest, or a plain list of volumes
+    :type document: dict | list
+    :rtype: [Volume]
+    :raises: ValueError if a volume lacks its name or tenant, or is listed
+             twice
+    """
+
+    if isinstance(document, list):
+        document = {'volumes': document}
+    if not isinstance(document, dict) or not isinstance(
+            document.get('volumes'), list):
+        raise ValueError("A manifest needs a list of volumes")
+    volumes = []
+    seen = set()
+    for index, entry in enumerate(document['volumes']):
+        if not isinstance(entry, dict):
+            raise ValueError("Volume " + str(index) + " is no object")
+        tenant = entry.get('tenant', document.get('tenant'))
+        if not entry.get('name') or not tenant:
+            raise ValueError("Volume " + str(index) + " needs a name and a "
+                             "tenant")
+        volume = Volume(str(tenant), str(entry['name']), *[
+            entry.get(field, document.get(field))
+            for field in _OPTIONAL_FIELDS])
+        if key(volume) in seen:
+            raise ValueError("Volume " + key(volume) + " is listed twice")
+        seen.add(key(volume))
+        volumes.append(volume)
+    return volumes
+
+
+def load_manifest(path):
+    """Reads the volumes of the manifest at `path`
+
+    :rtype: [Volume]
+    :raises: ValueError if the file is no valid manifest
+    """
+
+    with open(path) as manifest_file:
+        try:
+            document = json.load(manifest_file)
+        except ValueError as e:
+            raise ValueError("Unable to parse manifest " + path + ": " +
+                             str(e))
+    return parse_manifest(document)
+
+
+def volume_url(host, volume):
+    return (host.rstrip('/') + VOLUMES_API_STRING + '/' +
+            quote(volume.tenant, safe='') + '/' +
+            quote(volume.name, safe=''))
+
+
+class Journal(object):
+    """Progress of a bulk run, as JSON lines of finished volumes
+
+    :param path: journal file
+    :type path: str
+    :param action: 'create' or 'delete'
+    :type action: str
+    """
+
+    def __init__(self, path, action):
+        self.path = path
+        self.action = action
+
+    def done(self):
+        """Returns the keys of the volumes the action succeeded for, and
+        that no later run of the other action changed again
+
+        :rtype: set
+        """
+
+        last = {}
+        try:
+            with open(self.path) as journal_file:
+                for line in journal_file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # the last line of an interrupted run may be cut off
+                        continue
+                    last[entry['volume']] = entry.get('action')
+        except IOError:
+            pass
+        return set(volume for volume, action in last.items()
+                   if action == self.action)
+
+    def record(self, results):
+        """Appends the volumes that succeeded
+
+        :type results: [ItemResult]
+        """
+
+        lines = [json.dumps({'action': self.action,
+                             'volume': key(result.volume)}) + '\n'
+                 for result in results if result.code == 0]
+        if not lines:
+            return
+        with open(self.path, 'a') as journal_file:
+            journal_file.write(''.join(lines))
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def _call(client, action, host, volume):
+    from requests.exceptions import RequestException
+
+    start = time.time()
+    url = volume_url(host, volume)
+    try:
+        if action == 'create':
+            body = dict((field, getattr(volume, field))
+                        for field in _OPTIONAL_FIELDS
+                        if getattr(volume, field) is not None)
+            r = client.request('PUT', url, data=json.dumps(body),
+                               headers={'Content-Type': 'application/json'})
+        else:
+            r = client.request('DELETE', url)
+    except RequestException as e:
+        return ItemResult(volume, 1, None, str(e), time.time() - start)
+    except Exception as e:
+        logging.debug("Request for volume " + key(volume) + " failed",
+                      exc_info=True)
+        return ItemResult(volume, 1, None, str(e) or type(e).__name__,
+                          time.time() - start)
+    if r.status_code in DONE_CODES[action]:
+        return ItemResult(volume, 0, r.status_code, None,
+                          time.time() - start)
+    return ItemResult(volume, 1, r.status_code, "status code " +
+                      str(r.status_code), time.time() - start)
+
+
+def provision(action, host, volumes, parallel, batch_size=DEFAULT_BATCH_SIZE,
+              journal=None, client=None):
+    """Creates or deletes `volumes`, skipping those `journal` has as done
+
+    :param action: 'create' or 'delete'
+    :type action: str
+    :param host: framework URL
+    :type host: str
+    :param volumes: volumes of the manifest
+    :type volumes: [Volume]
+    :param parallel: maximum number of concurrent requests
+    :type parallel: int
+    :param batch_size: volumes per batch
+    :type batch_size: int
+    :param journal: journal to resume from and record to
+    :type journal: Journal | None
+    :param client: framework API client, defaults to api.default_client()
+    :type client: api.FrameworkClient | None
+    :returns: results of the volumes sent, in manifest order
+    :rtype: [ItemResult]
+    """
+
+    import concurrent.futures
+    from dcos_quobyte import api
+
+    if action not in ACTIONS:
+        raise ValueError("Unknown volume action " + str(action))
+    if client is None:
+        client = (api.default_client() if parallel <= api.POOL_SIZE else
+                  api.FrameworkClient.from_environ(pool_size=parallel))
+    done = journal.done() if journal is not None else set()
+    pending = [volume for volume in volumes if key(volume) not in done]
+    if done:
+        logging.info("Skipping " + str(len(volumes) - len(pending)) +
+                     " volumes finished according to " + journal.path)
+
+    def call(volume):
+        return _call(client, action, host, volume)
+
+    results = []
+    with trace.span('volumes', action=action, volumes=len(pending)) as span:
+        with concurrent.futures.ThreadPoolExecutor(parallel) as pool:
+            for offset in range(0, len(pending), batch_size):
+                batch = list(pool.map(call,
+                                      pending[offset:offset + batch_size]))
+                if journal is not None:
+                    journal.record(batch)
+                results.extend(batch)
+                logging.info(action + " " + str(len(results)) + "/" +
+                             str(len(pending)) + " volumes, " +
+                             str(len(failures(results))) + " failed")
+        span.set('failed', len(failures(results)))
+    if journal is not None and not failures(results):
+        journal.remove()
+    return results
+
+
+def failures(results):
+    return [result for result in results if result.code != 0]
+
+
+def list_volumes(host, tenant=None, client=None):
+    """Returns the volumes the framework reports, optionally of one tenant
+
+    :rtype: [dict]
+    """
+
+    from dcos_quobyte import api
+
+    client = client or api.default_client()
+    params = {'tenant': tenant} if tenant else None
+    r = client.get(host.rstrip('/') + VOLUMES_API_STRING, params=params)
+    r.raise_for_status()
+    return r.json().get('volumes', [])
+
+
+def to_json(results):
+    """Returns a JSON serializable report with one entry per volume
+
+    :type results: [ItemResult]
+    :rtype: dict
+    """
+
+    return {'succeeded': len(results) - len(failures(results)),
+            'failed': len(failures(results)),
+            'volumes': [{'volume': key(result.volume), 'code': result.code,
+                         'status': result.status, 'error': result.error,
+                         'duration': round(result.duration, 3)}
+                        for result in results]}
+
+
+def format_report(action, results, skipped=0):
+    """Formats the failed volumes and a summary
+
+    :rtype: str
+    """
+
+    failed = failures(results)
+    lines = []
+    if failed:
+        width = max(len(key(result.volume)) for result in failed)
+        lines.extend("{0:<{1}}  failed ({2})".format(
+            key(result.volume), width, result.error) for result in failed)
+    lines.append(str(len(results) - len(failed)) + "/" + str(len(results)) +
+                 " volumes " + ("created" if action == 'create' else
+                                "deleted") +
+                 (", " + str(skipped) + " skipped as already done"
+                  if skipped else "") + ".")
+    return '\n'.join(lines)
+
+
+def format_table(entries):
+    """Formats volumes reported by the framework as a table
+
+    :param entries: volumes as returned by list_volumes()
+    :type entries: [dict]
+    :rtype: str
+    """
+
+    if not entries:
+        return "No volumes."
+    header = ('TENANT', 'NAME', 'CONFIGURATION')
+    rows = sorted(tuple(str(entry.get(field) or '') for field in
+                        ('tenant', 'name', 'configuration'))
+                  for entry in entries)
+    widths = [max(len(row[i]) for row in rows + [header])
+              for i in range(len(header))]
+    return '\n'.join('  '.join(value.ljust(width) for value, width
+                               in zip(row, widths)).rstrip()
+                     for row in [header] + rows)
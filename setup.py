@@ -72,7 +72,10 @@ setup(
     install_requires=[
         'docopt',
         'dcos',
+        'futures; python_version < "3"',
+        'jsonschema',
         'requests',
+        'six',
     ],
 
     # List additional groups of dependencies here (e.g. development
@@ -0,0 +1,258 @@
+"""Benchmarks of the dcos-quobyte command paths
+
+Runs framework discovery, build_url, start and stop against local stand-ins
+for the Mesos master and the Quobyte framework, and reports the p50/p99 wall
+time and the memory allocated per call.
+
+Usage:
+    bench_cli.py [--frameworks=<n>] [--latency=<ms>] [--iterations=<n>]
+                 [--output=<file>] [--baseline=<file>] [--tolerance=<pct>]
+                 [--scenario=<name>...]
+    bench_cli.py --list
+
+Options:
+    --baseline=<file>    Compare with the results of an earlier run and exit
+                         with status 1 if a p50 got slower than --tolerance
+    --frameworks=<n>     Comma separated numbers of frameworks registered with
+                         the master [default: 10,1000]
+    --iterations=<n>     Timed calls per scenario [default: 50]
+    --latency=<ms>       Response delay of the stand-in servers [default: 0]
+    --list               List the scenarios
+    --output=<file>      Where to save the results
+                         [default: tests/benchmark/results/latest.json]
+    --scenario=<name>    Only run the given scenarios
+    --tolerance=<pct>    Allowed p50 slowdown against --baseline in percent
+                         [default: 20]
+"""
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import collections
+import json
+import logging
+import math
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from docopt import docopt
+from servers import stand_ins
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+timer = getattr(time, 'perf_counter', time.time)
+
+ALLOCATION_ITERATIONS = 5
+RELEASE = '1.0'
+
+Scenario = collections.namedtuple('Scenario', ['name', 'call'])
+
+
+def _scenarios(cli, discovery, framework_url):
+    return [
+        Scenario('discovery-scan', lambda: cli.find_quobyte_framework(
+            discovery.CACHE_OFF)),
+        Scenario('discovery-cached', lambda: cli.find_quobyte_framework(
+            discovery.CACHE_USE)),
+        Scenario('build-url', lambda: cli.build_url(
+            cache_mode=discovery.CACHE_REFRESH)),
+        Scenario('start', lambda: cli.start(
+            framework_url, RELEASE, discovery.CACHE_OFF)),
+        Scenario('stop', lambda: cli.stop(
+            framework_url, discovery.CACHE_OFF)),
+        Scenario('start-discovered', lambda: cli.start(
+            None, RELEASE, discovery.CACHE_OFF)),
+    ]
+
+
+SCENARIO_NAMES = [scenario.name for scenario in _scenarios(None, None, None)]
+
+
+def percentile(samples, pct):
+    """Returns the nearest-rank percentile of `samples`
+
+    :param samples: measured values
+    :type samples: [float]
+    :param pct: percentile between 0 and 100
+    :type pct: float
+    :rtype: float
+    """
+
+    ordered = sorted(samples)
+    rank = max(0, int(math.ceil(len(ordered) * pct / 100.0)) - 1)
+    return ordered[rank]
+
+
+def measure_allocations(call):
+    """Returns the peak and the retained memory in KiB allocated by `call`,
+    as medians over a few calls, or (None, None) without tracemalloc.
+
+    :rtype: (float, float)
+    """
+
+    if tracemalloc is None:
+        return None, None
+    peaks = []
+    retained = []
+    for _ in range(ALLOCATION_ITERATIONS):
+        tracemalloc.start()
+        try:
+            call()
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        peaks.append(peak / 1024.0)
+        retained.append(current / 1024.0)
+    return percentile(peaks, 50), percentile(retained, 50)
+
+
+def run_scenario(scenario, frameworks, iterations):
+    # The first call pays for imports and connection setup, and warms the
+    # discovery cache for the cached scenario.
+    result = scenario.call()
+    if result is None or (isinstance(result, int) and result != 0):
+        raise RuntimeError(scenario.name + " failed with " + str(result))
+
+    samples = []
+    for _ in range(iterations):
+        start = timer()
+        scenario.call()
+        samples.append((timer() - start) * 1000.0)
+    peak, retained = measure_allocations(scenario.call)
+
+    return {
+        'scenario': scenario.name,
+        'frameworks': frameworks,
+        'iterations': iterations,
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p99_ms': round(percentile(samples, 99), 3),
+        'mean_ms': round(sum(samples) / len(samples), 3),
+        'peak_kib': None if peak is None else round(peak, 1),
+        'retained_kib': None if retained is None else round(retained, 1),
+    }
+
+
+def run(framework_counts, latency, iterations, names):
+    """Runs the selected scenarios for each number of frameworks
+
+    :rtype: [dict]
+    """
+
+    home = tempfile.mkdtemp(prefix='dcos-quobyte-bench-')
+    environ = dict(os.environ)
+    os.environ['HOME'] = home
+    os.environ['DCOS_CONFIG'] = os.path.join(home, 'dcos.toml')
+    # the stand-ins are not published in DNS, discovery scans the master
+    os.environ['DCOS_QUOBYTE_DNS_NAME'] = '0'
+    results = []
+    try:
+        from dcos_quobyte import cli, discovery
+
+        for frameworks in framework_counts:
+            with stand_ins(latency, frameworks) as (framework_url,
+                                                    master_url):
+                # A new configuration per run also gives the discovery cache
+                # a new cluster key.
+                with open(os.environ['DCOS_CONFIG'], 'w') as config:
+                    config.write('[core]\nmesos_master_url = "' +
+                                 master_url + '"\n')
+                for scenario in _scenarios(cli, discovery, framework_url):
+                    if names and scenario.name not in names:
+                        continue
+                    result = run_scenario(scenario, frameworks, iterations)
+                    print_result(result)
+                    results.append(result)
+    finally:
+        os.environ.clear()
+        os.environ.update(environ)
+        shutil.rmtree(home, ignore_errors=True)
+    return results
+
+
+def print_result(result):
+    allocations = ''
+    if result['peak_kib'] is not None:
+        allocations = "  peak {0:9.1f} KiB  retained {1:7.1f} KiB".format(
+            result['peak_kib'], result['retained_kib'])
+    print("{0:<18} {1:>6} frameworks  p50 {2:8.2f} ms  p99 {3:8.2f} ms{4}"
+          .format(result['scenario'], result['frameworks'],
+                  result['p50_ms'], result['p99_ms'], allocations))
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            stderr=subprocess.STDOUT).decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save(path, results, latency):
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(path, 'w') as results_file:
+        json.dump({'timestamp': time.time(),
+                   'revision': _git_revision(),
+                   'python': platform.python_version(),
+                   'latency_ms': latency * 1000.0,
+                   'results': results}, results_file, indent=2,
+                  sort_keys=True)
+    print("Results saved to " + path)
+
+
+def compare(baseline_path, results, tolerance):
+    """Prints the p50 changes against an earlier run
+
+    :returns: number of scenarios that got slower than `tolerance` percent
+    :rtype: int
+    """
+
+    with open(baseline_path) as baseline_file:
+        baseline = dict(((entry['scenario'], entry['frameworks']), entry)
+                        for entry in json.load(baseline_file)['results'])
+    regressions = 0
+    print("\nChanges against " + baseline_path)
+    for result in results:
+        before = baseline.get((result['scenario'], result['frameworks']))
+        if before is None or not before['p50_ms']:
+            continue
+        change = 100.0 * (result['p50_ms'] / before['p50_ms'] - 1)
+        slower = change > tolerance
+        regressions += slower
+        print("{0:<18} {1:>6} frameworks  p50 {2:+7.1f}%{3}".format(
+            result['scenario'], result['frameworks'], change,
+            "  REGRESSION" if slower else ""))
+    return regressions
+
+
+def main():
+    args = docopt(__doc__)
+    if args['--list']:
+        print('\n'.join(SCENARIO_NAMES))
+        return 0
+    unknown = set(args['--scenario']) - set(SCENARIO_NAMES)
+    if unknown:
+        print("Unknown scenarios: " + ", ".join(sorted(unknown)))
+        return 1
+
+    latency = float(args['--latency']) / 1000.0
+    results = run([int(n) for n in args['--frameworks'].split(',')],
+                  latency, int(args['--iterations']), args['--scenario'])
+    save(args['--output'], results, latency)
+    if args['--baseline'] and compare(args['--baseline'], results,
+                                      float(args['--tolerance'])):
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING)
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""Local stand-ins for the Mesos master and the Quobyte framework API
+
+Both servers run in a child process, so that their threads neither compete
+with the benchmarked code for the GIL nor show up in its allocations.
+"""
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import contextlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, 'dcos-quobyte'))
+import httpstub  # noqa: E402
+
+QUOBYTE_FRAMEWORK_NAME = 'quobyte'
+TASKS_PER_FRAMEWORK = 3
+
+
+def master_state(frameworks, quobyte_url):
+    """Builds a master state document with `frameworks` frameworks, the last
+    of which is the Quobyte framework serving at `quobyte_url`.
+
+    :param frameworks: total number of frameworks
+    :type frameworks: int
+    :param quobyte_url: webui_url of the Quobyte framework
+    :type quobyte_url: str
+    :rtype: dict
+    """
+
+    entries = []
+    for i in range(frameworks):
+        quobyte = i == frameworks - 1
+        framework_id = '20151001-000000-0000-' + str(i).zfill(4)
+        entries.append({
+            'id': framework_id,
+            'name': QUOBYTE_FRAMEWORK_NAME if quobyte else 'app-' + str(i),
+            'role': '*',
+            'active': True,
+            'hostname': 'agent-' + str(i % 50) + '.example.com',
+            'webui_url': quobyte_url if quobyte else
+            'http://agent-' + str(i % 50) + '.example.com:' + str(20000 + i),
+            'user': 'root',
+            'resources': {'cpus': 1.5, 'mem': 2048.0, 'disk': 4096.0},
+            'tasks': [{
+                'id': framework_id + '-task-' + str(j),
+                'name': 'task-' + str(j),
+                'state': 'TASK_RUNNING',
+                'slave_id': 'S' + str((i + j) % 50),
+                'framework_id': framework_id,
+                'resources': {'cpus': 0.5, 'mem': 512.0},
+                'statuses': [{'state': 'TASK_RUNNING',
+                              'timestamp': 1443657600.0 + j}],
+            } for j in range(TASKS_PER_FRAMEWORK)],
+            'completed_tasks': [],
+        })
+    return {
+        'version': '0.24.1',
+        'leader': 'master@127.0.0.1:5050',
+        'frameworks': entries,
+        'completed_frameworks': [],
+        'slaves': [{'id': 'S' + str(i),
+                    'hostname': 'agent-' + str(i) + '.example.com',
+                    'pid': 'slave(1)@10.0.0.' + str(i) + ':5051'}
+                   for i in range(50)],
+    }
+
+
+class _Handler(httpstub.Handler):
+    # Headers and body are written separately, which would otherwise add
+    # the delayed ACK timeout of the client to every response.
+    disable_nagle_algorithm = True
+
+    def _respond(self):
+        self.read_body()
+        time.sleep(self.server.latency)
+        body = self.server.routes.get(self.path.split('?')[0])
+        if body is None:
+            self.respond(404)
+        else:
+            self.respond(200, body, 'application/json')
+
+    do_GET = _respond
+    do_POST = _respond
+
+
+def _serve(latency, frameworks, ports):
+    framework = httpstub.start(_Handler, latency=latency, routes={
+        '/v1/version': b'{"version": "1.0"}'})
+    quobyte_url = httpstub.url(framework)
+
+    master = httpstub.start(_Handler, latency=latency, routes={
+        '/master/state.json': json.dumps(
+            master_state(frameworks, quobyte_url)).encode('utf-8')})
+    ports.put((quobyte_url, httpstub.url(master) + '/'))
+    while True:
+        time.sleep(3600)
+
+
+@contextlib.contextmanager
+def stand_ins(latency=0.0, frameworks=100):
+    """Runs a mock Quobyte framework and a mock Mesos master
+
+    :param latency: seconds each server waits before answering a request
+    :type latency: float
+    :param frameworks: number of frameworks registered with the master
+    :type frameworks: int
+    :returns: URLs of the framework API and of the master
+    :rtype: context manager yielding (str, str)
+    """
+
+    ports = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_serve,
+                                      args=(latency, frameworks, ports))
+    process.daemon = True
+    process.start()
+    try:
+        yield ports.get(timeout=60)
+    finally:
+        process.terminate()
+        process.join()
@@ -0,0 +1,96 @@
+"""Local HTTP stand-ins for the framework API and the Mesos master
+
+Tests subclass Handler with the do_<METHOD> methods they need and start a
+server per test with serve(), which stops it again in the test's cleanups.
+"""
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import threading
+
+from six.moves import BaseHTTPServer, socketserver
+
+POLL_INTERVAL = 0.05
+
+
+class Server(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def read_body(self):
+        """Reads the request body
+
+        :rtype: bytes
+        """
+
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def respond(self, status, body=b'', content_type=None):
+        """Sends a response with a Content-Length delimited body
+
+        :type status: int
+        :type body: bytes
+        :type content_type: str | None
+        """
+
+        self.send_response(status)
+        if content_type is not None:
+            self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start(handler, **attributes):
+    """Starts a server on a free local port in a daemon thread
+
+    :param handler: request handler class
+    :type handler: type
+    :param attributes: set on the server for the handler to use
+    :rtype: Server
+    """
+
+    server = Server(('127.0.0.1', 0), handler)
+    for name, value in attributes.items():
+        setattr(server, name, value)
+    thread = threading.Thread(target=server.serve_forever,
+                              args=(POLL_INTERVAL,))
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+def url(server):
+    """Returns the base URL of `server`
+
+    :type server: Server
+    :rtype: str
+    """
+
+    return 'http://127.0.0.1:' + str(server.server_address[1])
+
+
+def serve(test_case, handler, **attributes):
+    """Starts a server for the duration of `test_case`
+
+    :type test_case: unittest.TestCase
+    :param handler: request handler class
+    :type handler: type
+    :param attributes: set on the server for the handler to use
+    :returns: the server and its base URL
+    :rtype: (Server, str)
+    """
+
+    server = start(handler, **attributes)
+    test_case.addCleanup(server.server_close)
+    test_case.addCleanup(server.shutdown)
+    return server, url(server)
@@ -0,0 +1,175 @@
+""" Unit tests for the dcos-quobyte asyncio backend """
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import sys
+import unittest
+
+import httpstub
+import mock
+
+from dcos_quobyte import api
+from dcos_quobyte import batch
+from dcos_quobyte import cli
+from dcos_quobyte import rolling
+
+if sys.version_info >= (3, 5):
+    import asyncio
+    from dcos_quobyte import aio
+
+
+class _Handler(httpstub.Handler):
+
+    def setup(self):
+        httpstub.Handler.setup(self)
+        self.server.connections += 1
+
+    def do_GET(self):
+        self.server.bodies.append(self.read_body())
+        responses = self.server.routes.get(self.path, [(404, b'')])
+        status, content = responses.pop(0) if len(responses) > 1 \
+            else responses[0]
+        if self.path != '/chunked':
+            return self.respond(status, content)
+        self.send_response(status)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for part in (content[:3], content[3:]):
+            self.wfile.write(('%x\r\n' % len(part)).encode('ascii') +
+                             part + b'\r\n')
+        self.wfile.write(b'0\r\n\r\n')
+
+
+@unittest.skipIf(sys.version_info < (3, 5), "asyncio backend needs 3.5")
+class dcos_quobyte_aio_test (unittest.TestCase):
+
+    def setUp(self):
+        print("\n------- Testing method " + self._testMethodName)
+        routes = {
+            '/v1/version': [(200, b'')],
+            '/v1/state': [(200, b'{"release": "2.0", "healthy": true}')],
+            '/chunked': [(200, b'{"chunked": true}')],
+            '/flaky': [(503, b''), (200, b'ok')]}
+        self.server, self.url = httpstub.serve(self, _Handler, connections=0,
+                                               bodies=[], routes=routes)
+        sleep_patcher = mock.patch.object(api, 'backoff_delay',
+                                          return_value=0)
+        sleep_patcher.start()
+        self.addCleanup(sleep_patcher.stop)
+
+    def _run(self, coroutine_function):
+        loop = asyncio.new_event_loop()
+        client = aio.AsyncHTTPClient(timeout=(1, 2), retries=2)
+        try:
+            return loop.run_until_complete(coroutine_function(client)), \
+                client
+        finally:
+            client.close()
+            loop.close()
+
+    def test_keep_alive(self):
+        async def requests(client):
+            return [(await client.get(self.url + path)).status_code
+                    for path in ('/v1/version', '/v1/state', '/missing')]
+
+        codes, client = self._run(requests)
+
+        self.assertEqual([200, 200, 404], codes)
+        self.assertEqual(1, client.connections_opened)
+        self.assertEqual(1, self.server.connections)
+
+    def test_chunked_and_retry(self):
+        async def requests(client):
+            chunked = await client.get(self.url + '/chunked')
+            flaky = await client.get(self.url + '/flaky')
+            return chunked.json(), flaky.status_code
+
+        (document, status), _ = self._run(requests)
+
+        self.assertEqual({'chunked': True}, document)
+        self.assertEqual(200, status)
+
+    def test_framework_call_not_resent(self):
+        async def call(client):
+            return await aio.framework_call(client, self.url, '/flaky')
+
+        code, _ = self._run(call)
+
+        self.assertEqual(503, code)
+        self.assertEqual(1, len(self.server.bodies))
+
+    def test_connection_refused(self):
+        self.server.server_close()
+
+        async def call(client):
+            return await aio.framework_call(client, self.url, '/v1/version')
+
+        code, _ = self._run(call)
+        self.assertEqual(2, code)
+
+    @mock.patch.object(api, 'default_client',
+                       return_value=api.FrameworkClient(retries=0))
+    def test_run_batch(self, mock_default_client):
+        hosts = [self.url, self.url + '/', 'http://127.0.0.1:1']
+
+        results = aio.run_batch('start', hosts, parallel=2, release='2.0')
+
+        self.assertEqual(hosts, [result.host for result in results])
+        self.assertEqual([0, 0, 2], [result.code for result in results])
+        self.assertEqual([b'2.0', b'2.0'], self.server.bodies)
+
+    @mock.patch.object(api, 'default_client',
+                       return_value=api.FrameworkClient(retries=0))
+    def test_run_batch_negotiate(self, mock_default_client):
+        results = aio.run_batch('start', [self.url], release='2.0',
+                                negotiate=True)
+
+        self.assertEqual(0, results[0].code)
+        self.assertEqual([b''], self.server.bodies)
+
+        results = aio.run_batch('start', [self.url], release='3.0',
+                                negotiate=True)
+
+        self.assertEqual(0, results[0].code)
+        self.assertEqual([b'', b'', b'3.0'], self.server.bodies)
+
+    def test_run_batch_without_release(self):
+        self.assertRaises(ValueError, aio.run_batch, 'start', [self.url])
+
+    def test_upgrade_wave(self):
+        results = aio.upgrade_wave([self.url], '2.0', timeout=5)
+
+        self.assertEqual(0, results[0].code)
+
+        results = aio.upgrade_wave([self.url], '3.0', timeout=0)
+        self.assertEqual(1, results[0].code)
+        self.assertIn('did not converge', results[0].error)
+
+    def test_rolling_upgrade_run_wave(self):
+        run_wave = mock.Mock(side_effect=lambda wave: aio.upgrade_wave(
+            wave, '2.0', 5))
+
+        results = rolling.rolling_upgrade([self.url, self.url], '2.0', None,
+                                          None, window=1, run_wave=run_wave)
+
+        self.assertEqual([0, 0], [result.code for result in results])
+        self.assertEqual(2, run_wave.call_count)
+
+    @mock.patch.object(cli, 'print')
+    @mock.patch.dict('os.environ', {api.BACKEND_ENV: 'asyncio'})
+    def test_cli_run_batch(self, mock_cli_print):
+        with mock.patch.object(aio, 'run_batch', return_value=[
+                batch.Result('http://a:1', 0, None, 0.1)]) as mock_run:
+            self.assertEqual(0, cli.run_batch(cli.stop, ['http://a:1'], 5,
+                                              cache_mode='use'))
+        mock_run.assert_called_once_with('stop', ['http://a:1'], 5, None,
+                                         False)
+
+    @mock.patch.dict('os.environ', {api.BACKEND_ENV: 'asyncio'})
+    def test_backend(self):
+        self.assertEqual(api.BACKEND_ASYNCIO, api.backend())
+        with mock.patch.dict('os.environ', {api.BACKEND_ENV: 'bogus'}):
+            self.assertEqual(api.BACKEND_THREADS, api.backend())
+
+if __name__ == '__main__':
+    unittest.main()
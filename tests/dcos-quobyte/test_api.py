@@ -0,0 +1,110 @@
+""" Unit tests for the dcos-quobyte framework API client """
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import os
+import unittest
+
+import mock
+import requests
+from requests.exceptions import ConnectionError, ConnectTimeout, ReadTimeout
+
+from dcos_quobyte import api
+
+
+class dcos_quobyte_api_test (unittest.TestCase):
+
+    def setUp(self):
+        print("\n------- Testing method " + self._testMethodName)
+        sleep_patcher = mock.patch.object(api.time, 'sleep')
+        self.mock_sleep = sleep_patcher.start()
+        self.addCleanup(sleep_patcher.stop)
+        self.client = api.FrameworkClient(connect_timeout=1, read_timeout=2,
+                                          retries=2)
+
+    @mock.patch.object(requests.Session, 'request')
+    def test_get_uses_timeouts(self, mock_request):
+        mock_request.return_value.status_code = requests.codes.ok
+
+        self.client.get('http://test.adr:1234/v1/version', data='1.0')
+
+        mock_request.assert_called_once_with(
+            'GET', 'http://test.adr:1234/v1/version', data='1.0',
+            timeout=(1, 2))
+
+    @mock.patch.object(requests.Session, 'request')
+    def test_retry_connection_error(self, mock_request):
+        ok = mock.Mock(status_code=requests.codes.ok)
+        mock_request.side_effect = [ConnectionError, ok]
+
+        self.assertIs(ok, self.client.get('http://test.adr:1234/'))
+        self.assertEqual(2, mock_request.call_count)
+        self.assertEqual(1, self.mock_sleep.call_count)
+
+    @mock.patch.object(requests.Session, 'request')
+    def test_retry_status_exhausted(self, mock_request):
+        mock_request.return_value.status_code = 503
+
+        response = self.client.get('http://test.adr:1234/')
+
+        self.assertEqual(503, response.status_code)
+        self.assertEqual(3, mock_request.call_count)
+
+    @mock.patch.object(requests.Session, 'request',
+                       side_effect=ConnectionError)
+    def test_no_retry_for_post(self, mock_request):
+        self.assertRaises(ConnectionError, self.client.request, 'POST',
+                          'http://test.adr:1234/')
+        self.assertEqual(1, mock_request.call_count)
+
+    @mock.patch.object(requests.Session, 'request')
+    def test_side_effects_retried_before_connecting(self, mock_request):
+        ok = mock.Mock(status_code=requests.codes.ok)
+        mock_request.side_effect = [ConnectTimeout, ok]
+
+        self.assertIs(ok, self.client.get('http://test.adr:1234/',
+                                          idempotent=False))
+        self.assertEqual(2, mock_request.call_count)
+
+        for outcome in (ReadTimeout, ConnectionError,
+                        mock.Mock(status_code=503)):
+            mock_request.reset_mock()
+            mock_request.side_effect = [outcome, ok]
+            try:
+                self.client.get('http://test.adr:1234/', idempotent=False)
+            except (ReadTimeout, ConnectionError):
+                pass
+            self.assertEqual(1, mock_request.call_count)
+
+    def test_connect_failed(self):
+        try:
+            requests.get('http://127.0.0.1:1/', timeout=1)
+        except ConnectionError as e:
+            refused = e
+        self.assertTrue(api.connect_failed(refused))
+        self.assertTrue(api.connect_failed(ConnectTimeout()))
+        self.assertFalse(api.connect_failed(ReadTimeout()))
+        self.assertFalse(api.connect_failed(ConnectionError("reset")))
+
+    def test_backoff_delay_bounds(self):
+        for attempt in range(10):
+            delay = api.backoff_delay(attempt)
+            self.assertTrue(0 <= delay <= api.BACKOFF_CAP)
+            self.assertTrue(delay <= api.BACKOFF_BASE * 2 ** attempt)
+
+    @mock.patch.dict(os.environ, {api.CONNECT_TIMEOUT_ENV: '0.5',
+                                  api.READ_TIMEOUT_ENV: '7',
+                                  api.RETRIES_ENV: '0',
+                                  api.KEEP_ALIVE_ENV: '0'})
+    def test_from_environ(self):
+        client = api.FrameworkClient.from_environ()
+
+        self.assertEqual((0.5, 7.0), client.timeout)
+        self.assertEqual(0, client.retries)
+        self.assertEqual('close', client.session.headers['Connection'])
+
+    def test_default_client_is_shared(self):
+        self.assertIs(api.default_client(), api.default_client())
+
+if __name__ == '__main__':
+    unittest.main()
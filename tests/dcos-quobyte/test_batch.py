@@ -0,0 +1,77 @@
+""" Unit tests for dcos-quobyte batch operations """
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import mock
+
+from dcos_quobyte import batch
+
+
+class dcos_quobyte_batch_test (unittest.TestCase):
+
+    def setUp(self):
+        print("\n------- Testing method " + self._testMethodName)
+
+    def test_parse_hosts(self):
+        self.assertEqual(['http://a:1', 'http://b:2'],
+                         batch.parse_hosts(' http://a:1,,http://b:2 '))
+
+    def test_load_targets(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        path = os.path.join(tmp_dir, 'targets')
+        with open(path, 'w') as targets_file:
+            targets_file.write('# tier 1\nhttp://a:1\n\n  http://b:2  \n')
+
+        self.assertEqual(['http://a:1', 'http://b:2'],
+                         batch.load_targets(path))
+
+    def test_run_concurrently(self):
+        hosts = ['http://a:1', 'http://b:2', 'http://c:3']
+        barrier = threading.Event()
+        started = []
+
+        def operation(host):
+            started.append(host)
+            if len(started) == len(hosts):
+                barrier.set()
+            # only returns if all operations run at the same time
+            self.assertTrue(barrier.wait(5))
+            return 0
+
+        results = batch.run(operation, hosts, parallel=3)
+
+        self.assertEqual(hosts, [result.host for result in results])
+        self.assertEqual([0, 0, 0], [result.code for result in results])
+
+    def test_run_keeps_going_on_errors(self):
+        def operation(host):
+            if host == 'bad':
+                raise ValueError('boom')
+            return 500 if host == 'error' else 0
+
+        results = batch.run(operation, ['bad', 'error', 'good'], parallel=2)
+
+        self.assertEqual([1, 500, 0], [result.code for result in results])
+        self.assertEqual('boom', results[0].error)
+
+    def test_run_no_hosts(self):
+        self.assertRaises(ValueError, batch.run, mock.Mock(), [])
+
+    @mock.patch.object(batch, 'print')
+    def test_report(self, mock_print):
+        results = [batch.Result('http://a:1', 0, None, 0.1),
+                   batch.Result('http://b:2', 500, None, 0.2)]
+
+        self.assertEqual(1, batch.report(results))
+        mock_print.assert_called_with('1/2 targets succeeded.')
+        self.assertEqual(0, batch.report(results[:1]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+""" Unit tests for the dcos-quobyte Python API """
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import unittest
+
+import mock
+
+from dcos_quobyte import cli
+from dcos_quobyte import client
+from dcos_quobyte import discovery
+from dcos_quobyte import monitor
+
+
+class dcos_quobyte_client_test (unittest.TestCase):
+
+    def setUp(self):
+        print("\n------- Testing method " + self._testMethodName)
+
+    @mock.patch.object(cli, 'stop', return_value=0)
+    @mock.patch.object(cli, 'start', return_value=0)
+    @mock.patch.object(cli, 'find_quobyte_framework',
+                       return_value='http://a:1/')
+    def test_discovers_once(self, mock_find, mock_start, mock_stop):
+        quobyte = client.QuobyteClient()
+
+        quobyte.start('1.0')
+        quobyte.stop()
+
+        mock_find.assert_called_once_with(discovery.CACHE_USE)
+        mock_start.assert_called_once_with('http://a:1', '1.0',
+                                           negotiate=True, prefetch=False)
+        mock_stop.assert_called_once_with('http://a:1')
+
+    @mock.patch.object(cli, 'start', side_effect=[2, 0])
+    @mock.patch.object(cli, 'find_quobyte_framework',
+                       side_effect=['http://old:1', 'http://new:2'])
+    def test_rediscovers_after_connection_failure(self, mock_find,
+                                                  mock_start):
+        quobyte = client.QuobyteClient()
+
+        quobyte.start('1.0')
+
+        self.assertEqual('http://new:2', quobyte.host)
+        mock_find.assert_called_with(discovery.CACHE_REFRESH)
+        mock_start.assert_called_with('http://new:2', '1.0', negotiate=True,
+                                      prefetch=False)
+
+    @mock.patch.object(cli, 'find_quobyte_framework')
+    @mock.patch.object(cli, 'stop', return_value=500)
+    def test_failure_raises(self, mock_stop, mock_find):
+        quobyte = client.QuobyteClient('http://a:1/')
+
+        with self.assertRaises(client.QuobyteError) as context:
+            quobyte.stop()
+        self.assertEqual(500, context.exception.code)
+        self.assertFalse(mock_find.called)
+
+    @mock.patch.object(cli, 'wait_operation', return_value=1)
+    @mock.patch.object(cli, 'start', return_value=0)
+    def test_start_wait_timeout(self, mock_start, mock_wait_operation):
+        quobyte = client.QuobyteClient('http://a:1')
+
+        self.assertRaises(client.QuobyteError, quobyte.start, '1.0',
+                          wait=True, timeout=5)
+        mock_wait_operation.assert_called_once_with('start', ['http://a:1'],
+                                                    5)
+
+    @mock.patch.object(cli, 'dcos_client')
+    @mock.patch.object(discovery, 'fetch_framework_tasks', return_value=[])
+    @mock.patch.object(monitor.StateFetcher, '__call__',
+                       return_value={'release': '1.0', 'healthy': True})
+    def test_status_keeps_clients(self, mock_fetch_state, mock_fetch_tasks,
+                                  mock_dcos_client):
+        quobyte = client.QuobyteClient('http://a:1')
+
+        self.assertEqual('1.0', quobyte.status()['release'])
+        quobyte.status()
+
+        mock_dcos_client.assert_called_once_with()
+        self.assertEqual(2, mock_fetch_tasks.call_count)
+
+if __name__ == '__main__':
+    unittest.main()
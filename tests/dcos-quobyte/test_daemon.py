@@ -0,0 +1,105 @@
+""" Unit tests for the dcos-quobyte daemon """
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+
+import mock
+
+from dcos_quobyte import cli
+from dcos_quobyte import client
+from dcos_quobyte import daemon
+from dcos_quobyte import monitor
+from test_dcos_quobyte import _main_args
+
+
+@unittest.skipUnless(hasattr(socket, 'AF_UNIX'), "needs Unix sockets")
+class dcos_quobyte_daemon_test (unittest.TestCase):
+
+    def setUp(self):
+        print("\n------- Testing method " + self._testMethodName)
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        self.path = os.path.join(tmp_dir, 'daemon.sock')
+        self.server = daemon.Daemon(self.path)
+        thread = threading.Thread(target=self.server.serve_forever,
+                                  args=(0.05,))
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    @mock.patch.object(client.QuobyteClient, 'start')
+    def test_start(self, mock_start):
+        response = daemon.call(self.path, {'command': 'start',
+                                           'host': 'http://a:1',
+                                           'release': '1.0', 'wait': True,
+                                           'timeout': 30, 'force': True})
+
+        self.assertEqual({'code': 0, 'output': '', 'error': None}, response)
+        mock_start.assert_called_once_with('1.0', True, 30, force=True,
+                                           prefetch=False)
+
+    @mock.patch.object(client.QuobyteClient, 'stop',
+                       side_effect=client.QuobyteError('stop failed', 500))
+    def test_failure(self, mock_stop):
+        response = daemon.call(self.path, {'command': 'stop', 'host': None})
+
+        self.assertEqual(500, response['code'])
+        self.assertEqual('stop failed', response['error'])
+
+    @mock.patch.object(client.QuobyteClient, 'status',
+                       return_value={'framework': 'http://a:1',
+                                     'release': '1.0', 'healthy': True,
+                                     'tasks': {}})
+    def test_status_reuses_client(self, mock_status):
+        for _ in range(2):
+            response = daemon.call(self.path, {'command': 'status',
+                                               'host': 'http://a:1'})
+            self.assertEqual(0, response['code'])
+        self.assertIn('Release    1.0', response['output'])
+        self.assertIs(self.server.client('http://a:1'),
+                      self.server.client('http://a:1'))
+
+    def test_unsupported_command(self):
+        response = daemon.call(self.path, {'command': 'upgrade'})
+
+        self.assertEqual(1, response['code'])
+
+    def test_serve_refuses_second_daemon(self):
+        self.assertEqual(1, daemon.serve(self.path))
+
+    @mock.patch.object(cli, 'print')
+    @mock.patch.object(cli, 'status')
+    @mock.patch.object(monitor, 'format_table', return_value='table')
+    @mock.patch.object(client.QuobyteClient, 'status', return_value={})
+    @mock.patch("dcos_quobyte.cli.docopt",
+                return_value=_main_args({'status': True,
+                                         '--host': 'http://a:1'}))
+    def test_cli_forwards(self, mock_docopt_docopt, mock_status,
+                          mock_format_table, mock_cli_status,
+                          mock_cli_print):
+        with mock.patch.dict(os.environ, {daemon.SOCKET_ENV: self.path}):
+            self.assertEqual(0, cli.main())
+        self.assertFalse(mock_cli_status.called)
+        mock_cli_print.assert_called_once_with('table')
+
+    @mock.patch.object(cli, 'stop', return_value=0)
+    @mock.patch("dcos_quobyte.cli.docopt",
+                return_value=_main_args({'stop': True, '--force': True}))
+    def test_cli_runs_locally_without_daemon(self, mock_docopt_docopt,
+                                             mock_cli_stop):
+        missing = self.path + '.missing'
+        with mock.patch.dict(os.environ, {daemon.SOCKET_ENV: missing}):
+            self.assertEqual(0, cli.main())
+        mock_cli_stop.assert_called_once_with(host=None, cache_mode='use',
+                                              ordered=False, batch_size=10,
+                                              timeout=600.0)
+
+if __name__ == '__main__':
+    unittest.main()
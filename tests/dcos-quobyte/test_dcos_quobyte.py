@@ -2,23 +2,120 @@
 
 from __future__ import print_function
 from __future__ import unicode_literals
+import json
 import unittest
 import mock
 from mock.mock import ANY
 import six
 
+from dcos_quobyte import api
+from dcos_quobyte import batch
 from dcos_quobyte import cli
 from dcos_quobyte.cli import docopt
 from dcos_quobyte import constants
+from dcos_quobyte import discovery
+from dcos_quobyte import monitor
+from dcos_quobyte import operations
+from dcos_quobyte import trace
+from dcos_quobyte import versions
 from dcos import mesos
 import requests
-from requests.exceptions import ConnectionError
+from requests.exceptions import ConnectionError, ConnectTimeout, Timeout
+
+
+def _framework(name, webui_url, framework_id=None, active=True):
+    return discovery.Framework(id=framework_id or name + '-id', name=name,
+                               role='*', webui_url=webui_url,
+                               hostname=None, active=active)
+
+
+MAIN_ARGS = {'-h': False,
+             '--help': False,
+             '--info': False,
+             'start': False,
+             'stop': False,
+             'upgrade': False,
+             '--config-schema': False,
+             '--host': None,
+             '--release': None,
+             '--refresh': False,
+             '--no-cache': False,
+             '--hosts': None,
+             '--targets': None,
+             '--all': False,
+             '--parallel': '10',
+             '--window': '1',
+             '--max-failures': '0',
+             '--timeout': '600',
+             'status': False,
+             '--json': False,
+             '--watch': False,
+             '--interval': '2',
+             '--trace': False,
+             '--wait': False,
+             '--async': False,
+             'wait': False,
+             '<operation-id>': None,
+             'daemon': False,
+             '--socket': None,
+             'inventory': False,
+             '--csv': False,
+             'logs': False,
+             '--follow': False,
+             '--tail': '4096',
+             'metrics': False,
+             '--samples': '1',
+             '--prometheus': False,
+             '--force': False,
+             '--prefetch': False,
+             'apply': False,
+             '--file': None,
+             '--dry-run': False,
+             'bench-api': False,
+             '--operation': 'state',
+             '--concurrency': '10',
+             '--rate': '0',
+             '--duration': '10',
+             '--requests': None,
+             'volumes': False,
+             'list': False,
+             'create': False,
+             'delete': False,
+             '--batch-size': None,
+             '--journal': None,
+             '--tenant': None,
+             'preflight': False,
+             '--preflight': False,
+             '--agent-timeout': '10',
+             'plan': False,
+             '--domain': None,
+             '--output': None}
+
+
+def _main_args(overrides=None):
+    args = dict(MAIN_ARGS)
+    args.update(overrides or {})
+    return args
 
 
 class dcos_quobyte_cli_test (unittest.TestCase):
 
     def setUp(self):
         print("\n------- Testing method " + self._testMethodName)
+        cluster_key_patcher = mock.patch.object(discovery, 'cluster_key',
+                                                return_value=None)
+        cluster_key_patcher.start()
+        self.addCleanup(cluster_key_patcher.stop)
+        dns_patcher = mock.patch.object(discovery, 'resolve_dns_url',
+                                        return_value=None)
+        dns_patcher.start()
+        self.addCleanup(dns_patcher.stop)
+        self.client = api.FrameworkClient()
+        for patcher in (mock.patch.object(api, 'default_client',
+                                          return_value=self.client),
+                        mock.patch.object(api.time, 'sleep')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
 
     @mock.patch.object(cli, 'print')
     def test_info(self, mock_cli):
@@ -26,7 +123,7 @@ class dcos_quobyte_cli_test (unittest.TestCase):
         cli.info()
         mock_cli.assert_called_once_with(cli.INFO_STRING)
 
-    @mock.patch.object(requests, 'get')
+    @mock.patch.object(requests.Session, 'request')
     def test_start(self, mock_requests):
         test_url = "http://test.master.adr:1234"
         test_release = "0.0.0"
@@ -35,9 +132,11 @@ class dcos_quobyte_cli_test (unittest.TestCase):
         result_code = cli.start(test_url, test_release)
         print ("Test result is " + str(result_code))
 
-        mock_requests.assert_called_once_with("http://test.master.adr:1234"
+        mock_requests.assert_called_once_with("GET",
+                                              "http://test.master.adr:1234"
                                               "/v1/version",
-                                              data='0.0.0')
+                                              data='0.0.0',
+                                              timeout=self.client.timeout)
         self.assertEquals(0, result_code)
 
     def test_start_no_release(self):
@@ -46,15 +145,31 @@ class dcos_quobyte_cli_test (unittest.TestCase):
 
         self.assertRaises(ValueError, cli.start, test_url, test_release)
 
-    @mock.patch.object(requests, 'get', side_effect=ConnectionError)
+    @mock.patch.object(requests.Session, 'request',
+                       side_effect=ConnectionError)
     def test_start_connection_error(self, mock_requests):
         test_url = "http://test.master.adr:1234"
         test_release = "0.0.0"
 
         self.assertEqual(2, cli.start(test_url, test_release),
                          "Wrong exit value on ConnectionError test.")
+        # the command may have reached the framework, it is not resent
+        self.assertEqual(1, mock_requests.call_count)
 
-    @mock.patch.object(requests, 'get')
+    @mock.patch.object(requests.Session, 'request', side_effect=ConnectTimeout)
+    def test_start_connect_timeout(self, mock_requests):
+        self.assertEqual(2, cli.start("http://test.master.adr:1234", "0.0.0"))
+        self.assertEqual(self.client.retries + 1, mock_requests.call_count)
+
+    @mock.patch.object(requests.Session, 'request')
+    def test_start_not_retried_on_status(self, mock_requests):
+        mock_requests.return_value.status_code = 503
+
+        self.assertEqual(503, cli.start("http://test.master.adr:1234",
+                                        "0.0.0"))
+        self.assertEqual(1, mock_requests.call_count)
+
+    @mock.patch.object(requests.Session, 'request')
     def test_start_bad_status(self, mock_requests):
         test_url = "http://test.master.adr:1234"
         test_release = "0.0.0"
@@ -62,78 +177,254 @@ class dcos_quobyte_cli_test (unittest.TestCase):
 
         result_code = cli.start(test_url, test_release)
 
-        mock_requests.assert_called_once_with("http://test.master.adr:1234"
+        mock_requests.assert_called_once_with("GET",
+                                              "http://test.master.adr:1234"
                                               "/v1/version",
-                                              data='0.0.0')
+                                              data='0.0.0',
+                                              timeout=self.client.timeout)
         self.assertEquals(500, result_code)
 
-    @mock.patch.object(requests, 'get')
+    @mock.patch.object(requests.Session, 'request', side_effect=Timeout)
+    def test_start_timeout(self, mock_requests):
+        self.assertEqual(2, cli.start("http://test.master.adr:1234", "0.0.0"))
+
+    @mock.patch.object(requests.Session, 'request')
+    @mock.patch.object(cli, 'get_state', return_value={'release': '0.0.0',
+                                                       'healthy': True})
+    def test_start_negotiate_current(self, mock_cli_get_state,
+                                     mock_requests):
+        test_url = "http://test.master.adr:1234"
+
+        self.assertEqual(0, cli.start(test_url, "0.0.0", negotiate=True))
+        mock_cli_get_state.assert_called_once_with(test_url)
+        self.assertEqual(0, mock_requests.call_count)
+
+    @mock.patch.object(requests.Session, 'request')
+    @mock.patch.object(cli, 'get_state')
+    def test_start_negotiate_other(self, mock_cli_get_state, mock_requests):
+        test_url = "http://test.master.adr:1234"
+        mock_requests.return_value.status_code = requests.codes.ok
+        for state in ({'release': '0.0.0', 'healthy': False},
+                      {'release': '1.0.0', 'healthy': True}, None,
+                      ConnectionError()):
+            mock_cli_get_state.side_effect = [state]
+            mock_requests.reset_mock()
+
+            self.assertEqual(0, cli.start(test_url, "0.0.0", negotiate=True))
+            mock_requests.assert_called_once_with(
+                "GET", test_url + "/v1/version", data='0.0.0',
+                timeout=self.client.timeout)
+
+    @mock.patch.object(requests.Session, 'request')
+    @mock.patch.object(versions, 'prefetch', return_value=1)
+    def test_start_prefetch_failed(self, mock_prefetch, mock_requests):
+        test_url = "http://test.master.adr:1234"
+
+        self.assertEqual(1, cli.start(test_url, "0.0.0", prefetch=True))
+        mock_prefetch.assert_called_once_with(test_url, "0.0.0")
+        self.assertEqual(0, mock_requests.call_count)
+
+    @mock.patch.object(requests.Session, 'request')
     def test_stop(self, mock_requests):
         test_url = "http://test.master.adr:1234"
         mock_requests.return_value.status_code = requests.codes.ok
 
         cli.stop(test_url)
 
-        mock_requests.assert_called_once_with(test_url + "/v1/version")
+        mock_requests.assert_called_once_with("GET",
+                                              test_url + "/v1/version",
+                                              timeout=self.client.timeout)
 
-    @mock.patch.object(requests, 'get', side_effect=ConnectionError)
+    @mock.patch.object(requests.Session, 'request',
+                       side_effect=ConnectionError)
     def test_stop_connection_error(self, mock_requests):
         test_url = "http://test.master.adr:1234"
         mock_requests.return_value.status_code = 500
 
         self.assertEqual(2, cli.stop(test_url),
                          "Wrong exit value on ConnectionError test.")
+        self.assertEqual(1, mock_requests.call_count)
 
-    @mock.patch.object(requests, 'get')
+    @mock.patch.object(requests.Session, 'request')
     def test_stop_bad_status(self, mock_requests):
         test_url = "http://test.master.adr:1234"
         mock_requests.return_value.status_code = 500
 
         result_code = cli.stop(test_url)
 
-        mock_requests.assert_called_once_with("http://test.master.adr:1234"
-                                              "/v1/version")
+        mock_requests.assert_called_once_with("GET",
+                                              "http://test.master.adr:1234"
+                                              "/v1/version",
+                                              timeout=self.client.timeout)
         self.assertEquals(500, result_code)
 
+    @mock.patch.object(cli, 'print')
+    @mock.patch.object(cli, 'get_state', return_value={'release': '0.0.0',
+                                                       'healthy': True})
     @mock.patch.object(cli, 'start')
-    def test_upgrade(self, mock_cli_start):
+    def test_upgrade(self, mock_cli_start, mock_cli_get_state,
+                     mock_cli_print):
         test_url = "http://test.master.adr:1234"
         test_release = "0.0.0"
         mock_cli_start.return_value = 0
 
         self.assertEquals(0, cli.upgrade(test_url, test_release))
-        mock_cli_start.assert_called_once_with(test_url, test_release)
+        mock_cli_start.assert_called_once_with(test_url, test_release,
+                                               negotiate=True)
+        mock_cli_get_state.assert_called_once_with(test_url)
+
+    @mock.patch.object(cli, 'print')
+    @mock.patch.object(cli, 'start')
+    @mock.patch.object(versions, 'prefetch_all')
+    def test_upgrade_prefetch_failed(self, mock_prefetch_all, mock_cli_start,
+                                     mock_cli_print):
+        hosts = ["http://a:1", "http://b:2"]
+        mock_prefetch_all.return_value = [
+            batch.Result(hosts[0], 0, None, 0.1),
+            batch.Result(hosts[1], 1, None, 0.1)]
+
+        self.assertEquals(1, cli.upgrade(release="0.0.0", hosts=hosts,
+                                         prefetch=True))
+        mock_prefetch_all.assert_called_once_with(hosts, "0.0.0")
+        self.assertEqual(0, mock_cli_start.call_count)
+
+    def test_upgrade_no_release(self):
+        self.assertRaises(ValueError, cli.upgrade,
+                          "http://test.master.adr:1234", None)
+
+    @mock.patch.object(requests.Session, 'request')
+    def test_get_state(self, mock_requests):
+        mock_requests.return_value.status_code = requests.codes.ok
+        mock_requests.return_value.json.return_value = {'release': '1.0'}
+
+        self.assertEquals({'release': '1.0'},
+                          cli.get_state("http://test.master.adr:1234"))
+        mock_requests.assert_called_once_with(
+            "GET", "http://test.master.adr:1234/v1/state",
+            timeout=self.client.timeout)
+
+    @mock.patch.object(requests.Session, 'request')
+    def test_get_state_not_supported(self, mock_requests):
+        mock_requests.return_value.status_code = requests.codes.not_found
+
+        self.assertEquals(None, cli.get_state("http://test.master.adr:1234"))
 
     @mock.patch.object(mesos, 'DCOSClient', return_value=mock.Mock())
-    @mock.patch.object(mesos, 'get_master')
+    @mock.patch.object(discovery, 'fetch_framework_index')
     def test_find_quobyte_framework(self,
-                                    mock_mesos_get_master,
+                                    mock_fetch_index,
                                     mock_mesos_dcosclient):
-        fw_mock = mock.Mock()
-        fw_mock.frameworks.return_value = [
-            {'name': 'other_framework',
-             'webui_url': 'http://wrong.host.adr:4321'},
-            {'name': 'quobyte',
-             'webui_url': 'http://test.webui_url.adr:1234'}]
-        mock_mesos_get_master.return_value = fw_mock
+        mock_fetch_index.return_value = discovery.FrameworkIndex([
+            _framework('other_framework', 'http://wrong.host.adr:4321'),
+            _framework('quobyte', 'http://test.webui_url.adr:1234')])
 
         self.assertEquals("http://test.webui_url.adr:1234",
                           cli.find_quobyte_framework())
-        mock_mesos_get_master.assert_called_once_with(ANY)
+        mock_fetch_index.assert_called_once_with(ANY)
 
     @mock.patch.object(mesos, 'DCOSClient', return_value=mock.Mock())
-    @mock.patch.object(mesos, 'get_master')
+    @mock.patch.object(discovery, 'fetch_framework_index')
     def test_find_quobyte_framework_none(self,
-                                    mock_mesos_get_master,
-                                    mock_mesos_dcosclient):
-        fw_mock = mock.Mock()
-        fw_mock.frameworks.return_value = [
-            {'name': 'other_framework',
-             'webui_url': 'http://wrong.host.adr:4321'}]
-        mock_mesos_get_master.return_value = fw_mock
+                                         mock_fetch_index,
+                                         mock_mesos_dcosclient):
+        mock_fetch_index.return_value = discovery.FrameworkIndex([
+            _framework('other_framework', 'http://wrong.host.adr:4321'),
+            _framework('quobyte', 'http://inactive.adr:1234',
+                       active=False)])
 
         self.assertEquals(None, cli.find_quobyte_framework())
-        mock_mesos_get_master.assert_called_once_with(ANY)
+        mock_fetch_index.assert_called_once_with(ANY)
+
+    @mock.patch.object(mesos, 'DCOSClient', return_value=mock.Mock())
+    @mock.patch.object(discovery, 'fetch_framework_index')
+    def test_find_quobyte_framework_multiple(self,
+                                             mock_fetch_index,
+                                             mock_mesos_dcosclient):
+        mock_fetch_index.return_value = discovery.FrameworkIndex([
+            _framework('quobyte', 'http://first.adr:1234', 'fw-1'),
+            _framework('quobyte', 'http://second.adr:1234', 'fw-2')])
+
+        self.assertEquals("http://first.adr:1234",
+                          cli.find_quobyte_framework())
+
+    @mock.patch.object(cli, 'scan_quobyte_framework')
+    @mock.patch.object(discovery, 'is_reachable', return_value=True)
+    @mock.patch.object(discovery, 'load_cached_url',
+                       return_value='http://cached.quobyte.mesos:2323')
+    @mock.patch.object(discovery, 'cluster_key', return_value='key')
+    def test_find_quobyte_framework_cached(self, mock_key, mock_load,
+                                           mock_reachable, mock_scan):
+        self.assertEquals("http://cached.quobyte.mesos:2323",
+                          cli.find_quobyte_framework())
+        mock_load.assert_called_once_with('key')
+        self.assertFalse(mock_scan.called)
+
+    @mock.patch.object(discovery, 'store_url')
+    @mock.patch.object(cli, 'scan_quobyte_framework',
+                       return_value='http://fresh.quobyte.mesos:2323')
+    @mock.patch.object(discovery, 'is_reachable', return_value=False)
+    @mock.patch.object(discovery, 'load_cached_url',
+                       return_value='http://stale.quobyte.mesos:2323')
+    @mock.patch.object(discovery, 'cluster_key', return_value='key')
+    def test_find_quobyte_framework_cache_unreachable(self, mock_key,
+                                                      mock_load,
+                                                      mock_reachable,
+                                                      mock_scan, mock_store):
+        self.assertEquals("http://fresh.quobyte.mesos:2323",
+                          cli.find_quobyte_framework())
+        mock_store.assert_called_once_with('key',
+                                           'http://fresh.quobyte.mesos:2323')
+
+    @mock.patch.object(discovery, 'store_url')
+    @mock.patch.object(cli, 'scan_quobyte_framework')
+    @mock.patch.object(discovery, 'load_cached_url', return_value=None)
+    @mock.patch.object(discovery, 'cluster_key', return_value='key')
+    def test_find_quobyte_framework_dns(self, mock_key, mock_load,
+                                        mock_scan, mock_store):
+        discovery.resolve_dns_url.return_value = 'http://10.0.0.7:31001'
+
+        self.assertEquals("http://10.0.0.7:31001",
+                          cli.find_quobyte_framework())
+        self.assertFalse(mock_scan.called)
+        mock_store.assert_called_once_with('key', 'http://10.0.0.7:31001')
+
+    @mock.patch.object(discovery, 'store_url')
+    @mock.patch.object(cli, 'scan_quobyte_framework',
+                       return_value='http://fresh.quobyte.mesos:2323')
+    @mock.patch.object(discovery, 'load_cached_url')
+    @mock.patch.object(discovery, 'cluster_key', return_value='key')
+    def test_find_quobyte_framework_refresh(self, mock_key, mock_load,
+                                            mock_scan, mock_store):
+        discovery.resolve_dns_url.return_value = 'http://10.0.0.7:31001'
+
+        self.assertEquals("http://fresh.quobyte.mesos:2323",
+                          cli.find_quobyte_framework(discovery.CACHE_REFRESH))
+        self.assertFalse(mock_load.called)
+        self.assertFalse(discovery.resolve_dns_url.called)
+        mock_store.assert_called_once_with('key',
+                                           'http://fresh.quobyte.mesos:2323')
+
+    @mock.patch.object(discovery, 'store_url')
+    @mock.patch.object(cli, 'scan_quobyte_framework',
+                       return_value='http://fresh.quobyte.mesos:2323')
+    @mock.patch.object(discovery, 'cluster_key')
+    def test_find_quobyte_framework_no_cache(self, mock_key, mock_scan,
+                                             mock_store):
+        self.assertEquals("http://fresh.quobyte.mesos:2323",
+                          cli.find_quobyte_framework(discovery.CACHE_OFF))
+        self.assertFalse(mock_key.called)
+        self.assertFalse(mock_store.called)
+
+    def test_cache_mode(self):
+        self.assertEquals(discovery.CACHE_USE,
+                          cli.cache_mode({'--refresh': False,
+                                          '--no-cache': False}))
+        self.assertEquals(discovery.CACHE_REFRESH,
+                          cli.cache_mode({'--refresh': True,
+                                          '--no-cache': False}))
+        self.assertEquals(discovery.CACHE_OFF,
+                          cli.cache_mode({'--refresh': False,
+                                          '--no-cache': True}))
 
     def test_build_url(self):
         self.assertEquals("http://test.webui_url.adr:1234" + cli.API_STRING,
@@ -152,7 +443,7 @@ class dcos_quobyte_cli_test (unittest.TestCase):
         mock_cli_fqf.return_value = None
 
         self.assertRaises(ValueError, cli.build_url, test_url)
-        mock_cli_fqf.assert_called_once_with()
+        mock_cli_fqf.assert_called_once_with(discovery.CACHE_USE)
 
     def test_build_url_trailing_backslash(self):
         test_url = "http://test.master.adr:1234/"
@@ -168,13 +459,7 @@ class dcos_quobyte_cli_test (unittest.TestCase):
 
     @mock.patch.object(cli, 'print')
     @mock.patch("dcos_quobyte.cli.docopt",
-                return_value={'-h': False,
-                              '--help': False,
-                              '--info': False,
-                              'start': False,
-                              'stop': False,
-                              'upgrade': False,
-                              '--config-schema': False})
+                return_value=_main_args())
     def test_main(self, mock_docopt_docopt, mock_cli_print):
         self.assertEquals(1, cli.main())
         version_string = (six.text_type
@@ -186,13 +471,7 @@ class dcos_quobyte_cli_test (unittest.TestCase):
 
     @mock.patch.object(cli, 'print', return_value=0)
     @mock.patch("dcos_quobyte.cli.docopt",
-                return_value={'-h': False,
-                              '--help': True,
-                              '--info': False,
-                              'start': False,
-                              'stop': False,
-                              'upgrade': False,
-                              '--config-schema': False})
+                return_value=_main_args({'--help': True}))
     def test_main_help(self, mock_docopt_docopt, mock_cli_print):
         self.assertEquals(0, cli.main())
         mock_docopt_docopt.assert_called_once_with(cli.__doc__,
@@ -202,13 +481,7 @@ class dcos_quobyte_cli_test (unittest.TestCase):
 
     @mock.patch.object(cli, 'print', return_value=0)
     @mock.patch("dcos_quobyte.cli.docopt",
-                return_value={'-h': True,
-                              '--help': False,
-                              '--info': False,
-                              'start': False,
-                              'stop': False,
-                              'upgrade': False,
-                              '--config-schema': False})
+                return_value=_main_args({'-h': True}))
     def test_main_h(self, mock_docopt_docopt, mock_cli_print):
         self.assertEquals(0, cli.main())
         mock_docopt_docopt.assert_called_once_with(cli.__doc__,
@@ -218,13 +491,7 @@ class dcos_quobyte_cli_test (unittest.TestCase):
 
     @mock.patch.object(cli, 'info', return_value=0)
     @mock.patch("dcos_quobyte.cli.docopt",
-                return_value={'-h': False,
-                              '--help': False,
-                              '--info': True,
-                              'start': False,
-                              'stop': False,
-                              'upgrade': False,
-                              '--config-schema': False})
+                return_value=_main_args({'--info': True}))
     def test_main_info(self, mock_docopt_docopt, mock_cli_info):
         self.assertEquals(0, cli.main())
         mock_docopt_docopt.assert_called_once_with(cli.__doc__,
@@ -234,69 +501,319 @@ class dcos_quobyte_cli_test (unittest.TestCase):
 
     @mock.patch.object(cli, 'start', return_value=0)
     @mock.patch("dcos_quobyte.cli.docopt",
-                return_value={'-h': False,
-                              '--help': False,
-                              '--info': False,
-                              'start': True,
-                              'stop': False,
-                              'upgrade': False,
-                              '--config-schema': False,
-                              '--host': 'fake_host',
-                              '--release': 'fake_release'})
+                return_value=_main_args({'start': True,
+                                         '--host': 'fake_host',
+                                         '--release': 'fake_release'}))
     def test_main_start(self, mock_docopt_docopt, mock_cli_start):
         self.assertEquals(0, cli.main())
         mock_docopt_docopt.assert_called_once_with(cli.__doc__,
                                                    help=False,
                                                    version=ANY)
-        mock_cli_start.assert_called_once_with(host='fake_host',
-                                               release='fake_release')
+        mock_cli_start.assert_called_once_with(
+            host='fake_host', release='fake_release',
+            cache_mode=discovery.CACHE_USE, negotiate=True, prefetch=False)
 
     @mock.patch.object(cli, 'stop', return_value=0)
     @mock.patch("dcos_quobyte.cli.docopt",
-                return_value={'-h': False,
-                              '--help': False,
-                              '--info': False,
-                              'start': False,
-                              'stop': True,
-                              'upgrade': False,
-                              '--config-schema': False,
-                              '--host': 'fake_host',
-                              '--release': 'fake_release'})
+                return_value=_main_args({'stop': True,
+                                         '--host': 'fake_host',
+                                         '--release': 'fake_release'}))
     def test_main_stop(self, mock_docopt_docopt, mock_cli_stop):
         self.assertEquals(0, cli.main())
         mock_docopt_docopt.assert_called_once_with(cli.__doc__,
                                                    help=False,
                                                    version=ANY)
-        mock_cli_stop.assert_called_once_with(host='fake_host')
+        mock_cli_stop.assert_called_once_with(
+            host='fake_host', cache_mode=discovery.CACHE_USE, ordered=True,
+            batch_size=10, timeout=600.0)
 
     @mock.patch.object(cli, 'upgrade', return_value=0)
     @mock.patch("dcos_quobyte.cli.docopt",
-                return_value={'-h': False,
-                              '--help': False,
-                              '--info': False,
-                              'start': False,
-                              'stop': False,
-                              'upgrade': True,
-                              '--config-schema': False,
-                              '--host': 'fake_host',
-                              '--release': 'fake_release'})
+                return_value=_main_args({'upgrade': True,
+                                         '--host': 'fake_host',
+                                         '--release': 'fake_release'}))
     def test_main_upgrade(self, mock_docopt_docopt, mock_cli_upgrade):
         self.assertEquals(0, cli.main())
         mock_docopt_docopt.assert_called_once_with(cli.__doc__,
                                                    help=False,
                                                    version=ANY)
-        mock_cli_upgrade.assert_called_once_with(host='fake_host',
-                                               release='fake_release')
+        mock_cli_upgrade.assert_called_once_with(
+            host='fake_host', release='fake_release',
+            cache_mode=discovery.CACHE_USE, hosts=None, window=1,
+            max_failures=0, timeout=600.0, force=False, prefetch=False)
+
+    @mock.patch.object(cli, 'preflight', return_value=0)
+    @mock.patch("dcos_quobyte.cli.docopt",
+                return_value=_main_args({'preflight': True,
+                                         '--file': 'spec.json',
+                                         '--agent-timeout': '5'}))
+    def test_main_preflight(self, mock_docopt_docopt, mock_cli_preflight):
+        self.assertEquals(0, cli.main())
+        mock_cli_preflight.assert_called_once_with(
+            'spec.json', parallel=10, timeout=5.0, output_json=False)
+
+    @mock.patch.object(cli, 'plan', return_value=0)
+    @mock.patch("dcos_quobyte.cli.docopt",
+                return_value=_main_args({'plan': True,
+                                         '--domain': 'rack',
+                                         '--output': 'placed.json'}))
+    def test_main_plan(self, mock_docopt_docopt, mock_cli_plan):
+        self.assertEquals(0, cli.main())
+        mock_cli_plan.assert_called_once_with(
+            None, domain='rack', output='placed.json', output_json=False)
+
+    @mock.patch.object(cli, 'upgrade', return_value=0)
+    @mock.patch.object(cli, 'preflight', return_value=1)
+    @mock.patch("dcos_quobyte.cli.docopt",
+                return_value=_main_args({'upgrade': True,
+                                         '--release': 'fake_release',
+                                         '--preflight': True}))
+    def test_main_upgrade_preflight_failed(self, mock_docopt_docopt,
+                                           mock_cli_preflight,
+                                           mock_cli_upgrade):
+        self.assertEquals(1, cli.main())
+        mock_cli_preflight.assert_called_once_with(parallel=10, timeout=10.0)
+        self.assertFalse(mock_cli_upgrade.called)
+
+    @mock.patch.object(cli, 'start', return_value=0)
+    @mock.patch.object(cli, 'preflight', return_value=0)
+    @mock.patch("dcos_quobyte.cli.docopt",
+                return_value=_main_args({'start': True,
+                                         '--release': 'fake_release',
+                                         '--preflight': True}))
+    def test_main_start_preflight(self, mock_docopt_docopt,
+                                  mock_cli_preflight, mock_cli_start):
+        self.assertEquals(0, cli.main())
+        self.assertTrue(mock_cli_preflight.called)
+        self.assertTrue(mock_cli_start.called)
+
+    @mock.patch.object(cli, 'status', return_value=0)
+    @mock.patch("dcos_quobyte.cli.docopt",
+                return_value=_main_args({'status': True,
+                                         '--json': True,
+                                         '--no-cache': True}))
+    def test_main_status(self, mock_docopt_docopt, mock_cli_status):
+        self.assertEquals(0, cli.main())
+        mock_cli_status.assert_called_once_with(
+            host=None, cache_mode=discovery.CACHE_OFF, output_json=True,
+            watch=False, interval=2.0)
+
+    @mock.patch.object(cli, 'print')
+    @mock.patch.object(mesos, 'DCOSClient', return_value=mock.Mock())
+    @mock.patch.object(discovery, 'fetch_framework_tasks',
+                       return_value=[discovery.Task('t1', 'data', 'RUNNING',
+                                                    'S1', 'fw-1')])
+    @mock.patch.object(requests.Session, 'request')
+    def test_status_json(self, mock_requests, mock_fetch_tasks,
+                         mock_mesos_dcosclient, mock_cli_print):
+        mock_requests.return_value.status_code = requests.codes.ok
+        mock_requests.return_value.json.return_value = {'release': '1.0',
+                                                        'healthy': True}
+
+        self.assertEquals(0, cli.status("http://test.master.adr:1234/",
+                                        cache_mode=discovery.CACHE_OFF,
+                                        output_json=True))
+        printed = json.loads(mock_cli_print.call_args[0][0])
+        self.assertEquals('1.0', printed['release'])
+        self.assertEquals({'t1': {'name': 'data', 'state': 'RUNNING',
+                                  'agent': 'S1'}}, printed['tasks'])
+        mock_fetch_tasks.assert_called_once_with(cli.QUOBYTE_FRAMEWORK_NAME,
+                                                 ANY)
+
+    @mock.patch.object(cli, 'print')
+    @mock.patch.object(monitor, 'collect')
+    @mock.patch.object(monitor, 'load_cached',
+                       return_value={'framework': 'http://a:1',
+                                     'release': '1.0', 'healthy': True,
+                                     'tasks': {}})
+    def test_status_cached(self, mock_load_cached, mock_collect,
+                           mock_cli_print):
+        self.assertEquals(0, cli.status("http://a:1"))
+        self.assertFalse(mock_collect.called)
+        mock_load_cached.assert_called_once_with("http://a:1")
+
+    @mock.patch.object(cli, 'print')
+    @mock.patch.object(discovery, 'fetch_framework_tasks', return_value=[])
+    @mock.patch.object(requests.Session, 'request',
+                       side_effect=ConnectionError)
+    def test_status_connection_error(self, mock_requests, mock_fetch_tasks,
+                                     mock_cli_print):
+        self.assertEquals(2, cli.status("http://test.master.adr:1234/",
+                                        cache_mode=discovery.CACHE_OFF))
+        self.assertFalse(mock_cli_print.called)
+
+    def test_number_option(self):
+        self.assertEquals(3, cli.number_option({'--window': '3'}, '--window',
+                                               minimum=1))
+        self.assertEquals(1.5, cli.number_option({'--timeout': '1.5'},
+                                                 '--timeout', float))
+        self.assertRaises(ValueError, cli.number_option, {'--window': '0'},
+                          '--window', minimum=1)
+        self.assertRaises(ValueError, cli.number_option, {'--window': 'x'},
+                          '--window')
+
+    def test_usage(self):
+        for argv in (['quobyte', 'start', '--release=1', '--all'],
+                     ['quobyte', 'stop', '--hosts=a,b', '--parallel=2'],
+                     ['quobyte', 'upgrade', '--release=1', '--window=2',
+                      '--max-failures=1', '--timeout=30', '--refresh'],
+                     ['quobyte', 'status', '--watch', '--interval=5',
+                      '--trace'],
+                     ['quobyte', 'start', '--release=1', '--wait',
+                      '--timeout=60'],
+                     ['quobyte', 'stop', '--async'],
+                     ['quobyte', 'stop', '--batch-size=5', '--timeout=60'],
+                     ['quobyte', 'wait', 'abc123', '--timeout=60'],
+                     ['quobyte', 'daemon', '--socket=/tmp/q.sock'],
+                     ['quobyte', 'inventory', '--csv'],
+                     ['quobyte', 'logs', '--follow', '--tail=100'],
+                     ['quobyte', 'metrics', '--samples=3', '--prometheus'],
+                     ['quobyte', 'upgrade', '--release=1', '--all',
+                      '--prefetch', '--force'],
+                     ['quobyte', 'apply', '-f', 'spec.json', '--all',
+                      '--dry-run'],
+                     ['quobyte', 'volumes', 'create', '-f', 'volumes.json',
+                      '--parallel=50', '--batch-size=500'],
+                     ['quobyte', 'volumes', 'list', '--tenant=a', '--json'],
+                     ['quobyte', 'bench-api', '--operation=state',
+                      '--concurrency=4', '--rate=100', '--duration=5',
+                      '--requests=500', '--json'],
+                     ['quobyte', 'preflight', '-f', 'spec.json',
+                      '--agent-timeout=5', '--json'],
+                     ['quobyte', 'start', '--release=1', '--preflight'],
+                     ['quobyte', 'plan', '-f', 'spec.json', '--domain=rack',
+                      '--output=placed.json'],
+                     ['quobyte', '--info']):
+            args = docopt(cli.__doc__, argv=argv, help=False)
+            self.assertEquals(sorted(MAIN_ARGS),
+                              sorted(k for k in args if k != 'quobyte'))
+
+    @mock.patch.object(cli, 'print')
+    @mock.patch.object(mesos, 'DCOSClient', return_value=mock.Mock())
+    @mock.patch.object(discovery, 'fetch_framework_tasks')
+    @mock.patch("dcos_quobyte.cli.docopt",
+                return_value=_main_args({'inventory': True, '--json': True}))
+    def test_main_inventory(self, mock_docopt_docopt, mock_fetch_tasks,
+                            mock_mesos_dcosclient, mock_print):
+        def fetch_tasks(framework_name, dcos_client, agents):
+            agents['S1'] = discovery.Agent('S1', 'agent1', None)
+            return [discovery.Task('t1', 'metadata', 'TASK_RUNNING', 'S1',
+                                   'fw-1')]
+        mock_fetch_tasks.side_effect = fetch_tasks
+
+        self.assertEquals(0, cli.main())
+        output = json.loads(mock_print.call_args[0][0])
+        self.assertEquals({'metadata': 1}, output['roles'])
+        self.assertEquals({'S1': {'hostname': 'agent1',
+                                  'roles': {'metadata': 1}}},
+                          output['agents'])
+
+    @mock.patch.object(cli, 'wait_operation', return_value=0)
+    @mock.patch.object(cli, 'start', return_value=0)
+    @mock.patch.object(cli, 'find_quobyte_framework',
+                       return_value='http://a:1/')
+    @mock.patch("dcos_quobyte.cli.docopt",
+                return_value=_main_args({'start': True, '--wait': True,
+                                         '--release': 'fake_release',
+                                         '--timeout': '30'}))
+    def test_main_start_wait(self, mock_docopt_docopt, mock_find,
+                             mock_cli_start, mock_wait_operation):
+        self.assertEquals(0, cli.main())
+        mock_cli_start.assert_called_once_with(
+            host='http://a:1', release='fake_release',
+            cache_mode=discovery.CACHE_USE, negotiate=True, prefetch=False)
+        mock_wait_operation.assert_called_once_with('start', ['http://a:1'],
+                                                    30.0)
+
+    @mock.patch.object(cli, 'print')
+    @mock.patch.object(operations, 'submit', return_value='abc123')
+    @mock.patch.object(cli, 'stop', return_value=0)
+    @mock.patch("dcos_quobyte.cli.docopt",
+                return_value=_main_args({'stop': True, '--async': True,
+                                         '--hosts': 'http://a:1,http://b:2'}))
+    def test_main_stop_async(self, mock_docopt_docopt, mock_cli_stop,
+                             mock_submit, mock_cli_print):
+        self.assertEquals(0, cli.main())
+        mock_submit.assert_called_once_with('stop', ['http://a:1',
+                                                     'http://b:2'])
+        mock_cli_print.assert_called_with('abc123')
+
+    @mock.patch.object(operations, 'submit')
+    @mock.patch.object(cli, 'stop', return_value=500)
+    @mock.patch("dcos_quobyte.cli.docopt",
+                return_value=_main_args({'stop': True, '--async': True,
+                                         '--host': 'http://a:1'}))
+    def test_main_stop_async_failed(self, mock_docopt_docopt, mock_cli_stop,
+                                    mock_submit):
+        self.assertEquals(500, cli.main())
+        self.assertFalse(mock_submit.called)
+
+    @mock.patch.object(mesos, 'DCOSClient', return_value=mock.Mock())
+    @mock.patch.object(operations, 'wait', return_value=False)
+    @mock.patch.object(operations, 'load',
+                       return_value={'action': 'stop',
+                                     'hosts': ['http://a:1']})
+    def test_wait(self, mock_load, mock_wait, mock_mesos_dcosclient):
+        self.assertEquals(1, cli.wait('abc123', 5))
+        mock_wait.assert_called_once_with(['http://a:1'],
+                                          operations.TARGET_STOPPED, ANY, 5,
+                                          errors=ANY)
+
+    @mock.patch.object(operations, 'load', return_value=None)
+    def test_wait_unknown(self, mock_load):
+        self.assertRaises(ValueError, cli.wait, 'abc123')
+
+    @mock.patch.object(trace, 'enable')
+    @mock.patch.object(cli, 'stop', return_value=0)
+    @mock.patch("dcos_quobyte.cli.docopt",
+                return_value=_main_args({'stop': True, '--trace': True}))
+    def test_main_trace(self, mock_docopt_docopt, mock_cli_stop,
+                        mock_trace_enable):
+        self.assertEquals(0, cli.main())
+        mock_trace_enable.assert_called_once_with()
+
+    @mock.patch.object(cli, 'print')
+    @mock.patch.object(cli, 'start', side_effect=[0, 500])
+    @mock.patch("dcos_quobyte.cli.docopt",
+                return_value=_main_args({'start': True,
+                                         '--hosts': 'http://a:1, http://b:2',
+                                         '--release': 'fake_release',
+                                         '--parallel': '1'}))
+    def test_main_start_batch(self, mock_docopt_docopt, mock_cli_start,
+                              mock_cli_print):
+        self.assertEquals(1, cli.main())
+        mock_cli_start.assert_has_calls([
+            mock.call(host='http://a:1', release='fake_release',
+                      cache_mode=discovery.CACHE_USE, negotiate=True),
+            mock.call(host='http://b:2', release='fake_release',
+                      cache_mode=discovery.CACHE_USE, negotiate=True)])
+
+    @mock.patch.object(cli, 'print')
+    @mock.patch.object(cli, 'stop', return_value=0)
+    @mock.patch.object(cli, 'find_quobyte_frameworks',
+                       return_value=['http://a:1', 'http://b:2'])
+    @mock.patch("dcos_quobyte.cli.docopt",
+                return_value=_main_args({'stop': True, '--all': True}))
+    def test_main_stop_all(self, mock_docopt_docopt, mock_cli_fqfs,
+                           mock_cli_stop, mock_cli_print):
+        self.assertEquals(0, cli.main())
+        self.assertEquals(2, mock_cli_stop.call_count)
+
+    @mock.patch.object(mesos, 'DCOSClient', return_value=mock.Mock())
+    @mock.patch.object(discovery, 'fetch_framework_index')
+    def test_find_quobyte_frameworks(self, mock_fetch_index,
+                                     mock_mesos_dcosclient):
+        mock_fetch_index.return_value = discovery.FrameworkIndex([
+            _framework('quobyte', 'http://first.adr:1234', 'fw-1'),
+            _framework('other_framework', 'http://wrong.host.adr:4321'),
+            _framework('quobyte', 'http://second.adr:1234', 'fw-2')])
+
+        self.assertEquals(['http://first.adr:1234', 'http://second.adr:1234'],
+                          cli.find_quobyte_frameworks())
 
     @mock.patch.object(cli, 'config_schema', return_value=0)
     @mock.patch("dcos_quobyte.cli.docopt",
-                return_value={'-h': False,
-                              '--help': False,
-                              '--info': False,
-                              'start': False,
-                              'stop': False,
-                              'upgrade': False,
-                              '--config-schema': True})
+                return_value=_main_args({'--config-schema': True}))
     def test_main_config_schema(self, mock_docopt_docopt, mock_cli_cschema):
         self.assertEquals(0, cli.main())
         mock_docopt_docopt.assert_called_once_with(cli.__doc__,
@@ -0,0 +1,422 @@
+""" Unit tests for dcos-quobyte framework discovery """
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import json
+import os
+import shutil
+import socket
+import tempfile
+import time
+import unittest
+
+import mock
+import requests
+
+from dcos_quobyte import discovery
+
+MASTER_STATE = {
+    'version': '0.25.0',
+    'slaves': [{'id': 'S1', 'resources': {'cpus': 4.0, 'disk': [1, 2]}}],
+    'frameworks': [
+        {'id': 'fw-1',
+         'name': 'marathon',
+         'role': '*',
+         'active': True,
+         'webui_url': 'http://marathon.adr:8080',
+         'tasks': [{'id': 'task "with" \\ escapes \u00e9',
+                    'labels': [{'key': '}{][', 'value': ''}]}]},
+        {'id': 'fw-2',
+         'name': 'quobyte',
+         'role': 'storage',
+         'active': True,
+         'hostname': 'agent1',
+         'webui_url': 'http://quobyte.adr:7070',
+         'capabilities': [],
+         'used_resources': {'cpus': 1.5, 'mem': 1024}},
+        {'id': 'fw-3',
+         'name': 'quobyte',
+         'role': 'storage',
+         'active': False,
+         'webui_url': None}],
+    'completed_frameworks': [{'id': 'fw-0', 'name': 'quobyte'}]
+}
+
+
+def _chunked(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class dcos_quobyte_discovery_test (unittest.TestCase):
+
+    def setUp(self):
+        print("\n------- Testing method " + self._testMethodName)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        path_patcher = mock.patch.object(
+            discovery, 'cache_path',
+            return_value=os.path.join(self.tmp_dir, 'quobyte',
+                                      'discovery.json'))
+        path_patcher.start()
+        self.addCleanup(path_patcher.stop)
+
+    def test_store_and_load(self):
+        discovery.store_url('key', 'http://test.webui_url.adr:1234')
+
+        self.assertEqual('http://test.webui_url.adr:1234',
+                         discovery.load_cached_url('key', ttl=60))
+        self.assertEqual(None, discovery.load_cached_url('other', ttl=60))
+
+    def test_load_expired(self):
+        discovery.store_url('key', 'http://test.webui_url.adr:1234')
+
+        with mock.patch.object(time, 'time',
+                               return_value=time.time() + 120):
+            self.assertEqual(None, discovery.load_cached_url('key', ttl=60))
+
+    def test_invalidate(self):
+        discovery.store_url('key', 'http://test.webui_url.adr:1234')
+        discovery.invalidate('key')
+
+        self.assertEqual(None, discovery.load_cached_url('key', ttl=60))
+
+    def test_load_corrupt_cache(self):
+        os.makedirs(os.path.dirname(discovery.cache_path()))
+        with open(discovery.cache_path(), 'w') as cache_file:
+            cache_file.write('{not json')
+
+        self.assertEqual(None, discovery.load_cached_url('key', ttl=60))
+
+    @mock.patch.dict(os.environ, {discovery.CACHE_TTL_ENV: '42'})
+    def test_cache_ttl_env(self):
+        self.assertEqual(42, discovery.cache_ttl())
+
+    def test_cluster_key_changes_with_config(self):
+        config_path = os.path.join(self.tmp_dir, 'dcos.toml')
+        with mock.patch.dict(os.environ, {'DCOS_CONFIG': config_path}):
+            self.assertEqual(None, discovery.cluster_key())
+            with open(config_path, 'w') as config_file:
+                config_file.write('[core]\ndcos_url = "http://a"\n')
+            first_key = discovery.cluster_key()
+            with open(config_path, 'w') as config_file:
+                config_file.write('[core]\ndcos_url = "http://b"\n')
+
+            self.assertNotEqual(None, first_key)
+            self.assertNotEqual(first_key, discovery.cluster_key())
+
+    def test_is_reachable(self):
+        server = socket.socket()
+        server.bind(('127.0.0.1', 0))
+        server.listen(1)
+        self.addCleanup(server.close)
+        port = server.getsockname()[1]
+
+        self.assertTrue(discovery.is_reachable(
+            'http://127.0.0.1:' + str(port) + '/'))
+        server.close()
+        self.assertFalse(discovery.is_reachable(
+            'http://127.0.0.1:' + str(port) + '/'))
+
+
+class dcos_quobyte_framework_index_test (unittest.TestCase):
+
+    def setUp(self):
+        print("\n------- Testing method " + self._testMethodName)
+
+    def test_iter_frameworks(self):
+        document = json.dumps(MASTER_STATE, indent=1)
+        for size in (1, 2, 7, 64, len(document)):
+            frameworks = list(discovery.iter_frameworks(
+                _chunked(document, size)))
+
+            self.assertEqual(['fw-1', 'fw-2', 'fw-3'],
+                             [f.id for f in frameworks])
+            self.assertEqual(discovery.Framework(
+                id='fw-2', name='quobyte', role='storage',
+                webui_url='http://quobyte.adr:7070', hostname='agent1',
+                active=True), frameworks[1])
+            self.assertEqual(None, frameworks[2].webui_url)
+
+    def test_iter_frameworks_completed(self):
+        document = json.dumps(MASTER_STATE)
+        frameworks = list(discovery.iter_frameworks(
+            [document], keys=('completed_frameworks',)))
+
+        self.assertEqual(['fw-0'], [f.id for f in frameworks])
+
+    def test_iter_frameworks_truncated(self):
+        document = json.dumps(MASTER_STATE)
+
+        self.assertRaises(ValueError, list,
+                          discovery.iter_frameworks([document[:-40]]))
+
+    def test_iter_framework_tasks(self):
+        state = {'frameworks': [
+            {'tasks': [{'id': 'early', 'state': 'TASK_RUNNING'}],
+             'name': 'quobyte'},
+            {'id': 'fw-1', 'name': 'marathon',
+             'tasks': [{'id': 'other', 'name': 'web'}]},
+            {'id': 'fw-2', 'name': 'quobyte',
+             'tasks': [{'id': 'data.1', 'name': 'data',
+                        'state': 'TASK_RUNNING', 'slave_id': 'S1',
+                        'framework_id': 'fw-2',
+                        'resources': {'cpus': 1.0}}]}]}
+        document = json.dumps(state)
+
+        tasks = list(discovery.iter_framework_tasks(_chunked(document, 3),
+                                                    'quobyte'))
+
+        self.assertEqual(['early', 'data.1'], [t.id for t in tasks])
+        self.assertEqual(discovery.Task('data.1', 'data', 'TASK_RUNNING',
+                                        'S1', 'fw-2'), tasks[1])
+
+    def test_iter_framework_tasks_agents(self):
+        state = dict(MASTER_STATE, slaves=[
+            {'id': 'S1', 'hostname': 'agent1', 'resources': {'cpus': 4.0},
+             'pid': 'slave(1)@10.0.0.1:5051'},
+            {'id': 'S2', 'hostname': 'agent2'}])
+        agents = {}
+
+        list(discovery.iter_framework_tasks(
+            _chunked(json.dumps(state), 7), 'quobyte', agents=agents))
+
+        self.assertEqual(
+            {'S1': discovery.Agent('S1', 'agent1', 'slave(1)@10.0.0.1:5051'),
+             'S2': discovery.Agent('S2', 'agent2', None)}, agents)
+        self.assertEqual('http://10.0.0.1:5051',
+                         discovery.agent_url(agents['S1']))
+        self.assertIsNone(discovery.agent_url(agents['S2']))
+
+    def test_iter_task_directories(self):
+        state = {'id': 'S1',
+                 'frameworks': [
+                     {'id': 'fw-other',
+                      'executors': [{'id': 'e0', 'directory': '/d/e0',
+                                     'tasks': [{'id': 't0'}]}]},
+                     {'executors': [{'id': 'e1', 'directory': '/d/e1',
+                                     'tasks': [{'id': 't1'}],
+                                     'queued_tasks': [{'id': 't2'}]}],
+                      'id': 'fw-1'}],
+                 'completed_frameworks': [
+                     {'id': 'fw-1',
+                      'completed_executors': [{'id': 't3',
+                                               'directory': '/d/t3'}]}]}
+
+        self.assertEqual(
+            {'e1': '/d/e1', 't1': '/d/e1', 't2': '/d/e1', 't3': '/d/t3'},
+            dict(discovery.iter_task_directories(
+                _chunked(json.dumps(state), 9), set(['fw-1']))))
+
+    def test_iter_executor_tasks(self):
+        state = {'frameworks': [
+            {'id': 'fw-1',
+             'executors': [{'id': 'quobyte-executor', 'directory': '/d/e',
+                            'tasks': [{'id': 'data.1'}, {'id': 'data.2'}]},
+                           {'id': 'api.1', 'tasks': [{'id': 'api.1'}]}]},
+            {'id': 'fw-other',
+             'executors': [{'id': 'e0', 'tasks': [{'id': 't0'}]}]}]}
+
+        self.assertEqual(
+            [('api.1', 'api.1'), ('quobyte-executor', 'data.1'),
+             ('quobyte-executor', 'data.2')],
+            sorted(discovery.iter_executor_tasks(
+                _chunked(json.dumps(state), 11), set(['fw-1']))))
+
+    def test_read_fields(self):
+        state = {'id': 'S1', 'frameworks': [{'id': 'fw-1'}] * 50,
+                 'hostname': 'agent1',
+                 'reserved_resources_full': {'quobyte': [{'name': 'disk'}]},
+                 'flags': {'port': '5051'}}
+
+        self.assertEqual(
+            {'hostname': 'agent1',
+             'reserved_resources_full': {'quobyte': [{'name': 'disk'}]}},
+            discovery.read_fields(_chunked(json.dumps(state), 7),
+                                  set(['hostname', 'reserved_resources_full',
+                                       'unknown'])))
+
+    def test_index(self):
+        index = discovery.FrameworkIndex(discovery.iter_frameworks(
+            [json.dumps(MASTER_STATE)]))
+
+        self.assertEqual(3, len(index))
+        self.assertEqual(['fw-2'],
+                         [f.id for f in index.by_name('quobyte')])
+        self.assertEqual(['fw-2', 'fw-3'],
+                         [f.id for f in index.by_name('quobyte',
+                                                      inactive=True)])
+        self.assertEqual([], index.by_name('unknown'))
+        self.assertEqual('marathon', index.by_id('fw-1').name)
+        self.assertEqual('3 frameworks (2 active, 2 distinct names)',
+                         index.summary())
+
+    @mock.patch.object(requests, 'get')
+    def test_fetch_framework_index(self, mock_get):
+        document = json.dumps(MASTER_STATE).encode('utf-8')
+        mock_get.return_value.status_code = requests.codes.ok
+        mock_get.return_value.iter_content.return_value = _chunked(document,
+                                                                   5)
+        dcos_client = mock.Mock()
+        dcos_client.master_url.return_value = 'http://master/state.json'
+
+        index = discovery.fetch_framework_index(dcos_client)
+
+        self.assertEqual(3, len(index))
+        mock_get.assert_called_once_with('http://master/state.json',
+                                         stream=True,
+                                         timeout=discovery.RACE_TIMEOUT)
+        mock_get.return_value.close.assert_called_once_with()
+
+    @mock.patch.object(requests, 'get')
+    def test_fetch_task_counts(self, mock_get):
+        mock_get.return_value.status_code = requests.codes.ok
+        mock_get.return_value.json.return_value = {'frameworks': [
+            {'id': 'fw-1', 'name': 'quobyte', 'webui_url': 'http://a:1',
+             'TASK_RUNNING': 2, 'TASK_STAGING': 1, 'used_resources': {}},
+            {'id': 'fw-2', 'name': 'marathon', 'TASK_RUNNING': 7}]}
+        dcos_client = mock.Mock()
+        dcos_client.master_url.return_value = 'http://master/state-summary'
+
+        counts = discovery.fetch_task_counts('quobyte', dcos_client)
+
+        self.assertEqual([discovery.TaskCounts(
+            'fw-1', 'http://a:1', {'TASK_RUNNING': 2, 'TASK_STAGING': 1})],
+            counts)
+        dcos_client.master_url.assert_called_once_with(
+            discovery.SUMMARY_PATH)
+        mock_get.assert_called_once_with('http://master/state-summary',
+                                         timeout=discovery.RACE_TIMEOUT)
+
+    @mock.patch.object(discovery, 'fetch_framework_tasks',
+                       return_value=[
+                           discovery.Task('t1', 'data', 'TASK_RUNNING', 'S1',
+                                          'fw-1'),
+                           discovery.Task('t2', 'data', 'TASK_RUNNING', 'S2',
+                                          'fw-1')])
+    @mock.patch.object(requests, 'get')
+    def test_fetch_task_counts_without_summary(self, mock_get,
+                                               mock_fetch_tasks):
+        mock_get.return_value.status_code = requests.codes.not_found
+
+        counts = discovery.fetch_task_counts('quobyte', mock.Mock())
+
+        self.assertEqual([discovery.TaskCounts(None, None,
+                                               {'TASK_RUNNING': 2})], counts)
+
+
+class dcos_quobyte_master_race_test (unittest.TestCase):
+
+    def setUp(self):
+        print("\n------- Testing method " + self._testMethodName)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        path_patcher = mock.patch.object(
+            discovery, 'masters_path',
+            return_value=os.path.join(self.tmp_dir, 'masters.json'))
+        path_patcher.start()
+        self.addCleanup(path_patcher.stop)
+        self.requested = []
+
+    def _masters(self, delays, leader='master@m1:5050'):
+        """Patches requests.get with masters answering after `delays`
+        seconds, keyed by URL, as master@<host>:5050"""
+
+        def get(url, **kwargs):
+            self.requested.append(url)
+            time.sleep(delays[url])
+            state = dict(MASTER_STATE, leader=leader,
+                         pid='master@' + url.split('/')[2] + ':5050')
+            response = mock.Mock(status_code=requests.codes.ok)
+            response.iter_content.return_value = _chunked(
+                json.dumps(state).encode('utf-8'), 50)
+            return response
+
+        patcher = mock.patch.object(requests, 'get', side_effect=get)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_master_state_urls(self):
+        dcos_client = mock.Mock()
+        dcos_client.master_url.return_value = 'http://dcos/mesos/' + \
+            discovery.STATE_PATH
+        with mock.patch.dict(os.environ, {discovery.MASTERS_ENV:
+                                          'http://m1:5050/, ,http://m2'}):
+            self.assertEqual(['http://dcos/mesos/master/state.json',
+                              'http://m1:5050/master/state.json',
+                              'http://m2/master/state.json'],
+                             discovery.master_state_urls(dcos_client))
+
+    def test_race_fastest_leader_wins(self):
+        self._masters({'http://m1/state': 0.0, 'http://m2/state': 0.3},
+                      leader='master@m2:5050')
+        # m1 answers first but is not leading
+        index, winner = discovery.race_framework_index(
+            ['http://m1/state', 'http://m2/state'])
+
+        self.assertEqual('http://m2/state', winner)
+        self.assertEqual(3, len(index))
+
+    def test_race_stragglers_do_not_delay(self):
+        self._masters({'http://m1/state': 0.0, 'http://slow/state': 5})
+        start = time.time()
+
+        index, winner = discovery.race_framework_index(
+            ['http://slow/state', 'http://m1/state'])
+
+        self.assertEqual('http://m1/state', winner)
+        self.assertLess(time.time() - start, 1)
+
+    def test_race_no_leader(self):
+        self._masters({'http://m1/state': 0.0}, leader='master@m2:5050')
+
+        self.assertEqual((None, None), discovery.race_framework_index(
+            ['http://m1/state']))
+
+    def test_race_preferred_first(self):
+        self._masters({'http://m1/state': 0.0, 'http://m2/state': 0.0},
+                      leader='master@m2:5050')
+
+        index, winner = discovery.race_framework_index(
+            ['http://m1/state', 'http://m2/state'], 'http://m2/state')
+
+        self.assertEqual('http://m2/state', winner)
+        self.assertEqual(['http://m2/state'], self.requested)
+
+    def test_race_hedges_slow_preferred(self):
+        self._masters({'http://m1/state': 0.0, 'http://m2/state': 5})
+
+        index, winner = discovery.race_framework_index(
+            ['http://m1/state', 'http://m2/state'], 'http://m2/state',
+            hedge_delay=0.05)
+
+        self.assertEqual('http://m1/state', winner)
+        self.assertEqual(['http://m2/state', 'http://m1/state'],
+                         self.requested)
+
+    def test_racing_remembers_winner(self):
+        self._masters({'http://m1/state': 0.0, 'http://m2/state': 0.1},
+                      leader='master@m2:5050')
+        urls = ['http://m1/state', 'http://m2/state']
+
+        discovery.fetch_framework_index_racing(mock.Mock(), urls, 'key')
+        self.assertEqual('http://m2/state',
+                         discovery.load_preferred_master('key'))
+
+        del self.requested[:]
+        discovery.fetch_framework_index_racing(mock.Mock(), urls, 'key')
+        self.assertEqual(['http://m2/state'], self.requested)
+
+    @mock.patch.object(discovery, 'fetch_framework_index')
+    def test_racing_falls_back(self, mock_fetch_index):
+        self._masters({'http://m1/state': 0.0}, leader='master@m2:5050')
+        dcos_client = mock.Mock()
+
+        self.assertEqual(mock_fetch_index.return_value,
+                         discovery.fetch_framework_index_racing(
+                             dcos_client, ['http://m1/state'], 'key'))
+        mock_fetch_index.assert_called_once_with(dcos_client)
+        self.assertIsNone(discovery.load_preferred_master('key'))
+
+
+if __name__ == '__main__':
+    unittest.main()
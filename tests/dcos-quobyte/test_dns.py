@@ -0,0 +1,138 @@
+""" Unit tests for the dcos-quobyte DNS client """
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import os
+import socket
+import struct
+import threading
+import unittest
+
+import mock
+
+from dcos_quobyte import discovery
+from dcos_quobyte import dns
+
+SRV_NAME = '_quobyte._tcp.marathon.mesos'
+TARGET = 'quobyte-x1.marathon.slave.mesos'
+
+
+def _record(name, rtype, data):
+    return (name + struct.pack(str('>HHIH'), rtype, dns.CLASS_IN, 60,
+                               len(data)) + data)
+
+
+def _answer(query):
+    """Answers like Mesos-DNS: SRV records for SRV_NAME with the target's
+    A record as additional record, A records for the target, NXDOMAIN for
+    anything else.  Names in the answers point back to the question."""
+
+    query_id, _, _, _, _, _ = struct.unpack(str('>HHHHHH'), query[:12])
+    name_end = query.index(b'\0', 12) + 1
+    name = query[12:name_end]
+    qtype = struct.unpack(str('>H'), query[name_end:name_end + 2])[0]
+    question = query[12:name_end + 4]
+    pointer = struct.pack(str('>H'), 0xc000 | 12)
+    if qtype == dns.TYPE_SRV and name == dns.encode_name(SRV_NAME):
+        target = dns.encode_name(TARGET)
+        first = _record(pointer, dns.TYPE_SRV,
+                        struct.pack(str('>HHH'), 0, 0, 31001) + target)
+        # the target of the second record is compressed as well
+        target_offset = 12 + len(question) + len(first) - len(target)
+        second = _record(pointer, dns.TYPE_SRV,
+                         struct.pack(str('>HHH'), 1, 0, 31002) +
+                         struct.pack(str('>H'), 0xc000 | target_offset))
+        additional = _record(struct.pack(str('>H'), 0xc000 | target_offset),
+                             dns.TYPE_A, socket.inet_aton('127.0.0.1'))
+        return (struct.pack(str('>HHHHHH'), query_id, 0x8180, 1, 2, 0, 1) +
+                question + first + second + additional)
+    if qtype == dns.TYPE_A and name == dns.encode_name(TARGET):
+        return (struct.pack(str('>HHHHHH'), query_id, 0x8180, 1, 1, 0, 0) +
+                question + _record(pointer, dns.TYPE_A,
+                                   socket.inet_aton('10.0.0.7')))
+    return (struct.pack(str('>HHHHHH'), query_id, 0x8183, 1, 0, 0, 0) +
+            question)
+
+
+class _StubResolver(threading.Thread):
+
+    def __init__(self):
+        super(_StubResolver, self).__init__()
+        self.daemon = True
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.address = self.sock.getsockname()
+        self.queries = 0
+
+    def run(self):
+        while True:
+            try:
+                query, sender = self.sock.recvfrom(512)
+            except socket.error:
+                return
+            self.queries += 1
+            self.sock.sendto(_answer(query), sender)
+
+
+class dcos_quobyte_dns_test (unittest.TestCase):
+
+    def setUp(self):
+        print("\n------- Testing method " + self._testMethodName)
+        self.resolver = _StubResolver()
+        self.resolver.start()
+        self.addCleanup(self.resolver.sock.close)
+        env_patcher = mock.patch.dict(os.environ, {
+            dns.SERVER_ENV: '127.0.0.1:' + str(self.resolver.address[1])})
+        env_patcher.start()
+        self.addCleanup(env_patcher.stop)
+
+    def test_nameserver(self):
+        self.assertEqual(('10.0.0.1', 5353),
+                         dns.nameserver({dns.SERVER_ENV: '10.0.0.1:5353'}))
+        self.assertEqual(('fd00::1', 53),
+                         dns.nameserver({dns.SERVER_ENV: 'fd00::1'}))
+        self.assertEqual(('127.0.0.1', 53),
+                         dns.nameserver({}, '/nonexistent/resolv.conf'))
+
+    def test_resolve_srv(self):
+        self.assertEqual([('127.0.0.1', 31001), ('127.0.0.1', 31002)],
+                         dns.resolve_srv(SRV_NAME))
+
+    def test_resolve_a(self):
+        self.assertEqual(['10.0.0.7'], dns.resolve_a(TARGET))
+
+    def test_nxdomain(self):
+        self.assertEqual([], dns.resolve_srv('_other._tcp.marathon.mesos'))
+
+    def test_no_answer(self):
+        silent = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        silent.bind(('127.0.0.1', 0))
+        self.addCleanup(silent.close)
+
+        self.assertRaises(dns.DNSError, dns.resolve_a, TARGET,
+                          silent.getsockname(), 0.05)
+
+    def test_mismatched_response(self):
+        self.assertRaises(dns.DNSError, dns.parse_response,
+                          _answer(dns.build_query(1, TARGET, dns.TYPE_A)), 2)
+
+    @mock.patch.object(discovery, 'is_reachable',
+                       side_effect=lambda url: url.endswith(':31002'))
+    def test_resolve_dns_url(self, mock_reachable):
+        self.assertEqual('http://127.0.0.1:31002',
+                         discovery.resolve_dns_url('quobyte.marathon.mesos'))
+        self.assertEqual(1, self.resolver.queries)
+
+    @mock.patch.object(discovery, 'is_reachable', return_value=True)
+    def test_resolve_dns_url_with_port(self, mock_reachable):
+        self.assertEqual('http://10.0.0.7:7070',
+                         discovery.resolve_dns_url(TARGET + ':7070'))
+
+    def test_resolve_dns_url_disabled(self):
+        with mock.patch.dict(os.environ, {discovery.DNS_NAME_ENV: '0'}):
+            self.assertIsNone(discovery.resolve_dns_url())
+        self.assertEqual(0, self.resolver.queries)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+""" Import time checks for the dcos-quobyte metadata commands
+
+The DCOS CLI runs `dcos-quobyte quobyte --info` whenever it lists its
+subcommands, so these commands must not pull in requests or the dcos modules.
+"""
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import os
+import subprocess
+import sys
+import unittest
+
+IMPORT_BUDGET_ENV = 'DCOS_QUOBYTE_IMPORT_BUDGET_MS'
+DEFAULT_IMPORT_BUDGET_MS = 100
+HEAVY_MODULES = ('requests', 'urllib3', 'dcos.mesos', 'dcos.http',
+                 'dcos.util', 'concurrent.futures')
+METADATA_COMMANDS = (['--info'], ['--config-schema'], ['--help'],
+                     ['--version'])
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+
+def _import_times(argv):
+    """Runs the subcommand with -X importtime and returns the cumulative
+    import time in microseconds of every imported module.
+    """
+
+    code = ("import sys; sys.argv = ['dcos-quobyte', 'quobyte'] + {0!r}; "
+            "from dcos_quobyte import cli; cli.main()").format(argv)
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [ROOT] + [p for p in [env.get('PYTHONPATH')] if p])
+    process = subprocess.Popen(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+    _, stderr = process.communicate()
+
+    times = {}
+    for line in stderr.decode('utf-8').splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+@unittest.skipIf(sys.version_info < (3, 7), "-X importtime needs Python 3.7")
+class dcos_quobyte_import_time_test (unittest.TestCase):
+
+    def setUp(self):
+        print("\n------- Testing method " + self._testMethodName)
+
+    def test_no_heavy_imports(self):
+        for argv in METADATA_COMMANDS:
+            times = _import_times(argv)
+
+            self.assertTrue('dcos_quobyte.cli' in times, argv)
+            heavy = [name for name in HEAVY_MODULES if name in times]
+            self.assertEqual([], heavy,
+                             "quobyte " + " ".join(argv) + " imports " +
+                             ", ".join(heavy))
+
+    def test_import_budget(self):
+        budget = int(os.environ.get(IMPORT_BUDGET_ENV,
+                                    DEFAULT_IMPORT_BUDGET_MS))
+        # best of three to even out a cold file system cache
+        elapsed = min(_import_times(['--info'])['dcos_quobyte.cli']
+                      for _ in range(3)) / 1000.0
+
+        self.assertTrue(elapsed <= budget,
+                        "Importing dcos_quobyte.cli took {0:.1f}ms, budget is "
+                        "{1}ms".format(elapsed, budget))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+""" Unit tests for the dcos-quobyte inventory """
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import unittest
+
+import six
+
+from dcos_quobyte import discovery
+from dcos_quobyte import inventory
+
+TASKS = [
+    discovery.Task('registry.1', 'registry', 'TASK_RUNNING', 'S1', 'fw-1'),
+    discovery.Task('metadata.1', 'metadata', 'TASK_RUNNING', 'S1', 'fw-1'),
+    discovery.Task('data.1', 'data', 'TASK_RUNNING', 'S1', 'fw-1'),
+    discovery.Task('data.2', 'data', 'TASK_STAGING', 'S2', 'fw-1'),
+    discovery.Task('api.1', 'api', 'TASK_RUNNING', 'S2', 'fw-1'),
+    discovery.Task('console.1', 'webconsole', 'TASK_RUNNING', 'S3', 'fw-1')]
+
+AGENTS = {'S1': discovery.Agent('S1', 'agent1', 'slave(1)@10.0.0.1:5051'),
+          'S2': discovery.Agent('S2', 'agent2', 'slave(1)@10.0.0.2:5051')}
+
+
+class dcos_quobyte_inventory_test (unittest.TestCase):
+
+    def setUp(self):
+        print("\n------- Testing method " + self._testMethodName)
+        self.inventory = inventory.build(TASKS, AGENTS)
+
+    def test_role_of(self):
+        self.assertEqual('metadata', inventory.role_of('quobyte-metadata'))
+        self.assertEqual('data', inventory.role_of('Data'))
+        self.assertEqual('other', inventory.role_of(None))
+
+    def test_indexes(self):
+        self.assertEqual(6, len(self.inventory))
+        self.assertEqual(['S1', 'S2', 'S3'], self.inventory.agents())
+        self.assertEqual(['registry', 'metadata', 'data', 'api', 'other'],
+                         self.inventory.roles())
+        self.assertEqual(['data.1', 'data.2'],
+                         [service.task_id for service
+                          in self.inventory.with_role('data')])
+        self.assertEqual(['data.2', 'api.1'],
+                         [service.task_id for service
+                          in self.inventory.on_agent('S2')])
+        self.assertEqual({'data': 1, 'api': 1},
+                         self.inventory.role_counts('S2'))
+        self.assertEqual(None, self.inventory.on_agent('S3')[0].hostname)
+
+    def test_strings_are_shared(self):
+        first, second = self.inventory.with_role('data')
+        self.assertIs(first.name, second.name)
+        self.assertEqual((), inventory.Service.__slots__)
+
+    def test_to_json(self):
+        output = inventory.to_json(self.inventory)
+
+        self.assertEqual(6, len(output['services']))
+        self.assertEqual({'task_id': 'api.1', 'name': 'api', 'role': 'api',
+                          'state': 'TASK_RUNNING', 'agent_id': 'S2',
+                          'hostname': 'agent2'}, output['services'][4])
+        self.assertEqual(2, output['roles']['data'])
+        self.assertEqual({'hostname': 'agent1',
+                          'roles': {'registry': 1, 'metadata': 1,
+                                    'data': 1}}, output['agents']['S1'])
+
+    def test_write_csv(self):
+        output = six.StringIO()
+
+        inventory.write_csv(self.inventory, output)
+
+        lines = output.getvalue().splitlines()
+        self.assertEqual('task_id,name,role,state,agent_id,hostname',
+                         lines[0])
+        self.assertEqual('console.1,webconsole,other,TASK_RUNNING,S3,',
+                         lines[-1])
+
+    def test_format_table(self):
+        lines = inventory.format_table(self.inventory).splitlines()
+
+        self.assertEqual(['AGENT', 'ROLE', 'STATE', 'TASK'], lines[0].split())
+        self.assertEqual(['S3', 'other', 'TASK_RUNNING', 'console.1'],
+                         lines[1].split())
+        self.assertEqual(['agent1', 'data', 'TASK_RUNNING', 'data.1'],
+                         lines[2].split())
+        self.assertEqual("6 tasks on 3 agents: registry 1, metadata 1, "
+                         "data 2, api 1, other 1", lines[-1])
+        self.assertEqual("No Quobyte tasks running.",
+                         inventory.format_table(inventory.Inventory([])))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+""" Unit tests for dcos-quobyte framework API load tests """
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import json
+import threading
+import unittest
+
+import httpstub
+import mock
+
+from dcos_quobyte import cli
+from dcos_quobyte import discovery
+from dcos_quobyte import loadtest
+
+
+class _Handler(httpstub.Handler):
+
+    def do_GET(self):
+        body = self.read_body()
+        with self.server.lock:
+            self.server.requests.append((self.path, body))
+            failed = len(self.server.requests) in self.server.failing
+        self.respond(500 if failed else 200)
+
+
+class dcos_quobyte_histogram_test (unittest.TestCase):
+
+    def setUp(self):
+        print("\n------- Testing method " + self._testMethodName)
+
+    def test_exact_below_precision(self):
+        histogram = loadtest.Histogram()
+        for value in range(1, 101):
+            histogram.record(value)
+
+        self.assertEqual(50, histogram.percentile(50))
+        self.assertEqual(99, histogram.percentile(99))
+        self.assertEqual(100, histogram.percentile(100))
+        self.assertEqual(50.5, histogram.mean())
+
+    def test_relative_error(self):
+        histogram = loadtest.Histogram()
+        for value in (1000, 123456, 98765432):
+            single = loadtest.Histogram()
+            single.record(value)
+            histogram.record(value)
+            self.assertEqual(value, single.percentile(50))
+
+        bound = 1.0 / 2 ** (loadtest.PRECISION_BITS - 1)
+        self.assertTrue(abs(histogram.percentile(50) - 123456) <=
+                        123456 * bound)
+        self.assertEqual(98765432, histogram.percentile(100))
+
+    def test_bounded(self):
+        histogram = loadtest.Histogram(highest=10 ** 6)
+        size = len(histogram.counts)
+        for value in range(0, 2 * 10 ** 6, 997):
+            histogram.record(value)
+
+        self.assertEqual(size, len(histogram.counts))
+        self.assertEqual(10 ** 6, histogram.max)
+
+    def test_merge(self):
+        first, second = loadtest.Histogram(), loadtest.Histogram()
+        first.record(10)
+        second.record(30)
+        first.merge(second)
+
+        self.assertEqual((2, 10, 30), (first.count, first.min, first.max))
+        self.assertRaises(ValueError, first.merge,
+                          loadtest.Histogram(highest=100))
+
+    def test_empty(self):
+        self.assertIsNone(loadtest.Histogram().percentile(50))
+
+
+class dcos_quobyte_loadtest_test (unittest.TestCase):
+
+    def setUp(self):
+        print("\n------- Testing method " + self._testMethodName)
+        self.server, self.url = httpstub.serve(
+            self, _Handler, lock=threading.Lock(), requests=[],
+            failing=set())
+
+    def test_closed_loop(self):
+        self.server.failing = set([3])
+        sender = loadtest.client_sender(self.url + '/v1/version', '2.0')
+
+        result = loadtest.run(sender, concurrency=4, duration=30,
+                              requests=40)
+
+        self.assertEqual(39, result.histogram.count)
+        self.assertEqual({'500': 1}, result.errors)
+        self.assertEqual(40, len(self.server.requests))
+        self.assertEqual(('/v1/version', b'2.0'), self.server.requests[0])
+        summary = loadtest.summary(result)
+        self.assertEqual('closed', summary['model'])
+        self.assertEqual(0.025, summary['error_rate'])
+
+    def test_open_loop(self):
+        sender = loadtest.client_sender(self.url + '/v1/state')
+
+        result = loadtest.run(sender, concurrency=2, rate=50.0,
+                              duration=0.21)
+
+        # requests are due at 0, 20, ... 200ms
+        self.assertEqual(11, result.histogram.count)
+        self.assertTrue(result.elapsed >= 0.2)
+        self.assertEqual('open', loadtest.summary(result)['model'])
+
+    def test_connection_errors(self):
+        self.server.server_close()
+        sender = loadtest.client_sender(self.url + '/v1/state')
+
+        result = loadtest.run(sender, concurrency=1, requests=2)
+
+        self.assertEqual({'ConnectionError': 2}, result.errors)
+        self.assertIn("errors 2 (100.00%)", loadtest.format_summary(result))
+
+    @mock.patch.object(cli, 'print')
+    @mock.patch.object(discovery, 'cluster_key', return_value=None)
+    def test_cli_bench_api(self, mock_cluster_key, mock_print):
+        self.assertEqual(0, cli.bench_api(self.url, operation='state',
+                                          concurrency=2, requests=10,
+                                          output_json=True))
+
+        summary = json.loads(mock_print.call_args[0][0])
+        self.assertEqual(10, summary['succeeded'])
+        self.assertEqual(set(['/v1/state']),
+                         set(path for path, _ in self.server.requests))
+        self.assertRaises(ValueError, cli.bench_api, self.url,
+                          operation='start')
+
+
+if __name__ == '__main__':
+    unittest.main()
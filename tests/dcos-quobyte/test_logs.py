@@ -0,0 +1,138 @@
+""" Unit tests for dcos-quobyte log tailing """
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import unittest
+
+import mock
+import requests
+import six
+
+from dcos_quobyte import discovery
+from dcos_quobyte import logs
+
+AGENT = discovery.Agent('S1', 'agent1', 'slave(1)@10.0.0.1:5051')
+
+
+def _log(task_id='data.1', name='stdout'):
+    return logs.LogFile(task_id, name, AGENT, '/sandbox/' + task_id + '/' +
+                        name)
+
+
+class _Files(object):
+    """Stand-in for files/read.json over growing in-memory files, whose
+    offsets and lengths count UTF-8 bytes"""
+
+    def __init__(self, contents):
+        self.contents = contents
+        self.reads = []
+
+    def read(self, log, offset, length):
+        content = self.contents[log.path].encode('utf-8')
+        if offset == -1:
+            return {'data': '', 'offset': len(content)}
+        self.reads.append((log.path, offset, length))
+        return {'data': content[offset:offset + length].decode('utf-8'),
+                'offset': offset}
+
+
+class dcos_quobyte_logs_test (unittest.TestCase):
+
+    def setUp(self):
+        print("\n------- Testing method " + self._testMethodName)
+
+    def test_tail_is_incremental(self):
+        log = _log()
+        files = _Files({log.path: 'cut off\nfirst\nsecond\npart'})
+        tail = logs.Tail(log, files.read, tail=18)
+
+        self.assertEqual(['first', 'second'], list(tail.poll()))
+        files.contents[log.path] += 'ial\nthird\n'
+        self.assertEqual(['partial', 'third'], list(tail.poll()))
+        self.assertEqual([], list(tail.poll()))
+        self.assertEqual([(log.path, 7, logs.READ_LENGTH),
+                          (log.path, 25, logs.READ_LENGTH),
+                          (log.path, 35, logs.READ_LENGTH)], files.reads)
+
+    def test_tail_counts_bytes(self):
+        log = _log()
+        files = _Files({log.path: 'gr\u00fc\u00dfe\nzweite\n'})
+        tail = logs.Tail(log, files.read)
+
+        self.assertEqual(['gr\u00fc\u00dfe', 'zweite'], list(tail.poll()))
+        files.contents[log.path] += 'dritte \u2713\n'
+        self.assertEqual(['dritte \u2713'], list(tail.poll()))
+        self.assertEqual([], list(tail.poll()))
+        self.assertEqual([0, 15, 26], [offset for _, offset, _ in files.reads])
+
+    def test_tail_nothing_keeps_first_new_line(self):
+        log = _log()
+        files = _Files({log.path: 'old\n'})
+        tail = logs.Tail(log, files.read, tail=0)
+
+        self.assertEqual([], list(tail.poll()))
+        files.contents[log.path] += 'new\n'
+        self.assertEqual(['new'], list(tail.poll()))
+
+    def test_tail_reads_in_bounded_chunks(self):
+        log = _log()
+        files = _Files({log.path: 'x' * (logs.MAX_LINE + 2000) + '\nend\n'})
+        with mock.patch.object(logs, 'READ_LENGTH', 1024):
+            lines = list(logs.Tail(log, files.read, tail=10 ** 6).poll())
+
+        # the overlong line is cut right after exceeding MAX_LINE
+        self.assertEqual([logs.MAX_LINE + 1024, 976, 3],
+                         [len(line) for line in lines])
+        self.assertTrue(all(length == 1024 for _, _, length in files.reads))
+
+    def test_stream(self):
+        stdout, stderr = _log(), _log(name='stderr')
+        files = _Files({stdout.path: 'started\nready', stderr.path: ''})
+        output = six.StringIO()
+
+        self.assertEqual(0, logs.stream([stdout, stderr], files.read, output))
+        self.assertEqual('data.1 stdout | started\ndata.1 stdout | ready\n',
+                         output.getvalue())
+
+    def test_stream_failure(self):
+        def read(log, offset, length):
+            raise requests.exceptions.ConnectionError("agent down")
+
+        self.assertEqual(1, logs.stream([_log()], read, six.StringIO()))
+
+    @mock.patch.object(discovery, 'agent_state_chunks')
+    @mock.patch.object(discovery, 'fetch_framework_tasks')
+    def test_find_logs(self, mock_fetch_tasks, mock_agent_state):
+        def fetch_tasks(framework_name, dcos_client, agents):
+            agents['S1'] = AGENT
+            return [discovery.Task('data.1', 'data', 'TASK_RUNNING', 'S1',
+                                   'fw-1'),
+                    discovery.Task('lost.1', 'data', 'TASK_RUNNING', 'S9',
+                                   'fw-1')]
+        mock_fetch_tasks.side_effect = fetch_tasks
+        mock_agent_state.return_value.__enter__.return_value = [
+            '{"frameworks": [{"id": "fw-1", "executors": [{"id": "data.1", '
+            '"directory": "/sandbox/data.1/", "tasks": []}]}]}']
+
+        self.assertEqual([_log(name='stderr'), _log()],
+                         logs.find_logs('quobyte', mock.Mock()))
+
+    def test_file_reader_authenticates(self):
+        dcos_client = mock.Mock()
+        dcos_client.slave_url.return_value = 'http://agent/files/read.json'
+        dcos_client.slave_file_read.return_value = {'data': 'a',
+                                                    'offset': 0}
+        reader = logs.FileReader(dcos_client)
+
+        with mock.patch.object(reader._session, 'get') as mock_get:
+            mock_get.return_value.status_code = requests.codes.unauthorized
+            self.assertEqual('a', reader.read(_log(), 0, 10)['data'])
+            self.assertEqual('a', reader.read(_log(), 1, 10)['data'])
+
+        self.assertEqual(1, mock_get.call_count)
+        dcos_client.slave_file_read.assert_called_with(
+            'S1', 'http://10.0.0.1:5051', '/sandbox/data.1/stdout', 1, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
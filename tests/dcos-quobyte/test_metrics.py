@@ -0,0 +1,174 @@
+""" Unit tests for dcos-quobyte metrics """
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import unittest
+
+import mock
+import requests
+
+from dcos_quobyte import discovery
+from dcos_quobyte import inventory
+from dcos_quobyte import metrics
+
+AGENTS = {'S1': discovery.Agent('S1', 'agent1', 'slave(1)@10.0.0.1:5051'),
+          'S2': discovery.Agent('S2', 'agent2', 'slave(1)@10.0.0.2:5051')}
+
+TASKS = [discovery.Task('data.1', 'data', 'TASK_RUNNING', 'S1', 'fw-1'),
+         discovery.Task('data.2', 'data', 'TASK_RUNNING', 'S2', 'fw-1'),
+         discovery.Task('metadata.1', 'metadata', 'TASK_RUNNING', 'S2',
+                        'fw-1')]
+
+
+def _entry(task_id, timestamp, cpu, read, write=0, rx=0):
+    return {'executor_id': task_id,
+            'framework_id': 'fw-1',
+            'statistics': {
+                'timestamp': timestamp,
+                'cpus_user_time_secs': cpu,
+                'cpus_system_time_secs': cpu / 2.0,
+                'mem_rss_bytes': 1024,
+                'disk_used_bytes': 2048,
+                'net_rx_bytes': rx,
+                'blkio_statistics': {'throttling': [
+                    {'device': {'major': 8, 'minor': 0},
+                     'io_service_bytes': [{'op': 'Read', 'value': read},
+                                          {'op': 'Write', 'value': write}]},
+                    {'io_service_bytes': [{'op': 'Read', 'value': read},
+                                          {'op': 'Write', 'value': write},
+                                          {'op': 'Total',
+                                           'value': read + write}]}]}}}
+
+
+class dcos_quobyte_metrics_test (unittest.TestCase):
+
+    def setUp(self):
+        print("\n------- Testing method " + self._testMethodName)
+        self.now = 100.0
+        self.counters = {'data.1': [0.0, 0], 'data.2': [0.0, 0],
+                         'metadata.1': [0.0, 0]}
+        self.collector = metrics.Collector(inventory.build(TASKS, AGENTS),
+                                           AGENTS, self._statistics,
+                                           lambda: {'healthy': True},
+                                           history=3)
+
+    def _statistics(self, agent):
+        entries = [_entry(task.id, self.now, *self.counters[task.id])
+                   for task in TASKS if task.slave_id == agent.id]
+        entries.append(_entry('other', self.now, 1.0, 1))
+        return entries
+
+    def _advance(self, seconds, **reads):
+        self.now += seconds
+        for task_id, (cpu, read) in reads.items():
+            counters = self.counters[task_id.replace('_', '.')]
+            counters[0] += cpu
+            counters[1] += read
+
+    def test_usage(self):
+        usage = metrics.usage(_entry('t', 1.0, 2.0, 300, 400)['statistics'])
+
+        self.assertEqual(metrics.Usage(1.0, 3.0, 1024, 2048, 300, 400, 0, 0),
+                         usage)
+
+    def test_rates(self):
+        previous = metrics.Usage(10.0, 1.0, 0, 0, 0, 0, 0, 0)
+        current = metrics.Usage(12.0, 2.0, 5, 6, 200, 400, 20, 40)
+
+        self.assertEqual(metrics.Rates(12.0, 0.5, 5, 6, 100, 200, 10, 20),
+                         metrics.rates(previous, current))
+        self.assertIsNone(metrics.rates(current, previous))
+        self.assertIsNone(metrics.rates(current, current))
+
+    def test_collector(self):
+        self.assertEqual(0, self.collector.sample())
+        self.assertEqual({}, self.collector.latest())
+
+        self._advance(2, data_1=(1.0, 4096), data_2=(0.5, 1024))
+        self.collector.sample()
+
+        latest = self.collector.latest()
+        self.assertEqual(['data.1', 'data.2', 'metadata.1'], sorted(latest))
+        self.assertEqual(0.75, latest['data.1'].cpus)
+        self.assertEqual(2048, latest['data.1'].disk_read_rate)
+        self.assertEqual(0, latest['metadata.1'].disk_read_rate)
+        self.assertTrue(self.collector.framework[-1].up)
+
+    def test_collector_custom_executor(self):
+        def statistics(agent):
+            entries = self._statistics(agent)
+            for entry in entries:
+                if entry['executor_id'] == 'data.2':
+                    entry['executor_id'] = 'quobyte-executor'
+            return entries
+        fetch_executors = mock.Mock(return_value={
+            'quobyte-executor': ['data.2']})
+        collector = metrics.Collector(inventory.build(TASKS, AGENTS), AGENTS,
+                                      statistics,
+                                      fetch_executors=fetch_executors)
+
+        collector.sample()
+        self._advance(2, data_2=(0.5, 1024))
+        collector.sample()
+
+        self.assertEqual(0.375, collector.latest()['data.2'].cpus)
+        # only read again for executors that were not seen before
+        self.assertEqual(2, fetch_executors.call_count)
+
+    def test_ring_buffer(self):
+        for _ in range(5):
+            self._advance(1, data_1=(0.1, 10))
+            self.collector.sample()
+
+        self.assertEqual(3, len(self.collector.rates['data.1']))
+        self.assertEqual(3, len(self.collector.framework))
+
+    def test_failed_agent(self):
+        def fetch(agent):
+            if agent.id == 'S2':
+                raise requests.exceptions.ConnectionError("down")
+            return self._statistics(agent)
+        self.collector._fetch_statistics = fetch
+
+        self.assertEqual(1, self.collector.sample())
+
+    @mock.patch.object(metrics.time, 'sleep')
+    def test_run_fixed_interval(self, mock_sleep):
+        clock = [0.0]
+        sample_times = []
+
+        def sample():
+            sample_times.append(clock[0])
+            clock[0] += 0.4
+        collector = mock.Mock(sample=sample)
+        mock_sleep.side_effect = lambda seconds: clock.__setitem__(
+            0, clock[0] + seconds)
+
+        with mock.patch.object(metrics.time, 'time', lambda: clock[0]):
+            metrics.run(collector, samples=3, interval=1.0)
+
+        self.assertEqual([0.0, 1.0, 2.0, 3.0], sample_times)
+
+    def test_formats(self):
+        self.collector.sample()
+        self._advance(2, data_2=(0.2, 8192), data_1=(0.2, 1024))
+        self.collector.sample()
+
+        table = metrics.format_table(self.collector).splitlines()
+        self.assertEqual('TASK', table[0].split()[0])
+        self.assertEqual(['data.2', 'agent2', 'data', '0.15', '1.0K',
+                          '2.0K', '4.0K'], table[1].split()[:7])
+
+        prometheus = metrics.format_prometheus(self.collector)
+        self.assertIn('quobyte_framework_up 1\n', prometheus)
+        self.assertIn('quobyte_task_disk_read_bytes_per_second{task="data.2",'
+                      'agent="agent2",role="data"} 4096.0\n', prometheus)
+
+        output = metrics.to_json(self.collector)
+        self.assertEqual('metadata', output['tasks']['metadata.1']['role'])
+        self.assertEqual(4096, output['tasks']['data.2']['samples'][-1][
+            'disk_read_rate'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+""" Unit tests for dcos-quobyte status snapshots """
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+import requests
+
+from dcos_quobyte import cache
+from dcos_quobyte import discovery
+from dcos_quobyte import monitor
+
+TASKS = [discovery.Task('data.1', 'data', 'TASK_RUNNING', 'S1', 'fw-1'),
+         discovery.Task('registry.1', 'registry', 'TASK_STAGING', 'S2',
+                        'fw-1')]
+
+
+class dcos_quobyte_monitor_test (unittest.TestCase):
+
+    def setUp(self):
+        print("\n------- Testing method " + self._testMethodName)
+
+    def test_collect(self):
+        snap = monitor.collect('http://a:1',
+                               lambda: {'release': '1.0', 'healthy': True},
+                               lambda: TASKS)
+
+        self.assertEqual('1.0', snap['release'])
+        self.assertEqual({'name': 'registry', 'state': 'TASK_STAGING',
+                          'agent': 'S2'}, snap['tasks']['registry.1'])
+
+    def test_diff(self):
+        old = monitor.snapshot('http://a:1', {'release': '1.0'}, TASKS)
+        new = monitor.snapshot(
+            'http://a:1', {'release': '2.0'},
+            [TASKS[1]._replace(state='TASK_RUNNING'),
+             discovery.Task('metadata.1', 'metadata', 'TASK_RUNNING', 'S3',
+                            'fw-1')])
+
+        changes = monitor.diff(old, new)
+
+        self.assertEqual([('release', None, '1.0', '2.0'),
+                          ('task', 'data.1', old['tasks']['data.1'], None),
+                          ('task', 'metadata.1', None,
+                           new['tasks']['metadata.1']),
+                          ('task', 'registry.1', old['tasks']['registry.1'],
+                           new['tasks']['registry.1'])], changes)
+        self.assertEqual('~ release: 1.0 -> 2.0\n'
+                         '- data.1\n'
+                         '+ metadata.1 metadata TASK_RUNNING S3\n'
+                         '~ registry.1 TASK_STAGING -> TASK_RUNNING',
+                         monitor.format_changes(changes))
+        self.assertEqual([], monitor.diff(new, new))
+
+    def test_format_table(self):
+        table = monitor.format_table(
+            monitor.snapshot('http://a:1', {'release': '1.0',
+                                            'healthy': False}, TASKS))
+
+        self.assertEqual(['Framework  http://a:1',
+                          'Release    1.0',
+                          'Healthy    no',
+                          '',
+                          'ID          NAME      STATE         AGENT',
+                          'data.1      data      TASK_RUNNING  S1',
+                          'registry.1  registry  TASK_STAGING  S2'],
+                         table.split('\n'))
+
+    @mock.patch.object(monitor, 'print')
+    @mock.patch.object(monitor.time, 'sleep')
+    def test_watch_prints_changes_only(self, mock_sleep, mock_print):
+        first = monitor.snapshot('http://a:1', {'release': '1.0'}, [])
+        second = monitor.snapshot('http://a:1', {'release': '2.0'}, [])
+        fetch = mock.Mock(side_effect=[first, first, first, second])
+
+        self.assertEqual(0, monitor.watch(fetch, output_json=True,
+                                          interval=1, iterations=4))
+
+        self.assertEqual(2, mock_print.call_count)
+        change = json.loads(mock_print.call_args[0][0])
+        self.assertEqual([['release', None, '1.0', '2.0']],
+                         change['changes'])
+        # the interval grows while nothing changes
+        self.assertEqual([mock.call(1), mock.call(2), mock.call(4)],
+                         mock_sleep.call_args_list)
+
+    @mock.patch.object(monitor, 'print')
+    @mock.patch.object(monitor.time, 'sleep')
+    def test_watch_keeps_polling_on_errors(self, mock_sleep, mock_print):
+        first = monitor.snapshot('http://a:1', {'release': '1.0'}, [])
+        second = monitor.snapshot('http://a:1', {'release': '2.0'}, [])
+        fetch = mock.Mock(side_effect=[
+            requests.exceptions.ConnectionError("refused"), first,
+            requests.exceptions.HTTPError("502"), second])
+
+        self.assertEqual(0, monitor.watch(fetch, output_json=True,
+                                          interval=1, iterations=4))
+
+        self.assertEqual(4, fetch.call_count)
+        self.assertEqual(2, mock_print.call_count)
+        self.assertEqual('1.0', json.loads(
+            mock_print.call_args_list[0][0][0])['release'])
+        change = json.loads(mock_print.call_args[0][0])
+        self.assertEqual([['release', None, '1.0', '2.0']],
+                         change['changes'])
+
+    def test_state_fetcher_conditional(self):
+        client = mock.Mock()
+        first = mock.Mock(status_code=requests.codes.ok,
+                          headers={'ETag': '"v1"'})
+        first.json.return_value = {'release': '1.0'}
+        client.get.side_effect = [
+            first, mock.Mock(status_code=requests.codes.not_modified)]
+        fetcher = monitor.StateFetcher(client, 'http://a:1/v1/state')
+
+        self.assertEqual({'release': '1.0'}, fetcher())
+        self.assertEqual({'release': '1.0'}, fetcher())
+        client.get.assert_called_with('http://a:1/v1/state',
+                                      headers={'If-None-Match': '"v1"'})
+
+    def test_task_fetcher_polls_counts(self):
+        counts = [[discovery.TaskCounts('fw-1', 'http://a:1',
+                                        {'TASK_RUNNING': 1,
+                                         'TASK_STAGING': 1})]] * 2 + \
+            [[discovery.TaskCounts('fw-1', 'http://a:1',
+                                   {'TASK_RUNNING': 2})]]
+        fetch_tasks = mock.Mock(side_effect=[TASKS, TASKS[:1]])
+        fetcher = monitor.TaskFetcher(mock.Mock(side_effect=counts),
+                                      fetch_tasks)
+
+        self.assertEqual(TASKS, fetcher())
+        self.assertEqual(TASKS, fetcher())
+        self.assertEqual(1, fetch_tasks.call_count)
+        self.assertEqual(TASKS[:1], fetcher())
+        self.assertEqual(2, fetch_tasks.call_count)
+
+    def test_status_cache(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        snap = monitor.snapshot('http://a:1', None, TASKS)
+
+        with mock.patch.object(cache, 'path',
+                               return_value=os.path.join(tmp_dir, 's.json')):
+            monitor.store('http://a:1', snap)
+            self.assertEqual(snap, monitor.load_cached('http://a:1'))
+            self.assertEqual(None, monitor.load_cached('http://b:2'))
+            other = monitor.snapshot('http://b:2', None, [])
+            monitor.store('http://b:2', other)
+            self.assertEqual(snap, monitor.load_cached('http://a:1'))
+            self.assertEqual(other, monitor.load_cached('http://b:2'))
+            with mock.patch.dict(os.environ, {monitor.STATUS_TTL_ENV: '-1'}):
+                self.assertEqual(None, monitor.load_cached('http://a:1'))
+
+if __name__ == '__main__':
+    unittest.main()
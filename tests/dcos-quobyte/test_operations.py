@@ -0,0 +1,127 @@
+""" Unit tests for the dcos-quobyte operation tracking """
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import mock
+
+from dcos_quobyte import discovery
+from dcos_quobyte import operations
+from dcos_quobyte import polling
+
+
+def _counts(webui_url, **states):
+    return discovery.TaskCounts(None, webui_url, states)
+
+
+class dcos_quobyte_operations_test (unittest.TestCase):
+
+    def setUp(self):
+        print("\n------- Testing method " + self._testMethodName)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        path_patcher = mock.patch.object(
+            operations, 'operations_path',
+            return_value=os.path.join(self.tmp_dir, 'operations.json'))
+        path_patcher.start()
+        self.addCleanup(path_patcher.stop)
+
+    def test_is_reached(self):
+        running = [_counts('http://a:1', TASK_RUNNING=3)]
+        starting = [_counts('http://a:1', TASK_RUNNING=2, TASK_STARTING=1)]
+        killing = [_counts('http://a:1', TASK_KILLING=1, TASK_KILLED=2)]
+        stopped = [_counts('http://a:1', TASK_KILLED=3)]
+
+        self.assertTrue(operations.is_reached(running,
+                                              operations.TARGET_RUNNING))
+        self.assertFalse(operations.is_reached(starting,
+                                               operations.TARGET_RUNNING))
+        self.assertFalse(operations.is_reached([],
+                                               operations.TARGET_RUNNING))
+        self.assertFalse(operations.is_reached(killing,
+                                               operations.TARGET_STOPPED))
+        self.assertTrue(operations.is_reached(stopped,
+                                              operations.TARGET_STOPPED))
+        self.assertTrue(operations.is_reached([],
+                                              operations.TARGET_STOPPED))
+
+    def test_select(self):
+        a = _counts('http://a:1/', TASK_RUNNING=1)
+        b = _counts('http://b:2', TASK_RUNNING=1)
+
+        self.assertEqual([a], operations.select([a, b], 'http://a:1'))
+        self.assertEqual([a, b], operations.select([a, b], 'http://c:3'))
+        self.assertEqual([], operations.select([a, b], 'http://c:3',
+                                               fallback=False))
+
+    @mock.patch.object(polling.time, 'sleep')
+    def test_wait(self, mock_sleep):
+        fetch_counts = mock.Mock(side_effect=[
+            [_counts('http://a:1', TASK_STAGING=1),
+             _counts('http://b:2', TASK_RUNNING=1)],
+            [_counts('http://a:1', TASK_RUNNING=1),
+             _counts('http://b:2', TASK_RUNNING=1)]])
+
+        self.assertTrue(operations.wait(['http://a:1', 'http://b:2'],
+                                        operations.TARGET_RUNNING,
+                                        fetch_counts, timeout=60))
+        self.assertEqual(2, fetch_counts.call_count)
+        self.assertEqual(1, mock_sleep.call_count)
+
+    @mock.patch.object(polling.time, 'sleep')
+    def test_wait_retries_errors(self, mock_sleep):
+        fetch_counts = mock.Mock(side_effect=[
+            IOError("master unavailable"),
+            [_counts('http://a:1', TASK_RUNNING=1)]])
+
+        self.assertTrue(operations.wait(['http://a:1'],
+                                        operations.TARGET_RUNNING,
+                                        fetch_counts, timeout=60,
+                                        errors=(IOError,)))
+        self.assertEqual(2, fetch_counts.call_count)
+
+    @mock.patch.object(polling.time, 'sleep')
+    def test_wait_unregistered_framework_stopped(self, mock_sleep):
+        other = _counts('http://b:2', TASK_RUNNING=3)
+        fetch_counts = mock.Mock(side_effect=[
+            [_counts('http://a:1', TASK_KILLING=1), other], [other]])
+
+        self.assertTrue(operations.wait(['http://a:1'],
+                                        operations.TARGET_STOPPED,
+                                        fetch_counts, timeout=60))
+        self.assertEqual(2, fetch_counts.call_count)
+
+    @mock.patch.object(polling.time, 'sleep')
+    def test_wait_timeout(self, mock_sleep):
+        fetch_counts = mock.Mock(
+            return_value=[_counts('http://a:1', TASK_RUNNING=1)])
+
+        with mock.patch.object(polling.time, 'time',
+                               side_effect=[0, 30, 61]):
+            self.assertFalse(operations.wait(['http://a:1'],
+                                             operations.TARGET_STOPPED,
+                                             fetch_counts, timeout=60))
+
+    def test_submit_and_load(self):
+        operation_id = operations.submit('stop', ['http://a:1'])
+
+        operation = operations.load(operation_id)
+        self.assertEqual('stop', operation['action'])
+        self.assertEqual(['http://a:1'], operation['hosts'])
+        self.assertIsNone(operations.load('unknown'))
+
+    def test_submit_drops_expired(self):
+        with mock.patch.object(time, 'time', return_value=1000.0):
+            old_id = operations.submit('start', ['http://a:1'])
+        new_id = operations.submit('start', ['http://a:1'])
+
+        self.assertIsNone(operations.load(old_id))
+        self.assertIsNotNone(operations.load(new_id))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,229 @@
+""" Unit tests for dcos-quobyte placement of services onto agents """
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from dcos_quobyte import cli
+from dcos_quobyte import discovery
+from dcos_quobyte import placement
+from dcos_quobyte import spec
+
+SCHEMA = json.loads(cli.SCHEMA)
+
+
+def _agent(number, rack, disks, **overrides):
+    agent = {'id': 'S' + str(number), 'hostname': 'a' + str(number) + '.adr',
+             'active': True,
+             'resources': {'cpus': 8.0, 'mem': 16384.0, 'disk': 10000.0},
+             'used_resources': {'cpus': 1.0, 'mem': 1024.0},
+             'attributes': {'rack': rack},
+             'reserved_resources_full': {'quobyte': [
+                 {'name': 'disk', 'disk': {'source': {'type': 'MOUNT'}}}
+                 for _ in range(disks)]}}
+    agent.update(overrides)
+    return agent
+
+
+AGENTS = [_agent(1, 'r1', 1), _agent(2, 'r1', 4), _agent(3, 'r2', 1),
+          _agent(4, 'r2', 4), _agent(5, 'r3', 1), _agent(6, 'r3', 1),
+          _agent(7, 'r3', 4, active=False)]
+
+
+def _hostnames(agents):
+    return sorted(agent.hostname for agent in agents)
+
+
+class dcos_quobyte_placement_test (unittest.TestCase):
+
+    def setUp(self):
+        print("\n------- Testing method " + self._testMethodName)
+        self.index = placement.build_model(AGENTS, 'quobyte', 'rack')
+
+    def test_fault_domain(self):
+        agent = _agent(1, 'r1', 0, domain={'fault_domain': {
+            'region': {'name': 'eu'}, 'zone': {'name': 'eu-1a'}}})
+
+        self.assertEqual('r1', placement.fault_domain(agent, 'rack'))
+        self.assertEqual('eu-1a', placement.fault_domain(agent))
+        self.assertEqual('a1.adr', placement.fault_domain(agent, 'row'))
+
+    def test_build_model(self):
+        self.assertEqual(6, len(self.index))
+        self.assertEqual(['r1', 'r2', 'r3'], self.index.domains())
+        self.assertEqual(placement.AgentModel(
+            'S2', 'a2.adr', 'r1', {'rack': 'r1'}, 7.0, 15360.0, 10000.0, 4),
+            self.index.by_id('S2'))
+        self.assertEqual(['S5', 'S6'],
+                         [agent.id for agent in self.index.in_domain('r3')])
+
+    def test_demands(self):
+        self.assertEqual(['metadata', 'registry', 'data', 'api'],
+                         [demand.role for demand in placement.demands()])
+
+        demand, = placement.demands({'services': {'data': {
+            'count': 2, 'cpus': 4,
+            'constraints': [['hostname', 'UNIQUE'], ['rack', 'UNIQUE'],
+                            ['rack', 'LIKE', 'r[12]']]}}})
+
+        self.assertEqual(('data', 2, 4, 1), (demand.role, demand.count,
+                                             demand.cpus, demand.disks))
+        self.assertEqual((('rack', 'LIKE', 'r[12]'),), demand.filters)
+        self.assertEqual(('rack', 1), (demand.spread, demand.cap))
+
+    def test_place_defaults(self):
+        result = placement.place(self.index, placement.demands())
+
+        assignments = result.assignments
+        self.assertEqual({}, result.missing)
+        # one per rack, on the agents with a single disk
+        self.assertEqual(['a1.adr', 'a3.adr', 'a5.adr'],
+                         _hostnames(assignments['metadata']))
+        self.assertEqual(['a2.adr', 'a4.adr', 'a6.adr'],
+                         _hostnames(assignments['registry']))
+        # the agents with disks left
+        self.assertEqual(['a2.adr', 'a4.adr'],
+                         _hostnames(assignments['data']))
+        self.assertEqual(['a1.adr'], _hostnames(assignments['api']))
+
+    def test_place_data_prefers_disks(self):
+        result = placement.place(self.index, placement.demands(
+            {'services': {'metadata': {'count': 1},
+                          'data': {'count': 2}}}))
+
+        self.assertEqual(['a1.adr'],
+                         _hostnames(result.assignments['metadata']))
+        self.assertEqual(['a2.adr', 'a4.adr'],
+                         _hostnames(result.assignments['data']))
+
+    def test_place_data_everywhere(self):
+        result = placement.place(self.index, placement.demands(
+            {'services': {'data': {'mem': 1024}}}))
+
+        self.assertEqual(['a1.adr', 'a2.adr', 'a3.adr', 'a4.adr', 'a5.adr',
+                          'a6.adr'], _hostnames(result.assignments['data']))
+
+    def test_place_constraints(self):
+        result = placement.place(self.index, placement.demands(
+            {'services': {'registry': {
+                'count': 3, 'constraints': [['rack', 'UNIQUE'],
+                                            ['rack', 'UNLIKE', 'r3']]}}}))
+
+        self.assertEqual(2, len(result.assignments['registry']))
+        self.assertEqual(['r1', 'r2'], sorted(
+            agent.domain for agent in result.assignments['registry']))
+        self.assertEqual({'registry': 1}, result.missing)
+
+    def test_place_resources(self):
+        result = placement.place(self.index, placement.demands(
+            {'services': {'metadata': {'count': 2, 'mem': 20000}}}))
+
+        self.assertEqual([], result.assignments['metadata'])
+        self.assertEqual({'metadata': 2}, result.missing)
+
+    def test_place_without_hostnames(self):
+        index = placement.build_model(
+            [_agent(1, 'r1', 1, hostname=None),
+             _agent(2, 'r1', 1, hostname=None),
+             _agent(3, 'r1', 1)], 'quobyte', 'rack')
+        desired = {'services': {'data': {'count': 3}}}
+
+        result = placement.place(index, placement.demands(desired))
+
+        self.assertEqual(['S1', 'S2', 'S3'], sorted(
+            agent.id for agent in result.assignments['data']))
+        self.assertIn("S2", placement.format_table(result, index))
+        self.assertEqual(['hostname', 'LIKE', 'a3\\.adr'], placement.to_spec(
+            result, desired)['services']['data']['constraints'][-1])
+
+    def test_to_spec(self):
+        desired = {'release': '1.4',
+                   'services': {'data': {
+                       'count': 2, 'mem': 4096,
+                       'constraints': [['hostname', 'LIKE', 'a[0-9].adr'],
+                                       ['rack', 'GROUP_BY']]}}}
+        result = placement.place(self.index, placement.demands(desired))
+
+        document = placement.to_spec(result, desired)
+
+        spec.validate(document, SCHEMA)
+        self.assertEqual(
+            {'release': '1.4',
+             'services': {'data': {
+                 'count': 2, 'mem': 4096,
+                 'constraints': [['rack', 'GROUP_BY'],
+                                 ['hostname', 'LIKE',
+                                  'a2\\.adr|a4\\.adr']]}}},
+            document)
+
+    def test_format_table(self):
+        result = placement.place(self.index, placement.demands(
+            {'services': {'registry': {'count': 1},
+                          'metadata': {'count': 9}}}))
+
+        self.assertEqual(
+            "ROLE      AGENT   DOMAIN  DISKS\n"
+            "registry  a2.adr  r1      4\n"
+            "metadata  a1.adr  r1      1\n"
+            "metadata  a2.adr  r1      4\n"
+            "metadata  a3.adr  r2      1\n"
+            "metadata  a4.adr  r2      4\n"
+            "metadata  a5.adr  r3      1\n"
+            "metadata  a6.adr  r3      1\n"
+            "\n"
+            "No agent fits 3 of the metadata services.\n"
+            "7 services placed on 6 of 6 agents in 3 failure domains.",
+            placement.format_table(result, self.index))
+
+
+class dcos_quobyte_plan_test (unittest.TestCase):
+
+    def setUp(self):
+        print("\n------- Testing method " + self._testMethodName)
+        print_patcher = mock.patch.object(cli, 'print')
+        self.mock_print = print_patcher.start()
+        self.addCleanup(print_patcher.stop)
+        client_patcher = mock.patch.object(cli, 'dcos_client')
+        client_patcher.start()
+        self.addCleanup(client_patcher.stop)
+        state_patcher = mock.patch.object(
+            discovery, 'master_state_chunks',
+            return_value=mock.MagicMock(**{'__enter__.return_value': [
+                json.dumps({'frameworks': [], 'slaves': AGENTS})]}))
+        state_patcher.start()
+        self.addCleanup(state_patcher.stop)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+    def test_plan_output(self):
+        spec_path = os.path.join(self.tmp_dir, 'spec.json')
+        output = os.path.join(self.tmp_dir, 'placed.json')
+        with open(spec_path, 'w') as spec_file:
+            json.dump({'release': '1.4',
+                       'services': {'data': {'count': 2}}}, spec_file)
+
+        self.assertEqual(0, cli.plan(spec_path, domain='rack', output=output))
+
+        placed = spec.load(output, SCHEMA)
+        self.assertEqual('1.4', placed['release'])
+        self.assertEqual([['hostname', 'LIKE', 'a2\\.adr|a4\\.adr']],
+                         placed['services']['data']['constraints'])
+
+    def test_plan_missing(self):
+        spec_path = os.path.join(self.tmp_dir, 'spec.json')
+        with open(spec_path, 'w') as spec_file:
+            json.dump({'services': {'metadata': {'count': 9}}}, spec_file)
+
+        self.assertEqual(1, cli.plan(spec_path, output_json=True))
+        placed = json.loads(self.mock_print.call_args[0][0])
+        self.assertEqual(6, placed['services']['metadata']['count'])
+
+
+if __name__ == '__main__':
+    unittest.main()
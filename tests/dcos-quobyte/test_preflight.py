@@ -0,0 +1,272 @@
+""" Unit tests for dcos-quobyte pre-flight checks of the Mesos agents """
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import json
+import threading
+import time
+import unittest
+
+import mock
+
+from dcos_quobyte import cli
+from dcos_quobyte import discovery
+from dcos_quobyte import preflight
+
+
+def _agent(agent_id, **overrides):
+    agent = {'id': agent_id, 'hostname': agent_id + '.adr', 'active': True,
+             'pid': 'slave(1)@10.0.0.1:5051',
+             'resources': {'cpus': 8.0, 'mem': 16384.0, 'disk': 100000.0,
+                           'ports': '[1025-2180, 7000-8000, 31000-32000]'},
+             'used_resources': {'cpus': 1.0, 'mem': 1024.0, 'disk': 0.0,
+                                'ports': '[31000-31001]'},
+             'attributes': {'rack': 'r1', 'disk_type': 'ssd'}}
+    agent.update(overrides)
+    return agent
+
+
+def _state(disks, role='quobyte'):
+    return {'reserved_resources_full': {role: [
+        {'name': 'disk', 'role': role, 'scalar': {'value': 1000},
+         'disk': {'source': {'type': 'MOUNT',
+                             'mount': {'root': '/mnt/d' + str(i)}}}}
+        for i in range(disks)] + [
+        {'name': 'disk', 'role': role, 'scalar': {'value': 50}},
+        {'name': 'cpus', 'role': role, 'scalar': {'value': 1}}]}}
+
+
+class dcos_quobyte_preflight_test (unittest.TestCase):
+
+    def setUp(self):
+        print("\n------- Testing method " + self._testMethodName)
+
+    def test_requirements_from_spec(self):
+        requirements = preflight.requirements_from_spec(
+            {'services': {'data': {'count': 5, 'mem': 4096,
+                                   'constraints': [['hostname', 'UNIQUE'],
+                                                   ['rack', 'LIKE', 'r.*']]},
+                          'registry': {'count': 3, 'cpus': 2}}})
+
+        self.assertEqual(2, requirements.cpus)
+        self.assertEqual(4096, requirements.mem)
+        self.assertEqual(1, requirements.disks)
+        self.assertEqual((('rack', 'LIKE', 'r.*'),), requirements.constraints)
+        self.assertEqual(5, requirements.agents)
+        self.assertEqual(preflight.DEFAULT_REQUIREMENTS,
+                         preflight.requirements_from_spec({'release': '1'}))
+
+    def test_parse_ranges(self):
+        self.assertEqual([(31000, 32000), (7860, 7863)],
+                         preflight.parse_ranges('[31000-32000, 7860-7863]'))
+        self.assertEqual([], preflight.parse_ranges(None))
+
+    def test_check_agent_fit(self):
+        self.assertEqual([], preflight.check_agent(
+            _agent('S1'), preflight.DEFAULT_REQUIREMENTS))
+
+    def test_check_agent_inactive(self):
+        self.assertEqual(['inactive'], [problem.check for problem in
+                                        preflight.check_agent(
+                                            _agent('S1', active=False),
+                                            preflight.DEFAULT_REQUIREMENTS)])
+
+    def test_check_agent_problems(self):
+        agent = _agent('S1', used_resources={'cpus': 7.5, 'mem': 0,
+                                             'ports': '[7861-7861]'})
+        requirements = preflight.DEFAULT_REQUIREMENTS._replace(
+            constraints=(('rack', 'CLUSTER', 'r2'),
+                         ('disk_type', 'UNLIKE', 'hdd'),
+                         ('hostname', 'LIKE', 'S.*')))
+
+        problems = preflight.check_agent(agent, requirements)
+
+        self.assertEqual(['cpus', 'ports', 'attributes'],
+                         [problem.check for problem in problems])
+        self.assertEqual("cpus 0.5 free, 1 needed", problems[0].message)
+        self.assertEqual("ports 7861 not available", problems[1].message)
+        self.assertEqual("constraint rack CLUSTER r2 not met",
+                         problems[2].message)
+
+    def test_check_agent_own_reservations(self):
+        agent = _agent('S1', used_resources={'cpus': 7.5, 'mem': 16000,
+                                             'ports': '[7860-7870]'},
+                       reserved_resources={'quobyte': {
+                           'cpus': 7.0, 'mem': 16000,
+                           'ports': '[7860-7863]'}})
+        requirements = preflight.DEFAULT_REQUIREMENTS._replace(
+            ports=(7860, 7864))
+
+        problems = preflight.check_agent(agent, requirements, 'quobyte')
+
+        self.assertEqual(["ports 7864 not available"],
+                         [problem.message for problem in problems])
+        self.assertEqual(['cpus', 'mem', 'ports'], [
+            problem.check for problem in
+            preflight.check_agent(agent, requirements, 'other')])
+
+    def test_check_agent_hosting(self):
+        agent = _agent('S1', used_resources={'cpus': 8.0, 'mem': 16384,
+                                             'ports': '[7860-7863]'})
+        requirements = preflight.DEFAULT_REQUIREMENTS._replace(
+            constraints=(('rack', 'CLUSTER', 'r2'),))
+
+        self.assertEqual(['attributes'], [
+            problem.check for problem in
+            preflight.check_agent(agent, requirements, hosting=True)])
+        self.assertEqual(['inactive'], [
+            problem.check for problem in
+            preflight.check_agent(_agent('S1', active=False),
+                                  requirements, hosting=True)])
+
+    def test_hosting_agents(self):
+        summary = {'frameworks': [
+            {'name': 'quobyte', 'slave_ids': ['S1', 'S2']},
+            {'name': 'quobyte', 'slave_ids': ['S3']},
+            {'name': 'marathon', 'slave_ids': ['S4']},
+            {'name': 'quobyte'}]}
+
+        self.assertEqual(set(['S1', 'S2', 'S3']),
+                         preflight.hosting_agents(summary, 'quobyte'))
+        self.assertEqual(set(), preflight.hosting_agents({}, 'quobyte'))
+
+    def test_count_reserved_disks(self):
+        self.assertEqual(2, preflight.count_reserved_disks(_state(2),
+                                                           'quobyte'))
+        self.assertEqual(0, preflight.count_reserved_disks(_state(2),
+                                                           'other'))
+        self.assertEqual(0, preflight.count_reserved_disks({}, 'quobyte'))
+
+    def test_fetch_all_is_bounded(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        agents = [discovery.Agent('S' + str(i), None, None)
+                  for i in range(20)]
+
+        def fetch(agent):
+            if agent.id == 'S3':
+                release.wait()
+            if agent.id == 'S4':
+                raise IOError("refused")
+            return agent.id
+
+        start = time.time()
+        results = preflight.fetch_all(agents, fetch, 0.3, 4)
+
+        self.assertLess(time.time() - start, 2)
+        self.assertNotIn('S3', results)
+        self.assertEqual((None, "refused"), results['S4'])
+        self.assertEqual(('S19', None), results['S19'])
+        self.assertEqual(19, len(results))
+
+    def test_run(self):
+        agents = [_agent('S1'), _agent('S2'), _agent('S3', active=False),
+                  _agent('S4'), _agent('S5')]
+        states = {'S1': _state(2), 'S2': _state(0), 'S5': _state(1)}
+
+        def fetch(agent):
+            if agent.id == 'S4':
+                raise IOError("refused")
+            return states[agent.id]
+
+        reports = preflight.run(agents, preflight.DEFAULT_REQUIREMENTS,
+                                fetch, 'quobyte', timeout=5)
+
+        self.assertEqual({'S1': [], 'S2': ['disks'], 'S3': ['inactive'],
+                          'S4': ['unreachable'], 'S5': []},
+                         dict((report.id, [problem.check for problem
+                                           in report.problems])
+                              for report in reports))
+        self.assertTrue(preflight.is_ready(reports,
+                                           preflight.DEFAULT_REQUIREMENTS))
+        self.assertFalse(preflight.is_ready(
+            reports, preflight.DEFAULT_REQUIREMENTS._replace(agents=3)))
+
+    def test_run_without_disks(self):
+        fetch = mock.Mock()
+
+        reports = preflight.run(
+            [_agent('S1')], preflight.DEFAULT_REQUIREMENTS._replace(disks=0),
+            fetch, 'quobyte')
+
+        self.assertEqual([], reports[0].problems)
+        self.assertFalse(fetch.called)
+
+    def test_format_summary(self):
+        reports = [
+            preflight.AgentReport('S1', 'a1', []),
+            preflight.AgentReport('S2', 'agent2', [
+                preflight.Problem('disks', "0 disks reserved")]),
+            preflight.AgentReport('S3', 'a3', [
+                preflight.Problem('cpus', "cpus 0 free, 1 needed"),
+                preflight.Problem('ports', "ports 7860 not available")])]
+
+        self.assertEqual(
+            "AGENT   PROBLEMS\n"
+            "a3      cpus 0 free, 1 needed; ports 7860 not available\n"
+            "agent2  0 disks reserved\n"
+            "\n"
+            "Failed checks: cpus 1, ports 1, disks 1\n"
+            "1 of 3 agents fit for Quobyte services, 1 needed.",
+            preflight.format_summary(reports,
+                                     preflight.DEFAULT_REQUIREMENTS))
+        self.assertEqual(
+            ['S3', 'S2'],
+            [entry['id'] for entry in preflight.to_json(
+                reports, preflight.DEFAULT_REQUIREMENTS)['unfit']])
+
+
+class dcos_quobyte_preflight_cli_test (unittest.TestCase):
+
+    def setUp(self):
+        print("\n------- Testing method " + self._testMethodName)
+        print_patcher = mock.patch.object(cli, 'print')
+        self.mock_print = print_patcher.start()
+        self.addCleanup(print_patcher.stop)
+        self.client = mock.Mock()
+        self.client.get_state_summary.return_value = {
+            'slaves': [_agent('S1'), _agent('S2', active=False)]}
+        client_patcher = mock.patch.object(cli, 'dcos_client',
+                                           return_value=self.client)
+        client_patcher.start()
+        self.addCleanup(client_patcher.stop)
+        fetcher_patcher = mock.patch.object(
+            preflight, 'agent_state_fetcher',
+            return_value=lambda agent: _state(1))
+        fetcher_patcher.start()
+        self.addCleanup(fetcher_patcher.stop)
+
+    def test_preflight(self):
+        self.assertEqual(0, cli.preflight())
+        self.mock_print.assert_called_once_with(
+            "AGENT   PROBLEMS\n"
+            "S2.adr  agent is not active\n"
+            "\n"
+            "Failed checks: inactive 1\n"
+            "1 of 2 agents fit for Quobyte services, 1 needed.")
+
+    def test_preflight_json(self):
+        self.assertEqual(0, cli.preflight(output_json=True))
+        report = json.loads(self.mock_print.call_args[0][0])
+        self.assertEqual((2, 1, True),
+                         (report['agents'], report['fit'], report['ready']))
+
+    def test_preflight_upgrade_in_place(self):
+        self.client.get_state_summary.return_value = {
+            'slaves': [_agent('S1', used_resources={
+                'cpus': 8.0, 'mem': 16384, 'ports': '[7860-7863]'})],
+            'frameworks': [{'name': 'quobyte', 'slave_ids': ['S1']}]}
+
+        self.assertEqual(0, cli.preflight())
+        self.mock_print.assert_called_once_with(
+            "1 of 1 agents fit for Quobyte services, 1 needed.")
+
+    @mock.patch('dcos_quobyte.spec.load',
+                return_value={'services': {'data': {'count': 2}}})
+    def test_preflight_spec_not_ready(self, mock_load):
+        self.assertEqual(1, cli.preflight('spec.json'))
+        mock_load.assert_called_once_with('spec.json', mock.ANY)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+""" Unit tests for dcos-quobyte rolling upgrades """
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import itertools
+import threading
+import unittest
+
+import mock
+from requests.exceptions import ConnectionError
+
+from dcos_quobyte import polling
+from dcos_quobyte import rolling
+
+
+class dcos_quobyte_rolling_test (unittest.TestCase):
+
+    def setUp(self):
+        print("\n------- Testing method " + self._testMethodName)
+        sleep_patcher = mock.patch.object(polling.time, 'sleep')
+        self.mock_sleep = sleep_patcher.start()
+        self.addCleanup(sleep_patcher.stop)
+
+    def test_is_converged(self):
+        self.assertTrue(rolling.is_converged(None, '2.0'))
+        self.assertTrue(rolling.is_converged({'release': '2.0'}, '2.0'))
+        self.assertFalse(rolling.is_converged({'release': '1.0'}, '2.0'))
+        self.assertFalse(rolling.is_converged({'release': '2.0',
+                                               'healthy': False}, '2.0'))
+
+    def test_waves(self):
+        hosts = ['a', 'b', 'c', 'd', 'e']
+        lock = threading.Lock()
+        upgraded = []
+        concurrent = [0, 0]
+
+        def upgrade_one(host):
+            with lock:
+                upgraded.append(host)
+                concurrent[0] += 1
+                concurrent[1] = max(concurrent)
+            return 0
+
+        def get_state(host):
+            with lock:
+                concurrent[0] -= 1
+            return {'release': '2.0'}
+
+        results = rolling.rolling_upgrade(hosts, '2.0', upgrade_one,
+                                          get_state, window=2)
+
+        self.assertEqual(hosts, [result.host for result in results])
+        self.assertEqual([0] * 5, [result.code for result in results])
+        self.assertEqual(sorted(hosts), sorted(upgraded))
+        self.assertTrue(concurrent[1] <= 2)
+
+    def test_abort_after_failures(self):
+        upgrade_one = mock.Mock(side_effect=lambda host:
+                                500 if host == 'b' else 0)
+        get_state = mock.Mock(return_value={'release': '2.0'})
+
+        results = rolling.rolling_upgrade(['a', 'b', 'c', 'd'], '2.0',
+                                          upgrade_one, get_state, window=1)
+
+        self.assertEqual([0, 500, None, None],
+                         [result.code for result in results])
+        self.assertEqual(rolling.SKIPPED_ERROR, results[3].error)
+        self.assertEqual(2, upgrade_one.call_count)
+
+    def test_tolerated_failures(self):
+        upgrade_one = mock.Mock(side_effect=lambda host:
+                                500 if host == 'b' else 0)
+        get_state = mock.Mock(return_value={'release': '2.0'})
+
+        results = rolling.rolling_upgrade(['a', 'b', 'c'], '2.0',
+                                          upgrade_one, get_state,
+                                          max_failures=1)
+
+        self.assertEqual([0, 500, 0], [result.code for result in results])
+
+    def test_waits_for_convergence(self):
+        get_state = mock.Mock(side_effect=[ConnectionError,
+                                           {'release': '1.0'},
+                                           {'release': '2.0'}])
+
+        results = rolling.rolling_upgrade(['a'], '2.0',
+                                          mock.Mock(return_value=0),
+                                          get_state)
+
+        self.assertEqual(0, results[0].code)
+        self.assertEqual(3, get_state.call_count)
+
+    def test_convergence_timeout(self):
+        clock = itertools.count(0, 4)
+        time_patcher = mock.patch.object(polling.time, 'time',
+                                         side_effect=lambda: next(clock))
+        time_patcher.start()
+        self.addCleanup(time_patcher.stop)
+
+        results = rolling.rolling_upgrade(
+            ['a'], '2.0', mock.Mock(return_value=0),
+            mock.Mock(return_value={'release': '1.0'}), timeout=10)
+
+        self.assertEqual(1, results[0].code)
+        self.assertTrue('did not converge' in results[0].error)
+
+
+class dcos_quobyte_polling_test (unittest.TestCase):
+
+    def setUp(self):
+        print("\n------- Testing method " + self._testMethodName)
+
+    @mock.patch.object(polling.time, 'sleep')
+    def test_wait_for_backoff(self, mock_sleep):
+        check = mock.Mock(side_effect=[False, False, False, 'done'])
+
+        self.assertEqual('done', polling.wait_for(check, 60, interval=1,
+                                                  max_interval=3, factor=2))
+        self.assertEqual([mock.call(1), mock.call(2), mock.call(3)],
+                         mock_sleep.call_args_list)
+
+if __name__ == '__main__':
+    unittest.main()
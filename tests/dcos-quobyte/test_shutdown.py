@@ -0,0 +1,259 @@
+""" Unit tests for dcos-quobyte ordered shutdown """
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import json
+import sys
+import unittest
+
+import mock
+import requests
+from requests.exceptions import ConnectionError
+
+from dcos_quobyte import api
+from dcos_quobyte import cli
+from dcos_quobyte import discovery
+from dcos_quobyte import polling
+from dcos_quobyte import shutdown
+
+SERVICES = {'data-1': 'data', 'data-2': 'data', 'data-3': 'data',
+            'metadata-1': 'metadata', 'registry-1': 'registry',
+            'api-1': 'api'}
+
+
+class _Framework(object):
+    """Stops requested tasks after they were polled `polls` times"""
+
+    def __init__(self, services, polls=1, status_code=200):
+        self.live = dict(services)
+        self.polls = polls
+        self.status_code = status_code
+        self.stopping = {}
+        self.requests = []
+        self.client = mock.Mock()
+        self.client.request.side_effect = self.request
+
+    def request(self, method, url, data=None, headers=None):
+        body = json.loads(data)
+        self.requests.append((body['role'], body['tasks']))
+        if self.status_code == 200:
+            for task_id in body['tasks']:
+                self.stopping[task_id] = self.polls
+        return mock.Mock(status_code=self.status_code)
+
+    def fetch_live(self):
+        for task_id in list(self.stopping):
+            self.stopping[task_id] -= 1
+            if self.stopping[task_id] < 0:
+                del self.stopping[task_id]
+                del self.live[task_id]
+        return dict(self.live)
+
+
+class dcos_quobyte_shutdown_test (unittest.TestCase):
+
+    def setUp(self):
+        print("\n------- Testing method " + self._testMethodName)
+        sleep_patcher = mock.patch.object(polling.time, 'sleep')
+        self.mock_sleep = sleep_patcher.start()
+        self.addCleanup(sleep_patcher.stop)
+        self.url = 'http://a:1'
+
+    def test_live_services(self):
+        tasks = [discovery.Task('t1', 'data', 'TASK_RUNNING', 'S1', 'fw-1'),
+                 discovery.Task('t2', 'metadata', 'TASK_KILLING', 'S1',
+                                'fw-1'),
+                 discovery.Task('t3', 'data', 'TASK_FINISHED', 'S1', 'fw-1'),
+                 discovery.Task('t4', 'registry', 'TASK_RUNNING', 'S2',
+                                'fw-2')]
+
+        self.assertEqual({'t1': 'data', 't2': 'metadata'},
+                         shutdown.live_services(tasks, set(['fw-1'])))
+        self.assertEqual(3, len(shutdown.live_services(tasks)))
+
+    def test_run_in_order(self):
+        framework = _Framework(SERVICES, polls=2)
+
+        code, phases = shutdown.run(self.url, framework.fetch_live,
+                                    batch_size=2, client=framework.client)
+
+        self.assertEqual(0, code)
+        self.assertEqual([('data', ['data-1', 'data-2']), ('data', ['data-3']),
+                          ('metadata', ['metadata-1']),
+                          ('registry', ['registry-1']), ('api', ['api-1'])],
+                         framework.requests)
+        self.assertEqual({}, framework.live)
+        self.assertEqual([('data', 3, 3, 2), ('metadata', 1, 1, 1),
+                          ('registry', 1, 1, 1), ('api', 1, 1, 1)],
+                         [phase[:4] for phase in phases])
+        framework.client.request.assert_called_with(
+            'POST', self.url + '/v1/stop', data=mock.ANY,
+            headers={'Content-Type': 'application/json'})
+        # polls back off between checks of a batch
+        self.assertTrue(self.mock_sleep.called)
+
+    def test_run_timeout_keeps_later_tiers(self):
+        framework = _Framework(SERVICES, polls=100)
+
+        code, phases = shutdown.run(self.url, framework.fetch_live,
+                                    batch_size=2, timeout=0,
+                                    client=framework.client)
+
+        self.assertEqual(1, code)
+        self.assertEqual([('data', ['data-1', 'data-2'])], framework.requests)
+        self.assertEqual(shutdown.Phase('data', 3, 0, 1, mock.ANY,
+                                        "2 still running after 0s"),
+                         phases[0])
+
+    def test_run_unsupported(self):
+        framework = _Framework(SERVICES, status_code=404)
+
+        self.assertEqual((None, []), shutdown.run(
+            self.url, framework.fetch_live, client=framework.client))
+
+    def test_run_failed_request(self):
+        framework = _Framework(SERVICES, status_code=500)
+
+        code, phases = shutdown.run(self.url, framework.fetch_live,
+                                    client=framework.client)
+
+        self.assertEqual(500, code)
+        self.assertEqual("stop request failed", phases[0].error)
+
+    def test_request_stop_connection_error(self):
+        client = mock.Mock()
+        client.request.side_effect = ConnectionError()
+
+        self.assertEqual(2, shutdown.request_stop(self.url, 'data', ['t1'],
+                                                  client))
+
+    def test_wait_stopped_survives_master_errors(self):
+        fetch_live = mock.Mock(side_effect=[ConnectionError(), {'t2': 'data'},
+                                            {}])
+
+        self.assertEqual(set(), shutdown.wait_stopped(['t1', 't2'],
+                                                      fetch_live, 60))
+        self.assertEqual(3, fetch_live.call_count)
+
+    def test_format_phases(self):
+        self.assertEqual(
+            "data      3/3 stopped in 2 batches, 1.5s\n"
+            "metadata  0/1 stopped in 1 batch, 0.0s, stop request failed",
+            shutdown.format_phases([
+                shutdown.Phase('data', 3, 3, 2, 1.5, None),
+                shutdown.Phase('metadata', 1, 0, 1, 0.01,
+                               "stop request failed")]))
+        self.assertEqual("No Quobyte services were running.",
+                         shutdown.format_phases([]))
+
+
+class dcos_quobyte_ordered_stop_test (unittest.TestCase):
+
+    def setUp(self):
+        print("\n------- Testing method " + self._testMethodName)
+        cluster_key_patcher = mock.patch.object(discovery, 'cluster_key',
+                                                return_value=None)
+        cluster_key_patcher.start()
+        self.addCleanup(cluster_key_patcher.stop)
+        for patcher in (mock.patch.object(polling.time, 'sleep'),
+                        mock.patch.object(cli, 'dcos_client'),
+                        mock.patch.object(
+                            discovery, 'fetch_task_counts',
+                            return_value=[discovery.TaskCounts(
+                                'fw-1', 'http://a:1', {})])):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        print_patcher = mock.patch.object(cli, 'print')
+        self.mock_print = print_patcher.start()
+        self.addCleanup(print_patcher.stop)
+        client_patcher = mock.patch.object(
+            api, 'default_client', return_value=api.FrameworkClient())
+        client_patcher.start()
+        self.addCleanup(client_patcher.stop)
+        self.url = 'http://a:1'
+
+    def _stop(self, stop_status, tasks):
+        def request(method, url, **kwargs):
+            return mock.Mock(status_code=stop_status if url.endswith(
+                '/v1/stop') else 200)
+
+        with mock.patch.object(discovery, 'fetch_framework_tasks',
+                               side_effect=tasks) as mock_fetch_tasks, \
+                mock.patch.object(requests.Session, 'request',
+                                  side_effect=request) as mock_request:
+            code = cli.stop(self.url, ordered=True, batch_size=10,
+                            timeout=60)
+        return code, [(args[0], args[1]) for args, _
+                      in mock_request.call_args_list], mock_fetch_tasks
+
+    def test_stop_ordered(self):
+        running = [discovery.Task('d1', 'data', 'TASK_RUNNING', 'S1',
+                                  'fw-1'),
+                   discovery.Task('m1', 'metadata', 'TASK_RUNNING', 'S1',
+                                  'fw-1'),
+                   discovery.Task('x1', 'data', 'TASK_RUNNING', 'S1',
+                                  'fw-2')]
+
+        code, calls, mock_fetch_tasks = self._stop(
+            200, [running, running[1:], []])
+
+        self.assertEqual(0, code)
+        # the probe, then data and metadata
+        self.assertEqual([('POST', self.url + '/v1/stop')] * 3 +
+                         [('GET', self.url + '/v1/version')], calls)
+        self.assertEqual(3, mock_fetch_tasks.call_count)
+        self.mock_print.assert_called_once_with(mock.ANY)
+
+    def test_stop_unsupported(self):
+        running = [discovery.Task('d1', 'data', 'TASK_RUNNING', 'S1',
+                                  'fw-1')]
+
+        code, calls, mock_fetch_tasks = self._stop(404, [running])
+
+        self.assertEqual(0, code)
+        self.assertEqual([('POST', self.url + '/v1/stop'),
+                          ('GET', self.url + '/v1/version')], calls)
+        self.assertFalse(mock_fetch_tasks.called)
+        self.assertFalse(self.mock_print.called)
+
+    def test_stop_master_unavailable(self):
+        with mock.patch.object(cli.logging, 'warning') as mock_warning:
+            code, calls, _ = self._stop(200, ConnectionError())
+
+        self.assertEqual(0, code)
+        self.assertEqual([('POST', self.url + '/v1/stop'),
+                          ('GET', self.url + '/v1/version')], calls)
+        mock_warning.assert_called_once_with(mock.ANY)
+        self.assertFalse(self.mock_print.called)
+
+    def test_stop_unknown_host(self):
+        self.url = 'http://b:2'
+        running = [discovery.Task('d1', 'data', 'TASK_RUNNING', 'S1',
+                                  'fw-1')]
+
+        with mock.patch.object(cli.logging, 'warning') as mock_warning:
+            code, calls, mock_fetch_tasks = self._stop(200, [running])
+
+        self.assertEqual(0, code)
+        # the tasks of the framework at http://a:1 are left alone
+        self.assertEqual([('POST', self.url + '/v1/stop'),
+                          ('GET', self.url + '/v1/version')], calls)
+        self.assertFalse(mock_fetch_tasks.called)
+        mock_warning.assert_called_once_with(mock.ANY)
+
+    @mock.patch.object(shutdown, 'run', return_value=(0, []))
+    @mock.patch.object(discovery, 'fetch_framework_tasks', return_value=[])
+    @mock.patch.object(requests.Session, 'request',
+                       return_value=mock.Mock(status_code=200))
+    def test_main_stop_default_batch_size(self, mock_request,
+                                          mock_fetch_tasks, mock_run):
+        with mock.patch.object(sys, 'argv', ['dcos-quobyte', 'quobyte',
+                                             'stop', '--host=' + self.url]):
+            self.assertEqual(0, cli.main())
+
+        self.assertEqual(shutdown.DEFAULT_BATCH_SIZE,
+                         mock_run.call_args[0][2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,198 @@
+""" Unit tests for dcos-quobyte deployment specs and apply """
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+import requests
+import six
+from requests.exceptions import ConnectionError
+
+from dcos_quobyte import api
+from dcos_quobyte import cli
+from dcos_quobyte import discovery
+from dcos_quobyte import spec
+
+SCHEMA = json.loads(cli.SCHEMA)
+SPEC = {'release': '1.3',
+        'services': {'data': {'count': 5, 'mem': 4096,
+                              'constraints': [['hostname', 'UNIQUE']]},
+                     'registry': {'count': 3}}}
+STATE = {'release': '1.3', 'healthy': True,
+         'services': {'data': {'count': 5, 'mem': 4096, 'cpus': 2,
+                               'constraints': [['hostname', 'UNIQUE']]},
+                      'registry': {'count': 3, 'cpus': 1},
+                      'metadata': {'count': 3}}}
+
+
+class dcos_quobyte_spec_test (unittest.TestCase):
+
+    def setUp(self):
+        print("\n------- Testing method " + self._testMethodName)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.url = 'http://a:1'
+
+    def _write(self, document):
+        path = os.path.join(self.tmp_dir, 'spec.json')
+        with open(path, 'w') as spec_file:
+            if not isinstance(document, six.string_types):
+                document = json.dumps(document)
+            spec_file.write(document)
+        return path
+
+    def test_load(self):
+        self.assertEqual(SPEC, spec.load(self._write(SPEC), SCHEMA))
+
+    def test_load_invalid(self):
+        for document in ({'release': 1},
+                         {'services': {'gateway': {'count': 1}}},
+                         {'services': {'data': {'count': -1}}},
+                         {'services': {'data': {'cpus': 0}}},
+                         {'services': {'data': {}}},
+                         {'services': {'data': {'constraints': [['a']]}}},
+                         {'replicas': 3}):
+            self.assertRaises(ValueError, spec.load, self._write(document),
+                              SCHEMA)
+
+    def test_load_unparsable(self):
+        self.assertRaises(ValueError, spec.load, self._write('{"release"'),
+                          SCHEMA)
+
+    def test_diff_unchanged(self):
+        plan = spec.diff(SPEC, STATE)
+
+        self.assertTrue(spec.is_empty(plan))
+        self.assertEqual([], spec.format_plan(plan, STATE))
+
+    def test_diff_changed(self):
+        desired = {'release': '1.4',
+                   'services': {'data': {'count': 6, 'mem': 4096},
+                                'registry': {'count': 3, 'disk': 100}}}
+
+        plan = spec.diff(desired, STATE)
+
+        self.assertEqual('1.4', plan.release)
+        self.assertEqual({'data': {'count': 6},
+                          'registry': {'disk': 100}}, plan.services)
+        self.assertEqual(['release 1.3 -> 1.4',
+                          'registry disk - -> 100',
+                          'data count 5 -> 6'],
+                         spec.format_plan(plan, STATE))
+
+    def test_diff_without_state(self):
+        plan = spec.diff(SPEC, None)
+
+        self.assertEqual('1.3', plan.release)
+        self.assertEqual(SPEC['services'], plan.services)
+
+    def test_update_services(self):
+        client = mock.Mock()
+        client.request.return_value.status_code = 200
+
+        self.assertEqual(0, spec.update_services(self.url + '/',
+                                                 {'data': {'count': 6}},
+                                                 client))
+        client.request.assert_called_once_with(
+            'PUT', self.url + '/v1/services',
+            data=json.dumps({'data': {'count': 6}}),
+            headers={'Content-Type': 'application/json'})
+
+    def test_update_services_failed(self):
+        client = mock.Mock()
+        client.request.return_value.status_code = 404
+        self.assertEqual(404, spec.update_services(self.url, {}, client))
+
+        client.request.side_effect = ConnectionError()
+        self.assertEqual(2, spec.update_services(self.url, {}, client))
+
+
+class dcos_quobyte_apply_test (unittest.TestCase):
+
+    def setUp(self):
+        print("\n------- Testing method " + self._testMethodName)
+        cluster_key_patcher = mock.patch.object(discovery, 'cluster_key',
+                                                return_value=None)
+        cluster_key_patcher.start()
+        self.addCleanup(cluster_key_patcher.stop)
+        client_patcher = mock.patch.object(
+            api, 'default_client', return_value=api.FrameworkClient())
+        client_patcher.start()
+        self.addCleanup(client_patcher.stop)
+        print_patcher = mock.patch.object(cli, 'print')
+        self.mock_print = print_patcher.start()
+        self.addCleanup(print_patcher.stop)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.path = os.path.join(self.tmp_dir, 'spec.json')
+        self.url = 'http://a:1'
+
+    def _apply(self, document, state, **kwargs):
+        with open(self.path, 'w') as spec_file:
+            json.dump(document, spec_file)
+        responses = {'/v1/state': mock.Mock(status_code=200),
+                     '/v1/services': mock.Mock(status_code=200),
+                     '/v1/version': mock.Mock(status_code=200)}
+        responses['/v1/state'].json.return_value = state
+
+        def request(method, url, **request_kwargs):
+            return responses[url[len(self.url):]]
+
+        with mock.patch.object(requests.Session, 'request',
+                               side_effect=request) as mock_request:
+            code = cli.apply(self.path, self.url, **kwargs)
+        return code, [(args[0], args[1][len(self.url):])
+                      for args, _ in mock_request.call_args_list]
+
+    def test_apply_unchanged(self):
+        code, calls = self._apply(SPEC, STATE)
+
+        self.assertEqual(0, code)
+        self.assertEqual([('GET', '/v1/state')], calls)
+        self.mock_print.assert_called_once_with(self.url +
+                                                "  matches the spec")
+
+    def test_apply_changed_service(self):
+        desired = {'services': {'data': {'count': 6}}}
+
+        code, calls = self._apply(desired, STATE)
+
+        self.assertEqual(0, code)
+        self.assertEqual([('GET', '/v1/state'), ('PUT', '/v1/services')],
+                         calls)
+
+    def test_apply_release(self):
+        code, calls = self._apply(dict(SPEC, release='1.4'), STATE)
+
+        self.assertEqual(0, code)
+        self.assertEqual([('GET', '/v1/state'), ('GET', '/v1/version')],
+                         calls)
+
+    def test_apply_dry_run(self):
+        code, calls = self._apply({'release': '1.4'}, STATE, dry_run=True)
+
+        self.assertEqual(0, code)
+        self.assertEqual([('GET', '/v1/state')], calls)
+        self.mock_print.assert_called_once_with(self.url +
+                                                "  release 1.3 -> 1.4")
+
+    @mock.patch.object(api.time, 'sleep')
+    def test_apply_unreachable(self, mock_sleep):
+        with open(self.path, 'w') as spec_file:
+            json.dump(SPEC, spec_file)
+
+        with mock.patch.object(requests.Session, 'request',
+                               side_effect=ConnectionError) as mock_request:
+            self.assertEqual(2, cli.apply(self.path, self.url))
+        self.assertTrue(all(args[1] == self.url + '/v1/state'
+                            for args, _ in mock_request.call_args_list))
+        self.assertFalse(self.mock_print.called)
+
+
+if __name__ == '__main__':
+    unittest.main()
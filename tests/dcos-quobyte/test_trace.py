@@ -0,0 +1,100 @@
+""" Unit tests for the dcos-quobyte timing spans """
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+import requests
+from requests.exceptions import ConnectionError
+
+from dcos_quobyte import api
+from dcos_quobyte import trace
+
+
+class dcos_quobyte_trace_test (unittest.TestCase):
+
+    def setUp(self):
+        print("\n------- Testing method " + self._testMethodName)
+        self.output = io.StringIO()
+        self.addCleanup(trace.disable)
+
+    def _spans(self):
+        return [json.loads(line) for line
+                in self.output.getvalue().splitlines()]
+
+    def test_disabled_span_is_shared(self):
+        self.assertFalse(trace.enabled())
+        with trace.span('a', key=1) as span:
+            span.set('b', 2)
+            span.add('c')
+        self.assertIs(span, trace.span('b'))
+        self.assertEqual('', self.output.getvalue())
+
+    def test_nested_spans(self):
+        trace.enable(self.output)
+        with trace.span('outer', host='a') as outer:
+            with trace.span('inner') as inner:
+                inner.add('bytes', 10)
+                inner.add('bytes', 5)
+            outer.set('code', 0)
+
+        first, second = self._spans()
+        self.assertEqual('inner', first['name'])
+        self.assertEqual(15, first['bytes'])
+        self.assertEqual(second['span'], first['parent'])
+        self.assertEqual(first['trace'], second['trace'])
+        self.assertEqual('outer', second['name'])
+        self.assertIsNone(second['parent'])
+        self.assertEqual({'host': 'a', 'code': 0},
+                         dict((key, second[key]) for key in ('host', 'code')))
+        self.assertTrue(second['duration_ms'] >= first['duration_ms'] >= 0)
+
+    def test_error_recorded(self):
+        trace.enable(self.output)
+        with self.assertRaises(ValueError):
+            with trace.span('failing'):
+                raise ValueError('boom')
+
+        span, = self._spans()
+        self.assertEqual('ValueError: boom', span['error'])
+
+    def test_enable_from_environ(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'trace.jsonl')
+
+        with mock.patch.dict(os.environ, {trace.TRACE_ENV: '0'}):
+            self.assertFalse(trace.enable_from_environ())
+        with mock.patch.dict(os.environ, {trace.TRACE_ENV: path}):
+            self.assertTrue(trace.enable_from_environ())
+        with trace.span('to_file'):
+            pass
+        trace.disable()
+
+        with open(path) as trace_file:
+            self.assertEqual('to_file', json.loads(trace_file.read())['name'])
+
+    @mock.patch.object(api.time, 'sleep')
+    @mock.patch.object(requests.Session, 'request')
+    def test_http_span(self, mock_request, mock_sleep):
+        ok = mock.Mock(status_code=requests.codes.ok, content=b'{"a": 1}')
+        mock_request.side_effect = [ConnectionError, ok]
+        trace.enable(self.output)
+
+        api.FrameworkClient(retries=2).get('http://test.adr:1234/v1/state')
+
+        span, = self._spans()
+        self.assertEqual('http', span['name'])
+        self.assertEqual('GET', span['method'])
+        self.assertEqual(200, span['status'])
+        self.assertEqual(1, span['retries'])
+        self.assertEqual(8, span['bytes'])
+
+if __name__ == '__main__':
+    unittest.main()
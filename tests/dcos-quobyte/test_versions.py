@@ -0,0 +1,88 @@
+""" Unit tests for dcos-quobyte release negotiation and prefetching """
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import unittest
+
+import mock
+from requests.exceptions import ConnectionError
+
+from dcos_quobyte import polling
+from dcos_quobyte import versions
+
+
+def _client(*codes):
+    client = mock.Mock()
+    client.get.side_effect = [mock.Mock(status_code=code) for code in codes]
+    return client
+
+
+class dcos_quobyte_versions_test (unittest.TestCase):
+
+    def setUp(self):
+        print("\n------- Testing method " + self._testMethodName)
+        sleep_patcher = mock.patch.object(polling.time, 'sleep')
+        sleep_patcher.start()
+        self.addCleanup(sleep_patcher.stop)
+        self.url = 'http://a:1'
+
+    def test_is_current(self):
+        self.assertTrue(versions.is_current({'release': '2.0'}, '2.0'))
+        self.assertFalse(versions.is_current(None, '2.0'))
+        self.assertFalse(versions.is_current({'release': '1.0'}, '2.0'))
+        self.assertFalse(versions.is_current({'release': '2.0',
+                                              'healthy': False}, '2.0'))
+
+    def test_runs_release(self):
+        get_state = mock.Mock(side_effect=[{'release': '2.0'},
+                                           ConnectionError(), ValueError()])
+
+        self.assertTrue(versions.runs_release(self.url, '2.0', get_state))
+        self.assertFalse(versions.runs_release(self.url, '2.0', get_state))
+        self.assertFalse(versions.runs_release(self.url, '2.0', get_state))
+
+    def test_prefetch(self):
+        client = _client(202, 202, 200)
+
+        self.assertEqual(0, versions.prefetch(self.url + '/', '2.0', client))
+        self.assertEqual(3, client.get.call_count)
+        client.get.assert_called_with(self.url + '/v1/prefetch', data='2.0')
+
+    def test_prefetch_unsupported(self):
+        for code in versions.PREFETCH_UNSUPPORTED:
+            self.assertEqual(0, versions.prefetch(self.url, '2.0',
+                                                  _client(code)))
+
+    def test_prefetch_failed(self):
+        self.assertEqual(500, versions.prefetch(self.url, '2.0',
+                                                _client(202, 500)))
+
+    def test_prefetch_unreachable(self):
+        client = mock.Mock()
+        client.get.side_effect = ConnectionError()
+
+        self.assertEqual(2, versions.prefetch(self.url, '2.0', client))
+
+    @mock.patch.object(polling.time, 'time', side_effect=[0, 0, 10, 10])
+    def test_prefetch_timeout(self, mock_time):
+        client = mock.Mock()
+        client.get.return_value = mock.Mock(status_code=202)
+
+        self.assertEqual(1, versions.prefetch(self.url, '2.0', client,
+                                              timeout=5))
+
+    def test_prefetch_no_release(self):
+        self.assertRaises(ValueError, versions.prefetch, self.url, None,
+                          _client())
+
+    @mock.patch.object(versions, 'prefetch', side_effect=[0, 500])
+    def test_prefetch_all(self, mock_prefetch):
+        results = versions.prefetch_all(['http://a:1', 'http://b:2'], '2.0',
+                                        parallel=1, timeout=5)
+
+        self.assertEqual([0, 500], [result.code for result in results])
+        mock_prefetch.assert_called_with('http://b:2', '2.0', timeout=5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,196 @@
+""" Unit tests for dcos-quobyte volume provisioning """
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import httpstub
+import mock
+from six.moves.urllib.parse import unquote
+
+from dcos_quobyte import api
+from dcos_quobyte import cli
+from dcos_quobyte import discovery
+from dcos_quobyte import volumes
+
+MANIFEST = {'tenant': 'analytics', 'configuration': 'BASE',
+            'volumes': [{'name': 'vol-' + str(i)} for i in range(25)] +
+            [{'name': 'home dir', 'tenant': 'users', 'user': 'ann'}]}
+
+
+class _Handler(httpstub.Handler):
+
+    def do_PUT(self):
+        body = json.loads(self.read_body().decode('utf-8'))
+        with self.server.lock:
+            self.server.calls.append(('PUT', self.path))
+            if self.path in self.server.failing:
+                return self.respond(500)
+            status = 409 if self.path in self.server.volumes else 201
+            self.server.volumes[self.path] = body
+        self.respond(status)
+
+    def do_DELETE(self):
+        with self.server.lock:
+            self.server.calls.append(('DELETE', self.path))
+            status = 204 if self.server.volumes.pop(self.path, None) \
+                else 404
+        self.respond(status)
+
+    def do_GET(self):
+        entries = [{'tenant': unquote(path.split('/')[3]),
+                    'name': unquote(path.split('/')[4]),
+                    'configuration': body.get('configuration')}
+                   for path, body in self.server.volumes.items()]
+        if self.path.endswith('?tenant=users'):
+            entries = [entry for entry in entries
+                       if entry['tenant'] == 'users']
+        self.respond(200, json.dumps({'volumes': entries}).encode('utf-8'))
+
+
+class dcos_quobyte_volumes_test (unittest.TestCase):
+
+    def setUp(self):
+        print("\n------- Testing method " + self._testMethodName)
+        self.server, self.url = httpstub.serve(
+            self, _Handler, lock=threading.Lock(), calls=[], volumes={},
+            failing=set())
+        self.client = api.FrameworkClient(retries=0)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.manifest = os.path.join(self.tmp_dir, 'volumes.json')
+        with open(self.manifest, 'w') as manifest_file:
+            json.dump(MANIFEST, manifest_file)
+
+    def test_parse_manifest(self):
+        parsed = volumes.load_manifest(self.manifest)
+
+        self.assertEqual(26, len(parsed))
+        self.assertEqual(volumes.Volume('analytics', 'vol-0', 'BASE', None,
+                                        None), parsed[0])
+        self.assertEqual(volumes.Volume('users', 'home dir', 'BASE', 'ann',
+                                        None), parsed[-1])
+        self.assertEqual([volumes.Volume('t', 'v', None, None, None)],
+                         volumes.parse_manifest([{'tenant': 't',
+                                                  'name': 'v'}]))
+
+    def test_parse_manifest_invalid(self):
+        for document in ({}, {'volumes': [{'name': 'v'}]},
+                         {'tenant': 't', 'volumes': [{'name': 'v'},
+                                                     {'name': 'v'}]},
+                         {'volumes': ['v']}):
+            self.assertRaises(ValueError, volumes.parse_manifest, document)
+
+    def test_provision(self):
+        wanted = volumes.load_manifest(self.manifest)
+        self.server.failing = set(['/v1/volumes/analytics/vol-3'])
+        journal = volumes.Journal(self.manifest + '.journal', 'create')
+
+        results = volumes.provision('create', self.url, wanted, parallel=4,
+                                    batch_size=10, journal=journal,
+                                    client=self.client)
+
+        self.assertEqual(wanted, [result.volume for result in results])
+        self.assertEqual(['analytics/vol-3'], [
+            volumes.key(result.volume)
+            for result in volumes.failures(results)])
+        self.assertEqual({'user': 'ann', 'configuration': 'BASE'},
+                         self.server.volumes['/v1/volumes/users/home%20dir'])
+        self.assertEqual(25, len(journal.done()))
+
+        # the repeated run only sends the failed volume and removes the
+        # journal
+        self.server.failing = set()
+        self.server.calls = []
+        results = volumes.provision('create', self.url, wanted, parallel=4,
+                                    batch_size=10, journal=journal,
+                                    client=self.client)
+
+        self.assertEqual([('PUT', '/v1/volumes/analytics/vol-3')],
+                         self.server.calls)
+        self.assertEqual([], volumes.failures(results))
+        self.assertFalse(os.path.exists(journal.path))
+
+    def test_provision_idempotent(self):
+        wanted = volumes.load_manifest(self.manifest)[:3]
+
+        for action in ('create', 'create', 'delete', 'delete'):
+            results = volumes.provision(action, self.url, wanted,
+                                        parallel=2, client=self.client)
+            self.assertEqual([], volumes.failures(results))
+        self.assertEqual({}, self.server.volumes)
+
+    def test_journal_other_action(self):
+        journal = volumes.Journal(self.manifest + '.journal', 'create')
+        journal.record([volumes.ItemResult(
+            volumes.Volume('t', 'v', None, None, None), 0, 201, None, 0.1)])
+        with open(journal.path, 'a') as journal_file:
+            journal_file.write('{"action": "cre')
+
+        self.assertEqual(set(['t/v']), journal.done())
+        self.assertEqual(set(), volumes.Journal(journal.path,
+                                                'delete').done())
+
+    def test_journal_later_action_clears(self):
+        path = self.manifest + '.journal'
+        first, second = [volumes.ItemResult(
+            volumes.Volume('t', name, None, None, None), 0, 200, None, 0.1)
+            for name in ('a', 'b')]
+        volumes.Journal(path, 'create').record([first, second])
+        # a partial delete of the created volumes
+        volumes.Journal(path, 'delete').record([first])
+
+        self.assertEqual(set(['t/b']), volumes.Journal(path, 'create').done())
+        self.assertEqual(set(['t/a']), volumes.Journal(path, 'delete').done())
+
+    def test_provision_unexpected_error(self):
+        wanted = volumes.load_manifest(self.manifest)[:3]
+        journal = volumes.Journal(self.manifest + '.journal', 'create')
+        request = self.client.request
+
+        def flaky_request(method, url, **kwargs):
+            if url.endswith('/vol-1'):
+                raise ValueError("bad body")
+            return request(method, url, **kwargs)
+
+        with mock.patch.object(self.client, 'request',
+                               side_effect=flaky_request):
+            results = volumes.provision('create', self.url, wanted,
+                                        parallel=2, journal=journal,
+                                        client=self.client)
+
+        self.assertEqual([0, 1, 0], [result.code for result in results])
+        self.assertEqual("bad body", results[1].error)
+        self.assertEqual(set(['analytics/vol-0', 'analytics/vol-2']),
+                         journal.done())
+
+    @mock.patch.object(cli, 'print')
+    @mock.patch.object(discovery, 'cluster_key', return_value=None)
+    def test_cli_volumes(self, mock_cluster_key, mock_print):
+        self.assertEqual(0, cli.volumes('create', self.url,
+                                        manifest=self.manifest, parallel=8))
+        self.assertEqual("26/26 volumes created.",
+                         mock_print.call_args[0][0])
+
+        self.assertEqual(0, cli.volumes('list', self.url, tenant='users'))
+        self.assertEqual("TENANT  NAME      CONFIGURATION\n"
+                         "users   home dir  BASE",
+                         mock_print.call_args[0][0])
+
+        self.server.failing = set(['/v1/volumes/users/home%20dir'])
+        self.server.volumes = {}
+        self.assertEqual(1, cli.volumes('create', self.url,
+                                        manifest=self.manifest, parallel=8,
+                                        output_json=True))
+        report = json.loads(mock_print.call_args[0][0])
+        self.assertEqual((25, 1), (report['succeeded'], report['failed']))
+        self.assertEqual(500, report['volumes'][-1]['status'])
+
+
+if __name__ == '__main__':
+    unittest.main()